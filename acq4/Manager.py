@@ -15,6 +15,7 @@ import gc
 import getopt
 import os
 import sys
+import threading
 import time
 import weakref
 from collections import OrderedDict
@@ -32,6 +33,7 @@ from .util import DataManager, ptime, Qt
 from .util.DataManager import DirHandle
 from .util.HelpfulException import HelpfulException
 from .util.debug import logExc, logMsg, createLogWindow
+from .util.device_loader import DeviceLoader, formatStartupReport
 
 _ = logExc  # prevent cleanup of logExc; needed by debug
 
@@ -75,6 +77,8 @@ class Manager(Qt.QObject):
         # self.devices = OrderedDict()  # all currently loaded devices
         self.modules = OrderedDict()  # all currently running modules
         self.devices = OrderedDict()  # all devices loaded via Manager
+        self._lazyDevices = OrderedDict()  # name: (driver, config) of devices to be loaded on first use
+        self.deviceLoadTimes = OrderedDict()  # name: import/init times recorded by DeviceLoader
         self.definedModules = OrderedDict()  # all custom-defined module configurations
         self.config = OrderedDict()
         self.currentDir = None
@@ -304,30 +308,7 @@ class Manager(Qt.QObject):
 
                 ## configure new devices
                 elif key == 'devices':
-                    for k in cfg['devices']:
-                        if self.disableAllDevs or k in self.disableDevs:
-                            print(f"    --> Ignoring device '{k}' -- disabled by request")
-                            logMsg(f"    --> Ignoring device '{k}' -- disabled by request")
-                            continue
-                        print(f"  === Configuring device '{k}' ===")
-                        logMsg(f"  === Configuring device '{k}' ===")
-                        try:
-                            conf = cfg['devices'][k]
-                            try:
-                                driverName = conf['driver']
-                            except KeyError as exc:
-                                raise KeyError(f"No driver specified for device {k}") from exc
-                            if 'config' in conf:  # for backward compatibility
-                                conf = conf['config']
-                            self.loadDevice(driverName, conf, k)
-                        except:
-                            print(f"Error configuring device {k}:")
-                            if self.exitOnError:
-                                raise
-                            else:
-                                printExc()
-                    print("=== Device configuration complete ===")
-                    logMsg("=== Device configuration complete ===")
+                    self._loadDevices(cfg['devices'], cfg.get('deviceLoading', {}))
 
                 ## Copy in new module definitions
                 elif key == 'modules':
@@ -340,6 +321,13 @@ class Manager(Qt.QObject):
                     logMsg(f"=== Setting base directory: {cfg['storageDir']} ===")
                     self.setBaseDir(cfg['storageDir'])
 
+                ## persistent cache of parsed directory index files
+                elif key == 'indexCache':
+                    cacheFile = cfg['indexCache']
+                    if cacheFile is not None:
+                        cacheFile = os.path.join(self.configDir, cacheFile)
+                    DataManager.getDataManager().setIndexCache(cacheFile)
+
                 elif key == 'defaultCompression':
                     comp = cfg['defaultCompression']
                     try:
@@ -396,6 +384,99 @@ class Manager(Qt.QObject):
                 else:
                     printExc("Error in ACQ4 configuration:")
 
+    def _loadDevices(self, devConfigs, options):
+        """Load the devices defined in *devConfigs* using a DeviceLoader.
+
+        Driver modules are imported concurrently, and devices are constructed in dependency order. Device
+        entries may set ``lazy: True`` to defer construction until the first getDevice() call for that
+        device. *options* (the 'deviceLoading' config key) may set ``workers`` (default 4; 0 imports drivers
+        one at a time and loads devices in configuration order).
+        """
+        entries = OrderedDict()
+        lazy = set()
+        for k in devConfigs:
+            if self.disableAllDevs or k in self.disableDevs:
+                print(f"    --> Ignoring device '{k}' -- disabled by request")
+                logMsg(f"    --> Ignoring device '{k}' -- disabled by request")
+                continue
+            try:
+                conf = devConfigs[k]
+                try:
+                    driverName = conf['driver']
+                except KeyError as exc:
+                    raise KeyError(f"No driver specified for device {k}") from exc
+                if conf.get('lazy', False):
+                    lazy.add(k)
+                if 'config' in conf:  # for backward compatibility
+                    conf = conf['config']
+                else:
+                    conf = conf.copy()
+                    conf.pop('lazy', None)
+                entries[k] = (driverName, conf)
+            except:
+                print(f"Error configuring device {k}:")
+                if self.exitOnError:
+                    raise
+                else:
+                    printExc()
+
+        # lazy devices that are referred to by other (non-lazy) devices must be loaded now
+        changed = True
+        while changed:
+            changed = False
+            for name in list(lazy):
+                for other, (driver, conf) in entries.items():
+                    if other not in lazy and name in DeviceLoader.dependencies(other, conf, {name}):
+                        lazy.discard(name)
+                        changed = True
+                        break
+        for name in lazy:
+            print(f"    --> Deferring device '{name}' until first use")
+            logMsg(f"    --> Deferring device '{name}' until first use")
+            self._lazyDevices[name] = entries.pop(name)
+
+        def log(msg):
+            print(msg)
+            logMsg(msg)
+
+        def onError(name):
+            print(f"Error configuring device {name}:")
+            if self.exitOnError:
+                raise
+            else:
+                printExc()
+
+        loader = DeviceLoader(self, workers=options.get('workers', 4), onError=onError, log=log)
+        loader.load(entries)
+        self.deviceLoadTimes.update(loader.times)
+        print(loader.report())
+        msg = f"=== Device configuration complete ({len(entries)} devices in {loader.totalTime:.1f} s) ==="
+        print(msg)
+        logMsg(msg)
+
+    def _loadLazyDevice(self, name):
+        """Construct a device that was configured with ``lazy: True``; called on the first getDevice(name)."""
+        if threading.current_thread() is not threading.main_thread():
+            from .util.threadrun import runInGuiThread
+            return runInGuiThread(self._loadLazyDevice, name)
+        with self.lock:
+            entry = self._lazyDevices.get(name)
+        if entry is None:
+            # loaded by an earlier request
+            return self.getInterface('device', name)
+        logMsg(f"  === Configuring device '{name}' (first use) ===")
+        loader = DeviceLoader(self, workers=0)
+        loader.load({name: entry})  # raises if the device fails; it stays lazy so the next request retries
+        with self.lock:
+            self._lazyDevices.pop(name, None)
+        self.deviceLoadTimes[name] = dict(loader.times[name], lazy=True)
+        return self.getInterface('device', name)
+
+    def deviceStartupReport(self):
+        """Return a table of import and construction times for all devices loaded so far."""
+        totalTime = sum(t['import'] + t['init'] for t in self.deviceLoadTimes.values())
+        return formatStartupReport(self.deviceLoadTimes, totalTime)
+
     def listConfigurations(self):
         """Return a list of the named configurations available"""
         return list(self.config.get('configurations', {}).keys())
@@ -470,13 +551,23 @@ class Manager(Qt.QObject):
         try:
             return self.getInterface('device', name)
         except KeyError:
-            raise Exception("No device named %s. Options are %s" % (name, ','.join(self.listDevices())))
+            if name in self._lazyDevices:
+                return self._loadLazyDevice(name)
+            options = self.listDevices() + self.listLazyDevices()
+            raise Exception("No device named %s. Options are %s" % (name, ','.join(options)))
 
     def listDevices(self):
         """Return a list of the names of available devices.
         """
         return self.listInterfaces('device')
 
+    def listLazyDevices(self):
+        """Return the names of devices configured with ``lazy: True`` that have not been requested yet.
+
+        These are not included in listDevices(); they are loaded by the first getDevice() call for them.
+        """
+        return list(self._lazyDevices.keys())
+
     def reserveDevices(self, devices, timeout=10.0):
         """Return a DeviceLocker that can be used to reserve multiple devices simultaneously::
 
@@ -943,6 +1034,16 @@ class Task:
         self.startTime = None
         self.stopTime = None
 
+        # Threads blocked in wait() sleep on this condition; see notifyDeviceDone() and interruptWait()
+        self._waitCondition = threading.Condition()
+        self._waitInterrupted = False
+
+        # Set by prepare(); see execute()
+        self._prepared = False
+        self._armed = False
+        self._configOrder = None
+        self._startOrder = None
+
         # self.reserved = False
         try:
             self.cfg = command['protocol']
@@ -1023,6 +1124,49 @@ class Task:
         order = self.toposort(deps)
         return order
 
+    def prepare(self):
+        """Configure all device tasks once so that this task may be executed repeatedly.
+
+        After prepare(), each call to execute() skips device configuration and instead asks
+        each DeviceTask to rearm(), which typically only rewrites output buffers. Use
+        updateCommand() to change waveforms or holding values between runs.
+        """
+        with self.taskLock:
+            reserved = self.deviceLock is not None
+            self.reserveDevices()
+            try:
+                self._configOrder = self.getConfigOrder()
+                for devName in self._configOrder:
+                    self.tasks[devName].configure()
+                self._startOrder = self.getStartOrder()
+                self._prepared = True
+                self._armed = True
+            except:
+                self._prepared = False
+                raise
+            finally:
+                if not reserved:
+                    self.releaseDevices()
+
+    def isPrepared(self):
+        return self._prepared
+
+    def updateCommand(self, command):
+        """Update the command of a prepared task between runs, without reconfiguring devices.
+
+        *command* maps device names to dicts containing only the command keys that should
+        change. Raises NotImplementedError (or ValueError) if any device cannot apply the change,
+        in which case a new task must be created.
+        """
+        with self.taskLock:
+            if not self._prepared:
+                raise RuntimeError("updateCommand() requires a prepared task; see Task.prepare().")
+            for devName, devCmd in command.items():
+                if devName == 'protocol':
+                    raise ValueError("Cannot update the protocol section of a prepared task.")
+                self.tasks[devName].updateCommand(devCmd)
+                self.command[devName].update(devCmd)
+
     def execute(self, block=True, processEvents=True):
         """Start the task.
 
@@ -1034,6 +1178,8 @@ class Task:
             self.stopped = False  # whether sub-tasks have been stopped yet
             self.abortRequested = False
             self._done = False  # cached output of isDone()
+            self.startTime = None
+            self.stopTime = None
 
 
             ## We need to make sure devices are stopped and unlocked properly if anything goes wrong..
@@ -1046,17 +1192,26 @@ class Task:
 
                 prof.mark('reserve')
 
-                ## Determine order of device configuration.
-                configOrder = self.getConfigOrder()
+                if self._prepared:
+                    ## Prepared tasks are configured only once; afterward each run just re-arms the devices.
+                    if not self._armed:
+                        for devName in self._configOrder:
+                            self.tasks[devName].rearm()
+                            prof.mark(f'rearm {devName}')
+                    self._armed = False
+                    startOrder = self._startOrder
+                else:
+                    ## Determine order of device configuration.
+                    configOrder = self.getConfigOrder()
 
-                ## Configure all subtasks. Some devices may need access to other tasks, so we make all available here.
-                ## This is how we allow multiple devices to communicate and decide how to operate together.
-                ## Each task may modify the startOrder list to suit its needs.
-                for devName in configOrder:
-                    self.tasks[devName].configure()
-                    prof.mark(f'configure {devName}')
+                    ## Configure all subtasks. Some devices may need access to other tasks, so we make all available here.
+                    ## This is how we allow multiple devices to communicate and decide how to operate together.
+                    ## Each task may modify the startOrder list to suit its needs.
+                    for devName in configOrder:
+                        self.tasks[devName].configure()
+                        prof.mark(f'configure {devName}')
 
-                startOrder = self.getStartOrder()
+                    startOrder = self.getStartOrder()
 
                 if 'leadTime' in self.cfg:
                     time.sleep(self.cfg['leadTime'])
@@ -1082,22 +1237,8 @@ class Task:
                     return
 
                 ## Wait until all tasks are done
-                lastProcess = ptime.time()
-                isGuiThread = Qt.QThread.currentThread() == Qt.QCoreApplication.instance().thread()
-                while not self.isDone():
-                    now = ptime.time()
-                    elapsed = now - self.startTime
-                    if isGuiThread:
-                        if processEvents and now - lastProcess > 20e-3:  ## only process Qt events every 20ms
-                            Qt.QApplication.processEvents()
-                            lastProcess = ptime.time()
-
-                    ## If the task duration has not elapsed yet, only wake up every 10ms, and attempt to wake up 5ms before the end
-                    if elapsed < self.cfg['duration'] - 10e-3:
-                        sleep = min(10e-3, self.cfg['duration'] - elapsed - 5e-3)
-                    else:
-                        sleep = 1.0e-3  ## afterward, wake up more quickly so we can respond as soon as the task finishes
-                    time.sleep(sleep)
+                while not self.wait(processEvents=processEvents):
+                    pass
 
                 self.stop()
             except:
@@ -1148,6 +1289,73 @@ class Task:
             self._done = d
             return d
 
+    @property
+    def done(self):
+        """True if all device tasks are completed; see isDone()."""
+        return self.isDone()
+
+    def wait(self, timeout=None, processEvents=False):
+        """Block until the task has completed.
+
+        Rather than polling isDone(), the calling thread sleeps until the requested task duration
+        has elapsed and then blocks on each device task's waitUntilDone() (the NI-DAQ, for example,
+        waits inside the driver). The task timeout is still enforced as in isDone().
+
+        If *processEvents* is True and this is called from the GUI thread, Qt events are processed
+        every 20 ms while waiting.
+
+        Return True if the task is done, or False if *timeout* seconds elapsed or interruptWait()
+        was called first. Raise an exception if the task failed or timed out.
+        """
+        start = ptime.time()
+        inGuiThread = processEvents and Qt.QThread.currentThread() == Qt.QCoreApplication.instance().thread()
+        interval = 20e-3 if inGuiThread else 100e-3  ## upper bound on each sleep so we can check for timeouts
+        while not self.isDone():
+            with self._waitCondition:
+                if self._waitInterrupted:
+                    self._waitInterrupted = False
+                    return False
+
+            now = ptime.time()
+            sleep = interval
+            if timeout is not None:
+                sleep = min(sleep, start + timeout - now)
+                if sleep <= 0:
+                    return False
+
+            if inGuiThread:
+                Qt.QApplication.processEvents()
+
+            elapsed = None if self.startTime is None else now - self.startTime
+            if elapsed is None or elapsed < self.cfg['duration']:
+                ## No device can finish before the requested duration; sleep until then unless woken early
+                if elapsed is not None:
+                    sleep = min(sleep, self.cfg['duration'] - elapsed)
+                with self._waitCondition:
+                    if not self._waitInterrupted:
+                        self._waitCondition.wait(sleep)
+            else:
+                ## Block on each device until it reports completion
+                deadline = now + sleep
+                for devTask in list(self.tasks.values()):
+                    remaining = deadline - ptime.time()
+                    if remaining <= 0 or not devTask.waitUntilDone(remaining):
+                        break
+        return True
+
+    def notifyDeviceDone(self, devTask=None):
+        """Wake threads blocked in wait(); called by DeviceTask.notifyDone()."""
+        with self._waitCondition:
+            self._waitCondition.notify_all()
+
+    def interruptWait(self):
+        """Cause the current (or next) call to wait() to return False, e.g. so that a worker
+        thread can check whether it has been asked to abort.
+        """
+        with self._waitCondition:
+            self._waitInterrupted = True
+            self._waitCondition.notify_all()
+
     def _tasksDone(self):
         for t in self.tasks:
             if not self.tasks[t].isDone():
@@ -1171,8 +1379,11 @@ class Task:
             return ptime.time() - self.startTime
         return self.stopTime - self.startTime
 
-    def stop(self, abort=False):
+    def stop(self, abort=False, storeData=True):
         """Stop all tasks and read data. If abort is True, do not attempt to collect results from the task.
+
+        If storeData is False, storage requested by the protocol ('storeData') is skipped; call storeResult()
+        afterward (possibly from another thread) to write the data.
         """
         with self.taskLock:
 
@@ -1206,10 +1417,8 @@ class Task:
                     self.result = result
 
                     ## Store data if requested
-                    if 'storeData' in self.cfg and self.cfg['storeData'] is True:
-                        self.cfg['storageDir'].setInfo(result['protocol'])
-                        for t in self.tasks:
-                            self.tasks[t].storeResult(self.cfg['storageDir'])
+                    if storeData:
+                        self.storeResult()
                     prof.mark("store data")
             finally:
                 ## Regardless of any other problems, at least make sure we
@@ -1221,14 +1430,27 @@ class Task:
                 prof.mark("release all")
                 prof.finish()
 
+            self.notifyDeviceDone()
+
             if abort:
                 gc.collect()  ## it is often the case that now is a good time to garbage-collect.
 
-    def getResult(self):
+    def getResult(self, storeData=True):
         with self.taskLock:
-            self.stop()
+            self.stop(storeData=storeData)
             return self.result
 
+    def storeResult(self):
+        """Write results to the protocol's storageDir, if 'storeData' was requested.
+
+        This is called by stop() unless it was given storeData=False.
+        """
+        if self.result is None or self.cfg.get('storeData') is not True:
+            return
+        self.cfg['storageDir'].setInfo(self.result['protocol'])
+        for t in self.tasks:
+            self.tasks[t].storeResult(self.cfg['storageDir'])
+
     def reserveDevices(self):
         if self.deviceLock is None:
             try:
@@ -0,0 +1,180 @@
+"""
+Headless execution of analysis flowcharts over many files.
+
+FlowchartRunner takes a saved flowchart state (``Flowchart.saveState()`` or an ``.fc`` file) and runs it on a
+list of files in a pool of worker processes, each of which rebuilds the flowchart without any GUI. Results are
+yielded as soon as each file is finished, so they can be stored while the remaining files are processed::
+
+    runner = FlowchartRunner(detector.flowchart.saveState(), inputName='dataIn', outputs=['events'])
+    for fileName, output, error in runner.run(files):
+        ...
+
+Event detection results can be streamed directly into an AnalysisDatabase, either with `storeEventsToDB` or
+from the command line::
+
+    python -m acq4.analysis.FlowchartRunner --db analysis.sqlite --table EventDetector_events \\
+        detector.fc /path/to/experiment
+"""
+import argparse
+import fnmatch
+import multiprocessing
+import os
+import sys
+import traceback
+
+from pyqtgraph.configfile import readConfigFile
+
+## per-process state of worker processes
+_worker = {}
+
+
+def _initWorker(state, inputName, outputs):
+    ## runs once in each worker process; there is no display, so Qt must not try to open one
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    _worker['flowchart'] = buildFlowchart(state)
+    _worker['inputName'] = inputName
+    _worker['outputs'] = outputs
+
+
+def _processFile(fileName):
+    from acq4.util.DataManager import getHandle
+    try:
+        out = _worker['flowchart'].process(**{_worker['inputName']: getHandle(fileName)})
+        if _worker['outputs'] is not None:
+            out = {k: out[k] for k in _worker['outputs']}
+        return fileName, out, None
+    except Exception:
+        return fileName, None, traceback.format_exc()
+
+
+def buildFlowchart(state):
+    """Create a flowchart (with the ACQ4 node library) from a saved state, without showing any GUI."""
+    import pyqtgraph as pg
+    pg.mkQApp()
+    import acq4.util.flowchart as flowchart
+    fc = flowchart.Flowchart()
+    fc.restoreState(state, clear=True)
+    return fc
+
+
+def findFiles(paths, pattern='*.ma'):
+    """Return the names of all files matching *pattern* in *paths*. Directories are searched recursively."""
+    files = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+        for dirPath, dirNames, fileNames in os.walk(path):
+            dirNames.sort()
+            files.extend(os.path.join(dirPath, f) for f in sorted(fnmatch.filter(fileNames, pattern)))
+    return files
+
+
+class FlowchartRunner(object):
+    """Runs a saved flowchart on many files using a pool of headless worker processes.
+
+    Parameters
+    ----------
+    state : dict
+        Flowchart state as returned by ``Flowchart.saveState()``.
+    inputName : str
+        Name of the flowchart input that receives the handle of each file.
+    outputs : list | None
+        Names of the flowchart outputs to return for each file (default is all outputs). Only these are sent
+        back from the worker processes, so they must be picklable.
+    workers : int | None
+        Number of worker processes (default is one per CPU). With workers=0, files are processed in this process.
+    """
+
+    def __init__(self, state, inputName='dataIn', outputs=None, workers=None):
+        self.state = state
+        self.inputName = inputName
+        self.outputs = outputs
+        self.workers = os.cpu_count() if workers is None else workers
+
+    @classmethod
+    def fromFile(cls, fileName, **kwds):
+        """Create a runner from a saved flowchart (``.fc``) file."""
+        return cls(readConfigFile(fileName), **kwds)
+
+    def run(self, files):
+        """Process *files* (file names or handles) and yield (fileName, output, error) as each one finishes.
+
+        Files are yielded in the order they complete. *output* is a dict of the requested flowchart outputs,
+        or None if processing failed, in which case *error* holds the formatted traceback.
+        """
+        files = [f.name() if hasattr(f, 'name') else os.path.abspath(f) for f in files]
+        args = (self.state, self.inputName, self.outputs)
+        if self.workers == 0 or len(files) == 0:
+            _initWorker(*args)
+            for fileName in files:
+                yield _processFile(fileName)
+            return
+
+        ## spawn (rather than fork) so that workers do not inherit the Qt state of a running GUI
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(min(self.workers, len(files)), initializer=_initWorker, initargs=args) as pool:
+            for result in pool.imap_unordered(_processFile, files):
+                yield result
+
+    def storeEventsToDB(self, files, db, table, owner='EventDetector', output='events', progress=None):
+        """Run the flowchart on *files*, storing the event records from *output* to *table* in *db*.
+
+        Each file's events replace whatever was stored for that file before, and are written in their own
+        transaction as soon as the file is finished. If given, progress(nDone, nFiles, fileName, error) is
+        called after each file. Returns a dict {fileName: traceback} of files that could not be processed.
+        """
+        from acq4.analysis.modules.EventDetector.EventDetector import storeEvents
+        from acq4.util.DataManager import getHandle
+
+        errors = {}
+        files = list(files)
+        for i, (fileName, out, error) in enumerate(self.run(files)):
+            if error is None:
+                storeEvents(db, table, out[output], db.dataModel(), owner, sourceFiles=[getHandle(fileName)])
+            else:
+                errors[fileName] = error
+            if progress is not None:
+                progress(i + 1, len(files), fileName, error)
+        return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a saved analysis flowchart over a set of data files.")
+    parser.add_argument('flowchart', help="saved flowchart (.fc) file")
+    parser.add_argument('paths', nargs='+', help="data files and/or directories to search for data files")
+    parser.add_argument('--db', required=True, help="analysis database to store results in")
+    parser.add_argument('--table', default='EventDetector_events', help="table to store events in")
+    parser.add_argument('--owner', default='EventDetector', help="table owner recorded in the database")
+    parser.add_argument('--base-dir', default=None, help="base directory (required when creating a new database)")
+    parser.add_argument('--model', default='PatchEPhys', help="data model used by the database")
+    parser.add_argument('--input', default='dataIn', help="flowchart input that receives each file")
+    parser.add_argument('--output', default='events', help="flowchart output holding the event records")
+    parser.add_argument('--pattern', default='*.ma', help="file name pattern to use in directories")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes")
+    args = parser.parse_args(argv)
+
+    from acq4.analysis import dataModels
+    from acq4.util.database import AnalysisDatabase
+    from acq4.util.DataManager import getDirHandle
+
+    baseDir = None if args.base_dir is None else getDirHandle(args.base_dir)
+    db = AnalysisDatabase(args.db, dataModel=dataModels.loadModel(args.model), baseDir=baseDir)
+    files = findFiles(args.paths, args.pattern)
+    runner = FlowchartRunner.fromFile(args.flowchart, inputName=args.input, outputs=[args.output],
+                                      workers=args.workers)
+
+    def progress(n, nmax, fileName, error):
+        print("[%d/%d] %s%s" % (n, nmax, fileName, '' if error is None else '  FAILED'))
+
+    errors = runner.storeEventsToDB(files, db, args.table, owner=args.owner, output=args.output,
+                                    progress=progress)
+    for fileName, error in errors.items():
+        print("Error processing %s:\n%s" % (fileName, error), file=sys.stderr)
+    db.close()
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
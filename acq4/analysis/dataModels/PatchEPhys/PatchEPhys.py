@@ -8,6 +8,8 @@ import numpy as np
 
 from MetaArray import MetaArray
 
+from acq4.util.trace_cache import readTrace
+
 
 protocolNames = {
     'IV Curve': ('cciv.*', 'vciv.*'),
@@ -241,6 +243,14 @@ def getClampFile(protoDH):
     return None
 
 
+def readClampFile(fh):
+    """Read the clamp file *fh* through the process-wide trace cache.
+
+    Repeated reads of the same (unmodified) file return the cached data, which is read-only.
+    """
+    return readTrace(fh)
+
+
 def isClampFile(fh):
     if fh.shortName() not in deviceNames['Clamp'] and fh.shortName()[:-3] not in deviceNames['Clamp']:
         return False
@@ -698,7 +708,7 @@ class GetClamps():
                     continue
             except:
                 raise Exception("Error loading data for protocol %s:" % directory_name)
-            data_file = data_file_handle.read()
+            data_file = readClampFile(data_file_handle)
 
             self.data_mode = getClampMode(data_file, dir_handle=dh)
             if self.data_mode is None:
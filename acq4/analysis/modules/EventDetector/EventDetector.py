@@ -12,6 +12,7 @@ import acq4.util.FileLoader as FileLoader
 import acq4.util.DatabaseGui as DatabaseGui
 import pyqtgraph as pg
 from acq4.util.HelpfulException import HelpfulException
+from acq4.analysis.FlowchartRunner import FlowchartRunner, findFiles
 
 
 
@@ -52,6 +53,7 @@ class EventDetector(AnalysisModule):
         if dbCtrl == None:
             self.dbCtrl = DBCtrl(self, identity=self.dbIdentity)
             self.dbCtrl.storeBtn.clicked.connect(self.storeClicked)
+            self.dbCtrl.processAllBtn.clicked.connect(self.processAllClicked)
         else:
             self.dbCtrl = dbCtrl(self, identity=self.dbIdentity)
 
@@ -128,6 +130,40 @@ class EventDetector(AnalysisModule):
             self.dbCtrl.storeBtn.failure("Error.")
             raise
         
+    def processAllClicked(self):
+        try:
+            errors = self.processToDB(self.getElement('File Loader').loadedFiles())
+        except:
+            self.dbCtrl.processAllBtn.failure("Error.")
+            raise
+        if len(errors) > 0:
+            for fileName, error in errors.items():
+                print("Error processing %s:\n%s" % (fileName, error))
+            self.dbCtrl.processAllBtn.failure("%d files failed" % len(errors))
+        else:
+            self.dbCtrl.processAllBtn.success("Stored")
+
+    def processToDB(self, files, workers=None):
+        """Run the current detection flowchart on *files* in worker processes and store all events to the DB.
+
+        Directories in *files* are searched for .ma files. Returns a dict {fileName: traceback} of the files
+        that could not be processed.
+        """
+        dbui = self.getElement('Database')
+        table = dbui.getTableName(self.dbIdentity)
+        db = dbui.getDb()
+        if db is None:
+            raise Exception("No DB selected")
+        
+        fileNames = findFiles([fh.name() for fh in files])
+        runner = FlowchartRunner(self.flowchart.saveState(), inputName='dataIn', outputs=['events'], workers=workers)
+        with pg.ProgressDialog("Processing files...", 0, len(fileNames)) as dlg:
+            def progress(n, nmax, fileName, error):
+                dlg.setValue(n)
+                if dlg.wasCanceled():
+                    raise HelpfulException("Processing canceled by user.", msgType='status')
+            return runner.storeEventsToDB(fileNames, db, table, owner=self.dbIdentity, progress=progress)
+        
     def storeToDB(self, data=None):
         p = debug.Profiler("EventDetector.storeToDB", disabled=True)
         
@@ -155,56 +191,16 @@ class EventDetector(AnalysisModule):
                 return
             db('Delete from %s where ProtocolDir=%i' %(table, protocolID))            
             return
-            
-  
-        
         
-        ## determine the set of fields we expect to find in the table
-        columns = db.describeData(data)
-        columns.update({
-            'ProtocolSequenceDir': 'directory:ProtocolSequence',
-            'ProtocolDir': 'directory:Protocol',
-        })
-        
-        
-        p.mark("field list done")
-        
-        with db.transaction():
-            ## Make sure target table exists and has correct columns, links to input file
-            db.checkTable(table, owner=self.dbIdentity, columns=columns, create=True, addUnknownColumns=True, indexes=[['SourceFile'], ['ProtocolSequenceDir']])
-            
-            p.mark("data prepared")
-            
-            ## collect all protocol/Sequence dirs
-            prots = {}
-            seqs = {}
-            for fh in set(data['SourceFile']):
-                prots[fh] = fh.parent()
-                seqs[fh] = self.dataModel.getParent(fh, 'ProtocolSequence')
-                
-            ## delete all records from table for current input files
-            for fh in set(data['SourceFile']):
-                db.delete(table, where={'SourceFile': fh})
-            p.mark("previous records deleted")
-            
-            ## assemble final list of records
-            records = {}
-            for col in data.dtype.names:
-                records[col] = data[col]
-            records['ProtocolSequenceDir'] = list(map(seqs.get, data['SourceFile']))
-            records['ProtocolDir'] = list(map(prots.get, data['SourceFile']))
-            
-            p.mark("record list assembled")
-                
-            ## insert all data to DB
-            with pg.ProgressDialog("Storing events...", 0, 100) as dlg:
-                for n, nmax in db.iterInsert(table, records, chunkSize=50):
-                    dlg.setMaximum(nmax)
-                    dlg.setValue(n)
-                    if dlg.wasCanceled():
-                        raise HelpfulException("Scan store canceled by user.", msgType='status')
-            p.mark("records inserted")
-            p.finish()
+        with pg.ProgressDialog("Storing events...", 0, 100) as dlg:
+            def progress(n, nmax):
+                dlg.setMaximum(nmax)
+                dlg.setValue(n)
+                if dlg.wasCanceled():
+                    raise HelpfulException("Scan store canceled by user.", msgType='status')
+            storeEvents(db, table, data, self.dataModel, self.dbIdentity, progress=progress)
+        p.mark("records inserted")
+        p.finish()
 
         
         
@@ -230,17 +226,12 @@ class EventDetector(AnalysisModule):
         #if pRow is None:
             #return None, None
         
+        ## columnar reads are typed by the table schema, so empty results still have the correct fields
         if sourceFile is not None:
-            events = db.select(table, '*', where={'SourceFile': sourceFile}, toArray=True)
+            events = db.select(table, '*', where={'SourceFile': sourceFile}, toColumns=True)
         else:
-            events = db.select(table, '*', where={'ProtocolSequenceDir': sequenceDir}, toArray=True)
-        
-        if events is None:
-            ## need to make an empty array with the correct field names
-            schema = db.tableSchema(table)
-            ## NOTE: dtype MUST be specified as {names: formats: } since the names are unicode objects
-            ##  [(name, format), ..] does NOT work.
-            events = np.empty(0, dtype={'names': [k for k in schema], 'formats': [object]*len(schema)})
+            events = db.select(table, '*', where={'ProtocolSequenceDir': sequenceDir}, toColumns=True)
+        events = events.toArray()
             
         #else:   ## convert file strings to handles
             #if sourceFile is None:
@@ -263,7 +254,61 @@ class EventDetector(AnalysisModule):
         #except:
             #dbui.storeBtnFeedback(False, "Error!", "See console for error message..")
             #raise
-        
+
+
+def storeEvents(db, table, data, dataModel, owner, sourceFiles=(), progress=None):
+    """Store event records (as produced by the "events" output of an event detection flowchart) to *table*.
+
+    All records previously stored for the files in data['SourceFile'] and in *sourceFiles* are replaced, so
+    passing the analyzed file in *sourceFiles* also clears its old events when no new events were found.
+    If given, progress(n, nmax) is called after each chunk of records is inserted.
+    """
+    sourceFiles = set(sourceFiles)
+    if len(data) > 0:
+        sourceFiles.update(data['SourceFile'])
+
+    with db.transaction():
+        if len(data) == 0 or data.dtype.names is None:
+            ## nothing to insert; just remove any previous results
+            if db.hasTable(table):
+                for fh in sourceFiles:
+                    db.delete(table, where={'SourceFile': fh})
+            return
+
+        ## determine the set of fields we expect to find in the table
+        columns = db.describeData(data)
+        columns.update({
+            'ProtocolSequenceDir': 'directory:ProtocolSequence',
+            'ProtocolDir': 'directory:Protocol',
+        })
+
+        ## Make sure target table exists and has correct columns, links to input file
+        db.checkTable(table, owner=owner, columns=columns, create=True, addUnknownColumns=True, indexes=[['SourceFile'], ['ProtocolSequenceDir']])
+
+        ## collect all protocol/Sequence dirs
+        prots = {}
+        seqs = {}
+        for fh in set(data['SourceFile']):
+            prots[fh] = fh.parent()
+            seqs[fh] = dataModel.getParent(fh, 'ProtocolSequence')
+
+        ## delete all records from table for current input files
+        for fh in sourceFiles:
+            db.delete(table, where={'SourceFile': fh})
+
+        ## assemble final list of records
+        records = {}
+        for col in data.dtype.names:
+            records[col] = data[col]
+        records['ProtocolSequenceDir'] = list(map(seqs.get, data['SourceFile']))
+        records['ProtocolDir'] = list(map(prots.get, data['SourceFile']))
+
+        ## insert all data to DB
+        for n, nmax in db.iterInsert(table, records, chunkSize=50):
+            if progress is not None:
+                progress(n, nmax)
+
+
 class DBCtrl(Qt.QWidget):
     def __init__(self, host, identity):
         Qt.QWidget.__init__(self)
@@ -273,9 +318,12 @@ class DBCtrl(Qt.QWidget):
         self.setLayout(self.layout)
         self.dbgui = DatabaseGui.DatabaseGui(dm=host.dataManager(), tables={identity: 'EventDetector_events'})
         self.storeBtn = pg.FeedbackButton("Store to DB")
+        self.processAllBtn = pg.FeedbackButton("Process all files to DB")
+        self.processAllBtn.setToolTip("Run detection on all loaded files in parallel and store the results")
         #self.storeBtn.clicked.connect(self.storeClicked)
         self.layout.addWidget(self.dbgui)
         self.layout.addWidget(self.storeBtn)
+        self.layout.addWidget(self.processAllBtn)
         for name in ['getTableName', 'getDb']:
             setattr(self, name, getattr(self.dbgui, name))
             
@@ -182,7 +182,7 @@ class MapAnalyzer(AnalysisModule):
         eventTable = self.loader.dbGui.getTableName('Photostim.events')
         db = self.loader.dbGui.getDb()
         stats = db.select(statTable, '*', where={'ProtocolSequenceDir': sourceDir})
-        events = db.select(eventTable, '*', where={'ProtocolSequenceDir': sourceDir}, toArray=True)
+        events = db.select(eventTable, '*', where={'ProtocolSequenceDir': sourceDir}, toColumns=True).toArray()
         return events, stats
         
     def loadSpotFromDB(self, sourceDir):
@@ -191,7 +191,7 @@ class MapAnalyzer(AnalysisModule):
         eventTable = self.loader.dbGui.getTableName('Photostim.events')
         db = self.loader.dbGui.getDb()
         stats = db.select(statTable, '*', where={'ProtocolDir': sourceDir})
-        events = db.select(eventTable, '*', where={'ProtocolDir': sourceDir}, toArray=True)
+        events = db.select(eventTable, '*', where={'ProtocolDir': sourceDir}, toColumns=True).toArray()
         return events, stats
         
     def loadFileRequested(self, fhList):
@@ -682,6 +682,7 @@ class EventStatisticsAnalyzer:
         postScores = {'PoissonScore': [], 'PoissonAmpScore': [], 'ZScore': [], 'FitAmpSum': []}
         
         
+        siteEvents = []
         for site in map.spots:
             postSiteEvents = []
             preSiteEvents = []
@@ -708,20 +709,32 @@ class EventStatisticsAnalyzer:
                 preSiteEvents.append(ev2)
                 
                 rates.append(spontRate[dh]['filteredSpontRate'])
-        
-            ## compute score for each site
+
+            siteEvents.append((postSiteEvents, preSiteEvents, rates, latencies, nEvents))
+
+        ## compute poisson scores for all sites at once
+        allPost = [ev[0] for ev in siteEvents]
+        allPre = [ev[1] for ev in siteEvents]
+        allRates = [ev[2] for ev in siteEvents]
+        poissonScores = {
+            'PoissonScore': poissonScore.PoissonScore.scoreMany(allPost, allRates, tMax=postDt),
+            'PoissonAmpScore': poissonScore.PoissonAmpScore.scoreMany(allPost, allRates, tMax=postDt, ampMean=ampMean, ampStdev=ampStdev),
+            'PoissonScore_Pre': poissonScore.PoissonScore.scoreMany(allPre, allRates, tMax=postDt),
+            'PoissonAmpScore_Pre': poissonScore.PoissonAmpScore.scoreMany(allPre, allRates, tMax=postDt, ampMean=ampMean, ampStdev=ampStdev),
+        }
+
+        for i, site in enumerate(map.spots):
+            postSiteEvents, preSiteEvents, rates, latencies, nEvents = siteEvents[i]
+
             ## note that keys added to site here are ultimately passed to host.getColor via Map.recolor
             site['data']['spontaneousRates'] = rates
             site['data']['events'] = events
             site['data']['ampMean'] = ampMean
             site['data']['ampStdev'] = ampStdev
-            site['data']['PoissonScore'] = poissonScore.PoissonScore.score(postSiteEvents, rates, tMax=postDt)
-            site['data']['PoissonAmpScore'] = poissonScore.PoissonAmpScore.score(postSiteEvents, rates, tMax=postDt, ampMean=ampMean, ampStdev=ampStdev)
+            for key, scores in poissonScores.items():
+                site['data'][key] = scores[i]
             postScores['PoissonScore'].append(site['data']['PoissonScore'])
             postScores['PoissonAmpScore'].append(site['data']['PoissonAmpScore'])
-            
-            site['data']['PoissonScore_Pre'] = poissonScore.PoissonScore.score(preSiteEvents, rates, tMax=postDt)
-            site['data']['PoissonAmpScore_Pre'] = poissonScore.PoissonAmpScore.score(preSiteEvents, rates, tMax=postDt, ampMean=ampMean, ampStdev=ampStdev)
             preScores['PoissonScore'].append(site['data']['PoissonScore_Pre'])
             preScores['PoissonAmpScore'].append(site['data']['PoissonAmpScore_Pre'])
             
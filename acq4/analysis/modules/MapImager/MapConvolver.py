@@ -1,7 +1,11 @@
 from __future__ import print_function
 
+from collections import OrderedDict
+
 import numpy as np
-import scipy
+import scipy.interpolate
+import scipy.ndimage
+from scipy.spatial import Delaunay, cKDTree
 
 import pyqtgraph as pg
 from acq4.analysis.tools import functions as afn
@@ -29,17 +33,25 @@ class MapConvolver(Qt.QWidget):
 
         self.items = []
         self.filePath = filePath
-        self.data = data
+        self.data = None
+        self.renderer = None
+        self.viewRegion = None  ## (x0, y0, x1, y1) of the visible area, or None to render the whole map
+        self.viewPixelSize = None
         self.output = None
+        self.outputOrigin = None  ## map coordinates of output[0, 0]
         self._availableFields = None ## a list of fieldnames that are available for coloring/contouring
         
         self.ui.processBtn.hide()
         self.addBtn.clicked.connect(self.addItem)
         self.ui.processBtn.clicked.connect(self.processClicked)
+        self.ui.spacingSpin.sigValueChanged.connect(self.itemChanged)
+        if data is not None:
+            self.setData(data)
         
         
     def setData(self, data):
         self.data = data
+        self.renderer = None if data is None else MapRenderer(data)
         fields = []
         #self.blockSignals = True
         try:
@@ -96,17 +108,19 @@ class MapConvolver(Qt.QWidget):
     def itemChanged(self):
         self.process()
         
-    def processClicked():
+    def processClicked(self):
         self.process()
-        
-    def process(self):
-        if self.data == None:
-            return
-        if len(self.items) == 0:
-            return
-        
-        params = {}
-        spacing = self.ui.spacingSpin.value()
+
+    def setViewRegion(self, region, pixelSize=None):
+        """Render only *region* (x0, y0, x1, y1), with pixels no smaller than *pixelSize*, so that the map
+        resolution follows the zoom level of the view. Pass None to render the whole map again.
+        """
+        self.viewRegion = region
+        self.viewPixelSize = pixelSize
+        self.process()
+
+    def getParams(self):
+        params = OrderedDict()
         for i in self.items:
             if str(i.convolutionCombo.currentText()) == "Gaussian convolution":
                 params[str(i.paramCombo.currentText())] = {'sigma':i.sigmaSpin.value()}
@@ -115,24 +129,34 @@ class MapConvolver(Qt.QWidget):
                 params[str(i.paramCombo.currentText())]= {'mode':i.modeCombo.currentText()}
             else:
                 pass
-                
-        
+        return params
         
-        arr = MapConvolver.convolveMaptoImage(self.data, params, spacing=spacing)
-        arrs = MapConvolver.interpolateMapToImage(self.data, params, spacing)
-    
+    def process(self):
+        if self.renderer is None:
+            return
+        if len(self.items) == 0:
+            return
         
-        dtype = arr.dtype.descr
-        for p in arrs.keys():
-            if p not in arr.dtype.names:
-                dtype.append((p, float))
-            
-        self.output = np.zeros(arr.shape, dtype=dtype)
-        self.output[:] = arr
-        for p in arrs:
-            self.output[p] = arrs[p]
+        params = self.getParams()
+        spacing = self.ui.spacingSpin.value()
+        if self.viewPixelSize is not None:
+            spacing = max(spacing, self.viewPixelSize)
+        arrs, origin = self.renderer.render(params, spacing, region=self.viewRegion)
+        self.output = toRecordArray(arrs)
+        self.outputOrigin = origin
         
         self.sigOutputChanged.emit(self.output, spacing)
+
+    def renderFullMap(self):
+        """Render the whole map at the configured spacing, regardless of the current view region.
+
+        Return (output, origin, spacing), or None if there is nothing to render.
+        """
+        if self.renderer is None or len(self.items) == 0:
+            return None
+        spacing = self.ui.spacingSpin.value()
+        arrs, origin = self.renderer.render(self.getParams(), spacing)
+        return toRecordArray(arrs), origin, spacing
         
     @staticmethod
     def interpolateMapToImage(data, params, spacing=0.000005):
@@ -143,27 +167,8 @@ class MapConvolver(Qt.QWidget):
                             ex: {'postCharge': {'mode':'nearest'}, 'dirCharge':{'mode':'cubic'}}
                 spacing - the size of each pixel in the returned grids (default is 5um)
              """        
-        
-        xmin = data['xPos'].min()
-        ymin = data['yPos'].min()
-        xdim = int((data['xPos'].max()-xmin)/spacing)+5
-        ydim = int((data['yPos'].max()-ymin)/spacing)+5
-        
-        pts = np.array([data['xPos'], data['yPos']], dtype=float)
-        pts[0] = pts[0]-xmin
-        pts[1] = pts[1]-ymin
-        pts = pts.transpose()/spacing
-        
-        xi = np.indices((xdim, ydim))
-        xi = xi.transpose(1,2,0)
-        
-        arrs = {}
-        
-        for p in params:
-            if 'mode' in params[p].keys():
-                arrs[p] = scipy.interpolate.griddata(pts, data[p], xi, method=params[p]['mode']) ## griddata function hangs when method='linear' in scipy versions earlier than 0.10.0
-                arrs[p][np.isnan(arrs[p])] = 0
-        return arrs
+        params = {p: opts for p, opts in params.items() if 'mode' in opts}
+        return MapRenderer(data).render(params, spacing)[0]
         
     @staticmethod
     def convolveMaptoImage(data, params, spacing=5e-6):
@@ -174,25 +179,208 @@ class MapConvolver(Qt.QWidget):
                            ex: {'postCharge': {'sigma':80e-6}, 'dirCharge':{'kernel': ndarray to use as the convolution kernel}}
                spacing - the size of each pixel in the returned grid (default is 5um)
             """
-        #arr = data
-        arr = afn.convertPtsToSparseImage(data, list(params.keys()), spacing)
-        
-                                       
-        ## convolve image using either given kernel or gaussian kernel with sigma=sigma
         for p in params:
             if 'mode' in params[p].keys():
                 continue
-            elif params[p].get('kernel', None) is None:
-                if params[p].get('sigma', None) is None:
-                    raise Exception("Please specify either a kernel to use for convolution, or sigma for a gaussian kernel for %s param." %p)                    
-                arr[p] = scipy.ndimage.filters.gaussian_filter(arr[p], int(params[p]['sigma']/spacing))
-            else:
+            elif params[p].get('kernel', None) is not None:
                 raise Exception("Convolving by a non-gaussian kernel is not yet supported.")
-                #arr[p] = scipy.ndimage.filters.convolve(arr[p], params[p]['kernel'])
-                
-                
-        return arr
-        
+            elif params[p].get('sigma', None) is None:
+                raise Exception("Please specify either a kernel to use for convolution, or sigma for a gaussian kernel for %s param." %p)                    
+        params = {p: opts for p, opts in params.items() if 'mode' not in opts}
+        return toRecordArray(MapRenderer(data).render(params, spacing)[0])
+
+
+def toRecordArray(arrs):
+    """Combine a dict of equally shaped float arrays into one record array."""
+    shape = next(iter(arrs.values())).shape if len(arrs) > 0 else (0, 0)
+    arr = np.zeros(shape, dtype=[(str(p), float) for p in arrs])
+    for p, a in arrs.items():
+        arr[p] = a
+    return arr
+
+
+class MapRenderer(object):
+    """Renders the scattered values of a stimulation map onto regular pixel grids.
+
+    Pixel (i, j) of a grid with pixel size *spacing* is centered at origin + (i, j) * spacing, where origin is
+    the minimum spot position. The geometry of the map (spots binned per pixel, nearest-neighbor tree and
+    Delaunay triangulation) is computed once and shared by all parameters. Images are rendered in square
+    tiles that are cached, so that rendering a different region, or changing the options of one parameter,
+    only computes tiles that have not been seen before.
+
+    Parameter options are as for MapConvolver: {'sigma': s} for a gaussian convolution of the spot values
+    (spots sharing a pixel are averaged first), or {'mode': 'nearest'|'linear'|'cubic'} for interpolation.
+    Interpolated pixels outside the convex hull of the spots are 0.
+    """
+
+    tileSize = 128
+    maxTiles = 1024
+    maxBinnings = 16  ## number of pixel sizes whose spot binning is cached
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = np.column_stack([data['xPos'], data['yPos']]).astype(float)
+        self.origin = self.pos.min(axis=0)
+        self.extent = self.pos.max(axis=0)
+        ## interpolation runs in normalized coordinates so the triangulation does not depend on pixel size
+        self._scale = max(float((self.extent - self.origin).max()), 1e-12)
+        self._norm = (self.pos - self.origin) / self._scale
+        self._tree = None
+        self._tri = None
+        self._bins = OrderedDict()
+        self._interpolators = {}
+        self._geometry = OrderedDict()
+        self._tiles = OrderedDict()
+
+    def gridShape(self, spacing):
+        """Shape of the image covering the whole map at *spacing*."""
+        return tuple(((self.extent - self.origin) / spacing).astype(int) + 5)
+
+    def render(self, params, spacing, region=None):
+        """Render every parameter in *params* ({name: options}) at pixel size *spacing*.
+
+        If *region* (x0, y0, x1, y1) is given, only the pixels of the full-map grid that overlap it are
+        rendered. Returns ({name: 2D array}, origin), where origin is the map position of pixel [0, 0].
+        """
+        full = np.array(self.gridShape(spacing))
+        if region is None:
+            start = np.zeros(2, dtype=int)
+            stop = full
+        else:
+            r = np.asarray(region, dtype=float)
+            start = np.clip(np.floor((r[:2] - self.origin) / spacing).astype(int), 0, full)
+            stop = np.clip(np.ceil((r[2:] - self.origin) / spacing).astype(int) + 1, start, full)
+        ts = self.tileSize
+        tile0 = start // ts
+        tile1 = (stop - 1) // ts + 1
+
+        out = OrderedDict()
+        for p, opts in params.items():
+            img = np.zeros(tuple(stop - start))
+            for tx in range(tile0[0], tile1[0]):
+                for ty in range(tile0[1], tile1[1]):
+                    tileStart = np.array([tx, ty]) * ts
+                    lo = np.maximum(start, tileStart)
+                    hi = np.minimum(stop, tileStart + ts)
+                    if np.any(hi <= lo):
+                        continue
+                    tile = self._tile(p, opts, spacing, tx, ty)
+                    img[lo[0]-start[0]:hi[0]-start[0], lo[1]-start[1]:hi[1]-start[1]] = \
+                        tile[lo[0]-tileStart[0]:hi[0]-tileStart[0], lo[1]-tileStart[1]:hi[1]-tileStart[1]]
+            out[p] = img
+        return out, self.origin + start * spacing
+
+    def _tile(self, param, opts, spacing, tx, ty):
+        if 'mode' in opts:
+            optKey = ('mode', str(opts['mode']))
+        else:
+            optKey = ('sigma', float(opts['sigma']))
+        key = (param, optKey, spacing, tx, ty)
+        tile = self._tiles.get(key)
+        if tile is None:
+            if optKey[0] == 'mode':
+                tile = self._interpolateTile(param, optKey[1], spacing, tx, ty)
+            else:
+                tile = self._convolveTile(param, optKey[1], spacing, tx, ty)
+            self._tiles[key] = tile
+            while len(self._tiles) > self.maxTiles:
+                self._tiles.popitem(last=False)
+        else:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def _binned(self, param, spacing):
+        """Return the pixels that contain spots, and the mean value of *param* in each of them."""
+        bins = self._bins.get(spacing)
+        if bins is None:
+            pix = ((self.pos - self.origin) / spacing).astype(int)
+            pixels, inverse, counts = np.unique(pix, axis=0, return_inverse=True, return_counts=True)
+            ## the last item holds the binned values of each parameter at this spacing
+            bins = (pixels, inverse.ravel(), counts, {})
+            self._bins[spacing] = bins
+            while len(self._bins) > self.maxBinnings:
+                self._bins.popitem(last=False)
+        else:
+            self._bins.move_to_end(spacing)
+        pixels, inverse, counts, values = bins
+        if param not in values:
+            values[param] = np.bincount(inverse, weights=self.data[param], minlength=len(pixels)) / counts
+        return pixels, values[param]
+
+    def _convolveTile(self, param, sigma, spacing, tx, ty):
+        ts = self.tileSize
+        s = sigma / spacing
+        pad = int(4.0 * s + 0.5) + 1  ## gaussian_filter truncates the kernel at 4 sigma
+        x0, y0 = tx * ts - pad, ty * ts - pad
+        size = ts + 2 * pad
+        pixels, values = self._binned(param, spacing)
+        mask = ((pixels[:, 0] >= x0) & (pixels[:, 0] < x0 + size) &
+                (pixels[:, 1] >= y0) & (pixels[:, 1] < y0 + size))
+        img = np.zeros((size, size))
+        img[pixels[mask, 0] - x0, pixels[mask, 1] - y0] = values[mask]
+        if s > 0:
+            img = scipy.ndimage.gaussian_filter(img, s, mode='constant')
+        return img[pad:pad + ts, pad:pad + ts]
+
+    def _tileGeometry(self, mode, spacing, tx, ty):
+        """Return the per-pixel lookup for interpolating any parameter into a tile.
+
+        For 'nearest' this is the index of the nearest spot; for 'linear' the vertex indices and barycentric
+        weights of the enclosing triangle; for 'cubic' the normalized pixel coordinates.
+        """
+        key = (mode, spacing, tx, ty)
+        geom = self._geometry.get(key)
+        if geom is not None:
+            self._geometry.move_to_end(key)
+            return geom
+        ts = self.tileSize
+        idx = np.indices((ts, ts)).reshape(2, -1).T + np.array([tx, ty]) * ts
+        xi = idx * spacing / self._scale
+        if mode == 'nearest':
+            if self._tree is None:
+                self._tree = cKDTree(self._norm)
+            geom = self._tree.query(xi)[1]
+        elif mode == 'linear':
+            tri = self._triangulation()
+            simplex = tri.find_simplex(xi)
+            T = tri.transform[simplex]
+            b = np.einsum('ijk,ik->ij', T[:, :2], xi - T[:, 2])
+            weights = np.column_stack([b, 1 - b.sum(axis=1)])
+            weights[simplex < 0] = np.nan
+            geom = (tri.simplices[simplex], weights)
+        else:
+            geom = xi
+        self._geometry[key] = geom
+        while len(self._geometry) > self.maxTiles:
+            self._geometry.popitem(last=False)
+        return geom
+
+    def _triangulation(self):
+        if self._tri is None:
+            self._tri = Delaunay(self._norm)
+        return self._tri
+
+    def _interpolateTile(self, param, mode, spacing, tx, ty):
+        geom = self._tileGeometry(mode, spacing, tx, ty)
+        values = np.asarray(self.data[param], dtype=float)
+        if mode == 'nearest':
+            tile = values[geom]
+        elif mode == 'linear':
+            verts, weights = geom
+            tile = (values[verts] * weights).sum(axis=1)
+        elif mode == 'cubic':
+            interp = self._interpolators.get(param)
+            if interp is None:
+                interp = scipy.interpolate.CloughTocher2DInterpolator(self._triangulation(), values)
+                self._interpolators[param] = interp
+            tile = interp(geom)
+        else:
+            raise ValueError("Unknown interpolation mode '%s'" % mode)
+        tile = tile.reshape(self.tileSize, self.tileSize)
+        tile[np.isnan(tile)] = 0
+        return tile
+
+    
 class ConvolverItem(Qt.QTreeWidgetItem):
     def __init__(self, mc):
         self.mc = mc
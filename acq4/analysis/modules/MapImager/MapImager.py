@@ -5,6 +5,8 @@ from collections import OrderedDict
 import numpy as np
 import os
 
+import pyqtgraph as pg
+
 import acq4.util.debug as debug
 from MetaArray import MetaArray
 from acq4.analysis.AnalysisModule import AnalysisModule
@@ -71,6 +73,8 @@ class MapImager(AnalysisModule):
         self.mapConvolver.sigFieldsChanged.connect(self.convolverFieldsChanged)
         self.spatialCorrelator.sigOutputChanged.connect(self.correlatorOutputChanged)
         self.colorMapper.sigChanged.connect(self.computeColors)
+        ## re-render the visible region when the view is panned or zoomed, after it has settled
+        self.viewRangeProxy = pg.SignalProxy(self.canvas.view.sigRangeChanged, slot=self.viewRangeChanged, delay=0.2)
         
         
     def getFields(self):
@@ -113,16 +117,28 @@ class MapImager(AnalysisModule):
         self.contourPlotter.adjustContours(data, parentItem=self.imgItem)
         
     def recolorMap(self, data):
+        if data is None:
+            return
+        ## the convolver may render only the visible part of the map, so the image is repositioned every time
+        x, y = self.mapConvolver.outputOrigin
         if self.imgItem is None:
-            if data is None:
-                return
-            table = self.dbquery.table()
-            x = table['xPos'].min()
-            y = table['yPos'].min()
             self.imgItem = ImageCanvasItem(data, pos=(x, y), scale=self.spacing, movable=False, scalable=False, name="ConvolvedMap")
             self.canvas.addItem(self.imgItem)
             return
-        self.imgItem.updateImage(data)
+        tr = pg.SRTTransform()
+        tr.translate(x, y)
+        tr.scale(self.spacing, self.spacing)
+        self.imgItem.baseTransform = tr
+        self.imgItem.updateTransform()
+        self.imgItem.graphicsItem().setImage(data)
+
+    def viewRangeChanged(self, *args):
+        if self.imgItem is None:
+            return
+        view = self.canvas.view
+        rect = view.viewRect()
+        self.mapConvolver.setViewRegion(
+            (rect.left(), rect.top(), rect.right(), rect.bottom()), pixelSize=min(view.viewPixelSize()))
         
     def convolverFieldsChanged(self, fields):
         self.giveOptsToCM(fields)
@@ -142,19 +158,17 @@ class MapImager(AnalysisModule):
             self.fileDialog.fileSelected.connect(self.saveMA)
             return  
         
-        table = self.dbquery.table()
-        x = table['xPos'].min()
-        y = table['yPos'].min()        
+        ## the displayed image may cover only the visible region at screen resolution; save the whole map
+        ## at the configured spacing instead
+        imgData, (x, y), spacing = self.mapConvolver.renderFullMap()
         
-        #print "params:", self.imgData.dtype.names
-        #print "shape:", self.imgData.shape
         #arr = MetaArray(self.currentData) ### need to format this with axes and info
-        arr = MetaArray([self.imgData[p] for p in self.imgData.dtype.names], info=[
-            {'name':'vals', 'cols':[{'name':p} for p in self.imgData.dtype.names]},
-            {'name':'xPos', 'units':'m', 'values':np.arange(self.imgData.shape[0])*self.spacing+x},
-            {'name':'yPos', 'units':'m', 'values':np.arange(self.imgData.shape[1])*self.spacing+y},
+        arr = MetaArray([imgData[p] for p in imgData.dtype.names], info=[
+            {'name':'vals', 'cols':[{'name':p} for p in imgData.dtype.names]},
+            {'name':'xPos', 'units':'m', 'values':np.arange(imgData.shape[0])*spacing+x},
+            {'name':'yPos', 'units':'m', 'values':np.arange(imgData.shape[1])*spacing+y},
             
-            {'spacing':self.spacing}
+            {'spacing':spacing}
         ]) 
         
         arr.write(fileName)    
@@ -13,6 +13,10 @@ Ui_Form = Qt.importTemplate('.SpatialCorrelatorCtrlTemplate')
 class SpatialCorrelator(Qt.QWidget):
     
     sigOutputChanged = Qt.Signal(object)
+
+    ## if the input has one of these fields, it may contain several maps; when separateMapsChk is checked,
+    ## spots are only correlated with other spots from the same map
+    mapFields = ['ProtocolSequenceDir']
     
     def __init__(self):
         Qt.QWidget.__init__(self)
@@ -27,6 +31,7 @@ class SpatialCorrelator(Qt.QWidget):
         
         #self.outline = SpatialOutline()
         self.data = None ## will be a record array with 1 row per stimulation - needs to contain fields xpos, ypos, numOfPostEvents, significance
+        self.mapKey = None
         
         self.ctrl.processBtn.hide()
         self.ctrl.processBtn.clicked.connect(self.process)
@@ -36,6 +41,7 @@ class SpatialCorrelator(Qt.QWidget):
         self.ctrl.thresholdSpin.sigValueChanged.connect(self.paramChanged)
         self.ctrl.probabilityRadio.toggled.connect(self.paramChanged)
         self.ctrl.eventCombo.currentIndexChanged.connect(self.paramChanged)
+        self.ctrl.separateMapsChk.toggled.connect(self.paramChanged)
         
         
     #def getOutline(self):
@@ -56,7 +62,9 @@ class SpatialCorrelator(Qt.QWidget):
             return
         
         self.data = np.zeros(len(arr), dtype=arr.dtype.descr + [('prob', float)])
-        self.data[:] = arr
+        for name in fields:  ## structured arrays with different fields can't be assigned as a whole
+            self.data[name] = arr[name]
+        self.mapKey = next((f for f in self.mapFields if f in fields), None)
         
         if 'numOfPreEvents' in fields and 'PreRegionLen' in fields:
             self.calculateSpontRate()
@@ -80,7 +88,8 @@ class SpatialCorrelator(Qt.QWidget):
             return
         
         #print "calculating Probs"
-        fn.bendelsSpatialCorrelationAlgorithm(self.data, self.ctrl.radiusSpin.value(), self.ctrl.spontSpin.value(), self.ctrl.deltaTSpin.value(), printProcess=False, eventsKey=str(self.ctrl.eventCombo.currentText()))
+        mapKey = self.mapKey if self.ctrl.separateMapsChk.isChecked() else None
+        fn.bendelsSpatialCorrelationAlgorithm(self.data, self.ctrl.radiusSpin.value(), self.ctrl.spontSpin.value(), self.ctrl.deltaTSpin.value(), printProcess=False, eventsKey=str(self.ctrl.eventCombo.currentText()), mapKey=mapKey)
         #print "probs calculated"
         self.data['prob'] = 1-self.data['prob'] ## give probability that events are not spontaneous
         
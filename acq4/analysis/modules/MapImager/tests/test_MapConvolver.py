@@ -0,0 +1,86 @@
+import numpy as np
+import pyqtgraph as pg
+import scipy.interpolate
+import scipy.ndimage
+
+import acq4.analysis.tools.functions as afn
+from acq4.analysis.modules.MapImager.MapConvolver import MapConvolver, MapRenderer
+
+pg.mkQApp()
+
+
+def makeMap():
+    rng = np.random.default_rng(0)
+    grid = np.indices((20, 20)).reshape(2, -1).T * 45e-6 + 1e-3
+    data = np.zeros(len(grid), dtype=[('xPos', float), ('yPos', float), ('a', float), ('b', float)])
+    data['xPos'] = grid[:, 0] + rng.normal(scale=3e-6, size=len(grid))
+    data['yPos'] = grid[:, 1] + rng.normal(scale=3e-6, size=len(grid))
+    data['a'] = rng.random(len(grid))
+    data['b'] = rng.random(len(grid))
+    return data
+
+
+def test_renderer_matches_full_frame_methods():
+    data = makeMap()
+    spacing = 5e-6
+    renderer = MapRenderer(data)
+    out, origin = renderer.render({'a': {'sigma': 45e-6}, 'b': {'mode': 'linear'}}, spacing)
+    assert np.allclose(origin, [data['xPos'].min(), data['yPos'].min()])
+
+    sparse = afn.convertPtsToSparseImage(data, ['a'], spacing)
+    expected = scipy.ndimage.gaussian_filter(sparse['a'], 45e-6 / spacing, mode='constant')
+    assert out['a'].shape == expected.shape
+    assert np.allclose(out['a'], expected)
+
+    pts = np.column_stack([data['xPos'] - origin[0], data['yPos'] - origin[1]]) / spacing
+    xi = np.indices(out['b'].shape).transpose(1, 2, 0)
+    for mode in ('linear', 'nearest', 'cubic'):
+        img = renderer.render({'b': {'mode': mode}}, spacing)[0]['b']
+        expected = scipy.interpolate.griddata(pts, data['b'], xi, method=mode)
+        expected[np.isnan(expected)] = 0
+        assert np.allclose(img, expected, atol=1e-5), mode
+
+
+def test_renderer_region_is_crop_of_full_map():
+    data = makeMap()
+    spacing = 4e-6
+    params = {'a': {'sigma': 30e-6}, 'b': {'mode': 'cubic'}}
+    renderer = MapRenderer(data)
+    full, fullOrigin = renderer.render(params, spacing)
+    part, origin = renderer.render(params, spacing, region=(1.2e-3, 1.3e-3, 1.5e-3, 1.4e-3))
+    i0 = np.round((origin - fullOrigin) / spacing).astype(int)
+    for p in params:
+        shape = part[p].shape
+        assert shape[0] > 0 and shape[1] > 0
+        assert np.allclose(part[p], full[p][i0[0]:i0[0] + shape[0], i0[1]:i0[1] + shape[1]])
+
+
+def test_full_map_ignores_view_region():
+    data = makeMap()
+    mc = MapConvolver(data=data)
+    mc.addItem()
+    spacing = mc.ui.spacingSpin.value()
+    mc.setViewRegion((1.2e-3, 1.3e-3, 1.5e-3, 1.4e-3), pixelSize=20e-6)
+    assert mc.output.shape != MapRenderer(data).gridShape(spacing)
+
+    output, origin, fullSpacing = mc.renderFullMap()
+    assert fullSpacing == spacing
+    assert output.shape == MapRenderer(data).gridShape(spacing)
+    assert np.allclose(origin, [data['xPos'].min(), data['yPos'].min()])
+
+
+def test_binning_cache_is_bounded():
+    data = makeMap()
+    renderer = MapRenderer(data)
+    renderer.maxBinnings = 3
+    params = {'a': {'sigma': 30e-6}, 'b': {'sigma': 30e-6}}
+    first = renderer.render(params, 5e-6)[0]
+    ## zooming renders at many different pixel sizes
+    for i in range(10):
+        renderer.render(params, 5e-6 + i * 1e-7)
+    assert len(renderer._bins) == 3
+    assert all(len(bins[3]) == 2 for bins in renderer._bins.values())
+    ## evicted binnings are recomputed on demand
+    renderer._tiles.clear()
+    again = renderer.render(params, 5e-6)[0]
+    assert all(np.allclose(first[p], again[p]) for p in params)
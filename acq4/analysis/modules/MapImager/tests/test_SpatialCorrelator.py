@@ -0,0 +1,46 @@
+import numpy as np
+import pyqtgraph as pg
+
+import acq4.analysis.tools.functions as afn
+from acq4.analysis.modules.MapImager.SpatialCorrelator import SpatialCorrelator
+
+pg.mkQApp()
+
+
+def makeRepeatMaps():
+    ## two repeats of the same map, overlapping in space
+    rng = np.random.default_rng(1)
+    grid = np.indices((6, 6)).reshape(2, -1).T * 40e-6
+    data = np.zeros(2 * len(grid), dtype=[('xPos', float), ('yPos', float), ('numOfPostEvents', int),
+                                          ('ProtocolSequenceDir', object)])
+    data['xPos'] = np.concatenate([grid[:, 0], grid[:, 0]])
+    data['yPos'] = np.concatenate([grid[:, 1], grid[:, 1]])
+    data['numOfPostEvents'] = rng.integers(0, 2, size=len(data))
+    data['ProtocolSequenceDir'] = ['map_000'] * len(grid) + ['map_001'] * len(grid)
+    return data
+
+
+def expectedProbs(data, corr, mapKey):
+    arr = np.zeros(len(data), dtype=data.dtype.descr + [('prob', float)])
+    for name in data.dtype.names:
+        arr[name] = data[name]
+    afn.bendelsSpatialCorrelationAlgorithm(arr, corr.ctrl.radiusSpin.value(), corr.ctrl.spontSpin.value(),
+                                           corr.ctrl.deltaTSpin.value(), eventsKey='numOfPostEvents', mapKey=mapKey)
+    return 1 - arr['prob']
+
+
+def test_maps_are_only_separated_on_request():
+    data = makeRepeatMaps()
+    corr = SpatialCorrelator()
+    corr.ctrl.spontSpin.setValue(1.0)
+    corr.setData(data)
+    corr.ctrl.eventCombo.setValue('numOfPostEvents')
+    assert not corr.ctrl.separateMapsChk.isChecked()
+
+    together = expectedProbs(data, corr, None)
+    separate = expectedProbs(data, corr, 'ProtocolSequenceDir')
+    assert not np.allclose(together, separate)
+    assert np.allclose(corr.data['prob'], together)
+
+    corr.ctrl.separateMapsChk.setChecked(True)
+    assert np.allclose(corr.data['prob'], separate)
@@ -623,7 +623,7 @@ class PSPReversal(AnalysisModule):
             except:
                 print("Error loading data for protocol %s:" % directory_name)
                 continue  # If something goes wrong here, we just carry on
-            data_file = data_file_handle.read()
+            data_file = self.dataModel.readClampFile(data_file_handle)
             self.devicesUsed = self.dataModel.getDevices(data_dir_handle)
             self.holding = self.dataModel.getClampHoldingLevel(data_file_handle)
             self.amp_settings = self.dataModel.getWCCompSettings(data_file)
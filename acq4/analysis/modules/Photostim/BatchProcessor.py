@@ -0,0 +1,123 @@
+import contextlib
+
+import pyqtgraph as pg
+from acq4.analysis.FlowchartRunner import FlowchartRunner
+from acq4.util.result_cache import ResultCache, fileIdentity, flowchartState
+
+
+class BatchProcessor(object):
+    """Computes events and stats for every spot in a scan.
+
+    Results are looked up first in the scan's in-memory caches, then in an optional persistent ResultCache.
+    Only the remaining spots are processed. Event detection, the expensive part, is spread over a pool of
+    spawned worker processes that run the detector flowchart headless (see FlowchartRunner); stats depend on
+    the spot and the analysis flowchart in this process, so they are computed here. Event results are keyed
+    by the clamp file and the state of the detector flowchart; stat results by the spot, the events they were
+    computed from, and the state of the analysis flowchart. Node positions are ignored, as is the color scheme,
+    so reopening a map or recoloring it does not redo any detection.
+    """
+
+    ## Increase when the structure of cached events or stats changes
+    version = 1
+
+    def __init__(self, host, cache=None):
+        self.host = host
+        self.cache = cache
+
+    def setCache(self, cache):
+        self.cache = cache
+
+    def eventKey(self, fh, detectorState):
+        return ResultCache.makeKey('Photostim.events', self.version, fileIdentity(fh.name()), detectorState)
+
+    def statKey(self, dh, fh, events, analysisState):
+        return ResultCache.makeKey('Photostim.stats', self.version, dh.name(), fileIdentity(fh.name()),
+                                   events, analysisState)
+
+    def process(self, scan, workers=None, progressDialog=None, useCache=True):
+        """Return a list of stats, one per spot in *scan*, computing whatever is not already cached.
+
+        The scan's in-memory caches are updated with any new results. *workers* is the number of processes used
+        for event detection (None uses one per CPU; 1 detects events in this process with the host's detector).
+        If *progressDialog* is given, it is the label of a progress dialog shown during event detection.
+        """
+        cache = self.cache if useCache else None
+        host = self.host
+        spots = scan.spots()
+        handles = [(spot.data(), host.dataModel.getClampFile(spot.data())) for spot in spots]
+
+        if cache is not None:
+            detectorState = flowchartState(host.detector.flowchart.saveState())
+            analysisState = flowchartState(host.flowchart.saveState())
+
+        ## look up what we can without processing
+        allEvents = [None] * len(spots)
+        allStats = [None] * len(spots)
+        todo = []
+        for i, (dh, fh) in enumerate(handles):
+            events = scan.cachedEvents(fh)
+            if events is None and cache is not None:
+                events = cache.get(self.eventKey(fh, detectorState))
+                if events is not None:
+                    scan.updateEventCache(fh, events, signal=False)
+            stats = scan.cachedStats(dh)
+            if stats is None and events is not None and cache is not None:
+                stats = cache.get(self.statKey(dh, fh, events, analysisState))
+                if stats is not None:
+                    host.addSpotInfo(stats, spots[i])
+                    scan.updateStatCache(dh, stats)
+            allEvents[i] = events
+            allStats[i] = stats
+            if stats is None:
+                todo.append(i)
+
+        ## detect missing events, then compute missing stats, storing new results to the caches
+        newEntries = []
+        needEvents = [i for i in todo if allEvents[i] is None]
+        newEvents = self.detectEvents([handles[i][1] for i in needEvents], workers, progressDialog)
+        for i, events in zip(needEvents, newEvents):
+            fh = handles[i][1]
+            scan.updateEventCache(fh, events, signal=False)
+            allEvents[i] = events
+            if cache is not None:
+                newEntries.append((self.eventKey(fh, detectorState), events))
+        for i in todo:
+            dh, fh = handles[i]
+            ## processStats adds inputs to the dict it is given; keep the events as they came from the detector
+            stats = host.processStats(dict(allEvents[i]), spots[i])
+            scan.updateStatCache(dh, stats)
+            allStats[i] = stats
+            if cache is not None:
+                newEntries.append((self.statKey(dh, fh, allEvents[i], analysisState), stats))
+        if len(newEntries) > 0:
+            cache.putMany(newEntries)
+
+        return allStats
+
+    def detectEvents(self, fileHandles, workers=None, progressDialog=None):
+        """Return the detector output for each of *fileHandles*.
+
+        With workers=1 (or a single file), the host's detector is used in this process. Otherwise the detector
+        flowchart is rebuilt in a pool of spawned worker processes, which works the same on all platforms.
+        """
+        if len(fileHandles) == 0:
+            return []
+        if workers == 1 or len(fileHandles) == 1:
+            return [self.host.processEvents(fh) for fh in fileHandles]
+
+        runner = FlowchartRunner(self.host.detector.flowchart.saveState(), inputName='dataIn', workers=workers)
+        results = {}
+        if progressDialog is None:
+            dlg = contextlib.nullcontext()
+        else:
+            dlg = pg.ProgressDialog(progressDialog, 0, len(fileHandles))
+        with dlg:
+            for fileName, out, error in runner.run(fileHandles):
+                if error is not None:
+                    raise Exception("Event detection failed for %s:\n%s" % (fileName, error))
+                results[fileName] = out
+                if progressDialog is not None:
+                    dlg += 1
+                    if dlg.wasCanceled():
+                        raise Exception("Event detection canceled by user.")
+        return [results[fh.name()] for fh in fileHandles]
@@ -235,10 +235,22 @@ class Map:
     def isVisible(self):
         return self.sPlotItem.isVisible()
             
-    def recolor(self, n=1, nMax=1, parallel=False):  ## ignore parallel here; it's plenty fast already.
+    def recolor(self, n=1, nMax=1, parallel=False):
         if not self.sPlotItem.isVisible():
             return
         spots = self.sPlotItem.points()
+        
+        ## bring the stats of all source scans up to date first, so that anything missing is computed in parallel
+        scans = []
+        for s in spots:
+            for scan, dh in s.data()['sites']:
+                if scan not in scans:
+                    scans.append(scan)
+        for scan in scans:
+            self.host.batchProcessor.process(scan, workers=None if parallel else 1,
+                                             progressDialog="Processing scan %s" % scan.name(),
+                                             useCache=self.host.useResultCache())
+        
         colors = []
         with pg.ProgressDialog("Computing map %s (%d/%d)" % (self.name(), n, nMax), 0, len(spots)) as dlg:
             for i in range(len(spots)):
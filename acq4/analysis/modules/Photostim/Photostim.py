@@ -16,6 +16,8 @@ from pyqtgraph import multiprocess
 from pyqtgraph.flowchart import Flowchart
 from acq4.util import Qt
 from acq4.util.HelpfulException import HelpfulException
+from acq4.util.result_cache import ResultCache
+from .BatchProcessor import BatchProcessor
 from .DBCtrl import DBCtrl
 from .Scan import Scan, loadScanSequence
 from .ScatterPlotter import ScatterPlotter
@@ -69,6 +71,10 @@ class Photostim(AnalysisModule):
         self.recolorParallelCheck = Qt.QCheckBox('Parallel')
         self.recolorParallelCheck.setChecked(True)
         self.recolorLayout.addWidget(self.recolorParallelCheck)
+        self.recolorCacheCheck = Qt.QCheckBox('Cache')
+        self.recolorCacheCheck.setToolTip("Reuse (and store) events and stats computed in earlier sessions")
+        self.recolorCacheCheck.setChecked(True)
+        self.recolorLayout.addWidget(self.recolorCacheCheck)
         
         ## scatter plot
         self.scatterPlot = ScatterPlotter()
@@ -83,6 +89,14 @@ class Photostim(AnalysisModule):
         #self.seriesScans = {}
         self.maps = []
         
+        ## persistent cache of per-spot results, shared by all sessions
+        self.resultCache = None
+        try:
+            self.resultCache = ResultCache(self.resultCacheFile())
+        except Exception:
+            debug.printExc('Error opening Photostim result cache:')
+        self.batchProcessor = BatchProcessor(self, cache=self.resultCache)
+        
         ## create event detector
         fcDir = os.path.join(os.path.abspath(os.path.split(__file__)[0]), "detector_fc")
         self.detector = EventDetector.EventDetector(host, flowchartDir=fcDir, dbIdentity=self.dbIdentity+'.events')
@@ -127,6 +141,10 @@ class Photostim(AnalysisModule):
     def quit(self):
         self.scans = []
         self.maps = []
+        if self.resultCache is not None:
+            self.resultCache.close()
+            self.resultCache = None
+            self.batchProcessor.setCache(None)
         return AnalysisModule.quit(self)
         
     def elementChanged(self, element, old, new):
@@ -392,6 +410,13 @@ class Photostim(AnalysisModule):
         #for i in range(len(self.maps)):
             #self.maps[i].recolor(self, i, len(self.maps))
 
+    @staticmethod
+    def resultCacheFile():
+        return os.path.join(os.path.expanduser('~'), '.local', 'acq4', 'photostim_results.sqlite')
+
+    def useResultCache(self):
+        return self.recolorCacheCheck.isChecked()
+
     def getColor(self, stats, data=None):
         ## Note: the data argument is used elsewhere (MapAnalyzer)
         #print "STATS:", stats
@@ -428,7 +453,12 @@ class Photostim(AnalysisModule):
             
         if stats is None:
             raise Exception('No data returned from analysis (check flowchart for errors).')
-            
+        
+        return self.addSpotInfo(stats, spot)
+        
+    def addSpotInfo(self, stats, spot):
+        ## add the position and protocol dirs of *spot* to stats (also reapplied to stats loaded from the result cache)
+        dh = spot.data()
         try:
             pos = spot.viewPos()
             stats['xPos'] = pos.x()
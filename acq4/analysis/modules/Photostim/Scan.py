@@ -4,7 +4,6 @@ import time
 import acq4.util.Canvas as Canvas
 import acq4.util.functions as fn
 import pyqtgraph as pg
-import pyqtgraph.multiprocess as mp
 from acq4.util import Qt
 
 
@@ -275,35 +274,31 @@ class Scan(Qt.QObject):
     def recolor(self, n, nMax, parallel=False):
         if not self.item.isVisible():
             return
-        spots = self.spots()
-        handles = [(spot.data(), self.host.dataModel.getClampFile(spot.data())) for spot in spots]
-        result = []
         
-        ## This can be very slow; try to run in parallel (requires fork(); runs serially on windows).
+        ## This can be very slow; cached results are reused and the rest is processed in parallel.
         start = time.time()
         workers = None if parallel else 1
         msg = "Processing scan (%d / %d)" % (n+1, nMax)
-        with mp.Parallelize(tasks=enumerate(handles), result=result, workers=workers, progressDialog=msg) as tasker:
-            for i, dhfh in tasker:
-                dh, fh = dhfh
-                events = self.getEvents(fh, signal=False)
-                stats = self.getStats(dh, signal=False)
-                color = self.host.getColor(stats)
-                tasker.result.append((i, color, stats, events))
-                
+        allStats = self.host.batchProcessor.process(self, workers=workers, progressDialog=msg,
+                                                    useCache=self.host.useResultCache())
         print("recolor took %0.2fsec" % (time.time() - start))
         
-        ## Collect all results, store to caches, and recolor spots
-        for i, color, stats, events in result:
-            dh, fh = handles[i]
-            self.updateStatCache(dh, stats)
-            self.updateEventCache(fh, events, signal=False)
-            spot = spots[i]
-            spot.setBrush(color)
+        for spot, stats in zip(self.spots(), allStats):
+            spot.setBrush(self.host.getColor(stats))
         
         self.sigEventsChanged.emit(self)  ## it's possible events didn't actually change, but meh.
         
-        
+    def cachedStats(self, dh):
+        ## Return in-memory stats for dh if they are still valid, otherwise None.
+        if dh in self.stats and (self.statsLocked or dh in self.statCacheValid):
+            return self.stats[dh]
+        return None
+        
+    def cachedEvents(self, fh):
+        ## Return in-memory events for fh if they are still valid, otherwise None.
+        if fh in self.events and (self.eventsLocked or fh in self.eventCacheValid):
+            return self.events[fh]
+        return None
             
     def getStats(self, dh, signal=True):
         ## Return stats for a single file. (cached if available)
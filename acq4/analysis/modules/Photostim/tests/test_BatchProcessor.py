@@ -0,0 +1,148 @@
+import numpy as np
+
+from acq4.analysis.modules.Photostim.BatchProcessor import BatchProcessor
+from acq4.util.result_cache import ResultCache
+
+
+class Handle(object):
+    def __init__(self, name):
+        self._name = name
+
+    def name(self):
+        return self._name
+
+
+class Spot(object):
+    def __init__(self, dh):
+        self._dh = dh
+
+    def data(self):
+        return self._dh
+
+
+class FakeFlowchart(object):
+    def __init__(self, state):
+        self.state = state
+
+    def saveState(self):
+        return {'nodes': [{'name': 'n', 'pos': (0, 0), 'state': self.state}]}
+
+
+class FakeHost(object):
+    """Stands in for Photostim: events are the clamp file size, stats scale them by the analysis 'gain'."""
+    def __init__(self, clampFiles):
+        self.clampFiles = clampFiles
+        self.detector = FakeHost.Detector()
+        self.flowchart = FakeFlowchart({'gain': 1})
+        self.dataModel = self
+        self.eventCalls = 0
+        self.statCalls = 0
+
+    class Detector(object):
+        flowchart = FakeFlowchart({'threshold': 1})
+
+    def getClampFile(self, dh):
+        return self.clampFiles[dh]
+
+    def processEvents(self, fh):
+        self.eventCalls += 1
+        with open(fh.name(), 'rb') as f:
+            return {'events': np.array([len(f.read())]), 'regions': {}}
+
+    def processStats(self, data, spot):
+        self.statCalls += 1
+        stats = {'amp': float(data['events'][0] * self.flowchart.state['gain'])}
+        return self.addSpotInfo(stats, spot)
+
+    def addSpotInfo(self, stats, spot):
+        stats['ProtocolDir'] = spot.data()
+        return stats
+
+
+class FakeScan(object):
+    def __init__(self, spots):
+        self._spots = spots
+        self.events = {}
+        self.stats = {}
+
+    def spots(self):
+        return self._spots
+
+    def cachedEvents(self, fh):
+        return self.events.get(fh)
+
+    def cachedStats(self, dh):
+        return self.stats.get(dh)
+
+    def updateEventCache(self, fh, events, signal=True):
+        self.events[fh] = events
+
+    def updateStatCache(self, dh, stats):
+        self.stats[dh] = stats
+
+
+def test_batch_uses_persistent_cache(tmp_path):
+    clampFiles = {}
+    spots = []
+    for i in range(4):
+        fileName = tmp_path / ('%03d.ma' % i)
+        fileName.write_bytes(b'x' * (i + 1))
+        dh = Handle(str(tmp_path / ('%03d' % i)))
+        clampFiles[dh] = Handle(str(fileName))
+        spots.append(Spot(dh))
+    host = FakeHost(clampFiles)
+    cache = ResultCache(str(tmp_path / 'results.sqlite'))
+    proc = BatchProcessor(host, cache=cache)
+
+    stats = proc.process(FakeScan(spots), workers=1)
+    assert [s['amp'] for s in stats] == [1, 2, 3, 4]
+    assert host.eventCalls == 4 and host.statCalls == 4
+
+    ## a new session (empty in-memory caches) reuses the stored results
+    stats = proc.process(FakeScan(spots), workers=1)
+    assert [s['amp'] for s in stats] == [1, 2, 3, 4]
+    assert stats[2]['ProtocolDir'] is spots[2].data()
+    assert host.eventCalls == 4 and host.statCalls == 4
+
+    ## changing the analysis recomputes stats only; changing a data file recomputes its events
+    host.flowchart.state = {'gain': 10}
+    (tmp_path / '001.ma').write_bytes(b'x' * 7)
+    stats = proc.process(FakeScan(spots), workers=1)
+    assert [s['amp'] for s in stats] == [10, 70, 30, 40]
+    assert host.eventCalls == 5 and host.statCalls == 8
+    cache.close()
+
+
+def detectorState():
+    ## a real detector flowchart (events = size of the clamp file) that can be rebuilt in worker processes
+    import pyqtgraph as pg
+    import acq4.util.flowchart as flowchart
+    pg.mkQApp()
+    fc = flowchart.Flowchart(terminals={'dataIn': {'io': 'in'}, 'events': {'io': 'out'}})
+    node = fc.createNode('PythonEval', name='Size')
+    node.text.setPlainText("return {'output': [len(open(args['input'].name(), 'rb').read())]}")
+    fc.connectTerminals(fc['dataIn'], node['input'])
+    fc.connectTerminals(node['output'], fc['events'])
+    return fc.saveState()
+
+
+def test_batch_detects_events_in_process_pool(tmp_path):
+    clampFiles = {}
+    spots = []
+    for i in range(3):
+        fileName = tmp_path / ('%03d.ma' % i)
+        fileName.write_bytes(b'x' * (i + 1))
+        dh = Handle(str(tmp_path / ('%03d' % i)))
+        clampFiles[dh] = Handle(str(fileName))
+        spots.append(Spot(dh))
+    host = FakeHost(clampFiles)
+    host.detector = FakeHost.Detector()
+    host.detector.flowchart = FakeFlowchart(None)
+    host.detector.flowchart.saveState = detectorState
+    scan = FakeScan(spots)
+
+    stats = BatchProcessor(host).process(scan, workers=2)
+    assert [s['amp'] for s in stats] == [1, 2, 3]
+    ## events came from the worker processes, not the host's detector
+    assert host.eventCalls == 0 and host.statCalls == 3
+    assert scan.events[clampFiles[spots[1].data()]] == {'events': [2]}
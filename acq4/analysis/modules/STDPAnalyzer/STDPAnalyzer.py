@@ -188,7 +188,7 @@ class STDPAnalyzer(AnalysisModule):
                     if df is None:
                         print('Error in reading data file %s' % f.name())
                         break
-                    data = df.read()
+                    data = self.dataModel.readClampFile(df)
                     timestamp = data.infoCopy()[-1]['startTime']
                     arr[i]['timestamp'] = timestamp
                     arr[i]['data'] = data
@@ -224,7 +224,7 @@ class STDPAnalyzer(AnalysisModule):
                     if df is None:
                         print('Error in reading data file %s' % f.name())
                         break
-                    data = df.read()
+                    data = self.dataModel.readClampFile(df)
                     timestamp = data.infoCopy()[-1]['startTime']
                     arr[i]['timestamp'] = timestamp
                     arr[i]['data'] = data
@@ -423,7 +423,7 @@ class STDPAnalyzer(AnalysisModule):
         while t < len(includedTraces):
             traces = includedTraces[(includedTraces['timestamp'] >= self.expStart+time*i)*(includedTraces['timestamp'] < self.expStart+time*i+time)]
             if len(traces) > 1:
-                x = traces[0]['data']
+                x = traces[0]['data'].copy()  ## cached trace data is read-only
                 for trace2 in traces[1:]:
                     x += trace2['data']
                 x /= len(traces)
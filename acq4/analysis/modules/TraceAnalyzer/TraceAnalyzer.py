@@ -11,6 +11,7 @@ from acq4.util.DirTreeWidget import DirTreeLoader
 from acq4.util.FileLoader import FileLoader
 import pyqtgraph.flowchart as fc
 import pyqtgraph.debug as debug
+from acq4.analysis.FlowchartRunner import FlowchartRunner
 import os
 
 class TraceAnalyzer(AnalysisModule):
@@ -29,8 +30,11 @@ class TraceAnalyzer(AnalysisModule):
         self.processWidget.setLayout(self.processLayout)
         self.processBtn = Qt.QPushButton('Process')
         self.processCheck = Qt.QCheckBox('Auto')
+        self.parallelCheck = Qt.QCheckBox('Parallel')
+        self.parallelCheck.setToolTip("Process files in background worker processes (plots are not updated)")
         self.processLayout.addWidget(self.processBtn)
         self.processLayout.addWidget(self.processCheck)
+        self.processLayout.addWidget(self.parallelCheck)
         self.confLayout = Qt.QGridLayout()
         self.confWidget.setLayout(self.confLayout)
         self.confLayout.addWidget(self.confLoader, 0, 0)
@@ -88,11 +92,21 @@ class TraceAnalyzer(AnalysisModule):
         output = []
         
         table = self.getElement('Results')
-        for fh in self.fileLoader.loadedFiles():
-            try:
-                output.append(self.flowchart.process(Input=fh))
-            except:
-                debug.printExc('Error processing %s' % fh)
+        files = self.fileLoader.loadedFiles()
+        if self.parallelCheck.isChecked():
+            runner = FlowchartRunner(self.flowchart.saveState(), inputName='Input')
+            results = {}
+            for fileName, out, error in runner.run(files):
+                if error is not None:
+                    print("Error processing %s:\n%s" % (fileName, error))
+                results[fileName] = out
+            output = [results[fh.name()] for fh in files if results[fh.name()] is not None]
+        else:
+            for fh in files:
+                try:
+                    output.append(self.flowchart.process(Input=fh))
+                except:
+                    debug.printExc('Error processing %s' % fh)
         table.setData(output)
     
     def outputChanged(self):
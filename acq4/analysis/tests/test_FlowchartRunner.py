@@ -0,0 +1,31 @@
+import pyqtgraph as pg
+
+import acq4.util.flowchart as flowchart
+from acq4.analysis.FlowchartRunner import FlowchartRunner, findFiles
+
+
+def makeState():
+    pg.mkQApp()
+    fc = flowchart.Flowchart(terminals={'dataIn': {'io': 'in'}, 'events': {'io': 'out'}})
+    node = fc.createNode('PythonEval', name='Length')
+    node.text.setPlainText("return {'output': len(open(args['input'].name()).read())}")
+    fc.connectTerminals(fc['dataIn'], node['input'])
+    fc.connectTerminals(node['output'], fc['events'])
+    return fc.saveState()
+
+
+def test_flowchart_runner(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    for i, name in enumerate(['a.ma', 'b.ma', 'sub/c.ma', 'sub/skip.txt']):
+        (tmp_path / name).write_text('x' * (i + 1))
+    files = findFiles([str(tmp_path)])
+    assert [f[len(str(tmp_path)):] for f in files] == ['/a.ma', '/b.ma', '/sub/c.ma']
+
+    state = makeState()
+    for workers in (0, 2):
+        runner = FlowchartRunner(state, outputs=['events'], workers=workers)
+        results = {f: (out, err) for f, out, err in runner.run(files + [str(tmp_path / 'missing.ma')])}
+        assert [results[f][0] for f in files] == [{'events': 1}, {'events': 2}, {'events': 3}]
+        ## failures are reported per file without stopping the run
+        out, err = results[str(tmp_path / 'missing.ma')]
+        assert out is None and 'Error' in err
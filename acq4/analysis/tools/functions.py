@@ -1,8 +1,10 @@
 from __future__ import print_function
 import numpy as np
-import math
+import scipy.stats
+from scipy.spatial import cKDTree
 from pyqtgraph.debug import Profiler
 import acq4.util.functions as utilFn
+from acq4.util.HelpfulException import HelpfulException
 
 
 
@@ -52,120 +54,113 @@ def convertPtsToSparseImage(data, params, spacing=5e-6):
     return arr
 
 
-def bendelsSpatialCorrelationAlgorithm(data, radius, spontRate, timeWindow, printProcess=False, eventsKey='numOfPostEvents'):
-    ## check that data has 'xPos', 'yPos' and 'numOfPostEvents'
-    #SpatialCorrelator.checkArrayInput(data) 
-    #prof = Profiler("bendelsSpatialCorrelationAlgorithm", disabled=True)
+def spatialNeighborCounts(data, radius, isEvent, mapKey=None):
+    """For every spot in *data*, count the spots (including itself) closer than *radius*, and how many of those
+    are flagged in the boolean array *isEvent*.
+
+    Neighbors are found with a KD-tree, so this scales as O(n log n) rather than O(n**2). If *mapKey* names a
+    field of *data*, spots are only compared with other spots that have the same value in that field; this
+    allows many maps to be processed in a single call.
+
+    Returns (nSpots, nEventSpots) as integer arrays.
+    """
+    xy = np.column_stack([data['xPos'], data['yPos']]).astype(float)
+    isEvent = np.asarray(isEvent, dtype=bool)
+    nSpots = np.zeros(len(data), dtype=int)
+    nEventSpots = np.zeros(len(data), dtype=int)
+    r = np.nextafter(radius, 0)  ## the tree includes points at exactly *radius*; the algorithms exclude them
+
+    if mapKey is None:
+        groups = [np.arange(len(data))]
+    else:
+        mapIds = {}
+        ids = np.array([mapIds.setdefault(v, len(mapIds)) for v in data[mapKey]], dtype=int)
+        order = np.argsort(ids, kind='stable')
+        groups = np.split(order, np.flatnonzero(np.diff(ids[order])) + 1)
+
+    for inds in groups:
+        if len(inds) == 0:
+            continue
+        pts = xy[inds]
+        nSpots[inds] = cKDTree(pts).query_ball_point(pts, r, return_length=True)
+        evPts = pts[isEvent[inds]]
+        if len(evPts) > 0:
+            nEventSpots[inds] = cKDTree(evPts).query_ball_point(pts, r, return_length=True)
+    return nSpots, nEventSpots
+
+
+def _addProbField(data):
+    if 'prob' not in data.dtype.names:
+        return utilFn.concatenateColumns([data, np.zeros(len(data), dtype=[('prob', float)])])
+    data['prob'] = 0
+    return data
+
+
+def bendelsSpatialCorrelationAlgorithm(data, radius, spontRate, timeWindow, printProcess=False, eventsKey='numOfPostEvents', mapKey=None):
+    """Return *data* with a 'prob' field holding, for each spot, the probability that the events in the spots
+    within *radius* could have occurred spontaneously.
+
+    *spontRate* may be a scalar or an array with one rate per spot (for example, per-map rates when several
+    maps are processed together using *mapKey*; see spatialNeighborCounts).
+    If *data* already has a 'prob' field, it is filled in place.
+    """
     fields = data.dtype.names
     if 'xPos' not in fields or 'yPos' not in fields or eventsKey not in fields:
         raise HelpfulException("Array input needs to have the following fields: 'xPos', 'yPos', the field specified in *eventsKey*. Current fields are: %s" %str(fields))   
-    #prof.mark("checked fields")
     
-    ## add 'prob' field to data array
-    if 'prob' not in data.dtype.names:
-        arr = utilFn.concatenateColumns([data, np.zeros(len(data), dtype=[('prob', float)])])
-        #arr[:] = data     
-        data = arr
-    else:
-        data['prob']=0
-    #prof.mark("set 'prob' field")
-        
-    table = np.zeros((200, 200)) ## add a lookup table so that we don't have to calculate the same probabilities over and over...saves a bit of time
+    data = _addProbField(data)
     
     ## spatial correlation algorithm from :
     ## Bendels, MHK; Beed, P; Schmitz, D; Johenning, FW; and Leibold C. Detection of input sites in 
     ## scanning photostimulation data based on spatial correlations. 2010. Journal of Neuroscience Methods.
     
     ## calculate probability of seeing a spontaneous event in time window
-    p = 1-np.exp(-spontRate*timeWindow)
+    p = 1-np.exp(-np.asarray(spontRate, dtype=float)*timeWindow)
     if printProcess:
-        print("======  Spontaneous Probability: %f =======" % p)
-    #prof.mark('calculated spontaneous probability')
+        print("======  Spontaneous Probability: %s =======" % p)
         
     ## for each spot, calculate the probability of having the events in nearby spots occur randomly
-    for x in data:
-        spots = data[(np.sqrt((data['xPos']-x['xPos'])**2+(data['yPos']-x['yPos'])**2)) < radius]
-        nSpots = len(spots)
-        nEventSpots = len(spots[spots[eventsKey] > 0])
-        
-        prob = 0
-        if table[nEventSpots, nSpots] != 0: ## try looking up value in table (it was stored there if we calculated it before), otherwise calculate it now
-            prob = table[nEventSpots, nSpots]
-            #prof.mark('look-up')
-        else: 
-            for j in range(nEventSpots, nSpots+1):
-                a = ((p**j)*((1-p)**(nSpots-j))*math.factorial(nSpots))/(math.factorial(j)*math.factorial(nSpots-j))
-                if printProcess:
-                    print("        Prob for %i events: %f     Total: %f" %(j, a, prob+a))
-                prob += a
-            table[nEventSpots, nSpots] = prob
-            #prof.mark('calculate')
-        if printProcess: ## for debugging
-            print("    %i out of %i spots had events. Probability: %f" %(nEventSpots, nSpots, prob))
-        x['prob'] = prob
-        
-        
-    #prof.mark("calculated probabilities")
-    #prof.finish()
+    ## (the binomial probability of seeing at least nEventSpots events in nSpots trials)
+    nSpots, nEventSpots = spatialNeighborCounts(data, radius, data[eventsKey] > 0, mapKey=mapKey)
+    data['prob'] = scipy.stats.binom.sf(nEventSpots-1, nSpots, p)
+    if printProcess: ## for debugging
+        for n, k, prob in zip(nSpots, nEventSpots, data['prob']):
+            print("    %i out of %i spots had events. Probability: %f" %(k, n, prob))
     
     return data
 
-def spatialCorrelationAlgorithm_ZScore(data, radius, printProcess=False, eventsKey='ZScore', spontKey='SpontZScore', threshold=1.645):
-    ## check that data has 'xPos', 'yPos' and 'numOfPostEvents'
-    #SpatialCorrelator.checkArrayInput(data) 
-    #prof = Profiler("bendelsSpatialCorrelationAlgorithm", disabled=True)
+def spatialCorrelationAlgorithm_ZScore(data, radius, printProcess=False, eventsKey='ZScore', spontKey='SpontZScore', threshold=1.645, mapKey=None):
+    """Like bendelsSpatialCorrelationAlgorithm, but spots count as having events if their *eventsKey* value is
+    below -*threshold*, and the spontaneous probability is the fraction of spots whose *spontKey* value is.
+
+    If *mapKey* is given, the spontaneous probability and neighborhoods are computed separately for each map.
+    """
     fields = data.dtype.names
     if 'xPos' not in fields or 'yPos' not in fields or eventsKey not in fields or spontKey not in fields:
         raise HelpfulException("Array input needs to have the following fields: 'xPos', 'yPos', the fields specified in *eventsKey* and *spontKey*. Current fields are: %s" %str(fields))   
-    #prof.mark("checked fields")
     
-    ## add 'prob' field to data array
-    if 'prob' not in data.dtype.names:
-        arr = utilFn.concatenateColumns([data, np.zeros(len(data), dtype=[('prob', float)])])
-        #arr[:] = data     
-        data = arr
-    else:
-        data['prob']=0
-    #prof.mark("set 'prob' field")
-        
-    table = np.zeros((200, 200)) ## add a lookup table so that we don't have to calculate the same probabilities over and over...saves a bit of time
+    data = _addProbField(data)
     
     ## spatial correlation algorithm from :
     ## Bendels, MHK; Beed, P; Schmitz, D; Johenning, FW; and Leibold C. Detection of input sites in 
     ## scanning photostimulation data based on spatial correlations. 2010. Journal of Neuroscience Methods.
     
     ## calculate probability of seeing a spontaneous event in time window -- for ZScore method, calculate probability that ZScore is spontaneously high
-    p = len(data[data[spontKey] < -threshold])/float(len(data))
-    #p = 1-np.exp(-spontRate*timeWindow)
-    #if printProcess:
-    #    print "======  Spontaneous Probability: %f =======" % p
-    #prof.mark('calculated spontaneous probability')
+    spont = data[spontKey] < -threshold
+    if mapKey is None:
+        p = spont.sum()/float(len(data))
+    else:
+        p = np.empty(len(data))
+        maps = data[mapKey]
+        for m in set(maps.tolist()):
+            mask = maps == m
+            p[mask] = spont[mask].mean()
     
-        
     ## for each spot, calculate the probability of having the events in nearby spots occur randomly
-    for x in data:
-        spots = data[(np.sqrt((data['xPos']-x['xPos'])**2+(data['yPos']-x['yPos'])**2)) < radius]
-        nSpots = len(spots)
-        nEventSpots = len(spots[spots[eventsKey] < -threshold])
-        
-        prob = 0
-        if table[nEventSpots, nSpots] != 0: ## try looking up value in table (it was stored there if we calculated it before), otherwise calculate it now
-            prob = table[nEventSpots, nSpots]
-            #prof.mark('look-up')
-        else: 
-            for j in range(nEventSpots, nSpots+1):
-                a = ((p**j)*((1-p)**(nSpots-j))*math.factorial(nSpots))/(math.factorial(j)*math.factorial(nSpots-j))
-                if printProcess:
-                    print("        Prob for %i events: %f     Total: %f" %(j, a, prob+a))
-                prob += a
-            table[nEventSpots, nSpots] = prob
-            #prof.mark('calculate')
-        if printProcess: ## for debugging
-            print("    %i out of %i spots had events. Probability: %f" %(nEventSpots, nSpots, prob))
-        x['prob'] = prob
-        
-        
-    #prof.mark("calculated probabilities")
-    #prof.finish()
+    nSpots, nEventSpots = spatialNeighborCounts(data, radius, data[eventsKey] < -threshold, mapKey=mapKey)
+    data['prob'] = scipy.stats.binom.sf(nEventSpots-1, nSpots, p)
+    if printProcess: ## for debugging
+        for n, k, prob in zip(nSpots, nEventSpots, data['prob']):
+            print("    %i out of %i spots had events. Probability: %f" %(k, n, prob))
     
     return data
\ No newline at end of file
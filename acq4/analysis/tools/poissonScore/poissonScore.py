@@ -99,44 +99,228 @@ Notes on probability computation:
 
 ## Code for playing with poisson distributions
 
+import concurrent.futures
+import hashlib
+import json
+import os
+
 import numpy as np
 import scipy.stats as stats
 import pyqtgraph as pg
 
-import pyqtgraph.multiprocess as mp
-import os
+## Increment whenever a change to the scoring code invalidates previously generated normalization tables.
+NORM_TABLE_VERSION = 1
 
 def poissonProcess(rate, tmax=None, n=None):
     """Simulate a poisson process; return a list of event times"""
-    events = []
-    t = 0
-    while True:
-        t += np.random.exponential(1./rate)
-        if tmax is not None and t > tmax:
-            break
-        events.append(t)
-        if n is not None and len(events) >= n:
-            break
-    return np.array(events)
+    if n is not None:
+        times = np.cumsum(np.random.exponential(1./rate, size=n))
+        if tmax is not None:
+            times = times[times <= tmax]
+        return times
+
+    ## draw intervals in blocks large enough that one block almost always reaches tmax
+    block = int(rate * tmax + 5 * (rate * tmax)**0.5) + 10
+    times = np.cumsum(np.random.exponential(1./rate, size=block))
+    while times[-1] <= tmax:
+        times = np.concatenate([times, times[-1] + np.cumsum(np.random.exponential(1./rate, size=block))])
+    return times[times <= tmax]
 
 def poissonProb(n, t, l, clip=False):
     """
     For a poisson process, return the probability of seeing at least *n* events in *t* seconds given
-    that the process has a mean rate *l*.
+    that the process has a mean rate *l*. *l* may also be an array with one rate per event.
     """
-    if l == 0:
-        if np.isscalar(n):
-            if n == 0:
-                return 1.0
+    if np.isscalar(l):
+        if l == 0:
+            if np.isscalar(n):
+                if n == 0:
+                    return 1.0
+                else:
+                    return 1e-25
             else:
-                return 1e-25
-        else:
-            return np.where(n==0, 1.0, 1e-25)
-    
-    p = stats.poisson(l*t).sf(n)   
+                return np.where(n==0, 1.0, 1e-25)
+        p = stats.poisson(l*t).sf(n)
+    else:
+        l = np.asarray(l)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p = stats.poisson(l*t).sf(n)
+        p = np.where(l == 0, np.where(n == 0, 1.0, 1e-25), p)
     if clip:
         p = np.clip(p, 0, 1.0-1e-25)
     return p
+
+def countEventsUpTo(times, groups=None):
+    """
+    For each event, return the number of events (within the same group) that occur at or before it.
+
+    This is equivalent to ``[(times <= t).sum() for t in times]`` applied separately to each group,
+    but takes O(n log n) time instead of O(n**2).
+    """
+    times = np.asarray(times)
+    if groups is None:
+        return np.searchsorted(np.sort(times), times, side='right')
+
+    groups = np.asarray(groups)
+    n = len(times)
+    if n == 0:
+        return np.zeros(0, dtype=int)
+    order = np.lexsort((times, groups))
+    sortedTimes = times[order]
+    sortedGroups = groups[order]
+
+    ## index of the last event sharing the same (group, time) as each event
+    change = np.empty(n, dtype=bool)
+    change[:-1] = (sortedGroups[1:] != sortedGroups[:-1]) | (sortedTimes[1:] != sortedTimes[:-1])
+    change[-1] = True
+    ends = np.flatnonzero(change)
+    last = ends[np.searchsorted(ends, np.arange(n))]
+    ## index of the first event in each group
+    first = np.searchsorted(sortedGroups, sortedGroups, side='left')
+
+    counts = np.empty(n, dtype=int)
+    counts[order] = last - first + 1
+    return counts
+
+def interpolateNormTable(table, rows, x):
+    """
+    For each pair (rows[i], x[i]), linearly interpolate the mapped value table[1, rows[i]] at the score
+    x[i] on the score axis table[0, rows[i]]. Scores beyond the end of the table are extrapolated from the
+    last segment.
+    """
+    out = np.empty(len(x))
+    for row in np.unique(rows):
+        mask = rows == row
+        xv = table[0, row]
+        yv = table[1, row]
+        xm = x[mask]
+        ind = np.searchsorted(xv, xm, side='right')  ## first index where xv > x
+        ind[ind == len(xv)] = len(xv) - 1
+        ind[ind == 0] = 1
+        x1, x2 = xv[ind-1], xv[ind]
+        y1, y2 = yv[ind-1], yv[ind]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s = np.where(x1 == x2, 0.0, (xm - x1) / (x2 - x1))
+        out[mask] = y1 + s * (y2 - y1)
+    return out
+
+def cumulativeScoreCounts(scores, r, nBins):
+    """
+    Return an array where element k is the number of *scores* with log_r(score) >= k (for k < nBins).
+    This is the histogram accumulated when generating normalization tables.
+    """
+    inds = np.clip((np.log(scores) / np.log(r)).astype(int), 0, nBins - 1)
+    hist = np.bincount(inds, minlength=nBins)
+    return hist[::-1].cumsum()[::-1]
+
+def normTableDirs():
+    """
+    Return the directories searched for cached normalization tables, in order of preference.
+    New tables are written to the first writable directory in this list.
+
+    The directory named by the ACQ4_POISSON_TABLE_DIR environment variable is searched first, followed by
+    the directory containing this module (which ships with precomputed tables) and ~/.local/acq4/poissonScore.
+    """
+    dirs = []
+    if os.environ.get('ACQ4_POISSON_TABLE_DIR'):
+        dirs.append(os.environ['ACQ4_POISSON_TABLE_DIR'])
+    dirs.append(os.path.dirname(os.path.abspath(__file__)))
+    dirs.append(os.path.join(os.path.expanduser('~'), '.local', 'acq4', 'poissonScore'))
+    return dirs
+
+def normTableFileName(cls, layout):
+    """
+    Return the cache file name for the normalization table of *cls* generated with *layout*.
+    The name contains a hash of the class name, the layout parameters and NORM_TABLE_VERSION, so changing
+    any of these causes a new table to be generated.
+    """
+    key = json.dumps({'class': cls.__name__, 'layout': layout, 'version': NORM_TABLE_VERSION}, sort_keys=True)
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    shape = normTableShape(layout)
+    return '%s_normTable_%s_float64_%s.dat' % (cls.__name__, 'x'.join(map(str, shape)), digest)
+
+def normTableShape(layout):
+    shape = (2,)
+    if 'reps' in layout:
+        shape += (len(layout['reps']),)
+    return shape + (len(layout['tVals']), layout['xSteps'])
+
+def normTableScoreStep(layout):
+    ## ratio between consecutive score values; scores are log-spaced from 1 to 10**xDecades
+    return 10**(float(layout['xDecades']) / layout['xSteps'])
+
+def readNormTable(cls, layout):
+    """Return the cached normalization table for *cls* and *layout*, or None if it has not been generated."""
+    fileName = normTableFileName(cls, layout)
+    for path in normTableDirs():
+        cacheFile = os.path.join(path, fileName)
+        if os.path.exists(cacheFile):
+            return np.fromfile(cacheFile, dtype=np.float64).reshape(normTableShape(layout))
+    return None
+
+def writeNormTable(cls, layout, norm):
+    """Write *norm* to the first writable cache directory; return the file name or None on failure."""
+    fileName = normTableFileName(cls, layout)
+    for path in normTableDirs():
+        cacheFile = os.path.join(path, fileName)
+        try:
+            os.makedirs(path, exist_ok=True)
+            ## write to a temporary file first so that concurrent readers never see a partial table
+            tmpFile = cacheFile + '.%d.tmp' % os.getpid()
+            with open(tmpFile, 'wb') as fh:
+                fh.write(norm.tobytes())
+            os.replace(tmpFile, cacheFile)
+            return cacheFile
+        except OSError:
+            continue
+    return None
+
+def _normTableJob(cls, layout, tIndex, n, seed):
+    ## runs in a worker process; each job gets its own seed so that workers do not generate identical event sets
+    if seed is not None:
+        np.random.seed(seed)
+    return cls.normTableCounts(layout, tIndex, n)
+
+def generateNormTable(cls, layout, processes=None, jobSize=10000):
+    """
+    Run the Monte-Carlo simulation that produces the normalization table for *cls*.
+
+    The simulation is split into jobs of at most *jobSize* event sets, which are distributed over a pool of
+    *processes* worker processes (default is one per CPU). If *processes* is 1, all jobs run in the
+    calling process.
+    """
+    shape = normTableShape(layout)
+    nev = np.array(layout['nev'])
+    jobs = [(i, min(jobSize, n-j)) for i, n in enumerate(nev) for j in range(0, n, jobSize)]
+
+    count = np.zeros(shape[1:], dtype=float)
+    if processes == 1:
+        for i, n in jobs:
+            count += _normTableJob(cls, layout, i, n, None)
+    else:
+        seeds = np.random.SeedSequence().generate_state(len(jobs))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_normTableJob, cls, layout, i, n, int(seed)) for (i, n), seed in zip(jobs, seeds)]
+            for fut in concurrent.futures.as_completed(futures):
+                count += fut.result()
+
+    count[count==0] = 1
+    norm = np.empty(shape)
+    norm[0] = normTableScoreStep(layout) ** np.arange(layout['xSteps'])
+    norm[1] = nev.reshape(len(nev), 1) / count
+    return norm
+
+def loadNormTable(cls, layout, generate=True, processes=None):
+    """
+    Return the normalization table for *cls* and *layout*, reading it from the disk cache if possible.
+    Otherwise, generate the table (if *generate* is True) and store it in the cache, or return None.
+    """
+    norm = readNormTable(cls, layout)
+    if norm is None and generate:
+        print("Generating %s ..." % normTableFileName(cls, layout))
+        norm = generateNormTable(cls, layout, processes=processes)
+        writeNormTable(cls, layout, norm)
+    return norm
     
 #def gaussProb(amps, mean, stdev):
     #"""
@@ -181,46 +365,47 @@ class PoissonScore:
         ev must be a list of record arrays. Each array describes a set of events; only required field is 'time'
         *rate* may be either a single value or a list (in which case the mean will be used)
         """
-        nSets = len(ev)
-        events = np.concatenate(ev)
+        return cls.scoreMany([ev], [rate], tMax=tMax, normalize=normalize, **kwds)[0]
 
-        if not np.isscalar(rate):   ### Is this valid???  I think so..
-            rate = np.mean(rate)
-        
-        if len(events) == 0:
-            score = 1.0
-        else:
-            #ev = [x['time'] for x in ev]  ## select times from event set
-            #ev = np.concatenate(ev)   ## mix events together
-            ev = events['time']
-            
-            nVals = np.array([(ev<=t).sum()-1 for t in ev]) ## looks like arange, but consider what happens if two events occur at the same time.
-            pi = poissonProb(nVals, ev, rate*nSets)  ## note that by using n=0 to len(ev)-1, we correct for the fact that the time window always ends at the last event
+    @classmethod
+    def scoreMany(cls, evSets, rates, tMax=None, normalize=True, **kwds):
+        """
+        Compute poisson scores for many sites in a single vectorized call.
+        *evSets* contains one item per site, each a list of event record arrays as accepted by score().
+        *rates* contains one rate per site (each may be a single value or a list, as in score()).
+        Extra keyword arguments are passed to amplitudeScore.
+        Return an array of scores, one per site.
+        """
+        nSites = len(evSets)
+        siteRates = np.array([r if np.isscalar(r) else np.mean(r) for r in rates], dtype=float)
+        nSets = np.array([len(ev) for ev in evSets])
+        events = [np.concatenate(ev) for ev in evSets]
+        nEvents = np.array([len(e) for e in events], dtype=int)
+
+        scores = np.ones(nSites)
+        hasEvents = nEvents > 0
+        if hasEvents.any():
+            ## mix together all events from each site; score every event from every site at once
+            allEvents = np.concatenate([e for e in events if len(e) > 0])
+            site = np.repeat(np.arange(nSites), nEvents)
+            times = allEvents['time']
+
+            nVals = countEventsUpTo(times, site) - 1  ## looks like arange, but consider what happens if two events occur at the same time.
+            pi = poissonProb(nVals, times, (siteRates*nSets)[site])  ## note that by using n=0 to len(ev)-1, we correct for the fact that the time window always ends at the last event
             pi = 1.0 / pi
-            
+
             ## apply extra score for uncommonly large amplitudes
             ## (note: by default this has no effect; see amplitudeScore)
-            ampScore = cls.amplitudeScore(events, **kwds)
-            pi *= ampScore
-            
-            mp = pi.max()
-            #mpp = min(cls.maxPoissonProb(ev, rate*nSets), 1.0-1e-12)  ## don't allow returning inf
-            #mpp = min(mp, 1.0-1e-12)
-            
-            score = mp
-            #score =  1.0 / (1.0 - mpp)
-            
-            
-        #n = len(ev)
+            pi *= cls.amplitudeScore(allEvents, **kwds)
+
+            starts = np.cumsum(nEvents) - nEvents
+            scores[hasEvents] = np.maximum.reduceat(pi, starts[hasEvents])
+
         if normalize:
-            ret = cls.mapScore(score, rate*tMax*nSets)
-        else:
-            ret = score
-        if np.isscalar(ret):
-            assert not np.isnan(ret)
+            ret = cls.mapScores(scores, siteRates*tMax*nSets)
         else:
-            assert not any(np.isnan(ret))
-        
+            ret = scores
+        assert not np.any(np.isnan(ret))
         return ret
 
     @classmethod
@@ -251,42 +436,34 @@ class PoissonScore:
         """
         Map score x to probability given we expect n events per set
         """
-        if cls.normalizationTable is None:
-            cls.normalizationTable = cls.generateNormalizationTable()
-            cls.extrapolateNormTable()
-            
-        nind = max(0, np.log(n)/np.log(2))
-        n1 = np.clip(int(np.floor(nind)), 0, cls.normalizationTable.shape[1]-2)
+        return cls.mapScores([x], [n])[0]
+
+    @classmethod
+    def mapScores(cls, x, n):
+        """
+        Map an array of scores x to probabilities given we expect n[i] events per set for each score
+        """
+        table = cls.getNormalizationTable()
+
+        x = np.asarray(x, dtype=float)
+        n = np.broadcast_to(np.asarray(n, dtype=float), x.shape)
+        with np.errstate(divide='ignore'):
+            nind = np.maximum(0, np.log(n)/np.log(2))
+        n1 = np.clip(np.floor(nind).astype(int), 0, table.shape[1]-2)
         n2 = n1+1
-        
-        mapped1 = []
-        for i in [n1, n2]:
-            norm = cls.normalizationTable[:,i]
-            ind = np.argwhere(norm[0] > x)
-            if len(ind) == 0:
-                ind = len(norm[0])-1
-            else:
-                ind = ind[0,0]
-            if ind == 0:
-                ind = 1
-            x1, x2 = norm[0, ind-1:ind+1]
-            y1, y2 = norm[1, ind-1:ind+1]
-            if x1 == x2:
-                s = 0.0
-            else:
-                s = (x-x1) / float(x2-x1)
-            mapped1.append(y1 + s*(y2-y1))
-        
-        mapped = mapped1[0] + (mapped1[1]-mapped1[0]) * (nind-n1)/float(n2-n1)
-        
+
+        mapped1 = interpolateNormTable(table, n1, x)
+        mapped2 = interpolateNormTable(table, n2, x)
+        mapped = mapped1 + (mapped2-mapped1) * (nind-n1)/(n2-n1)
+
         ## doesn't handle points outside of the original data.
         #mapped = scipy.interpolate.griddata(poissonScoreNorm[0], poissonScoreNorm[1], [x], method='cubic')[0]
         #normTable, tVals, xVals = poissonScoreNorm
         #spline = scipy.interpolate.RectBivariateSpline(tVals, xVals, normTable)
         #mapped = spline.ev(n, x)[0]
         #raise Exception()
-        assert not (np.isinf(mapped) or np.isnan(mapped))
-        assert mapped>0
+        assert not np.any(np.isinf(mapped) | np.isnan(mapped))
+        assert np.all(mapped>0)
         return mapped
 
     #@classmethod
@@ -354,7 +531,26 @@ class PoissonScore:
         return ret
         
     @classmethod
-    def generateNormalizationTable(cls, nEvents=1000000):
+    def getNormalizationTable(cls):
+        """Return the normalization table, loading (or, if necessary, generating) it on first use."""
+        if cls.normalizationTable is None:
+            cls.normalizationTable = cls.generateNormalizationTable()
+            cls.extrapolateNormTable()
+        return cls.normalizationTable
+
+    @classmethod
+    def normTableLayout(cls, nEvents=1000000):
+        """
+        Return the parameters determining the sample space of the normalization table.
+        *nEvents* sets the number of simulated event sets (fewer are simulated for longer tMax values).
+        """
+        rate = 1.0
+        tVals = 2**np.arange(9)  ## set of tMax values
+        nev = (nEvents / (rate*tVals)**0.5).astype(int)  # number of event sets to generate for each tMax value
+        return {'rate': rate, 'tVals': tVals.tolist(), 'nev': nev.tolist(), 'xSteps': 1000, 'xDecades': 30}
+
+    @classmethod
+    def generateNormalizationTable(cls, nEvents=1000000, processes=None):
         ## table looks like this:
         ##   (2 x M x N)
         ##   Axis 0:  (score, mapped)
@@ -365,52 +561,27 @@ class PoissonScore:
         ##    determine axis-1 index by expected number of events
         ##    look up axis-2 index from table[0, ind1]
         ##    look up mapped score at table[1, ind1, ind2]
-        
-        
-        ## parameters determining sample space for normalization table
-        rate = 1.0
-        tVals = 2**np.arange(9)  ## set of tMax values
-        nev = (nEvents / (rate*tVals)**0.5).astype(int)  # number of events to generate for each tMax value
-        
-        xSteps = 1000
-        r = 10**(30./xSteps)
-        xVals = r ** np.arange(xSteps)  ## log spacing from 1 to 10**20 in 500 steps
-        tableShape = (2, len(tVals), len(xVals))
-        
-        path = os.path.dirname(__file__)
-        cacheFile = os.path.join(path, '%s_normTable_%s_float64.dat' % (cls.__name__, 'x'.join(map(str,tableShape))))
-        
-        if os.path.exists(cacheFile):
-            norm = np.fromfile(cacheFile, dtype=np.float64).reshape(tableShape)
-        else:
-            print("Generating %s ..." % cacheFile)
-            norm = np.empty(tableShape)
-            counts = []
-            with mp.Parallelize(counts=counts) as tasker:
-                for task in tasker:
-                    count = np.zeros(tableShape[1:], dtype=float)
-                    for i, t in enumerate(tVals):
-                        n = nev[i] / tasker.numWorkers()
-                        for j in range(int(n)):
-                            if j%1000==0:
-                                print(t, j)
-                                tasker.process()
-                            ev = cls.generateRandom(rate=rate, tMax=t, reps=1)
-                            
-                            score = cls.score(ev, rate, normalize=False)
-                            ind = np.log(score) / np.log(r)
-                            count[i, :ind+1] += 1
-                    tasker.counts.append(count)
-                            
-            count = sum(counts)
-            count[count==0] = 1
-            norm[0] = xVals.reshape(1, len(xVals))
-            norm[1] = nev.reshape(len(nev), 1) / count
-
-            with open(cacheFile, 'wb') as fh:
-                fh.write(norm.tobytes())
+        ##
+        ## Tables are cached on disk (see loadNormTable); if no cached table exists, the simulation is run
+        ## in a pool of *processes* worker processes.
+        return loadNormTable(cls, cls.normTableLayout(nEvents), processes=processes)
 
-        return norm
+    @classmethod
+    def normTableCounts(cls, layout, tIndex, n, batchSize=1000):
+        """
+        Score *n* simulated event sets with tMax=layout['tVals'][tIndex]. Return an array shaped like the
+        normalization table where element [tIndex, k] counts the sets with a score of at least r**k.
+        """
+        rate = layout['rate']
+        t = layout['tVals'][tIndex]
+        r = normTableScoreStep(layout)
+        count = np.zeros(normTableShape(layout)[1:], dtype=float)
+        ## score simulated event sets in batches
+        for j in range(0, n, batchSize):
+            evSets = [cls.generateRandom(rate=rate, tMax=t, reps=1) for k in range(min(batchSize, n-j))]
+            scores = cls.scoreMany(evSets, [rate]*len(evSets), normalize=False)
+            count[tIndex] += cumulativeScoreCounts(scores, r, layout['xSteps'])
+        return count
         
     @classmethod
     def testMapping(cls, rate=1.0, tMax=1.0, n=10000, reps=3):
@@ -434,7 +605,7 @@ class PoissonScore:
     
     @classmethod
     def poissonScoreBlame(cls, ev, rate):
-        nVals = np.array([(ev<=t).sum()-1 for t in ev]) 
+        nVals = countEventsUpTo(ev) - 1
         pp1 = 1.0 /   (1.0 - poissonProb(nVals, ev, rate, clip=True))
         pp2 = 1.0 /   (1.0 - poissonProb(nVals-1, ev, rate, clip=True))
         diff = pp1 / pp2
@@ -571,14 +742,12 @@ class PoissonRepeatScore:
         ev = list(map(np.sort, ev))
         pp = np.empty((len(ev), len(ev2)))
         for i, trial in enumerate(ev):
-            nVals = []
-            for j in range(len(ev2)):
-                n = (trial<ev2[j]['time']).sum()
-                if any(trial == ev2[j]['time']) and ev2[j]['trial'] > i:  ## need to correct for the case where two events in separate trials happen to have exactly the same time.
-                    n += 1
-                nVals.append(n)
-            
-            pp[i] = 1.0 / (1.0 - poissonProb(np.array(nVals), ev2['time'], rate[i]))
+            nVals = np.searchsorted(trial, ev2['time'], side='left')  ## number of events in this trial before each time
+            ## need to correct for the case where two events in separate trials happen to have exactly the same time.
+            tied = np.searchsorted(trial, ev2['time'], side='right') > nVals
+            nVals = nVals + (tied & (ev2['trial'] > i))
+
+            pp[i] = 1.0 / (1.0 - poissonProb(nVals, ev2['time'], rate[i]))
            
             ## apply extra score for uncommonly large amplitudes
             ## (note: by default this has no effect; see amplitudeScore)
@@ -611,48 +780,106 @@ class PoissonRepeatScore:
         return np.ones(len(times))
         
     
+    @classmethod
+    def scoreMany(cls, evSets, rates, tMax=None, normalize=True, **kwds):
+        """
+        Compute scores for many sites in a single vectorized call. *evSets* contains one list of trials per
+        site (see score()), and *rates* one rate (or list of per-trial rates) per site. Return an array of scores.
+        """
+        if cls.amplitudeScore.__func__ is PoissonRepeatScore.amplitudeScore.__func__:
+            scores = cls._rawScoresNoAmplitude(evSets, rates)
+        else:
+            ## amplitude scores are defined per trial; score each site separately
+            scores = np.array([cls.score(ev, rate, normalize=False, **kwds) for ev, rate in zip(evSets, rates)],
+                              dtype=float)
+        if not normalize:
+            return scores
+        meanRates = np.array([np.mean(rate) for rate in rates])
+        return cls.mapScores(scores, meanRates*tMax, [len(ev) for ev in evSets])
+
+    @classmethod
+    def _rawScoresNoAmplitude(cls, evSets, rates):
+        ## Unnormalized scores of score() for every site at once, without the amplitude term.
+        ## Every event of a site is scored against each of the site's trials; the loop below runs once per
+        ## trial index (not per site), over all sites that have that many trials.
+        nSites = len(evSets)
+        nTrials = np.array([len(ev) for ev in evSets], dtype=int)
+        scores = np.ones(nSites)
+        trialTimes = [x['time'] for ev in evSets for x in ev]
+        if len(trialTimes) == 0:
+            return scores
+        trialSizes = np.array([len(t) for t in trialTimes], dtype=int)
+        times = np.concatenate(trialTimes).astype(float)
+        if len(times) == 0:
+            return scores
+        trialStart = np.cumsum(nTrials) - nTrials     ## global index of the first trial of each site
+        trialRates = np.concatenate([np.broadcast_to(np.asarray(r, dtype=float), (n,))
+                                     for r, n in zip(rates, nTrials)])
+        gTrial = np.repeat(np.arange(len(trialTimes)), trialSizes)     ## global trial of each event
+        site = np.repeat(np.repeat(np.arange(nSites), nTrials), trialSizes)
+        trial = gTrial - trialStart[site]                                ## trial of each event within its site
+
+        ## exact integer keys ordering events by (global trial, time)
+        tRank = np.unique(times, return_inverse=True)[1].ravel()
+        nRanks = tRank.max() + 2
+        sortedKeys = np.sort(gTrial * nRanks + tRank)
+
+        product = np.ones(len(times))
+        for k in range(nTrials.max()):
+            sel = np.flatnonzero(nTrials[site] > k)
+            g = trialStart[site[sel]] + k
+            base = np.searchsorted(sortedKeys, g * nRanks, side='left')
+            before = np.searchsorted(sortedKeys, g * nRanks + tRank[sel], side='left') - base
+            upTo = np.searchsorted(sortedKeys, g * nRanks + tRank[sel], side='right') - base
+            ## events at exactly the same time in an earlier trial count as preceding this one
+            nVals = before + ((upTo > before) & (trial[sel] > k))
+            product[sel] *= 1.0 / (1.0 - poissonProb(nVals, times[sel], trialRates[g]))
+
+        order = np.argsort(site, kind='stable')
+        nEvents = np.bincount(site, minlength=nSites)
+        hasEvents = nEvents > 0
+        starts = np.cumsum(nEvents) - nEvents
+        scores[hasEvents] = np.maximum.reduceat(product[order], starts[hasEvents])
+        return scores
+
     @classmethod
     def mapScore(cls, x, n, m):
         """
         Map score x to probability given we expect n events per set and m repeat sets
         """
-        if cls.normalizationTable is None:
-            cls.normalizationTable = cls.generateNormalizationTable()
-            cls.extrapolateNormTable()
-            
-        table = cls.normalizationTable[:,min(m-1, cls.normalizationTable.shape[1]-1)]  # select the table for this repeat number
-        
-        nind = np.log(n)/np.log(2)
-        n1 = np.clip(int(np.floor(nind)), 0, table.shape[2]-2)
+        return cls.mapScores([x], [n], [m])[0]
+
+    @classmethod
+    def mapScores(cls, x, n, m):
+        """
+        Map an array of scores x to probabilities given we expect n[i] events per set and m[i] repeat sets
+        """
+        ## flatten the (repeats, tMax) axes so that each (m, n) pair selects a single row
+        table = cls.getNormalizationTable()
+        nReps, nT = table.shape[1:3]
+        flat = table.reshape(2, nReps*nT, table.shape[3])
+
+        x = np.asarray(x, dtype=float)
+        n = np.broadcast_to(np.asarray(n, dtype=float), x.shape)
+        m = np.broadcast_to(np.asarray(m, dtype=int), x.shape)
+        repInd = np.minimum(m-1, nReps-1) * nT  # select the table for this repeat number
+
+        with np.errstate(divide='ignore'):
+            nind = np.log(n)/np.log(2)
+        n1 = np.clip(np.floor(nind).astype(int), 0, nT-2)
         n2 = n1+1
-        
-        mapped1 = []
-        for i in [n1, n2]:
-            norm = table[:,i]
-            ind = np.argwhere(norm[0] > x)
-            if len(ind) == 0:
-                ind = len(norm[0])-1
-            else:
-                ind = ind[0,0]
-            if ind == 0:
-                ind = 1
-            x1, x2 = norm[0, ind-1:ind+1]
-            y1, y2 = norm[1, ind-1:ind+1]
-            if x1 == x2:
-                s = 0.0
-            else:
-                s = (x-x1) / float(x2-x1)
-            mapped1.append(y1 + s*(y2-y1))
-        
-        mapped = mapped1[0] + (mapped1[1]-mapped1[0]) * (nind-n1)/float(n2-n1)
-        
+
+        mapped1 = interpolateNormTable(flat, repInd + n1, x)
+        mapped2 = interpolateNormTable(flat, repInd + n2, x)
+        mapped = mapped1 + (mapped2-mapped1) * (nind-n1)/(n2-n1)
+
         ## doesn't handle points outside of the original data.
         #mapped = scipy.interpolate.griddata(poissonScoreNorm[0], poissonScoreNorm[1], [x], method='cubic')[0]
         #normTable, tVals, xVals = poissonScoreNorm
         #spline = scipy.interpolate.RectBivariateSpline(tVals, xVals, normTable)
         #mapped = spline.ev(n, x)[0]
         #raise Exception()
-        assert not (np.isinf(mapped) or np.isnan(mapped))
+        assert not np.any(np.isinf(mapped) | np.isnan(mapped))
         return mapped
 
     @classmethod
@@ -667,52 +894,50 @@ class PoissonRepeatScore:
         return ret
         
     @classmethod
-    def generateNormalizationTable(cls, nEvents=1000000):
-        
-        ## parameters determining sample space for normalization table
+    def getNormalizationTable(cls):
+        """Return the normalization table, loading (or, if necessary, generating) it on first use."""
+        if cls.normalizationTable is None:
+            cls.normalizationTable = cls.generateNormalizationTable()
+            cls.extrapolateNormTable()
+        return cls.normalizationTable
+
+    @classmethod
+    def normTableLayout(cls, nEvents=1000000):
+        """
+        Return the parameters determining the sample space of the normalization table.
+        *nEvents* sets the number of simulated event sets (fewer are simulated for longer tMax values).
+        """
         reps = np.arange(1,5)  ## number of repeats
         rate = 1.0
         tVals = 2**np.arange(4)  ## set of tMax values
         nev = (nEvents / (rate*tVals)**0.5).astype(int)
-        
-        xSteps = 1000
-        r = 10**(30./xSteps)
-        xVals = r ** np.arange(xSteps)  ## log spacing from 1 to 10**20 in 500 steps
-        tableShape = (2, len(reps), len(tVals), len(xVals))
-        
-        path = os.path.dirname(__file__)
-        cacheFile = os.path.join(path, '%s_normTable_%s_float64.dat' % (cls.__name__, 'x'.join(map(str,tableShape))))
-        
-        if os.path.exists(cacheFile):
-            norm = np.fromfile(cacheFile, dtype=np.float64).reshape(tableShape)
-        else:
-            print("Generating %s ..." % cacheFile)
-            norm = np.empty(tableShape)
-            counts = []
-            with mp.Parallelize(tasks=[0,1], counts=counts) as tasker:
-                for task in tasker:
-                    count = np.zeros(tableShape[1:], dtype=float)
-                    for i, t in enumerate(tVals):
-                        n = nev[i]
-                        for j in range(int(n)):
-                            if j%1000==0:
-                                print(t, j)
-                            ev = cls.generateRandom(rate=rate, tMax=t, reps=reps[-1])
-                            for m in reps:
-                                score = cls.score(ev[:m], rate, normalize=False)
-                                ind = np.log(score) / np.log(r)
-                                count[m-1, i, :ind+1] += 1
-                    tasker.counts.append(count)
-                            
-            count = sum(counts)
-            count[count==0] = 1
-            norm[0] = xVals.reshape(1, 1, len(xVals))
-            norm[1] = nev.reshape(1, len(nev), 1) / count
-
-            with open(cacheFile, 'wb') as fh:
-                fh.write(norm.tobytes())
+        return {'rate': rate, 'reps': reps.tolist(), 'tVals': tVals.tolist(), 'nev': nev.tolist(),
+                'xSteps': 1000, 'xDecades': 30}
 
-        return norm
+    @classmethod
+    def generateNormalizationTable(cls, nEvents=1000000, processes=None):
+        ## table is (2 x repeats x tMax x score); see PoissonScore.generateNormalizationTable
+        return loadNormTable(cls, cls.normTableLayout(nEvents), processes=processes)
+
+    @classmethod
+    def normTableCounts(cls, layout, tIndex, n, batchSize=1000):
+        """
+        Score *n* simulated sets of trials with tMax=layout['tVals'][tIndex]. Return an array shaped like
+        the normalization table where element [m-1, tIndex, k] counts the sets of m trials with a score of
+        at least r**k.
+        """
+        rate = layout['rate']
+        reps = layout['reps']
+        t = layout['tVals'][tIndex]
+        r = normTableScoreStep(layout)
+        count = np.zeros(normTableShape(layout)[1:], dtype=float)
+        ## score simulated event sets in batches
+        for j in range(0, n, batchSize):
+            evs = [cls.generateRandom(rate=rate, tMax=t, reps=reps[-1]) for k in range(min(batchSize, n-j))]
+            for m in reps:
+                scores = cls.scoreMany([ev[:m] for ev in evs], [rate]*len(evs), normalize=False)
+                count[m-1, tIndex] += cumulativeScoreCounts(scores, r, layout['xSteps'])
+        return count
 
     @classmethod
     def extrapolateNormTable(cls):
@@ -785,6 +1010,29 @@ class PoissonRepeatAmpScore(PoissonRepeatScore):
         
 
 
+def loadNormalizationTables(classes=None):
+    """
+    Load the precomputed normalization tables of all scoring classes from the disk cache, so that the first
+    call to score() does not have to. Tables that have not been generated yet are left to be generated on
+    first use.
+    """
+    if classes is None:
+        classes = [PoissonScore, PoissonAmpScore, PoissonRepeatScore, PoissonRepeatAmpScore]
+    for cls in classes:
+        if cls.normalizationTable is not None:
+            continue
+        try:
+            norm = readNormTable(cls, cls.normTableLayout())
+        except Exception as exc:
+            print("Could not load normalization table for %s: %s" % (cls.__name__, exc))
+            continue
+        if norm is not None:
+            cls.normalizationTable = norm
+            cls.extrapolateNormTable()
+
+loadNormalizationTables()
+
+
 if __name__ == '__main__':
             
     app = pg.mkQApp()
@@ -0,0 +1,100 @@
+import numpy as np
+
+from acq4.analysis.tools.poissonScore import (
+    PoissonScore, PoissonAmpScore, PoissonRepeatScore, countEventsUpTo, poissonScore)
+
+
+def _events(times, amps):
+    ev = np.zeros(len(times), dtype=[('time', float), ('amp', float)])
+    ev['time'] = times
+    ev['amp'] = amps
+    return ev
+
+
+## fixed inputs and the scores computed for them by the original (per-event loop) implementation
+REF_SITES = [
+    [_events([0.01, 0.015, 0.02, 0.3], [1.5, 2.0, 0.7, 1.1])],
+    [_events([0.05, 0.2, 0.6], [0.4, 0.9, 1.2]), _events([0.04, 0.045, 0.5], [2.5, 1.0, 0.8])],
+    [_events([0.002, 0.004, 0.006, 0.008, 0.5], [3.0, 3.0, 2.0, 1.0, 0.5]), _events([0.9], [1.0]),
+     _events([], [])],
+]
+REF_RATES = [2.0, 5.0, 10.0]
+REF_SCORES = [
+    (PoissonScore, {}, False, [96602.20800676508, 69.50391872098243, 8758.155944946573]),
+    (PoissonScore, {}, True, [9950.199465765616, 11.561470861478087, 544.9311787408336]),
+    (PoissonAmpScore, {'ampMean': 0.5, 'ampStdev': 1.0}, False,
+     [229600.56399158447, 133.3286676591123, 28386.03037124996]),
+    (PoissonAmpScore, {'ampMean': 0.5, 'ampStdev': 1.0}, True,
+     [9884.573046928912, 9.993023215078122, 592.8238884759352]),
+    (PoissonRepeatScore, {}, False, [1.0202013400267558, 3.6509393076265635, 567548392.5564655]),
+    ## the original implementation raised IndexError when normalizing the third site
+    (PoissonRepeatScore, {}, True, [0.5221473661164838, 0.5351803610997161]),
+]
+
+
+def test_scores_match_reference_values():
+    for cls, kwds, normalize, expected in REF_SCORES:
+        sites = REF_SITES[:len(expected)]
+        rates = REF_RATES[:len(expected)]
+        single = [cls.score(ev, rate, tMax=1.0, normalize=normalize, **kwds) for ev, rate in zip(sites, rates)]
+        assert np.allclose(single, expected, rtol=1e-9, atol=0), (cls.__name__, normalize)
+        batch = cls.scoreMany(sites, rates, tMax=1.0, normalize=normalize, **kwds)
+        assert np.allclose(batch, expected, rtol=1e-9, atol=0), (cls.__name__, normalize)
+
+
+def test_countEventsUpTo():
+    times = np.array([3.0, 1.0, 2.0, 2.0, 0.5, 0.5, 4.0])
+    groups = np.array([0, 0, 0, 0, 1, 1, 1])
+    expected = [(times[groups == g] <= t).sum() for t, g in zip(times, groups)]
+    assert np.all(countEventsUpTo(times, groups) == expected)
+    assert np.all(countEventsUpTo(times) == [(times <= t).sum() for t in times])
+
+
+def test_scoreMany_matches_score():
+    np.random.seed(1)
+    sites = [PoissonScore.generateRandom(3.0, 1.0, reps=2) for i in range(50)]
+    sites.append([np.empty(0, dtype=sites[0][0].dtype)])
+    rates = [3.0] * len(sites)
+    for cls, kwds in [(PoissonScore, {}), (PoissonAmpScore, {'ampMean': 0.2, 'ampStdev': 1.0})]:
+        batch = cls.scoreMany(sites, rates, tMax=1.0, **kwds)
+        single = [cls.score(ev, rate, tMax=1.0, **kwds) for ev, rate in zip(sites, rates)]
+        assert np.allclose(batch, single)
+        raw = cls.scoreMany(sites, rates, normalize=False, **kwds)
+        assert raw[-1] == 1.0
+        assert np.all(raw >= 1.0)
+
+
+def test_normalization_table_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('ACQ4_POISSON_TABLE_DIR', str(tmp_path))
+    layout = PoissonScore.normTableLayout(nEvents=400)
+    fileName = poissonScore.normTableFileName(PoissonScore, layout)
+    assert fileName != poissonScore.normTableFileName(PoissonScore, PoissonScore.normTableLayout(nEvents=500))
+    assert fileName != poissonScore.normTableFileName(PoissonAmpScore, layout)
+
+    norm = poissonScore.loadNormTable(PoissonScore, layout, processes=2)
+    assert norm.shape == (2, 9, 1000)
+    assert (tmp_path / fileName).exists()
+    assert np.all(norm[1] >= 1)
+
+    ## second request is served from the cache without running the simulation
+    monkeypatch.setattr(poissonScore, 'generateNormTable', None)
+    assert np.all(poissonScore.loadNormTable(PoissonScore, layout) == norm)
+
+
+def test_precomputed_tables_loaded_at_import():
+    for cls in [PoissonScore, PoissonAmpScore, poissonScore.PoissonRepeatScore, poissonScore.PoissonRepeatAmpScore]:
+        assert cls.normalizationTable is not None
+
+
+def test_repeat_scoreMany_matches_score():
+    rng = np.random.default_rng(3)
+    sites = []
+    rates = []
+    for i in range(100):
+        nTrials = rng.integers(1, 5)
+        ## rounded times produce events at the same time in different trials
+        sites.append([_events(np.round(rng.random(rng.integers(0, 6)), 2), 1.0) for j in range(nTrials)])
+        rates.append(3.0 if i % 2 else list(rng.choice([1.0, 2.0, 5.0], size=nTrials)))
+    batch = PoissonRepeatScore.scoreMany(sites, rates, normalize=False)
+    single = [PoissonRepeatScore.score(ev, rate, normalize=False) for ev, rate in zip(sites, rates)]
+    assert np.allclose(batch, single, rtol=1e-12, atol=0)
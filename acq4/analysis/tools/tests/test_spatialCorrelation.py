@@ -0,0 +1,48 @@
+import math
+
+import numpy as np
+
+import acq4.analysis.tools.functions as afn
+
+
+def bruteForceProbs(data, radius, p, isEvent):
+    """Reference implementation: direct distance test and binomial sum for each spot."""
+    probs = []
+    for x in data:
+        near = np.sqrt((data['xPos'] - x['xPos']) ** 2 + (data['yPos'] - x['yPos']) ** 2) < radius
+        n = near.sum()
+        k = (near & isEvent).sum()
+        probs.append(sum(math.comb(n, j) * p ** j * (1 - p) ** (n - j) for j in range(k, n + 1)))
+    return np.array(probs)
+
+
+def makeMap(n, seed):
+    rng = np.random.default_rng(seed)
+    data = np.zeros(n, dtype=[('xPos', float), ('yPos', float), ('numOfPostEvents', int),
+                              ('ZScore', float), ('SpontZScore', float), ('map', int)])
+    data['xPos'] = rng.uniform(0, 500e-6, n)
+    data['yPos'] = rng.uniform(0, 500e-6, n)
+    data['numOfPostEvents'] = rng.poisson(0.3, n)
+    data['ZScore'] = rng.normal(size=n)
+    data['SpontZScore'] = rng.normal(size=n)
+    return data
+
+
+def test_bendels_matches_brute_force():
+    data = makeMap(300, 0)
+    spontRate, timeWindow = 3.0, 0.05
+    result = afn.bendelsSpatialCorrelationAlgorithm(data, 90e-6, spontRate, timeWindow)
+    p = 1 - np.exp(-spontRate * timeWindow)
+    expected = bruteForceProbs(data, 90e-6, p, data['numOfPostEvents'] > 0)
+    assert np.allclose(result['prob'], expected)
+
+
+def test_zscore_batch_matches_separate_maps():
+    maps = [makeMap(200, 1), makeMap(150, 2)]
+    for i, m in enumerate(maps):
+        m['map'] = i
+    combined = afn.spatialCorrelationAlgorithm_ZScore(np.concatenate(maps), 90e-6, threshold=1.0, mapKey='map')
+    for i, m in enumerate(maps):
+        p = (m['SpontZScore'] < -1.0).mean()
+        expected = bruteForceProbs(m, 90e-6, p, m['ZScore'] < -1.0)
+        assert np.allclose(combined['prob'][combined['map'] == i], expected)
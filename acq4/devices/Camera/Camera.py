@@ -23,6 +23,7 @@ from acq4.util.Thread import Thread
 from acq4.util.debug import printExc
 from acq4.util.future import Future, future_wrap
 from acq4.util.imaging.frame import Frame
+from acq4.util.imaging.frame_buffer import FrameRingBuffer
 from pyqtgraph import Vector, SRTTransform3D
 from pyqtgraph.debug import Profiler
 from .CameraInterface import CameraInterface
@@ -52,6 +53,10 @@ class Camera(DAQGeneric, OptomechDevice):
         exposeChannel: 'DAQ', '/Dev1/port0/line14'  # Channel for recording expose signal
         triggerOutChannel: 'DAQ', '/Dev1/PFI5'  # Channel the DAQ should trigger off of to sync with camera
         triggerInChannel: 'DAQ', '/Dev1/port0/line13'  # Channel the DAQ should raise to trigger the camera
+        frameQueueSize: 16  # Maximum number of frames waiting for processing; acquisition waits when full
+        frameBufferSize: 32  # Number of preallocated frames that drivers write into during acquisition
+        recordFormat: 'ChunkedVideo'  # Format for recorded videos: 'MetaArray' (default) or 'ChunkedVideo'
+        recordOptions: {'compression': 'gzip'}  # Options for the ChunkedVideo writer; 'blosc' and 'lz4' require hdf5plugin
         params:
             GAIN_INDEX: 2
             CLEAR_MODE: 'CLEAR_PRE_SEQUENCE'  # Overlap mode for QuantEM
@@ -112,7 +117,7 @@ class Camera(DAQGeneric, OptomechDevice):
         self.acqThread.started.connect(self.acqThreadStarted)
         self.acqThread.sigShowMessage.connect(self.showMessage)
 
-        self._processingThread = FrameProcessingThread()
+        self._processingThread = FrameProcessingThread(maxQueueSize=self.camConfig.get("frameQueueSize", 16))
         self._processingThread.sigFrameFullyProcessed.connect(self.sigNewFrame, type=Qt.Qt.DirectConnection)
         self._processingThread.start()
         self._processingThread.addFrameProcessor(self.addFrameInfo)
@@ -242,6 +247,19 @@ class Camera(DAQGeneric, OptomechDevice):
         """
         raise NotImplementedError("Function must be reimplemented in subclass.")
 
+    def allocateFrame(self, shape, dtype=np.uint16) -> np.ndarray:
+        """Return a writable array to hold the data for one new frame.
+
+        While the camera is running, the array is backed by the acquisition's preallocated
+        FrameRingBuffer, so drivers that fill it directly (rather than allocating their own
+        arrays in newFrames) avoid a per-frame allocation. The slot is recycled once the frame
+        data is no longer referenced.
+        """
+        buf = self.acqThread.frameBuffer
+        if buf is None:
+            return np.empty(shape, dtype=dtype)
+        return buf.acquire(shape, dtype)
+
     def startCamera(self):
         """Calls the camera driver to start the camera's acquisition. Call start instead of this to actually record frames."""
         raise NotImplementedError("Function must be reimplemented in subclass.")
@@ -533,12 +551,19 @@ class Camera(DAQGeneric, OptomechDevice):
     def showMessage(self, msg):
         self.sigShowMessage.emit(msg)
 
-    def addFrameProcessor(self, processor: Callable[[Frame], None], final: bool = False):
-        self._processingThread.addFrameProcessor(processor, final)
+    def addFrameProcessor(self, processor: Callable[[Frame], None], final: bool = False, **kwds):
+        """Add a callable to be invoked for each new frame. See FrameProcessingThread.addFrameProcessor
+        for the accepted *dropPolicy*, *workers* and *maxQueueSize* arguments.
+        """
+        self._processingThread.addFrameProcessor(processor, final, **kwds)
 
     def removeFrameProcessor(self, processor: Callable[[Frame], None]):
         self._processingThread.removeFrameProcessor(processor)
 
+    def frameProcessingStats(self) -> dict:
+        """Return queue depth, dropped frame counts and per-processor latency for the frame pipeline."""
+        return self._processingThread.stats()
+
     def isRunning(self):
         return self.acqThread.isRunning()
 
@@ -824,32 +849,206 @@ class CameraTaskResult:
         return self._frameTimes, self._frameTimesPrecise
 
 
+class _FrameProcessorStage:
+    """Runs a single frame processor on its own worker thread(s), fed by a queue of at most
+    *maxQueueSize* frames.
+
+    With dropPolicy="all", every frame is delivered; when the queue is full, `put` blocks until the
+    workers catch up (backpressure). With dropPolicy="latest", `put` never blocks; when the queue is
+    full, the oldest unprocessed frame is discarded and counted as dropped.
+    """
+
+    def __init__(self, processor: Callable[[Frame], None], dropPolicy="latest", workers=1, maxQueueSize=None):
+        if dropPolicy not in ("all", "latest"):
+            raise ValueError(f"Unknown frame drop policy {dropPolicy!r}")
+        if maxQueueSize is None:
+            maxQueueSize = 1 if dropPolicy == "latest" else 8
+        self.processor = processor
+        self.dropPolicy = dropPolicy
+        self.maxQueueSize = max(1, int(maxQueueSize))
+        self.stats = _ProcessorStats()
+        self._queue = deque()
+        self._maxQueueDepth = 0
+        self._cond = threading.Condition()
+        self._stop = False
+        self._threads = [
+            threading.Thread(target=self._run, daemon=True, name=f"FrameProcessorStage-{i}")
+            for i in range(max(1, int(workers)))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def put(self, frame: Frame, received: float):
+        with self._cond:
+            if self.dropPolicy == "latest":
+                while len(self._queue) >= self.maxQueueSize:
+                    self._queue.popleft()
+                    self.stats.dropped += 1
+            else:
+                while len(self._queue) >= self.maxQueueSize and not self._stop:
+                    self._cond.wait(0.1)
+                if self._stop:
+                    return
+            self._queue.append((frame, received))
+            self._maxQueueDepth = max(self._maxQueueDepth, len(self._queue))
+            self._cond.notify_all()
+
+    def queueDepth(self) -> int:
+        return len(self._queue)
+
+    def maxQueueDepth(self) -> int:
+        return self._maxQueueDepth
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while len(self._queue) == 0 and not self._stop:
+                    self._cond.wait(0.1)
+                if self._stop:
+                    return
+                frame, received = self._queue.popleft()
+                self._cond.notify_all()
+            _runProcessor(self.processor, frame, received, self.stats)
+            del frame  # don't hold a frame buffer slot while waiting for the next frame
+
+
+class _ProcessorStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.totalTime = 0.0
+        self.maxTime = 0.0
+        self.totalLatency = 0.0
+        self.maxLatency = 0.0
+
+    def record(self, runTime: float, latency: float):
+        with self.lock:
+            self.processed += 1
+            self.totalTime += runTime
+            self.maxTime = max(self.maxTime, runTime)
+            self.totalLatency += latency
+            self.maxLatency = max(self.maxLatency, latency)
+
+    def asDict(self) -> dict:
+        with self.lock:
+            n = max(self.processed, 1)
+            return {
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "meanTime": self.totalTime / n,
+                "maxTime": self.maxTime,
+                "meanLatency": self.totalLatency / n,
+                "maxLatency": self.maxLatency,
+            }
+
+
+def _runProcessor(processor: Callable[[Frame], None], frame: Frame, received: float, stats: _ProcessorStats):
+    start = ptime.time()
+    try:
+        processor(frame)
+    except Exception:
+        printExc("Frame processing callback failed")
+    end = ptime.time()
+    stats.record(end - start, end - received)
+
+
 class FrameProcessingThread(Thread):
+    """Delivers raw frames from the acquisition thread to all registered frame processors.
+
+    Incoming frames wait in a queue of at most *maxQueueSize* frames. When the queue is full,
+    `handleNewRawFrame` blocks until this thread catches up (backpressure), so the number of frames
+    held in memory stays bounded and no frame is discarded. Processors are either run serially, in
+    the order they were added, on this thread (the default; these see every frame and complete
+    before sigFrameFullyProcessed is emitted) or on separate worker stages with their own bounded
+    queues (see `addFrameProcessor`). Only processors with dropPolicy="latest" ever skip frames, so
+    a slow display does not hold up recording.
+    """
     sigFrameFullyProcessed = Qt.Signal(object)  # Frame
 
-    def __init__(self):
+    def __init__(self, maxQueueSize=16):
         super().__init__()
+        self._maxQueueSize = max(1, int(maxQueueSize))
+        self._blockedTime = 0.0
         self._stop = False
         self._processors = []
         self._final_processor = None
-        self._queue = queue.Queue()
-
-    def addFrameProcessor(self, processor: Callable[[Frame], None], final=False):
-        if final:
+        self._stages = {}
+        self._stats = {}
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._received = 0
+        self._maxQueueDepth = 0
+
+    def addFrameProcessor(
+            self,
+            processor: Callable[[Frame], None],
+            final=False,
+            dropPolicy="all",
+            workers=0,
+            maxQueueSize=None,
+    ):
+        """Add a callable to be invoked for each new frame.
+
+        Parameters
+        ----------
+        processor : callable
+            Called with each new Frame.
+        final : bool
+            If True, this processor is run after all other serial processors. Only one final
+            processor may be added.
+        dropPolicy : "all" | "latest"
+            "all" processors must see every frame (e.g. recording). "latest" processors only ever
+            see the most recent frame (e.g. display or analysis) and always run on their own stage.
+        workers : int
+            If 0, the processor is run serially on this thread. Otherwise, the processor is run on a
+            separate stage with this many worker threads, in parallel with the serial processors.
+            Note that frames may be delivered out of order when more than one worker is used.
+        maxQueueSize : int | None
+            Size of the queue feeding a separate stage. A full "all" stage blocks this thread until
+            it catches up; a full "latest" stage discards its oldest frame. Defaults to 8 for "all"
+            stages and 1 for "latest" stages.
+        """
+        if dropPolicy == "latest" and workers == 0:
+            workers = 1
+        if final and workers > 0:
+            raise ValueError("The `final` processor must run serially (workers=0).")
+        if workers > 0:
+            stage = _FrameProcessorStage(processor, dropPolicy, workers, maxQueueSize)
+            self._stages[processor] = stage
+            self._stats[processor] = stage.stats
+        elif dropPolicy != "all":
+            raise ValueError(f"Unknown frame drop policy {dropPolicy!r}")
+        elif final:
             if self._final_processor is not None:
                 raise RuntimeError("Only one `final` processor can be added.")
             self._final_processor = processor
+            self._stats[processor] = _ProcessorStats()
         else:
             self._processors.append(processor)
+            self._stats[processor] = _ProcessorStats()
 
     def removeFrameProcessor(self, processor: Callable[[Frame], None]):
         if processor in self._processors:
             self._processors.remove(processor)
         if processor == self._final_processor:
             self._final_processor = None
+        stage = self._stages.pop(processor, None)
+        if stage is not None:
+            stage.stop()
+        self._stats.pop(processor, None)
 
     def stop(self):
         self._stop = True
+        with self._cond:
+            self._cond.notify_all()
+        for stage in list(self._stages.values()):
+            stage.stop()
 
     @property
     def processors(self):
@@ -858,20 +1057,61 @@ class FrameProcessingThread(Thread):
         return self._processors
 
     def handleNewRawFrame(self, frame):
-        self._queue.put(frame)
+        now = ptime.time()
+        with self._cond:
+            self._received += 1
+            while len(self._queue) >= self._maxQueueSize and not self._stop:
+                self._cond.wait(0.1)
+            self._blockedTime += ptime.time() - now
+            if self._stop:
+                return
+            self._queue.append((frame, now))
+            self._maxQueueDepth = max(self._maxQueueDepth, len(self._queue))
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """Return a dict describing the current state of the pipeline: queue depth and size, time the
+        acquisition thread spent waiting for queue space, dropped frame counts, and per-processor
+        timing (seconds spent in each processor, and latency from frame arrival to completion).
+        """
+        with self._cond:
+            stats = {
+                "queueDepth": len(self._queue),
+                "maxQueueDepth": self._maxQueueDepth,
+                "maxQueueSize": self._maxQueueSize,
+                "blockedTime": self._blockedTime,
+                "received": self._received,
+            }
+        procStats = {}
+        for proc, pstats in list(self._stats.items()):
+            entry = pstats.asDict()
+            stage = self._stages.get(proc)
+            entry["queueDepth"] = 0 if stage is None else stage.queueDepth()
+            entry["maxQueueDepth"] = 0 if stage is None else stage.maxQueueDepth()
+            entry["maxQueueSize"] = 0 if stage is None else stage.maxQueueSize
+            entry["dropPolicy"] = "all" if stage is None else stage.dropPolicy
+            procStats[getattr(proc, "__qualname__", repr(proc))] = entry
+        stats["processors"] = procStats
+        return stats
 
     def run(self):
         while not self._stop:
-            try:
-                frame = self._queue.get(timeout=0.1)
-            except queue.Empty:
-                continue
+            with self._cond:
+                if len(self._queue) == 0:
+                    self._cond.wait(0.1)
+                if len(self._queue) == 0:
+                    continue
+                frame, received = self._queue.popleft()
+                self._cond.notify_all()
             for callback in self.processors:
-                try:
-                    callback(frame)
-                except Exception:
-                    printExc("Frame processing callback failed")
+                stats = self._stats.get(callback)
+                if stats is None:
+                    continue  # removed while we were running
+                _runProcessor(callback, frame, received, stats)
+            for stage in list(self._stages.values()):
+                stage.put(frame, received)
             self.sigFrameFullyProcessed.emit(frame)
+            del frame  # don't hold a frame buffer slot while waiting for the next frame
 
 
 class AcquireThread(Thread):
@@ -888,6 +1128,7 @@ class AcquireThread(Thread):
         self.tasks = []
         self.cameraStartEvent = threading.Event()
         self._recentFPS = deque(maxlen=10)
+        self.frameBuffer = None
 
     def __del__(self):
         if hasattr(self, "cam"):
@@ -909,6 +1150,12 @@ class AcquireThread(Thread):
         camState = dict(self.dev.getParams(["binning", "exposure", "region", "triggerMode"]))
         exposure = camState["exposure"]
         mode = camState["triggerMode"]
+        region = camState["region"]
+        binning = camState["binning"]
+        self.frameBuffer = FrameRingBuffer(
+            size=self.dev.camConfig.get("frameBufferSize", 32),
+            shape=(region[2] // binning[0], region[3] // binning[1]),
+        )
 
         try:
             self.dev.startCamera()
@@ -940,9 +1187,8 @@ class AcquireThread(Thread):
                         info["fps"] = None
 
                     for frame in frames:
-                        frameInfo = info.copy()
                         data = frame.pop("data")
-                        frameInfo.update(frame)  # copies 'time' key supplied by camera
+                        frameInfo = {**info, **frame}  # copies 'time' key supplied by camera
                         f = Frame(data, frameInfo)
                         self.dev._processingThread.handleNewRawFrame(f)
 
@@ -981,6 +1227,9 @@ class AcquireThread(Thread):
             except:
                 pass
             self.sigShowMessage.emit("ERROR starting acquisition (see console output)")
+        finally:
+            # frames still in use keep their slots alive
+            self.frameBuffer = None
 
     @future_wrap
     def getEstimatedFrameRate(self, _future: Future = None):
@@ -42,6 +42,8 @@ class CameraInterface(CameraModuleInterface):
         # takes care of displaying image data, 
         # contrast & background subtraction user interfaces
         self.imagingCtrl = ImagingCtrl()
+        recordFormat = self.cam.camConfig.get("recordFormat", "MetaArray")
+        self.imagingCtrl.recordThread.setVideoFormat(recordFormat, **self.cam.camConfig.get("recordOptions", {}))
         self.frameDisplay = self.imagingCtrl.frameDisplay
 
         # Move control panels into docks
@@ -112,10 +114,12 @@ class CameraInterface(CameraModuleInterface):
         self.binningComboProxy = SignalProxy(self.ui.binningCombo.currentIndexChanged, slot=self.binningComboChanged)
         self.ui.spinExposure.valueChanged.connect(self.setExposure)  # note that this signal (from acq4.util.SpinBox) is delayed.
 
-        # We get new frames by adding a processing step to the camera.
-        # This allows us to attach metadata (background+contrast info) to the frames before
-        # they are consumed by anyone else
-        self.cam.addFrameProcessor(self.newFrame, final=True)
+        # We get new frames by adding processing steps to the camera.
+        # Recording runs serially, so that every frame is recorded and gets its metadata
+        # (background+contrast info) before it is consumed by anyone else. Display runs on its
+        # own thread and only ever sees the latest frame, so it can't hold up acquisition.
+        self.cam.addFrameProcessor(self.recordFrame, final=True)
+        self.cam.addFrameProcessor(self.displayFrame, dropPolicy="latest")
 
         # Signals from Camera device
         self.cam.sigCameraStopped.connect(self.cameraStopped)
@@ -136,8 +140,11 @@ class CameraInterface(CameraModuleInterface):
             dev = Manager.getManager().getDevice(key['device'])
             dev.addKeyCallback(key['key'], self.hotkeyPressed, (action,))
 
-    def newFrame(self, frame):
-        self.imagingCtrl.newFrame(frame)
+    def recordFrame(self, frame):
+        self.imagingCtrl.recordFrame(frame)
+
+    def displayFrame(self, frame):
+        self.imagingCtrl.displayFrame(frame)
 
     def handleNewFrame(self, frame):
         self.sigNewFrame.emit(self, frame)
@@ -219,7 +226,8 @@ class CameraInterface(CameraModuleInterface):
             return
 
         with contextlib.suppress(TypeError):
-            self.cam.removeFrameProcessor(self.newFrame)
+            self.cam.removeFrameProcessor(self.recordFrame)
+            self.cam.removeFrameProcessor(self.displayFrame)
             self.cam.sigCameraStopped.disconnect(self.cameraStopped)
             self.cam.sigCameraStarted.disconnect(self.cameraStarted)
             self.cam.sigShowMessage.disconnect(self.showMessage)
@@ -350,19 +350,10 @@ class DAQGenericTask(DeviceTask):
             self.bufferedChannels.append(ch)
             # _DAQCmd[ch]['task'] = daqTask  ## ALSO DON't FORGET TO DELETE IT, ASS.
             if chConf['type'] in ['ao', 'do']:
-                # scale = self.getChanScale(ch)
                 cmdData = self._DAQCmd[ch]['command']
                 if cmdData is None:
                     continue
-                # cmdData = cmdData * scale
-
-                ## apply scale, offset or inversion for output lines
-                cmdData = self.mapping.mapToDaq(ch, cmdData)
-
-                if chConf['type'] == 'do':
-                    cmdData = cmdData.astype(np.uint32)
-                    cmdData[cmdData <= 0] = 0
-                    cmdData[cmdData > 0] = 0xFFFFFFFF
+                cmdData = self._mapCommand(ch, chConf['type'], cmdData)
 
                 daqTask.addChannel(chConf['channel'], chConf['type'], **self._DAQCmd[ch].get('lowLevelConf', {}))
                 self.daqTasks[ch] = daqTask  ## remember task so we can stop it later on
@@ -378,6 +369,38 @@ class DAQGenericTask(DeviceTask):
                 daqTask.addChannel(chConf['channel'], chConf['type'], **self._DAQCmd[ch].get('lowLevelConf', {}))
                 self.daqTasks[ch] = daqTask  ## remember task so we can stop it later on
 
+    def _mapCommand(self, ch, chType, cmdData):
+        ## apply scale, offset or inversion for output lines
+        cmdData = self.mapping.mapToDaq(ch, cmdData)
+
+        if chType == 'do':
+            cmdData = cmdData.astype(np.uint32)
+            cmdData[cmdData <= 0] = 0
+            cmdData[cmdData > 0] = 0xFFFFFFFF
+        return cmdData
+
+    def updateCommand(self, cmd):
+        """Update channel commands between runs of a prepared task.
+
+        *cmd* maps channel names to partial channel commands; new 'command' waveforms
+        are written to the existing DAQ channels, which must already be buffered and
+        must keep the same length.
+        """
+        chans = self.dev.listChannels()
+        for ch, chCmd in cmd.items():
+            if ch not in self._DAQCmd:
+                raise ValueError(f"Channel '{ch}' is not part of this task; a new task is required.")
+            if 'command' in chCmd:
+                if ch not in self.daqTasks:
+                    raise ValueError(f"Channel '{ch}' has no buffered command; a new task is required.")
+                old = self._DAQCmd[ch].get('command')
+                if old is not None and len(old) != len(chCmd['command']):
+                    raise ValueError(f"Command for channel '{ch}' changed length; a new task is required.")
+                chConf = chans[ch]
+                cmdData = self._mapCommand(ch, chConf['type'], chCmd['command'])
+                self.daqTasks[ch].setWaveform(chConf['channel'], cmdData)
+            self._DAQCmd[ch].update(chCmd)
+
     def getChanUnits(self, chan):
         if 'units' in self._DAQCmd[chan]:
             return self._DAQCmd[chan]['units']
@@ -392,6 +415,9 @@ class DAQGenericTask(DeviceTask):
         ## DAQ task handles this for us.
         return True
 
+    def waitUntilDone(self, timeout=None):
+        return self.waitForTasks(self.daqTasks.values(), timeout)
+
     def stop(self, abort=False):
         # with self.dev._DGLock:  ##not necessary
         ## Stop DAQ tasks before setting holding level.
@@ -455,10 +481,12 @@ class DAQGenericTask(DeviceTask):
         info = [axis(name='Channel', cols=cols), axis(name='Time', units='s', values=timeVals)] + [
             {'DAQ': daqState}]
 
-        protInfo = self._DAQCmd.copy()  ## copy everything but the command arrays and low-level configuration info
-        for ch in protInfo:
-            protInfo[ch].pop('command', None)
-            protInfo[ch].pop('lowLevelConf', None)
+        ## copy everything but the command arrays and low-level configuration info
+        ## (the command itself is left intact so that the task can be run again)
+        protInfo = {
+            ch: {k: v for k, v in chCmd.items() if k not in ('command', 'lowLevelConf')}
+            for ch, chCmd in self._DAQCmd.items()
+        }
         info[-1]['Protocol'] = protInfo
 
         return MetaArray(arr, info=info)
@@ -2,13 +2,14 @@
 from __future__ import annotations
 
 import os
+import threading
 import traceback
 from contextlib import contextmanager
 from typing import Optional
 
 import acq4
 from acq4.Interfaces import InterfaceMixin
-from acq4.util import Qt
+from acq4.util import Qt, ptime
 from acq4.util.Mutex import Mutex
 from acq4.util.debug import printExc
 from acq4.util.optional_weakref import Weakref
@@ -152,6 +153,9 @@ class Device(InterfaceMixin, Qt.QObject):  # QObject calls super, which is disas
         return f'<{self.__class__.__name__} "{self.name()}">'
     
 
+_doneConditionLock = threading.Lock()
+
+
 class DeviceTask(object):
     """
     DeviceTask handles all behavior of a single device during 
@@ -224,6 +228,31 @@ class DeviceTask(object):
         """
         pass
 
+    def rearm(self):
+        """
+        Prepare this task to run again using the configuration established by a
+        previous call to configure(). This is called instead of configure() when
+        a prepared parent Task (see Task.prepare) is executed more than once.
+
+        Devices whose configure() method allocates resources that persist
+        between runs (for example, DAQ channels) should reimplement this method
+        to only re-arm those resources. The default implementation simply calls
+        configure() again.
+        """
+        self.configure()
+
+    def updateCommand(self, cmd):
+        """
+        Update part of this task's command between runs of a prepared parent
+        Task, without reconfiguring the device. *cmd* is a dict containing only
+        the keys of the original command that should change (for example, a
+        new 'command' waveform).
+
+        The default implementation raises NotImplementedError, in which case
+        callers should create a new task instead.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support updating the command of a prepared task.")
+
     def getStartOrder(self):
         """
         This method is called by the parent task before starting any devices.
@@ -252,7 +281,65 @@ class DeviceTask(object):
         The default implementation returns True.
         """
         return True
-    
+
+    def waitUntilDone(self, timeout=None):
+        """
+        Block until this DeviceTask has completed or *timeout* seconds have
+        elapsed, and return the result of isDone().
+
+        Devices that can block on hardware completion (for example, the NI-DAQ)
+        should reimplement this. The default implementation checks isDone()
+        with an increasing interval (1 ms up to 20 ms), and wakes immediately
+        when notifyDone() is called.
+        """
+        deadline = None if timeout is None else ptime.time() + timeout
+        cond = self._getDoneCondition()
+        interval = 1e-3
+        while not self.isDone():
+            wait = interval
+            if deadline is not None:
+                wait = min(wait, deadline - ptime.time())
+                if wait <= 0:
+                    return False
+            with cond:
+                cond.wait(wait)
+            interval = min(interval * 2, 20e-3)
+        return True
+
+    def waitForTasks(self, tasks, timeout=None):
+        """
+        Block until all DeviceTasks in *tasks* (for example, the DAQ tasks this
+        task reads and writes through) have completed, then call notifyDone().
+        Return False if *timeout* seconds elapsed first.
+        """
+        deadline = None if timeout is None else ptime.time() + timeout
+        for task in set(tasks):
+            remaining = None if deadline is None else max(0.0, deadline - ptime.time())
+            if not task.waitUntilDone(remaining):
+                return False
+        self.notifyDone()
+        return True
+
+    def notifyDone(self):
+        """
+        Wake any threads waiting for this DeviceTask or its parent Task to
+        complete. Devices that finish asynchronously (for example, in a driver
+        callback or another thread) should call this as soon as isDone() would
+        return True.
+        """
+        cond = self._getDoneCondition()
+        with cond:
+            cond.notify_all()
+        parent = self.parentTask()
+        if parent is not None and hasattr(parent, 'notifyDeviceDone'):
+            parent.notifyDeviceDone(self)
+
+    def _getDoneCondition(self):
+        with _doneConditionLock:
+            if getattr(self, '_doneCondition', None) is None:
+                self._doneCondition = threading.Condition()
+            return self._doneCondition
+
     def stop(self, abort=False):
         """
         Stop this DeviceTask. If abort is True, then the task should stop as
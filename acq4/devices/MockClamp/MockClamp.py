@@ -248,6 +248,17 @@ class MockClampTask(DAQGenericTask):
         ### Do not configure daq until mode is set. Otherwise, holding values may be incorrect.
         DAQGenericTask.configure(self)
 
+    def updateCommand(self, cmd):
+        if 'mode' in cmd and cmd['mode'] != self.cmd['mode']:
+            raise ValueError("Cannot change clamp mode of a prepared task; a new task is required.")
+        daqCmd = {}
+        for key in ('command', 'holding'):
+            if key in cmd:
+                daqCmd[key] = cmd[key]
+        if len(daqCmd) > 0:
+            DAQGenericTask.updateCommand(self, {'command': daqCmd})
+        self.cmd.update(cmd)
+
     def read(self):
         ## Called by DAQGeneric to simulate a read-from-DAQ
         return self.job.result(timeout=30)
@@ -460,6 +460,32 @@ class MultiClampTask(DeviceTask):
                     daqTask.addChannel(chConf['channel'], chConf['type'], mode)
                 self.daqTasks[ch] = daqTask
         
+    def rearm(self):
+        scale = self.state['extCmdScale']
+        self.configure()
+        if 'command' in self.daqTasks and self.state['extCmdScale'] != scale:
+            ## external command sensitivity changed since the waveform was written
+            self.updateCommand({'command': self.cmd['command']})
+
+    def updateCommand(self, cmd):
+        """Update the holding level or command waveform between runs of a prepared task."""
+        if 'mode' in cmd and cmd['mode'].upper() != self.cmd['mode']:
+            raise ValueError("Cannot change clamp mode of a prepared task; a new task is required.")
+        if 'command' in cmd:
+            if 'command' not in self.daqTasks or len(cmd['command']) != len(self.cmd['command']):
+                raise ValueError("Command waveform structure changed; a new task is required.")
+            scale = self.state['extCmdScale']
+            if scale == 0.:
+                raise ValueError("Can not update command--external command sensitivity is disabled by MultiClamp commander.")
+            chConf = self.dev.config['commandChannel']
+            self.daqTasks['command'].setWaveform(chConf['channel'], cmd['command'] / scale)
+        if 'holding' in cmd and cmd['holding'] != self.cmd.get('holding') and self.cmd['mode'] != 'I=0':
+            self.dev.setHolding(self.cmd['mode'], cmd['holding'])
+            self.holdingVal = self.dev.getHolding(self.cmd['mode'])
+        for k, v in cmd.items():
+            if k != 'mode':
+                self.cmd[k] = v
+
     def start(self):
         ## possibly nothing required here, DAQ will start recording.
         pass
@@ -467,6 +493,9 @@ class MultiClampTask(DeviceTask):
     def isDone(self):
         ## DAQ task handles this for us.
         return True
+
+    def waitUntilDone(self, timeout=None):
+        return self.waitForTasks(self.daqTasks.values(), timeout)
         
     def getResult(self):
         ## Access data recorded from DAQ task
@@ -258,6 +258,11 @@ class Task(DeviceTask):
             assert triggerChan is not None, f"Task requests for {tDevName} to trigger {self.dev.name()}, but no trigger channel is configured between these devices."
             self.st.setTrigger(triggerChan)
         
+    def rearm(self):
+        ## Channels, clocks and triggers are kept from the previous run; only buffers are rewritten.
+        if self.st.hasTasks():
+            self.st.rearm()
+
     def getStartOrder(self):
         before = []
         after = []
@@ -291,6 +296,13 @@ class Task(DeviceTask):
             return self.st.isDone()
         else:
             return True
+
+    def waitUntilDone(self, timeout=None):
+        ## Block in the driver until the DAQ tasks complete instead of polling isDone()
+        if self.st.hasTasks() and not self.st.wait(timeout):
+            return False
+        self.notifyDone()
+        return True
         
         
     def stop(self, wait=False, abort=False):
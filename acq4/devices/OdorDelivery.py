@@ -412,6 +412,12 @@ class OdorTask(DeviceTask):
     def isDone(self):
         return self._future is not None and self._future.isDone()
 
+    def waitUntilDone(self, timeout=None):
+        if self._future is None:
+            return DeviceTask.waitUntilDone(self, timeout)
+        self._future.finishedEvent.wait(timeout)
+        return self.isDone()
+
     def getResult(self):
         cmd = self._cmd.copy()
         i = 0
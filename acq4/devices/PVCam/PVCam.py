@@ -130,7 +130,9 @@ class PVCam(Camera):
             frame = {}
             frame['time'] = self.lastFrameTime + (dt * (i+1))
             frame['id'] = self.frameId
-            frame['data'] = self.acqBuffer[fInd].copy()
+            src = self.acqBuffer[fInd]
+            frame['data'] = self.allocateFrame(src.shape, src.dtype)
+            frame['data'][:] = src
             #print frame['data']
             frames.append(frame)
             self.frameId += 1
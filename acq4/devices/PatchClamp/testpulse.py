@@ -52,6 +52,7 @@ class TestPulseThread(Thread):
             '_index': 0,
         }
         self._lastTask = None
+        self._reuseTasks = True  # cleared if the clamp device cannot update prepared tasks
 
         self._daqName = self._clampDev.getDAQName("primary")
         self._clampName = self._clampDev.name()
@@ -94,6 +95,9 @@ class TestPulseThread(Thread):
 
     def stop(self, block=False):
         self._stop = True
+        task = self._lastTask
+        if task is not None:
+            task.interruptWait()
         if block and not self.wait(10000):
             raise RuntimeError("Timed out waiting for test pulse thread exit.")
                 
@@ -128,10 +132,12 @@ class TestPulseThread(Thread):
         params = self._params
         runMode = currentMode if params['clampMode'] is None else params['clampMode']
 
-        # Can't reuse tasks yet; remove this when we can.
-        self._lastTask = None
-
-        if self._lastTask is None or self._lastTask._paramIndex != params['_index'] or self._lastTask._clampMode != runMode:
+        if (
+            not self._reuseTasks
+            or self._lastTask is None
+            or self._lastTask._paramIndex != params['_index']
+            or self._lastTask._clampMode != runMode
+        ):
             taskParams = self.paramsForMode(runMode)
             task = self.createTask(taskParams)
             task._paramIndex = params['_index']
@@ -147,13 +153,15 @@ class TestPulseThread(Thread):
             if self._clampDev.getMode() != currentMode:
                 task.releaseDevices()
                 return
-            
-            task.execute()
-                
-            while not task.isDone():
+
+            if not self._armTask(task):
+                return
+            task.execute(block=False)
+
+            # wait() returns False early only if stop() interrupts it
+            while not task.wait():
                 if checkStop:
                     self.checkStop()
-                time.sleep(0.01)
         
             tp = None
             if params['autoBiasEnabled']:
@@ -169,6 +177,29 @@ class TestPulseThread(Thread):
 
         self.sigTestPulseFinished.emit(self._clampDev, tp)
 
+    def _armTask(self, task: Task):
+        """Prepare *task* for its first run, or rewrite its command waveform for a repeat run.
+
+        The command waveform includes the holding level, which may have changed (for example,
+        due to auto bias) since the previous run. Returns False if the task cannot be reused;
+        in that case a new task is created for every subsequent run.
+        """
+        if not self._reuseTasks:
+            return True
+        if not task.isPrepared():
+            task.prepare()
+            return True
+        cmdData = self._makeCommandWaveform(self._lastTaskParams)
+        if np.array_equal(cmdData, task.command[self._clampName]['command']):
+            return True
+        try:
+            task.updateCommand({self._clampName: {'command': cmdData}})
+        except (NotImplementedError, ValueError):
+            self._reuseTasks = False
+            self._lastTask = None
+            return False
+        return True
+
     def _makeTpResult(self, task: Task) -> PatchClampTestPulse:
         mode = task.command[self._clampName]['mode']
         params = self.paramsForMode(mode)
@@ -227,19 +258,25 @@ class TestPulseThread(Thread):
             tp = self._params['postProcessing'](tp)
         return tp
 
-    def createTask(self, params: dict) -> Task:
+    def _makeCommandWaveform(self, params: dict) -> np.ndarray:
         duration = params['preDuration'] + params['pulseDuration'] + params['postDuration']
         numPts = int(float(duration * params['sampleRate']) * params['downsample']) // params['downsample']
         params['numPts'] = numPts  # send this back for analysis
-        mode = params['clampMode']
 
         cmdData = np.empty(numPts * params['average'])
-        cmdData[:] = self._clampDev.getHolding(mode)
+        cmdData[:] = self._clampDev.getHolding(params['clampMode'])
 
         for i in range(params['average']):
             start = (numPts * i) + int(params['preDuration'] * params['sampleRate'])
             stop = start + int(params['pulseDuration'] * params['sampleRate'])
             cmdData[start:stop] += params['amplitude']
+        return cmdData
+
+    def createTask(self, params: dict) -> Task:
+        duration = params['preDuration'] + params['pulseDuration'] + params['postDuration']
+        cmdData = self._makeCommandWaveform(params)
+        numPts = params['numPts']
+        mode = params['clampMode']
 
         cmd = {
             'protocol': {'duration': duration * params['average']},
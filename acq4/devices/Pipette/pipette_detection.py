@@ -1,7 +1,7 @@
 from __future__ import print_function
 import scipy.optimize, scipy.ndimage
 import numpy as np
-from acq4.util.image_registration import iterativeImageTemplateMatch
+from acq4.util.image_registration import TemplateBank
 import pyqtgraph as pg
 
 
@@ -94,11 +94,30 @@ class PipetteDetector(object):
 
 
 class TemplateMatchPipetteDetector(PipetteDetector):
+    def __init__(self, reference, pipette, templateBank=None):
+        PipetteDetector.__init__(self, reference, pipette)
+        self._templateBank = templateBank
+
+    @property
+    def templateBank(self):
+        """TemplateBank built from the filtered reference frames.
+
+        Building a bank is much more expensive than matching against it, so callers that detect
+        repeatedly with the same reference should reuse this object (see PipetteTracker).
+        """
+        if self._templateBank is None:
+            self._templateBank = TemplateBank(np.stack(self.filtered_ref))
+        return self._templateBank
+
+    @templateBank.setter
+    def templateBank(self, bank):
+        self._templateBank = bank
+
     def estimateOffset(self, img, show=False):
         reference = self.reference
 
         # run template match against all template frames
-        match = [iterativeImageTemplateMatch(img, t) for t in self.filtered_ref]
+        match = self.templateBank.match(img)
 
         if show:
             pg.plot([m[0][0] for m in match], title='x match vs z')
@@ -7,7 +7,7 @@ import pyqtgraph as pg
 from acq4.Manager import getManager
 from acq4.util import Qt
 from acq4.util.future import Future, future_wrap
-from acq4.util.image_registration import imageTemplateMatch
+from acq4.util.image_registration import TemplateBank, imageTemplateMatch
 from acq4.util.imaging.sequencer import acquire_z_stack
 from .pipette_detection import TemplateMatchPipetteDetector
 
@@ -32,6 +32,14 @@ class PipetteTracker(object):
         except Exception:
             self.reference = {}
 
+        # detectors are kept per reference set so that their template banks are only built once
+        self._detectors = {}
+        try:
+            with open(self._templateBankFileName(), "rb") as fh:
+                self._savedTemplateBanks = pickle.load(fh)
+        except Exception:
+            self._savedTemplateBanks = {}
+
     def takeFrame(self, imager=None, ensureFreshFrames=True):
         """Acquire one frame from an imaging device.
 
@@ -199,6 +207,11 @@ class PipetteTracker(object):
         with open(self.dev.configFileName("ref_frames.pk"), "wb") as fh:
             pickle.dump(self.reference, fh)
 
+        # template bank for the old reference frames is no longer valid
+        self._detectors.pop(key, None)
+        if self._savedTemplateBanks.pop(key, None) is not None:
+            self._saveTemplateBanks()
+
     def measureTipPosition(
         self, frame, searchRegion="near_tip", padding=50e-6, threshold=0.6, pos=None, tipLength=None, movePipette=False
     ):
@@ -252,7 +265,7 @@ class PipetteTracker(object):
         else:
             bg_frame = None
 
-        detector = self.detectorClass(reference, self.dev)
+        detector = self._getDetector()
 
         if searchRegion == 'near_tip':
             # generate suggested crop and pipette position
@@ -290,6 +303,37 @@ class PipetteTracker(object):
                 "No reference frames found for this pipette / objective / filter combination: %s" % repr(key)
             )
 
+    def _getDetector(self):
+        """Return a detector for the current imager state, reusing the template bank from previous calls
+        or from a previous session if the reference frames have not changed.
+        """
+        key = self._getImager().getDeviceStateKey()
+        detector = self._detectors.get(key)
+        if detector is not None:
+            return detector
+
+        detector = self.detectorClass(self._getReference(), self.dev)
+        if isinstance(detector, TemplateMatchPipetteDetector):
+            bank = self._savedTemplateBanks.get(key)
+            if bank is not None and bank.signature == TemplateBank.computeSignature(np.stack(detector.filtered_ref)):
+                detector.templateBank = bank
+            else:
+                self._savedTemplateBanks[key] = detector.templateBank
+                self._saveTemplateBanks()
+        self._detectors[key] = detector
+        return detector
+
+    def _templateBankFileName(self):
+        return self.dev.configFileName("ref_frames_bank.pk")
+
+    def _saveTemplateBanks(self):
+        # banks are derived from ref_frames.pk and rebuilt when missing, so failure to write is not fatal
+        try:
+            with open(self._templateBankFileName(), "wb") as fh:
+                pickle.dump(self._savedTemplateBanks, fh)
+        except Exception:
+            pg.debug.printExc("Could not save pipette template bank:")
+
     def autoCalibrate(self, **kwds):
         """Automatically calibrate the pipette tip position using template matching on a single camera frame.
 
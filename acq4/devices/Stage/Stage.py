@@ -37,6 +37,11 @@ class Stage(Device, OptomechDevice):
             Speed (m/s) to use when a movement is requested with speed='fast'
         slowSpeed : float
             Speed (m/s) to use when a movement is requested with speed='slow'
+        acceleration : float
+            Optional acceleration (m/s^2) of programmed moves; used to predict move durations
+            (see acq4.util.imaging.mosaic_planner).
+        settleTime : float
+            Optional time (s) to allow for vibrations to settle after each move; used to predict move durations.
     """
 
     sigPositionChanged = Qt.Signal(object, object, object)  # self, new position, old position
@@ -78,6 +83,8 @@ class Stage(Device, OptomechDevice):
         self._defaultSpeed = 'fast'
         self.setFastSpeed(config.get('fastSpeed', 1e-3))
         self.setSlowSpeed(config.get('slowSpeed', 10e-6))
+        self.acceleration = config.get('acceleration', None)
+        self.settleTime = config.get('settleTime', 0)
 
         self._limits = [(None, None)] * nAxes
         if 'limits' in config:
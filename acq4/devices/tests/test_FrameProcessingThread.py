@@ -0,0 +1,169 @@
+import threading
+import time
+
+import numpy as np
+
+from acq4.devices.Camera.Camera import FrameProcessingThread
+from acq4.util.imaging.frame import Frame
+from acq4.util.imaging.frame_buffer import FrameRingBuffer
+
+
+def _frames(n):
+    return [Frame(np.zeros((2, 2)), {"id": i}) for i in range(n)]
+
+
+def _waitFor(condition, timeout=5.0):
+    start = time.time()
+    while not condition():
+        if time.time() - start > timeout:
+            raise TimeoutError("condition not met")
+        time.sleep(0.01)
+
+
+def test_serial_processors_see_every_frame():
+    thread = FrameProcessingThread()
+    seen = []
+    finalSeen = []
+    thread.addFrameProcessor(lambda f: seen.append(f.info()["id"]))
+    thread.addFrameProcessor(lambda f: finalSeen.append(f.info()["id"]), final=True)
+    thread.start()
+    try:
+        for frame in _frames(20):
+            thread.handleNewRawFrame(frame)
+        _waitFor(lambda: len(finalSeen) == 20)
+    finally:
+        thread.stop()
+        thread.wait()
+    assert seen == list(range(20))
+    assert finalSeen == list(range(20))
+    assert all(s["dropped"] == 0 for s in thread.stats()["processors"].values())
+
+
+def test_full_queue_blocks_and_bounds_memory():
+    queueSize = 4
+    thread = FrameProcessingThread(maxQueueSize=queueSize)
+    # queued frames, plus one being handed over, one in the serial processors and two in the display stage
+    buf = FrameRingBuffer(size=queueSize + 4, shape=(64, 64))
+    recordSeen = []
+    displaySeen = []
+
+    def record(frame):
+        time.sleep(0.002)
+        recordSeen.append(frame.info()["id"])
+
+    def display(frame):
+        time.sleep(0.01)
+        displaySeen.append(frame.info()["id"])
+
+    thread.addFrameProcessor(record)
+    thread.addFrameProcessor(display, dropPolicy="latest")
+    thread.start()
+    try:
+        # the producer is much faster than the processors; frames in flight are limited to the queue
+        # plus the frames being processed, so the ring buffer never runs out of slots
+        for i in range(100):
+            thread.handleNewRawFrame(Frame(buf.acquire(), {"id": i}))
+        _waitFor(lambda: len(recordSeen) == 100)
+        _waitFor(lambda: displaySeen and displaySeen[-1] == 99)
+    finally:
+        thread.stop()
+        thread.wait()
+    assert recordSeen == list(range(100))
+    assert buf.stats["fallbackAllocations"] == 0
+    stats = thread.stats()
+    assert stats["maxQueueDepth"] <= queueSize
+    assert stats["maxQueueSize"] == queueSize
+    assert stats["blockedTime"] > 0
+    displayStats = [s for name, s in stats["processors"].items() if "display" in name][0]
+    assert displayStats["maxQueueDepth"] == 1
+    assert displayStats["dropped"] > 0
+    assert displayStats["dropped"] + displayStats["processed"] == 100
+
+
+def test_latest_policy_drops_stale_frames():
+    thread = FrameProcessingThread()
+    release = threading.Event()
+    slowSeen = []
+    allSeen = []
+
+    def slow(frame):
+        release.wait()
+        slowSeen.append(frame.info()["id"])
+
+    thread.addFrameProcessor(slow, dropPolicy="latest")
+    thread.addFrameProcessor(lambda f: allSeen.append(f.info()["id"]))
+    thread.start()
+    try:
+        for frame in _frames(20):
+            thread.handleNewRawFrame(frame)
+        _waitFor(lambda: len(allSeen) == 20)
+        release.set()
+
+        def slowStats():
+            return [s for name, s in thread.stats()["processors"].items() if "slow" in name][0]
+
+        _waitFor(lambda: slowStats()["dropped"] + slowStats()["processed"] == 20)
+    finally:
+        thread.stop()
+        thread.wait()
+    assert allSeen == list(range(20))
+    assert slowSeen[-1] == 19
+    assert len(slowSeen) < 20
+    assert slowStats()["dropPolicy"] == "latest"
+
+
+def test_all_stage_sees_every_frame_while_latest_stage_drops():
+    thread = FrameProcessingThread()
+    release = threading.Event()
+    displaySeen = []
+    recordSeen = []
+
+    def display(frame):
+        release.wait()
+        displaySeen.append(frame.info()["id"])
+
+    def record(frame):
+        time.sleep(0.001)
+        recordSeen.append(frame.info()["id"])
+
+    thread.addFrameProcessor(display, dropPolicy="latest")
+    thread.addFrameProcessor(record, dropPolicy="all", workers=1)
+    thread.start()
+    try:
+        for frame in _frames(50):
+            thread.handleNewRawFrame(frame)
+        # a blocked "latest" processor does not hold up the "all" stage
+        _waitFor(lambda: len(recordSeen) == 50)
+        release.set()
+        _waitFor(lambda: displaySeen and displaySeen[-1] == 49)
+    finally:
+        thread.stop()
+        thread.wait()
+    assert recordSeen == list(range(50))
+    assert len(displaySeen) < 50
+    stats = thread.stats()["processors"]
+    recordStats = [s for name, s in stats.items() if "record" in name][0]
+    assert recordStats["dropped"] == 0 and recordStats["dropPolicy"] == "all"
+
+
+def test_all_stage_queue_is_bounded():
+    thread = FrameProcessingThread()
+    seen = []
+
+    def slow(frame):
+        time.sleep(0.002)
+        seen.append(frame.info()["id"])
+
+    thread.addFrameProcessor(slow, dropPolicy="all", workers=1, maxQueueSize=3)
+    thread.start()
+    try:
+        for frame in _frames(50):
+            thread.handleNewRawFrame(frame)
+        _waitFor(lambda: len(seen) == 50)
+    finally:
+        thread.stop()
+        thread.wait()
+    assert seen == list(range(50))
+    stats = [s for name, s in thread.stats()["processors"].items() if "slow" in name][0]
+    assert stats["maxQueueDepth"] <= 3 and stats["maxQueueSize"] == 3
+    assert stats["dropped"] == 0
@@ -0,0 +1,119 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import pyqtgraph as pg
+import pytest
+
+from acq4.Manager import Task
+from acq4.devices.Device import DeviceTask
+from acq4.drivers.nidaq.mock import MockNIDAQ
+
+pg.mkQApp()
+
+
+class CountingTask(DeviceTask):
+    def __init__(self, dev, cmd, parentTask):
+        DeviceTask.__init__(self, dev, cmd, parentTask)
+        self.cmd = cmd
+        self.configureCount = 0
+        self.startCount = 0
+
+    def configure(self):
+        self.configureCount += 1
+
+    def start(self):
+        self.startCount += 1
+
+    def updateCommand(self, cmd):
+        self.cmd.update(cmd)
+
+    def getResult(self):
+        return self.cmd['value']
+
+
+def makeTask():
+    dev = MagicMock()
+    dev.createTask = lambda cmd, parent: CountingTask(dev, cmd, parent)
+    dm = MagicMock()
+    dm.getDevice.return_value = dev
+    return Task(dm, {'protocol': {'duration': 0}, 'dev': {'value': 1}})
+
+
+def test_prepared_task_configures_once():
+    task = makeTask()
+    devTask = task.tasks['dev']
+    task.prepare()
+    assert devTask.configureCount == 1
+
+    task.execute()
+    assert task.getResult()['dev'] == 1
+    # first run uses the configuration from prepare()
+    assert devTask.configureCount == 1
+
+    task.updateCommand({'dev': {'value': 2}})
+    task.execute()
+    assert task.getResult()['dev'] == 2
+    # later runs re-arm (default rearm() calls configure()) but never rebuild the task
+    assert devTask.configureCount == 2
+    assert devTask.startCount == 2
+    assert task.command['dev']['value'] == 2
+
+
+def test_unprepared_task_rejects_update():
+    task = makeTask()
+    try:
+        task.updateCommand({'dev': {'value': 2}})
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("updateCommand should require a prepared task")
+
+
+def test_supertask_rearm_rewrites_buffers():
+    st = MockNIDAQ().createSuperTask()
+    written = []
+    st.addChannel('/Dev1/ao0', 'ao', mockFunc=lambda data, dt: written.append(data.copy()))
+    st.addChannel('/Dev1/ai0', 'ai')
+    st.setWaveform('/Dev1/ao0', np.zeros(10))
+    st.configureClocks(rate=1000, nPts=10)
+
+    st.start()
+    st.stop(wait=True)
+    assert len(written) == 1
+
+    st.rearm()
+    st.setWaveform('/Dev1/ao0', np.ones(10))
+    st.start()
+    st.stop(wait=True)
+    assert len(written) == 2
+    assert np.all(written[1] == 1)
+    assert np.all(st.getResult('/Dev1/ao0')['data'] == 1)
+
+
+def makeMultiClampTask(extCmdScale=1.0):
+    from acq4.devices.MultiClamp.multiclamp import MultiClampTask
+
+    task = MultiClampTask.__new__(MultiClampTask)
+    task.dev = MagicMock()
+    task.dev.config = {'commandChannel': {'channel': '/Dev1/ao0'}}
+    task.cmd = {'mode': 'VC', 'holding': -70e-3, 'command': np.zeros(10)}
+    task.state = {'extCmdScale': extCmdScale}
+    task.daqTasks = {'command': MagicMock()}
+    return task
+
+
+def test_multiclamp_update_applies_holding():
+    task = makeMultiClampTask()
+    task.updateCommand({'holding': -50e-3})
+    task.dev.setHolding.assert_called_once_with('VC', -50e-3)
+    assert task.cmd['holding'] == -50e-3
+    # unchanged holding is not sent to the amplifier again
+    task.updateCommand({'holding': -50e-3})
+    assert task.dev.setHolding.call_count == 1
+
+
+def test_multiclamp_update_rejects_disabled_command_scale():
+    task = makeMultiClampTask(extCmdScale=0.0)
+    with pytest.raises(ValueError):
+        task.updateCommand({'command': np.ones(10)})
+    task.daqTasks['command'].setWaveform.assert_not_called()
@@ -0,0 +1,95 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pyqtgraph as pg
+
+from acq4.Manager import Task
+from acq4.devices.Device import DeviceTask
+
+pg.mkQApp()
+
+
+class AsyncTask(DeviceTask):
+    """Finishes *delay* seconds after start() in a background thread, then calls notifyDone()."""
+
+    def __init__(self, dev, cmd, parentTask):
+        DeviceTask.__init__(self, dev, cmd, parentTask)
+        self.delay = cmd['delay']
+        self.finishTime = None
+
+    def start(self):
+        self.finishTime = None
+        threading.Timer(self.delay, self._finish).start()
+
+    def _finish(self):
+        self.finishTime = time.perf_counter()
+        self.notifyDone()
+
+    def isDone(self):
+        return self.finishTime is not None
+
+    def getResult(self):
+        return self.finishTime
+
+
+def makeTask(delay, duration=0):
+    dev = MagicMock()
+    dev.createTask = lambda cmd, parent: AsyncTask(dev, cmd, parent)
+    dm = MagicMock()
+    dm.getDevice.return_value = dev
+    return Task(dm, {'protocol': {'duration': duration}, 'dev': {'delay': delay}})
+
+
+def test_wait_wakes_on_device_completion():
+    task = makeTask(delay=0.05)
+    task.execute(block=False)
+    assert task.wait(timeout=5) is True
+    woke = time.perf_counter()
+    assert task.done
+    assert woke - task.tasks['dev'].finishTime < 0.02
+    assert task.getResult()['dev'] is not None
+
+
+def test_wait_timeout_and_interrupt():
+    task = makeTask(delay=0.5)
+    task.execute(block=False)
+    assert task.wait(timeout=0.01) is False
+
+    threading.Timer(0.02, task.interruptWait).start()
+    start = time.perf_counter()
+    assert task.wait() is False
+    assert time.perf_counter() - start < 0.3
+
+    assert task.wait(timeout=5) is True
+    task.stop()
+
+
+class PolledTask(DeviceTask):
+    """Finishes after *delay* seconds without calling notifyDone(); counts isDone() calls."""
+
+    def __init__(self, delay):
+        DeviceTask.__init__(self, MagicMock(), {}, None)
+        self.finishTime = time.perf_counter() + delay
+        self.polls = 0
+
+    def isDone(self):
+        self.polls += 1
+        return time.perf_counter() >= self.finishTime
+
+
+def test_default_wait_backs_off():
+    devTask = PolledTask(delay=0.2)
+    assert devTask.waitUntilDone(timeout=5) is True
+    # 1, 2, 4, 8, 16 ms, then every 20 ms; a fixed 1 ms interval would poll ~200 times
+    assert devTask.polls < 20
+
+
+def test_wait_for_tasks_notifies():
+    inner = PolledTask(delay=0.05)
+    outer = DeviceTask(MagicMock(), {}, None)
+    outer.notifyDone = MagicMock()
+    assert outer.waitForTasks([inner, inner], timeout=0.01) is False
+    outer.notifyDone.assert_not_called()
+    assert outer.waitForTasks([inner, inner], timeout=5) is True
+    outer.notifyDone.assert_called_once()
@@ -23,6 +23,7 @@ class SuperTask:
         self.devs = daq.listDevices()
         self.triggerChannel = None
         self.result = None
+        self.continuous = False
 
     def absChanName(self, chan):
         parts = chan.lstrip("/").split("/")
@@ -129,6 +130,7 @@ class SuperTask:
 
         key = self.getTaskKey(chan)
         self.taskInfo[key]["dataWritten"] = False
+        self.taskInfo[key]["cache"] = None
 
         # if info is not None:
         #     self.channelInfo[chan]['info'] = info
@@ -163,16 +165,33 @@ class SuperTask:
                     raise
                 self.taskInfo[k]["dataWritten"] = True
 
+    def rearm(self):
+        """Prepare to run again with the same channels, clocks and triggers.
+
+        Output buffers are released when tasks are unreserved in stop(), so all output
+        data is rewritten on the next start(); no channels or timing are reconfigured.
+        """
+        for k in self.tasks:
+            self.taskInfo[k]["dataWritten"] = False
+        self.result = None
+
     def hasTasks(self):
         return len(self.tasks) > 0
 
-    def configureClocks(self, rate, nPts):
-        """Configure sample clock and triggering for all tasks"""
+    def configureClocks(self, rate, nPts, continuous=False):
+        """Configure sample clock and triggering for all tasks.
+
+        If *continuous* is True, the tasks sample until they are stopped and *nPts* sets the size of the
+        driver's buffer per channel; read the data with a DaqStream (see stream.py). Output tasks regenerate
+        their waveform for as long as the tasks run.
+        """
         if len(self.tasks) == 0:
             raise Exception("No tasks to configure.")
         keys = list(self.tasks.keys())
         self.numPts = nPts
         self.rate = rate
+        self.continuous = continuous
+        sampleMode = self.daq.Val_ContSamps if continuous else self.daq.Val_FiniteSamps
 
         # Make sure we're only using 1 DAQ device (not sure how to tie 2 together yet)
         # ndevs = len(set([k[0] for k in keys]))
@@ -219,10 +238,10 @@ class SuperTask:
             if k[1] != clkSource:
                 # print "%s CfgSampClkTiming(%s, %f, Val_Rising, Val_FiniteSamps, %d)" % (str(k), clk, rate, nPts)
 
-                self.tasks[k].CfgSampClkTiming(clk, rate, self.daq.Val_Rising, self.daq.Val_FiniteSamps, nPts)
+                self.tasks[k].CfgSampClkTiming(clk, rate, self.daq.Val_Rising, sampleMode, nPts)
             else:
                 # print "%s CfgSampClkTiming('', %f, Val_Rising, Val_FiniteSamps, %d)" % (str(k), rate, nPts)
-                self.tasks[k].CfgSampClkTiming("", rate, self.daq.Val_Rising, self.daq.Val_FiniteSamps, nPts)
+                self.tasks[k].CfgSampClkTiming("", rate, self.daq.Val_Rising, sampleMode, nPts)
 
     def setTrigger(self, trig):
         # self.tasks[self.clockSource].CfgDigEdgeStartTrig(trig, Val_Rising)
@@ -275,6 +294,19 @@ class SuperTask:
                 return False
         return True
 
+    def wait(self, timeout=None):
+        """Block until all tasks are done or *timeout* seconds have elapsed.
+
+        The calling thread sleeps inside the driver until each task completes, rather than
+        polling isDone(). Return True if all tasks are done.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        for t in self.tasks:
+            remaining = -1 if deadline is None else max(0.0, deadline - time.time())
+            if not self.tasks[t].wait(remaining):
+                return False
+        return True
+
     def read(self):
         data = {}
         for t in self.tasks:
@@ -287,12 +319,10 @@ class SuperTask:
         # print "ST stopping, wait=",wait, " abort:", abort
         # need to be very careful about stopping and unreserving all hardware, even if there is a failure at some point.
         try:
-            if wait:
-                while not self.isDone():
-                    # print "Sleeping..", time.time()
-                    time.sleep(10e-6)
+            if wait and not self.continuous:
+                self.wait()
 
-            if not abort and self.isDone():
+            if not abort and not self.continuous and self.isDone():
                 # data must be read before stopping the task,
                 # but should only be read if we know the task is complete.
                 self.getResult()
@@ -360,8 +390,7 @@ class SuperTask:
         self.start()
         # print "wait/stop..", time.time()
         # self.stop(wait=True)
-        while not self.isDone():
-            time.sleep(10e-6)
+        self.wait()
         # print "get samples.."
         r = self.getResult()
         return r
@@ -28,6 +28,7 @@ class MockNIDAQ:
         self.Val_Cfg_Default = -1
         self.Val_ChanForAllLines = 1
         self.Val_ChanPerLine = 0
+        self.Val_ContSamps = 10123
         self.Val_Diff = 10106
         self.Val_FiniteSamps = 10178
         self.Val_NRSE = 10078
@@ -163,6 +164,18 @@ class MockNIDAQ:
         diff = (start + dur) - now
         return diff <= 0
 
+    def waitClock(self, clock, timeout=-1):
+        """Sleep until *clock* finishes or *timeout* seconds elapse (-1 waits forever)."""
+        if clock not in self.clocks:
+            return True
+        start, dur = self.clocks[clock]
+        diff = (start + dur) - time.time()
+        if timeout >= 0:
+            diff = min(diff, timeout)
+        if diff > 0:
+            time.sleep(diff)
+        return self.checkClock(clock)
+
 
 class Task:
     def __init__(self, nd):
@@ -173,6 +186,8 @@ class Task:
         self.nativeClock = None
         self.data = None
         self.mode = None
+        self.continuous = False
+        self.readPos = 0
 
     # def __getattr__(self, attr):
     #     return lambda *args: self
@@ -197,7 +212,7 @@ class Task:
         self.chOpts.append(kargs)
         self.mode = 'do'
 
-    def CfgSampClkTiming(self, clock, rate, b, c, nPts):
+    def CfgSampClkTiming(self, clock, rate, edge, sampleMode, nPts):
         if 'ai' in self.chans[0]:
             self.nativeClock = self.device() + '/ai/SampleClock'
         elif 'ao' in self.chans[0]:
@@ -208,6 +223,7 @@ class Task:
         self.clock = clock
         self.rate = rate
         self.nPts = nPts
+        self.continuous = sampleMode == self.nd.Val_ContSamps
         # print self.chans, self.clock
 
     def GetSampClkMaxRate(self):
@@ -227,7 +243,9 @@ class Task:
 
         return len(data)
 
-    def read(self):
+    def read(self, samples=None, timeout=10.0, dtype=None, continuous=False):
+        if continuous:
+            return self.readContinuous(samples, timeout)
         dur = self.nPts / self.rate
         tVals = np.linspace(0, dur, self.nPts)
         if 'd' in self.mode:
@@ -242,14 +260,42 @@ class Task:
                 data[i] = 0
         return (data, self.nPts)
 
+    def readContinuous(self, samples, timeout=10.0):
+        """Return the next *samples* per channel, sleeping until the clock has produced them.
+
+        Channels created with a ``mockStreamFunc(startIndex, n, rate)`` option are filled from that function;
+        all others read zeros.
+        """
+        clock = self.clock or self.nativeClock
+        start = self.nd.clocks[clock][0]
+        readyTime = start + (self.readPos + samples) / self.rate
+        wait = readyTime - time.time()
+        if wait > timeout:
+            raise TimeoutError("Timed out waiting for %d samples" % samples)
+        if wait > 0:
+            time.sleep(wait)
+        if 'd' in self.mode:
+            data = np.zeros((len(self.chans), samples), dtype=np.int32)
+        else:
+            data = np.zeros((len(self.chans), samples))
+        for i, opts in enumerate(self.chOpts):
+            if 'mockStreamFunc' in opts:
+                data[i] = opts['mockStreamFunc'](self.readPos, samples, self.rate)
+        self.readPos += samples
+        return (data, samples)
+
     def start(self):
+        self.readPos = 0
         # only start clock if it matches the native clock for this channel
         if self.clock is None or self.clock == self.nativeClock:
-            dur = self.nPts / self.rate
+            dur = float('inf') if self.continuous else self.nPts / self.rate
             self.nd.startClock(self.nativeClock, dur)
 
     def stop(self):
-        if self.clock is None:
+        if self.continuous:
+            # continuous clocks run until stopped; there is nothing to wait for
+            self.nd.clocks.pop(self.clock or self.nativeClock, None)
+        elif self.clock is None:
             self.nd.stopClock(self.nativeClock)
         else:
             self.nd.stopClock(self.clock)
@@ -260,6 +306,12 @@ class Task:
         else:
             return self.nd.checkClock(self.clock)
 
+    def wait(self, timeout=-1):
+        if self.clock is None:
+            return self.nd.waitClock(self.nativeClock, timeout)
+        else:
+            return self.nd.waitClock(self.clock, timeout)
+
     def GetTaskNumChans(self):
         return len(self.chans)
 
@@ -4,6 +4,9 @@ from inspect import signature
 import PyDAQmx
 import numpy as np
 
+## raised by DAQmxWaitUntilTaskDone when the timeout elapses before the task is done
+DAQmxErrorWaitUntilDoneDoesNotIndicateDone = -200560
+
 dataTypeConversions = {
     '<f8': 'F64',
     '<i2': 'I16',
@@ -266,7 +269,26 @@ class Task:
     def isDone(self):
         return self.IsTaskDone()
 
-    def read(self, samples=None, timeout=10.0, dtype=None):
+    def wait(self, timeout=-1):
+        """Block until the task is done or *timeout* seconds have elapsed (-1 waits forever).
+
+        The wait happens inside DAQmx, so the calling thread sleeps rather than polling.
+        Return True if the task is done.
+        """
+        try:
+            self.WaitUntilTaskDone(timeout)
+        except PyDAQmx.DAQError as exc:
+            if getattr(exc, 'error', None) != DAQmxErrorWaitUntilDoneDoesNotIndicateDone:
+                raise
+            return self.isDone()
+        return True
+
+    def read(self, samples=None, timeout=10.0, dtype=None, continuous=False):
+        """Read *samples* per channel; return (data, nPtsRead).
+
+        Finite tasks are read from the first sample. With *continuous* True, reads continue from the current
+        read position, so consecutive calls return consecutive blocks of a continuously sampling task.
+        """
         # reqSamps = samples
         # if samples is None:
         #    samples = self.GetSampQuantSampPerChan()
@@ -317,7 +339,10 @@ class Task:
 
         fName += dataTypeConversions[np.dtype(dtype).descr[0][1]]
 
-        self.SetReadRelativeTo(PyDAQmx.Val_FirstSample)
+        if continuous:
+            self.SetReadRelativeTo(PyDAQmx.Val_CurrReadPos)
+        else:
+            self.SetReadRelativeTo(PyDAQmx.Val_FirstSample)
         self.SetReadOffset(0)
 
         nPts = getattr(self, fName)(reqSamps, timeout, PyDAQmx.Val_GroupByChannel, buf, buf.size, None)
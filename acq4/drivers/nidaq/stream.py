@@ -0,0 +1,249 @@
+"""
+Continuous acquisition from a SuperTask.
+
+A SuperTask configured with ``configureClocks(rate, nPts, continuous=True)`` samples until it is stopped. DaqStream
+runs a reader thread that pulls fixed-size chunks from every input task, keeps the most recent samples in a ring
+buffer, and hands each chunk to its subscribers::
+
+    st = daq.createSuperTask()
+    st.addChannel('/Dev1/ai0', 'ai')
+    st.configureClocks(rate=20000, nPts=200000, continuous=True)
+    stream = DaqStream(st, chunkSize=2000, downsample=10)
+    stream.subscribe(callback)              # callback(data, info) is called from the reader thread
+    stream.record('/path/to/stream.h5')     # optional chunked writes to disk
+    stream.start()
+    ...
+    stream.stop()
+"""
+import queue
+import threading
+import time
+
+import h5py
+import numpy as np
+
+
+def downsampleChunk(data, ds, binary=False):
+    """Reduce a (nChans, nSamples) chunk by *ds*, averaging analog samples and subsampling digital ones."""
+    if ds == 1:
+        return data
+    if binary:
+        return data[:, ::ds]
+    n = data.shape[1] // ds
+    return data[:, :n * ds].reshape(data.shape[0], n, ds).mean(axis=2)
+
+
+class DaqStream:
+    """Reads a continuously running SuperTask in fixed-size chunks from a background thread.
+
+    Parameters
+    ----------
+    superTask : SuperTask
+        A SuperTask whose clocks were configured with ``continuous=True``. The stream starts and stops it.
+    chunkSize : int
+        Number of samples per channel read from the hardware at a time. Must be a multiple of *downsample*.
+    downsample : int
+        Factor by which chunks are reduced before they are buffered and delivered (mean for analog channels,
+        subsampling for digital channels).
+    bufferChunks : int
+        Number of (downsampled) chunks kept in the ring buffer returned by `latest`.
+    timeout : float
+        Seconds to wait for each chunk before the read is considered failed.
+    """
+
+    def __init__(self, superTask, chunkSize, downsample=1, bufferChunks=32, timeout=10.0):
+        if not getattr(superTask, 'continuous', False):
+            raise ValueError("SuperTask must be configured with configureClocks(..., continuous=True)")
+        if chunkSize % downsample != 0:
+            raise ValueError("chunkSize (%d) must be a multiple of downsample (%d)" % (chunkSize, downsample))
+        self.superTask = superTask
+        self.chunkSize = int(chunkSize)
+        self.downsample = int(downsample)
+        self.timeout = timeout
+        self.rate = superTask.rate / self.downsample
+
+        self.keys = [k for k in superTask.tasks if superTask.tasks[k].isInputTask()]
+        self.channels = []
+        for k in self.keys:
+            self.channels.extend(superTask.taskInfo[k]['chans'])
+        outChunk = self.chunkSize // self.downsample
+        self._buffer = np.zeros((len(self.channels), outChunk * bufferChunks))
+        self._bufferCount = 0  # total number of (downsampled) samples written into the ring buffer
+
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._writer = None
+        self._thread = None
+        self._stopRequested = threading.Event()
+        self.error = None
+        self.chunkCount = 0
+        self.startTime = None
+
+    def subscribe(self, callback):
+        """Call ``callback(data, info)`` with every chunk.
+
+        *data* maps channel names to 1D arrays; *info* holds 'rate', 'startIndex' (index of the first sample of
+        the chunk since the stream started, after downsampling), and 'time' (start time of the chunk).
+        Callbacks run in the reader thread and should return quickly.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.remove(callback)
+
+    def record(self, fileName, **kwds):
+        """Begin writing every chunk to an HDF5 file; see StreamWriter for options. Returns the writer."""
+        writer = StreamWriter(fileName, self.channels, self.rate, self.chunkSize // self.downsample, **kwds)
+        with self._lock:
+            if self._writer is not None:
+                raise RuntimeError("Stream is already being recorded to %s" % self._writer.fileName)
+            self._writer = writer
+        return writer
+
+    def stopRecording(self):
+        """Flush and close the file started by `record`. Returns the number of samples written per channel."""
+        with self._lock:
+            writer = self._writer
+            self._writer = None
+        if writer is None:
+            return 0
+        return writer.close()
+
+    def start(self):
+        if self.isRunning():
+            raise RuntimeError("Stream is already running.")
+        self._stopRequested.clear()
+        self.error = None
+        self.chunkCount = 0
+        self._bufferCount = 0
+        self.superTask.start()
+        self.startTime = self.superTask.startTime
+        self._thread = threading.Thread(target=self._run, daemon=True, name='DaqStream')
+        self._thread.start()
+
+    def stop(self):
+        """Stop reading, stop the hardware tasks and close any open recording."""
+        self._stopRequested.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.superTask.stop(abort=True)
+        finally:
+            self.stopRecording()
+        if self.error is not None:
+            raise RuntimeError("Error while reading DAQ stream") from self.error
+
+    def isRunning(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def latest(self, n=None):
+        """Return the most recent *n* buffered samples as a dict of channel name to array (oldest first)."""
+        with self._lock:
+            size = self._buffer.shape[1]
+            avail = min(self._bufferCount, size)
+            n = avail if n is None else min(n, avail)
+            end = self._bufferCount % size
+            idx = np.arange(end - n, end) % size
+            data = self._buffer[:, idx]
+        return {ch: data[i] for i, ch in enumerate(self.channels)}
+
+    def _run(self):
+        st = self.superTask
+        try:
+            while not self._stopRequested.is_set():
+                chunks = []
+                for k in self.keys:
+                    data, nPts = st.tasks[k].read(self.chunkSize, self.timeout, continuous=True)
+                    chunks.append(downsampleChunk(data, self.downsample, binary=k[1] in ('di', 'do')))
+                self._deliver(np.concatenate(chunks, axis=0))
+        except Exception as exc:
+            if not self._stopRequested.is_set():
+                self.error = exc
+
+    def _deliver(self, data):
+        n = data.shape[1]
+        startIndex = self.chunkCount * n
+        info = {
+            'rate': self.rate,
+            'startIndex': startIndex,
+            'time': self.startTime + startIndex / self.rate,
+        }
+        with self._lock:
+            size = self._buffer.shape[1]
+            start = self._bufferCount % size
+            self._buffer[:, start:start + n] = data  # chunk size divides the buffer size, so this never wraps
+            self._bufferCount += n
+            subscribers = list(self._subscribers)
+            writer = self._writer
+        self.chunkCount += 1
+
+        if writer is not None:
+            writer.append(data)
+        chanData = {ch: data[i] for i, ch in enumerate(self.channels)}
+        for cb in subscribers:
+            cb(chanData, info)
+
+
+class StreamWriter:
+    """Appends (nChans, nSamples) chunks to a resizable, chunked HDF5 dataset from a dedicated writer thread.
+
+    The file holds a 'data' dataset with one row per channel and attributes 'channels', 'rate' and 'startTime'.
+    The dataset grows by *preallocate* samples at a time and is trimmed on close.
+    """
+
+    def __init__(self, fileName, channels, rate, chunkSize, preallocate=None, compression=None, maxQueueSize=256):
+        self.fileName = fileName
+        self.sampleCount = 0
+        self._preallocate = max(preallocate or 100 * chunkSize, chunkSize)
+        self._error = None
+        self._queue = queue.Queue(maxsize=maxQueueSize)
+        f = h5py.File(fileName, 'w')
+        f.attrs['channels'] = list(channels)
+        f.attrs['rate'] = rate
+        f.attrs['startTime'] = time.time()
+        kwds = {} if compression is None else {'compression': compression}
+        f.create_dataset(
+            'data', shape=(len(channels), self._preallocate), maxshape=(len(channels), None), dtype=float,
+            chunks=(len(channels), chunkSize), **kwds,
+        )
+        self._file = f
+        self._thread = threading.Thread(target=self._run, daemon=True, name='StreamWriter')
+        self._thread.start()
+
+    def append(self, data):
+        if self._error is not None:
+            raise RuntimeError("Stream writer failed") from self._error
+        self._queue.put(data)
+
+    def close(self):
+        """Flush pending chunks, trim the dataset and close the file. Returns the number of samples written."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise RuntimeError("Stream writer failed") from self._error
+        return self.sampleCount
+
+    def _run(self):
+        f = self._file
+        try:
+            dset = f['data']
+            while True:
+                data = self._queue.get()
+                if data is None:
+                    break
+                start = self.sampleCount
+                stop = start + data.shape[1]
+                if stop > dset.shape[1]:
+                    dset.resize(dset.shape[1] + self._preallocate, axis=1)
+                dset[:, start:stop] = data
+                self.sampleCount = stop
+            dset.resize(self.sampleCount, axis=1)
+        except Exception as exc:
+            self._error = exc
+        finally:
+            f.close()
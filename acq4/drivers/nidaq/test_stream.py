@@ -0,0 +1,58 @@
+import threading
+
+import h5py
+import numpy as np
+
+from acq4.drivers.nidaq.mock import MockNIDAQ
+from acq4.drivers.nidaq.stream import DaqStream
+
+
+def ramp(start, n, rate):
+    return np.arange(start, start + n, dtype=float)
+
+
+def makeStream(**kwds):
+    daq = MockNIDAQ()
+    st = daq.createSuperTask()
+    st.addChannel('/Dev1/ai0', 'ai', mockStreamFunc=ramp)
+    st.addChannel('/Dev1/ai1', 'ai')
+    st.configureClocks(rate=100000., nPts=100000, continuous=True)
+    return DaqStream(st, **kwds)
+
+
+def test_stream_chunks_and_downsampling(tmp_path):
+    stream = makeStream(chunkSize=1000, downsample=10, bufferChunks=4)
+    chunks = []
+    done = threading.Event()
+
+    def collect(data, info):
+        chunks.append((data, info))
+        if len(chunks) == 6:
+            done.set()
+
+    stream.subscribe(collect)
+    writer = stream.record(str(tmp_path / 'stream.h5'))
+    stream.start()
+    assert done.wait(timeout=5)
+    latest = stream.latest(250)
+    stream.stop()
+    assert writer.sampleCount >= 600
+
+    # chunks are contiguous, downsampled by block averaging, and carry their sample index
+    for i, (data, info) in enumerate(chunks[:6]):
+        assert info['rate'] == 10000.
+        assert info['startIndex'] == i * 100
+        assert data['/Dev1/ai0'].shape == (100,)
+        expected = np.arange(i * 1000, (i + 1) * 1000).reshape(100, 10).mean(axis=1)
+        assert np.allclose(data['/Dev1/ai0'], expected)
+        assert np.all(data['/Dev1/ai1'] == 0)
+
+    # ring buffer holds only the most recent samples, oldest first
+    ai0 = latest['/Dev1/ai0']
+    assert len(ai0) == 250
+    assert np.all(np.diff(ai0) == 10)
+
+    with h5py.File(str(tmp_path / 'stream.h5'), 'r') as f:
+        assert list(f.attrs['channels']) == ['/Dev1/ai0', '/Dev1/ai1']
+        assert f['data'].shape == (2, writer.sampleCount)
+        assert np.allclose(f['data'][0, :600], np.concatenate([c[0]['/Dev1/ai0'] for c in chunks[:6]]))
@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+
+import h5py
+import numpy as np
+from MetaArray import MetaArray as MA
+
+from .FileType import FileType
+
+try:
+    import hdf5plugin
+
+    HAVE_HDF5PLUGIN = True
+except ImportError:
+    HAVE_HDF5PLUGIN = False
+
+## HDF5 filter ids registered by hdf5plugin for the compression schemes we write
+_PLUGIN_FILTERS = {32001: 'blosc', 32004: 'lz4'}
+_MISSING_PLUGIN = ("Compression '{}' requires the optional hdf5plugin package; install it with "
+                   "`pip install hdf5plugin` (or `pip install acq4[video-compression]`), or use 'gzip', 'lzf' or None.")
+
+
+def _compressionArgs(compression):
+    """Return h5py dataset keyword arguments for the requested compression scheme."""
+    if compression is None:
+        return {}
+    if compression in ('gzip', 'lzf'):
+        return {'compression': compression}
+    if compression in ('blosc', 'lz4'):
+        if not HAVE_HDF5PLUGIN:
+            raise ImportError(_MISSING_PLUGIN.format(compression))
+        if compression == 'lz4':
+            return dict(hdf5plugin.LZ4())
+        return dict(hdf5plugin.Blosc(cname='lz4', clevel=5, shuffle=hdf5plugin.Blosc.SHUFFLE))
+    raise ValueError(f"Unsupported compression '{compression}'")
+
+
+class ChunkedVideoWriter:
+    """Streams image frames into a preallocated, chunked HDF5 dataset from a dedicated writer thread.
+
+    Frames are accumulated into whole chunks before being written, and the dataset grows in large
+    preallocated blocks, so the cost per frame stays constant regardless of file size. Per-frame
+    times and transforms are stored as columnar datasets alongside the image data.
+
+    Use with DirHandle.writeFile, which opens the file::
+
+        writer = ChunkedVideoWriter(frameShape, dtype, compression='gzip')
+        fh = dirHandle.writeFile(writer, 'video.h5', fileType='ChunkedVideo', autoIncrement=True)
+        writer.append(frames, times, transforms)
+        ...
+        writer.close()
+
+    Parameters
+    ----------
+    frameShape : tuple
+        Shape of a single frame.
+    dtype : numpy dtype
+        Data type of the frames.
+    axis : str
+        Name of the stacking axis; 'Time' for videos, 'Depth' for z-stacks.
+    chunkFrames : int
+        Number of frames per HDF5 chunk.
+    preallocate : int
+        Number of frames by which the dataset is grown each time it fills up.
+    compression : None | 'gzip' | 'lzf' | 'blosc' | 'lz4'
+        Chunk compression. blosc and lz4 require the optional hdf5plugin package.
+    maxQueueSize : int
+        Maximum number of pending `append` calls before `append` blocks.
+    """
+
+    def __init__(self, frameShape, dtype, axis='Time', chunkFrames=16, preallocate=1024, compression=None,
+                 maxQueueSize=64):
+        self.frameShape = tuple(frameShape)
+        self.dtype = np.dtype(dtype)
+        self.axis = axis
+        self.chunkFrames = int(chunkFrames)
+        self.preallocate = max(int(preallocate), self.chunkFrames)
+        self.compression = compression
+        self._compressionArgs = _compressionArgs(compression)
+        self._queue = queue.Queue(maxsize=maxQueueSize)
+        self._file = None
+        self._thread = None
+        self._error = None
+        self._block = np.empty((self.chunkFrames,) + self.frameShape, dtype=self.dtype)
+        self._blockTimes = np.empty(self.chunkFrames)
+        self._blockTransforms = np.empty((self.chunkFrames, 4, 4))
+        self._blockCount = 0
+        self.frameCount = 0  # number of frames written to disk so far
+        self.fileName = None
+
+    def open(self, fileName):
+        """Create the file and start the writer thread."""
+        self.fileName = fileName
+        f = h5py.File(fileName, 'w')
+        f.attrs['axis'] = self.axis
+        f.attrs['frameCount'] = 0
+        maxFrames = (None,) + self.frameShape
+        f.create_dataset(
+            'frames', shape=(self.preallocate,) + self.frameShape, maxshape=maxFrames, dtype=self.dtype,
+            chunks=(self.chunkFrames,) + self.frameShape, **self._compressionArgs,
+        )
+        f.create_dataset('time', shape=(self.preallocate,), maxshape=(None,), dtype=float)
+        f.create_dataset('transform', shape=(self.preallocate, 4, 4), maxshape=(None, 4, 4), dtype=float)
+        self._file = f
+        self._thread = threading.Thread(target=self._run, daemon=True, name='ChunkedVideoWriter')
+        self._thread.start()
+
+    def append(self, frames, times, transforms=None):
+        """Queue frames for writing.
+
+        Parameters
+        ----------
+        frames : array or list of arrays
+            One or more frames, each with shape *frameShape*.
+        times : array
+            Acquisition time of each frame.
+        transforms : list | None
+            Optional per-frame transforms (pg.SRTTransform3D, QMatrix4x4 or 4x4 arrays) mapping
+            frame coordinates to global coordinates.
+        """
+        if self._error is not None:
+            raise RuntimeError("Video writer failed") from self._error
+        if transforms is None:
+            transforms = np.broadcast_to(np.eye(4), (len(times), 4, 4))
+        else:
+            transforms = np.array([_matrix(tr) for tr in transforms])
+        self._queue.put((frames, np.asarray(times, dtype=float), transforms))
+
+    def close(self):
+        """Flush all pending frames, trim the preallocated space and close the file.
+
+        Returns the number of frames written.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise RuntimeError("Video writer failed") from self._error
+        return self.frameCount
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                frames, times, transforms = item
+                for i in range(len(times)):
+                    n = self._blockCount
+                    self._block[n] = frames[i]
+                    self._blockTimes[n] = times[i]
+                    self._blockTransforms[n] = transforms[i]
+                    self._blockCount += 1
+                    if self._blockCount == self.chunkFrames:
+                        self._flushBlock()
+            self._flushBlock()
+            self._finish()
+        except Exception as exc:
+            self._error = exc
+            try:
+                self._file.close()
+            except Exception:
+                pass
+
+    def _flushBlock(self):
+        n = self._blockCount
+        if n == 0:
+            return
+        f = self._file
+        start = self.frameCount
+        stop = start + n
+        if stop > f['frames'].shape[0]:
+            newSize = f['frames'].shape[0] + self.preallocate
+            for name in ('frames', 'time', 'transform'):
+                f[name].resize(newSize, axis=0)
+        f['frames'][start:stop] = self._block[:n]
+        f['time'][start:stop] = self._blockTimes[:n]
+        f['transform'][start:stop] = self._blockTransforms[:n]
+        self.frameCount = stop
+        self._blockCount = 0
+
+    def _finish(self):
+        f = self._file
+        for name in ('frames', 'time', 'transform'):
+            f[name].resize(self.frameCount, axis=0)
+        f.attrs['frameCount'] = self.frameCount
+        f.close()
+
+
+def _matrix(tr):
+    if hasattr(tr, 'matrix'):
+        # SRTTransform3D / Transform3D
+        tr = tr.matrix()
+    if hasattr(tr, 'copyDataTo'):
+        # QMatrix4x4; data is stored column-major
+        return np.array(tr.copyDataTo()).reshape(4, 4).T
+    return np.asarray(tr, dtype=float).reshape(4, 4)
+
+
+class ChunkedVideoReader:
+    """Lazy, read-only access to a file written by ChunkedVideoWriter.
+
+    Indexing reads only the requested frames from disk::
+
+        with fileHandle.read() as video:
+            frame = video[10]
+            sub = video[100:200, ::2, ::2]
+
+    The file stays open until `close()` is called, the ``with`` block exits or the reader is
+    garbage collected. A closed reader reopens the file when it is accessed again.
+    """
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self._file = None
+        self._frames = None
+        self._open()
+
+    def _open(self):
+        if self._file is not None:
+            return
+        f = h5py.File(self.fileName, 'r')
+        frames = f['frames']
+        if not HAVE_HDF5PLUGIN:
+            plist = frames.id.get_create_plist()
+            for i in range(plist.get_nfilters()):
+                filterId = plist.get_filter(i)[0]
+                if filterId in _PLUGIN_FILTERS:
+                    f.close()
+                    raise ImportError(_MISSING_PLUGIN.format(_PLUGIN_FILTERS[filterId]))
+        self._file = f
+        self._frames = frames
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, item):
+        self._open()
+        return self._frames[item]
+
+    def readFrame(self, index):
+        """Return frame *index*. If the reader is closed, the file is only opened for this read."""
+        wasClosed = self._file is None
+        try:
+            return self[index]
+        finally:
+            if wasClosed:
+                self.close()
+
+    @property
+    def shape(self):
+        self._open()
+        return self._frames.shape
+
+    @property
+    def dtype(self):
+        self._open()
+        return self._frames.dtype
+
+    @property
+    def ndim(self):
+        self._open()
+        return self._frames.ndim
+
+    @property
+    def axis(self):
+        self._open()
+        return self._file.attrs['axis']
+
+    def times(self):
+        self._open()
+        return self._file['time'][:]
+
+    def transforms(self):
+        """Return an (N, 4, 4) array of per-frame transform matrices."""
+        self._open()
+        return self._file['transform'][:]
+
+    def translations(self):
+        self._open()
+        return self._file['transform'][:, :3, 3]
+
+    def asarray(self):
+        self._open()
+        return self._frames[:]
+
+    def asMetaArray(self):
+        """Load the entire file into a MetaArray, laid out like those written by the MetaArray recorder."""
+        times = self.times()
+        axis = {'name': self.axis, 'values': times - times[0] if len(times) > 0 else times,
+                'translation': self.translations()}
+        if self.axis == 'Time':
+            axis['units'] = 's'
+        return MA(self.asarray(), info=[axis, {'name': 'X'}, {'name': 'Y'}])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._frames = None
+
+    def __enter__(self):
+        self._open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ChunkedVideo(FileType):
+
+    extensions = ['.h5']   ## list of extensions handled by this class
+    dataTypes = [ChunkedVideoWriter]    ## list of python types handled by this class
+    priority = 10      ## low priority; only generic HDF5 files share this extension
+
+    @classmethod
+    def acceptsFile(cls, fileHandle):
+        """Accept only .h5 files laid out by ChunkedVideoWriter; other HDF5 files share the extension."""
+        if super().acceptsFile(fileHandle) is False:
+            return False
+        try:
+            with h5py.File(fileHandle.name(), 'r') as f:
+                isVideo = 'frames' in f and 'time' in f and 'axis' in f.attrs and 'frameCount' in f.attrs
+        except Exception:
+            return False
+        return cls.priority if isVideo else False
+
+    @classmethod
+    def write(cls, data, dirHandle, fileName, **args):
+        """Open a ChunkedVideoWriter at fileName. Frames are added later with writer.append().
+        Return the file name written (this allows the function to modify the requested file name)
+        """
+        fileName = cls.addExtension(fileName)
+        data.open(os.path.join(dirHandle.name(), fileName))
+        return fileName
+
+    @classmethod
+    def read(cls, fileHandle, *args, **kargs):
+        """Read a file, return a lazy ChunkedVideoReader"""
+        return ChunkedVideoReader(fileHandle.name())
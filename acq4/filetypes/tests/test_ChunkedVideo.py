@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+
+import h5py
+import numpy as np
+import pyqtgraph as pg
+import pytest
+
+import acq4.util.DataManager as dm
+from acq4.filetypes.ChunkedVideo import ChunkedVideo, ChunkedVideoWriter, ChunkedVideoReader
+
+
+def test_write_and_read_back():
+    root = tempfile.mkdtemp()
+    try:
+        dh = dm.getDirHandle(root)
+        writer = ChunkedVideoWriter((6, 5), np.uint16, chunkFrames=4, preallocate=8)
+        fh = dh.writeFile(writer, 'video.h5', fileType='ChunkedVideo', info={'exposure': 0.01})
+        frames = np.arange(21 * 6 * 5, dtype=np.uint16).reshape(21, 6, 5)
+        transforms = []
+        for i in range(21):
+            tr = pg.SRTTransform3D()
+            tr.translate(i, 2 * i, 0)
+            transforms.append(tr)
+        # append in uneven batches to exercise chunk accumulation and dataset growth
+        for start, stop in [(0, 3), (3, 10), (10, 11), (11, 21)]:
+            writer.append(frames[start:stop], np.arange(start, stop) * 0.1, transforms[start:stop])
+        assert writer.close() == 21
+
+        assert fh.info()['exposure'] == 0.01
+        video = fh.read()
+        assert isinstance(video, ChunkedVideoReader)
+        assert video.shape == (21, 6, 5)
+        assert np.all(video[5] == frames[5])
+        assert np.all(video[3:17] == frames[3:17])
+        assert np.allclose(video.times(), np.arange(21) * 0.1)
+        assert np.allclose(video.translations()[7], [7, 14, 0])
+
+        ma = video.asMetaArray()
+        assert ma.axisName(0) == 'Time'
+        assert np.all(ma.asarray() == frames)
+        video.close()
+
+        # a closed reader reopens on access; the with block closes it again
+        with fh.read() as video:
+            assert np.all(video.readFrame(4) == frames[4])
+        assert video._file is None
+        assert np.all(video.readFrame(6) == frames[6])
+        assert video._file is None
+        with h5py.File(fh.name(), 'r+'):
+            pass
+    finally:
+        shutil.rmtree(root)
+
+
+def test_other_hdf5_files_are_not_claimed():
+    root = tempfile.mkdtemp()
+    try:
+        dh = dm.getDirHandle(root)
+        with h5py.File(os.path.join(root, 'noise.h5'), 'w') as f:
+            f.create_dataset('psd', data=np.zeros((3, 4)))
+        dh.indexFile('noise.h5')
+        assert dh['noise.h5'].fileType() != 'ChunkedVideo'
+        assert ChunkedVideo.acceptsFile(dh['noise.h5']) is False
+
+        writer = ChunkedVideoWriter((2, 2), np.uint16)
+        fh = dh.writeFile(writer, 'video.h5', fileType='ChunkedVideo')
+        writer.close()
+        assert ChunkedVideo.acceptsFile(fh) == ChunkedVideo.priority
+    finally:
+        shutil.rmtree(root)
+
+
+def test_plugin_compression_without_hdf5plugin(monkeypatch):
+    import acq4.filetypes.ChunkedVideo as cv
+    monkeypatch.setattr(cv, 'HAVE_HDF5PLUGIN', False)
+    with pytest.raises(ImportError, match='hdf5plugin'):
+        ChunkedVideoWriter((2, 2), np.uint16, compression='lz4')
@@ -1,18 +1,24 @@
 from __future__ import print_function
-import time, weakref, collections
+import os, time, weakref, collections, threading
 import numpy as np
-from MetaArray import MetaArray
 
 from acq4.util import Qt
 
 from acq4.modules.Module import Module
 import acq4.util.InterfaceCombo  # just to register 'interface' parameter type
 from acq4.util.DataManager import getDirHandle
+from acq4.util.debug import printExc
+from acq4.util.noise_record import NoiseRecord, NoiseRecordWriter, WelchAccumulator
+from acq4.util.Thread import Thread
 import pyqtgraph as pg
 
 
 class NoiseMonitor(Module):
     """ Used to monitor electrical noise over long time periods.
+
+    Traces are acquired and analyzed in a background thread. For each trace, every channel appends a summary
+    row (min/mean/max/std/RMS), a Welch PSD and a decimated copy of the raw data to a single chunked HDF5
+    file (noise.h5) in its record directory.
     """
     moduleDisplayName = "Noise Monitor"
     moduleCategory = "Utilities"
@@ -45,6 +51,8 @@ class NoiseMonitor(Module):
             dict(name='interval', type='float', value=10, suffix='s', siPrefix=True, limits=[0.001, None], step=1.0),
             dict(name='trace duration', type='float', value=1.0, suffix='s', siPrefix=True, limits=[0.001, None], step=0.1),
             dict(name='sample rate', type='int', value=1e6, suffix='Hz', siPrefix=True, limits=[100, None], step=1e5),
+            dict(name='PSD segment', type='int', value=2048, limits=[16, None]),
+            dict(name='raw points', type='int', value=10000, limits=[100, None]),
         ])
         self.ptree = pg.parametertree.ParameterTree()
         self.ptree.setParameters(self.params)
@@ -56,19 +64,10 @@ class NoiseMonitor(Module):
         self.channels = collections.OrderedDict()
 
         self.win.show()
-        
-        self.timer = Qt.QTimer()
-        self.timer.timeout.connect(self.runOnce)
 
-    def runOnce(self):
-        if self.running:
-            return
-        self.running = True
-        try:
-            for w in self.channels.values():
-                w.runOnce()
-        finally:
-            self.running = False
+        self.thread = NoiseMonitorThread(self)
+        self.thread.sigTraceAnalyzed.connect(self.traceAnalyzed)
+        self.thread.finished.connect(self.threadStopped)
 
     def startToggled(self, start):
         if start:
@@ -77,18 +76,30 @@ class NoiseMonitor(Module):
                     self.newRecord()
                 if self.startTime is None:
                     self.startTime = time.time()
-                self.timer.start(self.params['interval'] * 1000)
-                self.runOnce()
+                self.thread.start()
             except:
                 self.startBtn.setChecked(False)
                 raise
             
             self.startBtn.setText('Stop')
         else:
-            self.timer.stop()
+            self.thread.stop()
             self.startBtn.setText('Start')
 
+    def threadStopped(self):
+        ## the thread may already have been restarted by newRecord() by the time this signal arrives
+        if not self.thread.isRunning():
+            self.startBtn.setChecked(False)
+
+    def traceAnalyzed(self, dev):
+        w = self.channels.get(dev, None)
+        if w is not None:
+            w.newTrace()
+
     def newRecord(self):
+        ## pause the thread while channels are replaced, then keep monitoring into the new record
+        wasRunning = self.thread.isRunning()
+        self.thread.stop(block=True)
         self.recordDir = self.manager.getCurrentDir().mkdir('NoiseMonitor', autoIncrement=True)
         self.recordWritable = True
         self.updateFileLabel()
@@ -97,8 +108,14 @@ class NoiseMonitor(Module):
 
         for dev in self.config['devices']:
             w = self.addChannel(dev, mode=self.config['devices'][dev]['mode'], recordDir=self.recordDir)
+
+        if wasRunning:
+            self.startTime = time.time()
+            self.thread.start()
         
     def loadClicked(self):
+        self.startBtn.setChecked(False)
+        self.thread.stop(block=True)
         try:
             startDir = self.manager.getCurrentDir()
         except Exception:
@@ -124,10 +141,61 @@ class NoiseMonitor(Module):
 
     def clearChannels(self):
         for w in self.channels.values():
+            w.close()
             w.hide()
             w.setParent(None)
         self.channels = collections.OrderedDict()
 
+    def quit(self):
+        self.thread.stop(block=True)
+        self.clearChannels()
+        Module.quit(self)
+
+
+class NoiseMonitorThread(Thread):
+    """Acquires a trace from every channel, then sleeps until *interval* seconds after the previous cycle began.
+
+    Analysis and storage also happen in this thread; the GUI is only notified through sigTraceAnalyzed.
+    Errors from a single acquisition are logged and monitoring continues; only stop() ends the thread.
+    """
+
+    sigTraceAnalyzed = Qt.Signal(object)  # device name
+
+    def __init__(self, mod):
+        Thread.__init__(self, name='NoiseMonitorThread')
+        self.mod = weakref.ref(mod)
+        self._stopEvent = threading.Event()
+
+    def start(self):
+        if self.isRunning():
+            return
+        self._stopEvent.clear()
+        Thread.start(self)
+
+    def stop(self, block=False):
+        self._stopEvent.set()
+        if block:
+            self.wait()
+
+    def run(self):
+        while not self._stopEvent.is_set():
+            mod = self.mod()
+            if mod is None:
+                break
+            params = {p.name(): p.value() for p in mod.params.children()}
+            cycleStart = time.time()
+            for dev, w in list(mod.channels.items()):
+                if self._stopEvent.is_set():
+                    break
+                try:
+                    w.runOnce(params, mod.startTime)
+                except Exception:
+                    printExc("Error acquiring noise trace from %s:" % dev)
+                    continue
+                self.sigTraceAnalyzed.emit(dev)
+            del mod
+            self._stopEvent.wait(max(0.0, cycleStart + params['interval'] - time.time()))
+
 
 class ChannelRecorder(Qt.QSplitter):
     def __init__(self, mod, dev, mode, recordDir):
@@ -146,9 +214,8 @@ class ChannelRecorder(Qt.QSplitter):
         else:
             self.units = 'V'
 
-        self.rawDataFile = None
-        self.envelopeFile = None
-        self.spectrogramFile = None
+        self.writer = None
+        self.record = None
         self.resetDisplay = True
         self.showNewRecords = True
 
@@ -184,29 +251,24 @@ class ChannelRecorder(Qt.QSplitter):
             self.loadRecord()
 
     def loadRecord(self):
-        self.rawDataFile = self.recordDir['rawData.ma']
-        self.envelopeFile = self.recordDir['envelope.ma']
-        self.spectrogramFile = self.recordDir['spectrogram.ma']
+        self.record = NoiseRecord(self.recordDir['noise.h5'].name())
         self.resetDisplay = True
         self.plotAnalysis()
         self.envLine.setValue(0)
 
     def lineDragged(self):
         self.showNewRecords = self.envLine.value() >= self.envLine.bounds()[1]
-        data = self.rawDataFile.read(readAllData=False)
-        tvals = data.xvals('Trial')
+        tvals = self.record.times()
         ind = np.argwhere(tvals >= self.envLine.value())[0,0]
         self.specLine.setValue(tvals[-1] * ind / len(tvals))
-        self.plotRawData(data['Trial': ind])
-        
-        # workaround for h5py bug that leaves file handles open
-        data._data.file.close()
+        self.plotRawData(ind)
 
-    def runOnce(self):
+    def runOnce(self, params, startTime):
+        """Acquire and analyze one trace, and append it to the record. Called from NoiseMonitorThread."""
         dev = self.dev
         mode = self.mode
-        dur = self.mod().params['trace duration']
-        rate = self.mod().params['sample rate']
+        dur = params['trace duration']
+        rate = params['sample rate']
         npts = int(dur * rate)
         cmd = {
             'protocol': {'duration': dur},
@@ -216,77 +278,43 @@ class ChannelRecorder(Qt.QSplitter):
         task = self.mod().manager.createTask(cmd)
         task.execute()
         result = task.getResult()
-        
-        trialArr = np.array([time.time() - self.mod().startTime])
-        
-        # Raw data plot/storage
-        data = result[dev]['Channel': 'primary']
-        dataArr = data.asarray()
-        
-        # inject random noise for testing
-        # dataArr += np.random.normal(size=len(dataArr), scale=1e-9)
-        # if np.random.random() > 0.9:
-        #     dataArr += np.sin(np.linspace(0, 1000 * np.random.random(), len(dataArr))) * 1e-9
 
+        trialTime = time.time() - startTime
+        dataArr = result[dev]['Channel': 'primary'].asarray()
+
+        if self.writer is None:
+            self.writer = NoiseRecordWriter(
+                os.path.join(self.recordDir.name(), 'noise.h5'), nFreq=params['PSD segment'] // 2 + 1,
+                rawPoints=params['raw points'], units=self.units)
+            self.record = self.writer.reader()
+            if not self.recordDir.isManaged('noise.h5'):
+                self.recordDir.indexFile('noise.h5')
+
+        # the PSD segment length is fixed for the lifetime of a record
+        acc = WelchAccumulator(rate, nperseg=self.writer.nperseg)
+        acc.add(dataArr)
+        self.writer.append(trialTime, dataArr, acc)
+
+    def newTrace(self):
+        ## a trace analyzed before "New Record" may arrive after this recorder was created; it has no data yet
+        if self.record is None:
+            return
         # plot raw data only if envelope line is at max position
+        trialTime = self.record.times()[-1]
         if self.showNewRecords:
-            self.plotRawData(data)
-            self.envLine.setValue(trialArr[0])
-            self.specLine.setValue(trialArr[0])
-        
-        ma = MetaArray(dataArr[np.newaxis, :], info=[
-            {'name': 'Trial', 'units': 's', 'values': trialArr}] + data._info)
-
-        if self.rawDataFile is None:
-            self.rawDataFile = self.recordDir.writeFile(ma, 'rawData', appendAxis='Trial', newFile=True)
-        else:
-            ma.write(self.rawDataFile.name(), appendAxis='Trial')
-
-
-        # Envelope analysis
-        envData = np.array([[dataArr.min(), dataArr.mean(), dataArr.max(), dataArr.std()]])
-        env = MetaArray(envData, info=[
-            {'name': 'Trial', 'units': 's', 'values': trialArr},
-            {'name': 'Metric', 'units': self.units}])
-        if self.envelopeFile is None:
-            self.envelopeFile = self.recordDir.writeFile(env, 'envelope', appendAxis='Trial', newFile=True)
-        else:
-            env.write(self.envelopeFile.name(), appendAxis='Trial')
-
-
-        # Spectrum analysis
-        fft = np.abs(np.fft.fft(dataArr))
-        fft = fft[:int(len(fft)/2)]
-        freqArr = np.linspace(0, rate/2., len(fft))
-
-        # downsample spectrogram
-        ds = len(fft) // 1000
-        fft = fft[:ds*1000].reshape(1000, ds).max(axis=1)
-        freqArr = freqArr[:ds*1000:ds]
-
-        # log scale for pretty
-        fft = np.log10(fft)
-
-        spec = MetaArray(fft[np.newaxis, :], info=[
-            {'name': 'Trial', 'units': 's', 'values': trialArr},
-            {'name': 'Frequency', 'units': 'Hz', 'values': freqArr}])
-        if self.spectrogramFile is None:
-            self.spectrogramFile = self.recordDir.writeFile(spec, 'spectrogram', appendAxis='Trial', newFile=True)
-        else:
-            spec.write(self.spectrogramFile.name(), appendAxis='Trial')
-                        
+            self.plotRawData(-1)
+            self.envLine.setValue(trialTime)
+            self.specLine.setValue(trialTime)
         self.plotAnalysis()
-            
-    def plotRawData(self, data=None):
-        if data is None:
-            data = self.rawDataFile.read()['Trial': -1]
-        self.plot.plot(data.xvals('Time'), data.asarray(), clear=True)
+
+    def plotRawData(self, index=-1):
+        tvals, data = self.record.raw(index)
+        self.plot.plot(tvals, data, clear=True)
         
     def plotAnalysis(self):
         # update envelope
-        envelope = self.envelopeFile.read()
-        trials = envelope.xvals('Trial')
-        envArr = envelope.asarray()
+        trials = self.record.times()
+        envArr = self.record.envelope()
         self.envelopePlot.clear()
         self.envelopePlot.addItem(self.envLine)
         grey = (255, 255, 255, 100)
@@ -301,19 +329,24 @@ class ChannelRecorder(Qt.QSplitter):
 
         self.envelopePlot.plot(trials, envArr[:,1])  # mean
 
-        # update spectrogram
-        specData = self.spectrogramFile.read()
-        specArr = specData.asarray()
+        # update spectrogram (log scale for pretty)
+        psd, freqs = self.record.psd()
+        specArr = np.log10(np.clip(psd, np.finfo(psd.dtype).tiny, None))
         self.spectrogram.setImage(specArr, autoLevels=self.resetDisplay, autoRange=True, 
-                                  scale=(trials[-1] / specArr.shape[0], specData.xvals('Frequency')[-1] / specArr.shape[1]))
+                                  scale=(trials[-1] / specArr.shape[0], freqs[-1] / specArr.shape[1]))
         
         self.envLine.setBounds([0, trials[-1]])
         
         self.resetDisplay = False
-        
-    def quit(self):
-        self.startBtn.setChecked(False)
-        Module.quit(self)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        elif self.record is not None:
+            self.record.close()
+        self.record = None
+        return Qt.QSplitter.close(self)
 
     
 
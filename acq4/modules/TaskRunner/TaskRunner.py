@@ -3,10 +3,11 @@ from collections import OrderedDict
 from functools import reduce
 
 import gc
-import numpy as np
 import os
+import queue
 import six
 import sys
+import threading
 import time
 
 import acq4.util.DirTreeWidget as DirTreeWidget
@@ -83,6 +84,10 @@ class TaskRunner(Module):
         # Since most modern systems have adequate memory, this is now disabled by default.
         self._reduceMemoryUsage = config.get('reduceMemoryUsage', False)
 
+        # If set, sequences are pipelined: the task for the next point is created while the current one runs,
+        # and results are written to disk in a background thread (see TaskThread.runPipelined).
+        self._pipelineSequences = config.get('pipelineSequences', False)
+
         self.lastProtoTime = None
         self.loopEnabled = False
         self.devListItems = {}
@@ -962,6 +967,8 @@ class TaskThread(Thread):
         self._currentTask = None
         self._currentFuture = None
         self._systrace = None
+        self._prefetched = None  # (params, task) created ahead of time by runPipelined()
+        self._resultWriter = None
 
     def startTask(self, task, paramSpace=None):
         with self.lock:
@@ -1003,6 +1010,8 @@ class TaskThread(Thread):
                 except Exception as e:
                     if e.args[0] != 'stop':
                         raise
+            elif self.ui._pipelineSequences:
+                self.runPipelined()
             else:
                 runSequence(self.runOnce, self.paramSpace, list(self.paramSpace.keys()))
 
@@ -1016,8 +1025,51 @@ class TaskThread(Thread):
         else:
             self._currentFuture._taskDone()
             self._currentFuture = None
+        finally:
+            self._prefetched = None
+
+    def runPipelined(self):
+        """Run a task sequence, overlapping per-task overhead with hardware execution.
+
+        While each task runs, the task for the next point in the sequence is created ahead of time, and
+        results of finished tasks are written to disk by a background thread instead of the task thread.
+        """
+        points = []
+        runSequence(points.append, self.paramSpace, list(self.paramSpace.keys()))
+
+        writer = _ResultWriter()
+        self._resultWriter = writer
+        try:
+            for i, params in enumerate(points):
+                nextParams = points[i + 1] if i + 1 < len(points) else None
+                try:
+                    self.runOnce(params, nextParams=nextParams)
+                except Exception as e:
+                    if len(e.args) > 0 and e.args[0] == 'stop':
+                        break
+                    raise
+        finally:
+            self._resultWriter = None
+            errors = writer.close()
+        if len(errors) > 0:
+            raise Exception("Failed to store results for %d task(s); see error log." % len(errors))
 
-    def runOnce(self, params=None):
+    def _selectCommand(self, params):
+        cmd = self.task
+        for p in params:
+            cmd = cmd[p: params[p]]
+        return cmd
+
+    def _prefetchTask(self, params):
+        ## Create the next task in the sequence while the current one is running.
+        ## Failures are ignored here; they are raised again when the task is created for real.
+        self._prefetched = None
+        try:
+            self._prefetched = (params, self.dm.createTask(self._selectCommand(params)))
+        except Exception:
+            pass
+
+    def runOnce(self, params=None, nextParams=None):
         # good time to collect garbage
         if self.ui._reduceMemoryUsage:
             gc.collect()
@@ -1027,10 +1079,7 @@ class TaskThread(Thread):
             params = {}
 
         ## Select correct command to execute
-        cmd = self.task
-        if params is not None:
-            for p in params:
-                cmd = cmd[p: params[p]]
+        cmd = self._selectCommand(params)
         prof.mark('select command')
 
         ## Wait before starting if we've already run too recently
@@ -1067,7 +1116,11 @@ class TaskThread(Thread):
                 "TaskRunner.runOnce failed to generate a proper command structure. Object type was '%s', should have been 'dict'." % type(
                     cmd))
 
-        task = self.dm.createTask(cmd)
+        if self._prefetched is not None and self._prefetched[0] == params:
+            task = self._prefetched[1]
+        else:
+            task = self.dm.createTask(cmd)
+        self._prefetched = None
         prof.mark('create task')
 
         self.lastRunTime = ptime.time()
@@ -1076,10 +1129,11 @@ class TaskThread(Thread):
             with self.lock:
                 self._currentTask = task
             task.execute(block=False)
-            # record estimated end time
-            endTime = time.time() + cmd['protocol']['duration']
             self.sigTaskStarted.emit(params)
             prof.mark('execute')
+            if nextParams is not None:
+                self._prefetchTask(nextParams)
+                prof.mark('prefetch next task')
         except Exception as exc:
             with self.lock:
                 self._currentTask = None
@@ -1093,8 +1147,9 @@ class TaskThread(Thread):
 
         try:
             ## wait for finish, watch for abort requests
+            ## (abort() interrupts the wait so that we can respond immediately)
             while True:
-                if task.isDone():
+                if task.wait():
                     prof.mark('task done')
                     break
                 with self.lock:
@@ -1103,11 +1158,12 @@ class TaskThread(Thread):
                         # NO -- task.stop() is not thread-safe.
                         task.stop(abort=True)
                         return
-                # adjust sleep time based on estimated time remaining in the task.
-                sleep = np.clip((endTime - time.time()) * 0.5, 1e-3, 20e-3)
-                time.sleep(sleep)
 
-            result = task.getResult()
+            ## In pipelined sequences, data is stored by a background thread
+            writer = self._resultWriter
+            result = task.getResult(storeData=writer is None)
+            if writer is not None:
+                writer.add(task)
         except:
             ## Make sure the task is fully stopped if there was a failure at any point.
             # printExc("\nError during task execution:")
@@ -1153,6 +1209,40 @@ class TaskThread(Thread):
                 # bad idea -- task.stop() is not thread-safe; must ask the task thread to stop.
                 # self._currentTask.stop(abort=True)
                 self.abortThread = True
+                self._currentTask.interruptWait()
+
+
+class _ResultWriter:
+    """Stores the results of finished tasks from a background thread.
+
+    The queue is bounded so that results cannot pile up in memory if storage is slower than acquisition.
+    """
+
+    def __init__(self, maxQueueSize=4):
+        self._queue = queue.Queue(maxsize=maxQueueSize)
+        self.errors = []
+        self._thread = threading.Thread(target=self._run, daemon=True, name='TaskResultWriter')
+        self._thread.start()
+
+    def add(self, task):
+        self._queue.put(task)
+
+    def close(self):
+        """Wait for all queued results to be stored; return a list of any errors raised."""
+        self._queue.put(None)
+        self._thread.join()
+        return self.errors
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            try:
+                task.storeResult()
+            except Exception as exc:
+                printExc("Error storing task result:")
+                self.errors.append(exc)
 
 
 class TaskFuture(Future):
@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+from unittest.mock import MagicMock
+
+import pyqtgraph as pg
+
+from acq4.Manager import Task
+from acq4.devices.Device import DeviceTask
+from acq4.modules.TaskRunner.TaskRunner import TaskThread
+from acq4.util.SequenceRunner import runSequence
+
+pg.mkQApp()
+
+
+class LoggingTask(DeviceTask):
+    def __init__(self, dev, cmd, parentTask):
+        DeviceTask.__init__(self, dev, cmd, parentTask)
+        self.cmd = cmd
+        self.log = cmd['log']
+        self.log.append(('create', cmd['x']))
+
+    def start(self):
+        self.log.append(('start', self.cmd['x']))
+
+    def getResult(self):
+        return self.cmd['x']
+
+    def storeResult(self, dirHandle):
+        self.log.append(('store', self.cmd['x'], threading.current_thread().name))
+
+
+def test_pipelined_sequence():
+    log = []
+    dev = MagicMock()
+    dev.createTask = lambda cmd, parent: LoggingTask(dev, cmd, parent)
+    dm = MagicMock()
+    dm.getDevice.return_value = dev
+    dm.createTask = lambda cmd: Task(dm, cmd)
+
+    ui = MagicMock()
+    ui.manager = dm
+    ui._reduceMemoryUsage = False
+    ui._pipelineSequences = True
+
+    key = ('dev', 'x')
+    paramSpace = OrderedDict([(key, [0, 1, 2])])
+    protocol = {'duration': 0, 'cycleTime': 0, 'storeData': True, 'storageDir': MagicMock()}
+    cmds = runSequence(lambda p: {'protocol': protocol, 'dev': {'x': p[key], 'log': log}}, paramSpace, [key])
+
+    thread = TaskThread(ui)
+    future = thread.startTask(cmds, paramSpace)
+    assert thread.wait(5000)
+    assert future.isDone() and not future.wasInterrupted()
+
+    # each task is created while the previous one is running
+    for x in (1, 2):
+        assert log.index(('create', x)) < log.index(('start', x))
+        assert log.index(('create', x)) > log.index(('start', x - 1))
+
+    # all results are stored, from the background writer thread
+    stores = [entry for entry in log if entry[0] == 'store']
+    assert [entry[1] for entry in stores] == [0, 1, 2]
+    assert all(entry[2] == 'TaskResultWriter' for entry in stores)
@@ -8,9 +8,11 @@ to easily store and retrieve data files along with metadata. The objects
 probably only need to be created via functions in the Manager class.
 """
 import contextlib
+import heapq
 import os
 import re
 import shutil
+import threading
 import time
 import weakref
 from collections import OrderedDict
@@ -22,6 +24,7 @@ from acq4.util.Mutex import Mutex
 from acq4.util.debug import printExc
 from pyqtgraph import SignalProxy, BusyCursor
 from pyqtgraph.configfile import readConfigFile, writeConfigFile, appendConfigFile
+from .log_file import LogWriter, iterLogFile
 
 if not hasattr(Qt.QtCore, 'Signal'):
     Qt.Signal = Qt.pyqtSignal
@@ -79,6 +82,42 @@ class DataManager(Qt.QObject):
         DataManager.INSTANCE = self
         self.cache = {}
         self.lock = Mutex(Qt.QMutex.Recursive)
+        self.indexCache = None
+
+    def setIndexCache(self, fileName):
+        """Use a persistent cache of parsed index files stored at *fileName* (see IndexCache).
+
+        If *fileName* is None, the cache is disabled.
+        """
+        from .index_cache import IndexCache
+
+        with self.lock:
+            if self.indexCache is not None:
+                self.indexCache.close()
+            self.indexCache = None if fileName is None else IndexCache(fileName)
+
+    def warmIndexCache(self, root, background=True):
+        """Parse and cache all index files below *root*.
+
+        If *background* is True, this runs in a daemon thread and the thread is returned.
+        """
+        if self.indexCache is None:
+            raise RuntimeError("No index cache configured; see setIndexCache().")
+        if not background:
+            return self.indexCache.warm(root)
+        thread = threading.Thread(target=self.indexCache.warm, args=(root,), daemon=True, name='IndexCacheWarmup')
+        thread.start()
+        return thread
+
+    def indexCacheBatch(self):
+        """Return a context manager that groups index cache writes made inside it into a single commit.
+
+        This is a no-op if no index cache is configured.
+        """
+        cache = self.indexCache
+        if cache is None:
+            return contextlib.nullcontext()
+        return cache.batch()
         
     def getDirHandle(self, dirName, create=False):
         with self.lock:
@@ -123,6 +162,16 @@ class DataManager(Qt.QObject):
         ## No signals; handles should explicitly inform the manager of changes
         #Qt.QObject.connect(handle, Qt.SIGNAL('changed'), self._handleChanged)
         
+    def _closeLogs(self, path):
+        """Close any open log files in the tree beneath *path* (they must be closed before moving or deleting)."""
+        with self.lock:
+            if not self._cacheHasName(path):
+                return
+            for h in self._getTree(path):
+                handle = self._getCache(h)
+                if isinstance(handle, DirHandle):
+                    handle.closeLog()
+
     def _handleChanged(self, handle, change, *args):
         with self.lock:
             if change in ['renamed', 'moved']:
@@ -272,6 +321,7 @@ class FileHandle(Qt.QObject):
             if oldDir.isManaged() and not newDir.isManaged():
                 raise ValueError("Not moving managed file to unmanaged location--this would cause loss of meta info.")
 
+            self.manager._closeLogs(fn1)
             os.rename(fn1, fn2)
             self.path = fn2
             self.parentDir = None
@@ -308,6 +358,7 @@ class FileHandle(Qt.QObject):
             if managed:
                 info = parent._fileInfo(oldName)
                 parent.forget(oldName)
+            self.manager._closeLogs(fn1)
             os.rename(fn1, fn2)
             self.path = fn2
             self.manager._handleChanged(self, 'renamed', fn1, fn2)
@@ -328,6 +379,7 @@ class FileHandle(Qt.QObject):
             if self.isFile():
                 os.remove(fn1)
             else:
+                self.manager._closeLogs(fn1)
                 shutil.rmtree(fn1)
             self.manager._handleChanged(self, 'deleted', fn1)
             self.path = None
@@ -429,6 +481,7 @@ class DirHandle(FileHandle):
         self.lsCache = {}  # sortMode: [files...]
         self.cTimeCache = {}
         self._indexFileExists = False
+        self._logWriter = None
 
         if not os.path.isdir(self.path) and create:
             os.mkdir(self.path)
@@ -464,40 +517,48 @@ class DirHandle(FileHandle):
             tags['__timestamp__'] = time.time()
             tags['__message__'] = str(msg)
 
-            fd = open(self._logFile(), 'a')
-            fd.write("%s\n" % repr(tags))
-            fd.close()
+            logFile = self._logFile()
+            if self._logWriter is None or self._logWriter.fileName != logFile:
+                self.closeLog()
+                self._logWriter = LogWriter(logFile)
+            self._logWriter.write(tags)
             self.emitChanged('log', tags)
 
-    def readLog(self, recursive=0):
-        """Return a list containing one dict for each log line"""
+    def closeLog(self):
+        """Flush and close the log file if it is open. It is reopened by the next call to logMsg()."""
         with self.lock:
-            logf = self._logFile()
-            if not os.path.exists(logf):
-                log = []
-            else:
-                try:
-                    fd = open(logf, 'r')
-                    lines = fd.readlines()
-                    fd.close()
-                    log = [eval(l.strip()) for l in lines]
-                except:
-                    print("****************** Error reading log file %s! *********************" % logf)
-                    raise
+            if self._logWriter is not None:
+                self._logWriter.close()
+                self._logWriter = None
 
-            if recursive > 0:
-                for d in self.subDirs():
-                    dh = self[d]
-                    subLog = dh.readLog(recursive=recursive-1)
-                    for msg in subLog:
-                        if 'subdir' not in msg:
-                            msg['subdir'] = ''
-                        msg['subdir'] = os.path.join(dh.shortName(), msg['subdir'])
-                    log  = log + subLog
-                log.sort(key=lambda a: a['__timestamp__'])
+    def readLog(self, recursive=0, startTime=None, stopTime=None, tags=None):
+        """Return a list containing one dict for each log line, sorted by time.
 
+        If *recursive* > 0, logs from subdirectories (up to that depth) are merged in, and each of their
+        messages is given a 'subdir' key. Messages may be restricted to startTime <= timestamp < stopTime,
+        and to those whose tags include all of the key/value pairs in *tags*.
+        """
+        with self.lock:
+            return list(self._iterLog(recursive, startTime, stopTime, tags))
+
+    def _iterLog(self, recursive, startTime, stopTime, tags):
+        log = iterLogFile(self._logFile(), startTime=startTime, stopTime=stopTime, tags=tags)
+        if recursive <= 0:
             return log
 
+        ## each log is already in time order, so they only need to be merged
+        logs = [log]
+        for d in self.subDirs():
+            dh = self[d]
+            logs.append(self._tagSubdir(dh._iterLog(recursive - 1, startTime, stopTime, tags), dh.shortName()))
+        return heapq.merge(*logs, key=lambda a: a['__timestamp__'])
+
+    @staticmethod
+    def _tagSubdir(log, name):
+        for msg in log:
+            msg['subdir'] = os.path.join(name, msg.get('subdir', ''))
+            yield msg
+
     def subDirs(self):
         """Return a list of string names for all sub-directories."""
         with self.lock:
@@ -595,8 +656,8 @@ class DirHandle(FileHandle):
                 files.remove(i)
 
         if sortMode == 'date':
-            # Sort files by creation time
-            with BusyCursor():
+            # Sort files by creation time; this may read the index of every subdirectory
+            with BusyCursor(), self.manager.indexCacheBatch():
                 for f in files:
                     if f not in self.cTimeCache:
                         self.cTimeCache[f] = self._getFileCTime(f)
@@ -807,7 +868,7 @@ class DirHandle(FileHandle):
         for f in self:
             if f.fileType() == "ImageFile" and 'background' not in f.shortName().lower():
                 frames.append(Frame.loadFromFileHandle(f))
-            elif f.fileType() == "MetaArray" and 'pixelSize' in f.info():
+            elif f.fileType() in ("MetaArray", "ChunkedVideo") and 'pixelSize' in f.info():
                 frame_s = Frame.loadFromFileHandle(f)
                 if not isinstance(frame_s, Frame):
                     frame_s = frame_s[find_surface(frame_s) or len(frame_s) // 2]
@@ -849,8 +910,12 @@ class DirHandle(FileHandle):
                     else:
                         raise Exception("Directory '%s' is not managed!" % (self.name()))
                 try:
-                    self._index = readConfigFile(indexFile)
                     self._indexMTime = os.path.getmtime(indexFile)
+                    cache = self.manager.indexCache
+                    if cache is None:
+                        self._index = readConfigFile(indexFile)
+                    else:
+                        self._index = cache.read(abspath(indexFile))
                 except:
                     print("***************Error while reading index file %s!*******************" % indexFile)
                     raise
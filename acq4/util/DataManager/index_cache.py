@@ -0,0 +1,179 @@
+"""
+Persistent cache of parsed directory index files.
+
+Each managed directory stores its meta-info in a text ``.index`` file that is slow to parse. IndexCache keeps
+the parsed contents in a single sqlite database keyed by the absolute path of the index file, together with the
+file's modification time and size. An entry is used only if both still match the file on disk, so edits made
+outside of ACQ4 (or by another ACQ4 instance) are always picked up.
+
+The cache can be warmed ahead of time from the command line::
+
+    python -m acq4.util.DataManager.index_cache --cache /path/to/index_cache.sqlite /path/to/data
+"""
+import argparse
+import contextlib
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+
+from pyqtgraph.configfile import readConfigFile
+
+
+class IndexCache:
+    """Sqlite-backed cache of parsed ``.index`` files.
+
+    Parameters
+    ----------
+    fileName : str
+        Path of the sqlite database. It is created if it does not exist.
+    """
+
+    def __init__(self, fileName):
+        self.fileName = os.path.abspath(fileName)
+        dirName = os.path.dirname(self.fileName)
+        if not os.path.isdir(dirName):
+            os.makedirs(dirName)
+        self._lock = threading.Lock()
+        self._batchDepth = 0
+        self._dirty = False
+        self._db = sqlite3.connect(self.fileName, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS indexes (path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, data BLOB)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _stat(indexFile):
+        st = os.stat(indexFile)
+        return st.st_mtime_ns, st.st_size
+
+    def get(self, indexFile):
+        """Return the cached contents of *indexFile*, or None if there is no valid cache entry."""
+        try:
+            mtime, size = self._stat(indexFile)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM indexes WHERE path=? AND mtime=? AND size=?", (indexFile, mtime, size)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            # written by an incompatible version; treat as a miss
+            return None
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Context manager that defers committing new entries until the outermost batch exits.
+
+        Batches may be nested and may be entered from several threads; warm() and DataManager directory listings
+        use this so that a pass over many index files costs a single sqlite commit.
+        """
+        with self._lock:
+            self._batchDepth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batchDepth -= 1
+                if self._batchDepth == 0 and self._dirty:
+                    self._db.commit()
+                    self._dirty = False
+
+    def put(self, indexFile, index):
+        """Store the parsed contents of *indexFile*.
+
+        The entry is committed immediately unless a batch() is active.
+        """
+        try:
+            mtime, size = self._stat(indexFile)
+            data = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO indexes (path, mtime, size, data) VALUES (?, ?, ?, ?)",
+                (indexFile, mtime, size, data),
+            )
+            if self._batchDepth == 0:
+                self._db.commit()
+            else:
+                self._dirty = True
+
+    def read(self, indexFile):
+        """Return the contents of *indexFile*, parsing it and updating the cache only if necessary."""
+        index = self.get(indexFile)
+        if index is None:
+            index = readConfigFile(indexFile)
+            self.put(indexFile, index)
+        return index
+
+    def warm(self, root, progress=None):
+        """Parse and cache every ``.index`` file below *root* that is not already cached.
+
+        If given, *progress* is called as ``progress(indexFile, cached)`` for every index file found, where
+        *cached* is True if the entry was already valid. Returns the number of index files that were parsed.
+        """
+        parsed = 0
+        with self.batch():
+            for dirPath, dirNames, fileNames in os.walk(root):
+                if '.index' not in fileNames:
+                    continue
+                indexFile = os.path.normcase(os.path.abspath(os.path.join(dirPath, '.index')))
+                cached = self.get(indexFile) is not None
+                if not cached:
+                    try:
+                        self.put(indexFile, readConfigFile(indexFile))
+                    except Exception as exc:
+                        print(f"Error reading index file {indexFile}: {exc}")
+                    else:
+                        parsed += 1
+                if progress is not None:
+                    progress(indexFile, cached)
+        return parsed
+
+    def prune(self):
+        """Remove entries for index files that no longer exist. Returns the number of entries removed."""
+        with self._lock:
+            paths = [row[0] for row in self._db.execute("SELECT path FROM indexes")]
+        missing = [(p,) for p in paths if not os.path.isfile(p)]
+        with self._lock:
+            self._db.executemany("DELETE FROM indexes WHERE path=?", missing)
+            self._db.commit()
+            self._dirty = False
+        return len(missing)
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+            self._dirty = False
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm the persistent ACQ4 directory index cache.")
+    parser.add_argument('--cache', required=True, help="Path of the index cache database.")
+    parser.add_argument('--prune', action='store_true', help="Remove entries for index files that no longer exist.")
+    parser.add_argument('roots', nargs='+', help="Data directories to scan.")
+    args = parser.parse_args(argv)
+
+    cache = IndexCache(args.cache)
+    if args.prune:
+        print(f"Removed {cache.prune()} stale entries.")
+    for root in args.roots:
+        parsed = cache.warm(root)
+        print(f"{root}: parsed {parsed} index files.")
+    cache.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
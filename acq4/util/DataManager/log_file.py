@@ -0,0 +1,159 @@
+"""
+Reading and writing of the per-directory ``.log`` files.
+
+Each line of a log file holds one message. Messages whose tags are all plain JSON types (str, int, float, bool,
+None, lists and dicts with string keys) are written as JSON objects. Anything else (tuples, numpy scalars, ...)
+would come back as a different type, so those messages use the python ``repr`` of a dict, as older files do;
+both formats are read back with the original types.
+Because messages are appended in time order, a time range can be located by bisecting on byte offsets instead
+of parsing the whole file.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+_jsonScalarTypes = (str, int, float, bool, type(None))
+
+
+def _isJsonExact(obj):
+    """Return True if *obj* is read back from JSON as an equal object of the same types."""
+    t = type(obj)
+    if t in _jsonScalarTypes:
+        return t is not float or (obj == obj and obj not in (float('inf'), float('-inf')))
+    if t is list:
+        return all(_isJsonExact(v) for v in obj)
+    if t is dict:
+        return all(type(k) is str and _isJsonExact(v) for k, v in obj.items())
+    return False
+
+
+def formatLogLine(entry):
+    if _isJsonExact(entry):
+        return json.dumps(entry)
+    return repr(entry)
+
+
+def parseLogLine(line):
+    line = line.strip()
+    try:
+        return json.loads(line)
+    except ValueError:
+        return eval(line, {'np': np, 'array': np.array})
+
+
+class LogWriter:
+    """Appends messages to a log file that is kept open between writes.
+
+    Every message is flushed to the operating system immediately so that readers always see it, but the
+    (much slower) fsync to disk happens at most once every *fsyncInterval* seconds.
+
+    At most `maxOpenFiles` log files are open at once across all writers; when another one is needed, the
+    least recently written file is closed, and reopened by its writer's next write.
+    """
+
+    maxOpenFiles = 32
+    _lock = threading.RLock()  # guards all writers, so that one can close another's file
+    _openWriters = OrderedDict()  # writer: None, least recently used first
+
+    def __init__(self, fileName, fsyncInterval=1.0):
+        self.fileName = fileName
+        self.fsyncInterval = fsyncInterval
+        self._file = None
+        self._lastSync = time.time()
+
+    def write(self, entry):
+        line = formatLogLine(entry) + '\n'
+        with LogWriter._lock:
+            self._open()
+            self._file.write(line)
+            self._file.flush()
+            now = time.time()
+            if now - self._lastSync > self.fsyncInterval:
+                os.fsync(self._file.fileno())
+                self._lastSync = now
+
+    def close(self):
+        with LogWriter._lock:
+            LogWriter._openWriters.pop(self, None)
+            self._closeFile()
+
+    def _open(self):
+        if self._file is not None:
+            LogWriter._openWriters.move_to_end(self)
+            return
+        while len(LogWriter._openWriters) >= LogWriter.maxOpenFiles:
+            writer, _ = LogWriter._openWriters.popitem(last=False)
+            writer._closeFile()
+        self._file = open(self.fileName, 'a')
+        LogWriter._openWriters[self] = None
+
+    def _closeFile(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+
+def _seekTime(fd, startTime):
+    """Position *fd* at the start of the first line whose timestamp may be >= startTime."""
+    fd.seek(0, os.SEEK_END)
+    lo, hi = 0, fd.tell()
+    # invariant: *lo* is the start of a line, and every line before it is earlier than startTime
+    while hi - lo > 4096:
+        mid = (lo + hi) // 2
+        fd.seek(mid)
+        fd.readline()  # skip partial line
+        pos = fd.tell()
+        line = fd.readline()
+        if not line:
+            hi = mid
+            continue
+        try:
+            t = parseLogLine(line.decode())['__timestamp__']
+        except Exception:
+            break
+        if t < startTime:
+            lo = pos
+        else:
+            hi = mid
+    fd.seek(lo)
+
+
+def iterLogFile(fileName, startTime=None, stopTime=None, tags=None):
+    """Yield the messages in a log file, in file order.
+
+    Parameters
+    ----------
+    startTime, stopTime : float | None
+        Only yield messages with startTime <= timestamp < stopTime.
+    tags : dict | None
+        Only yield messages whose tags include all of these key/value pairs.
+    """
+    if not os.path.exists(fileName):
+        return
+    with open(fileName, 'rb') as fd:
+        if startTime is not None:
+            _seekTime(fd, startTime)
+        for line in fd:
+            line = line.decode()
+            if line.strip() == '':
+                continue
+            try:
+                entry = parseLogLine(line)
+            except Exception:
+                print("****************** Error reading log file %s! *********************" % fileName)
+                raise
+            t = entry.get('__timestamp__', 0)
+            if startTime is not None and t < startTime:
+                continue
+            if stopTime is not None and t >= stopTime:
+                break
+            if tags is not None and any(entry.get(k, None) != v for k, v in tags.items()):
+                continue
+            yield entry
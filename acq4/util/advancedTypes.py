@@ -11,9 +11,64 @@ Includes:
 from __future__ import print_function
 
 import copy
+from collections import OrderedDict
 from collections.abc import Sequence
 
 
+class CaselessDict(OrderedDict):
+    """Case-insensitive dict. Values can be set and retrieved using keys of any case.
+    Note that when iterating, the original case is returned for each key."""
+
+    def __init__(self, *args):
+        OrderedDict.__init__(self)
+        self.keyMap = OrderedDict()
+        if len(args) == 0:
+            return
+        elif len(args) == 1 and isinstance(args[0], dict):
+            for k in args[0]:
+                self[k] = args[0][k]
+        else:
+            raise Exception("CaselessDict may only be instantiated with a single dict.")
+
+    def __setitem__(self, key, val):
+        kl = key.lower()
+        if kl in self.keyMap:
+            OrderedDict.__setitem__(self, self.keyMap[kl], val)
+        else:
+            OrderedDict.__setitem__(self, key, val)
+            self.keyMap[kl] = key
+
+    def __getitem__(self, key):
+        kl = key.lower()
+        if kl not in self.keyMap:
+            raise KeyError(key)
+        return OrderedDict.__getitem__(self, self.keyMap[kl])
+
+    def __contains__(self, key):
+        return key.lower() in self.keyMap
+
+    def __delitem__(self, key):
+        kl = key.lower()
+        if kl not in self.keyMap:
+            raise KeyError(key)
+        OrderedDict.__delitem__(self, self.keyMap[kl])
+        del self.keyMap[kl]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def update(self, d):
+        for k, v in d.items():
+            self[k] = v
+
+    def copy(self):
+        return CaselessDict(OrderedDict(self))
+
+    def clear(self):
+        OrderedDict.clear(self)
+        self.keyMap.clear()
+
+
 ## Template methods
 def wrapMethod(methodName):
     return lambda self, *a, **k: getattr(self._data_, methodName)(*a, **k)
@@ -7,65 +7,55 @@ import acq4.util.DataManager
 import acq4.util.debug as debug
 from acq4 import Manager
 from acq4.util import DataManager, functions
+from acq4.util.advancedTypes import CaselessDict
 from acq4.util.database.database import SqliteDatabase, parseColumnDefs, TableData
 from pyqtgraph.widgets.ProgressDialog import ProgressDialog
 
 
-class CaselessDict(OrderedDict):
-    """Case-insensitive dict. Values can be set and retrieved using keys of any case.
-    Note that when iterating, the original case is returned for each key."""
+class LazyHandle:
+    """Placeholder for a File/DirHandle read from an AnalysisDatabase (see AnalysisDatabase.select(lazyHandles=True)).
 
-    def __init__(self, *args):
-        OrderedDict.__init__(self, {})  ## requirement for the empty {} here seems to be a python bug?
-        self.keyMap = OrderedDict([(k.lower(), k) for k in OrderedDict.keys(self)])
-        if len(args) == 0:
-            return
-        elif len(args) == 1 and isinstance(args[0], dict):
-            for k in args[0]:
-                self[k] = args[0][k]
-        else:
-            raise Exception("CaselessDict may only be instantiated with a single dict.")
-
-    # def keys(self):
-    # return self.keyMap.values()
+    The real handle is only looked up (which requires access to the file system) when one of its
+    methods is used. name() with no arguments is answered without touching the file system.
+    Lazy handles compare equal to the real handle for the same path and hash by path; use resolve()
+    to get the real handle, eg. before mixing them with real handles as dict keys.
+    """
 
-    def __setitem__(self, key, val):
-        kl = key.lower()
-        if kl in self.keyMap:
-            OrderedDict.__setitem__(self, self.keyMap[kl], val)
-        else:
-            OrderedDict.__setitem__(self, key, val)
-            self.keyMap[kl] = key
+    def __init__(self, db, name):
+        self._db = db
+        self._relName = name
+        self._path = os.path.abspath(os.path.join(db.baseDir().name(), db._osPath(name)))
+        self._handle = None
 
-    def __getitem__(self, key):
-        kl = key.lower()
-        if kl not in self.keyMap:
-            raise KeyError(key)
-        return OrderedDict.__getitem__(self, self.keyMap[kl])
+    def resolve(self):
+        if self._handle is None:
+            self._handle = self._db._fileHandle(self._relName)
+        return self._handle
 
-    def __contains__(self, key):
-        return key.lower() in self.keyMap
+    def name(self, relativeTo=None):
+        if relativeTo is None:
+            return self._path
+        return self.resolve().name(relativeTo=relativeTo)
 
-    def update(self, d):
-        for k, v in d.items():
-            self[k] = v
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
 
-    def copy(self):
-        return CaselessDict(OrderedDict.copy(self))
+    def __eq__(self, other):
+        if isinstance(other, LazyHandle):
+            return os.path.normcase(self._path) == os.path.normcase(other._path)
+        if isinstance(other, DataManager.FileHandle):
+            return os.path.normcase(self._path) == os.path.normcase(other.name())
+        return NotImplemented
 
-    def __delitem__(self, key):
-        kl = key.lower()
-        if kl not in self.keyMap:
-            raise KeyError(key)
-        OrderedDict.__delitem__(self, self.keyMap[kl])
-        del self.keyMap[kl]
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
 
-    def __deepcopy__(self, memo):
-        raise Exception("deepcopy not implemented")
+    def __hash__(self):
+        return hash(os.path.normcase(self._path))
 
-    def clear(self):
-        OrderedDict.clear(self)
-        self.keyMap.clear()
+    def __repr__(self):
+        return "<LazyHandle '%s'>" % self._path
 
 
 class AnalysisDatabase(SqliteDatabase):
@@ -90,10 +80,13 @@ class AnalysisDatabase(SqliteDatabase):
     Version = '1'
 
 
-    def __init__(self, dbFile, dataModel, baseDir=None):
+    def __init__(self, dbFile, dataModel, baseDir=None, pragmas=None):
         create = False
         self.tableConfigCache = None
         self.columnConfigCache = CaselessDict()
+        ## identity cache of directories known to be in the DB; cleared whenever rows may have changed
+        self._dirRowIds = {}  ## {DirHandle: (table, rowid)}
+        self._dirHandles = {}  ## {(lowercase table, rowid): DirHandle}
         
         self.setDataModel(dataModel)
         self._baseDir = None
@@ -119,7 +112,7 @@ class AnalysisDatabase(SqliteDatabase):
             if version != AnalysisDatabase.Version:
                 self._convertDB(dbFile, version)
         
-        SqliteDatabase.__init__(self, dbFile)
+        SqliteDatabase.__init__(self, dbFile, pragmas=pragmas)
         self.file = dbFile
         
         if create:
@@ -492,6 +485,7 @@ class AnalysisDatabase(SqliteDatabase):
             ## if it is, just return the row ID
             rid = self.getDirRowID(handle)
             if rid is not None:
+                self._cacheDir(handle, table, rid)
                 return table, rid
             
             ## find all directory columns, make sure linked directories are present in DB
@@ -511,7 +505,27 @@ class AnalysisDatabase(SqliteDatabase):
             
             self.insert(table, info, ignoreExtraColumns=True)
             
-            return table, self.lastInsertRow()
+            rid = self.lastInsertRow()
+            self._cacheDir(handle, table, rid)
+            return table, rid
+
+    def _dirRowId(self, handle):
+        ## Return (table, rowid) for a directory, adding it to the DB if needed.
+        ## Results are cached until rows may have been removed (see _invalidateCaches).
+        if isinstance(handle, LazyHandle):
+            handle = handle.resolve()
+        cached = self._dirRowIds.get(handle)
+        if cached is None:
+            cached = self.addDir(handle)
+        return cached
+
+    def _cacheDir(self, handle, table, rowid):
+        self._dirRowIds[handle] = (table, rowid)
+        self._dirHandles[(table.lower(), rowid)] = handle
+
+    def _invalidateCaches(self):
+        self._dirRowIds.clear()
+        self._dirHandles.clear()
 
 
     def createView(self, viewName, tables):
@@ -641,6 +655,9 @@ class AnalysisDatabase(SqliteDatabase):
 
 
     def getDirRowID(self, dirHandle):
+        cached = self._dirRowIds.get(dirHandle)
+        if cached is not None:
+            return cached[1]
         table = self.dirTableName(dirHandle)
             
         if not self.hasTable(table):
@@ -656,14 +673,42 @@ class AnalysisDatabase(SqliteDatabase):
 
     def getDir(self, table, rowid):
         ## Return a DirHandle given table, rowid
-        res = self.select(table, ['Dir'], sql='where rowid=%d'%rowid)
-        if len(res) < 1:
-            raise Exception('rowid %d does not exist in %s' % (rowid, table)) 
-            #logMsg('rowid %d does not exist in %s' % (rowid, table), msgType='error') ### This needs to be caught further up in Photostim or somewhere, not here -- really this shouldn't be caught at all since it means something is wrong with the db
-            #return None
-        #print res
-        #return self.baseDir()[res[0]['Dir']]
-        return res[0]['Dir']
+        return self.getDirs(table, [rowid])[rowid]
+
+    def getDirs(self, table, rowids, lazy=False):
+        """Return a dict {rowid: DirHandle} for the given rows of a directory table.
+        
+        Handles are cached per database, and all rows that are not already cached are read with a single
+        query. If *lazy* is True, uncached directories are returned as LazyHandle instances instead.
+        """
+        key = table.lower()
+        handles = {}
+        missing = []
+        for rid in set(rowids):
+            handle = self._dirHandles.get((key, rid))
+            if handle is None:
+                missing.append(rid)
+            else:
+                handles[rid] = handle
+        
+        names = {}
+        chunkSize = 10000  ## keep statements well below sqlite's maximum length
+        for i in range(0, len(missing), chunkSize):
+            ids = ','.join(['%d' % rid for rid in missing[i:i+chunkSize]])
+            recs = SqliteDatabase.select(self, table, ['rowid', 'Dir'], sql='where rowid in (%s)' % ids)
+            for rec in recs:
+                names[rec['rowid']] = rec['Dir']
+        
+        for rid in missing:
+            if rid not in names:
+                raise Exception('rowid %d does not exist in %s' % (rid, table))
+            if lazy:
+                handles[rid] = LazyHandle(self, names[rid])
+            else:
+                handle = self._fileHandle(names[rid])
+                self._cacheDir(handle, table, rid)
+                handles[rid] = handle
+        return handles
 
     def dirTableName(self, dh):
         """Return the name of the directory table that should hold dh.
@@ -762,12 +807,18 @@ class AnalysisDatabase(SqliteDatabase):
             raise Exception("Can not describe data of type '%s'" % type(data))
         return columns
 
-    def select(self, table, columns='*', where=None, sql='', toDict=True, toArray=False, distinct=False, limit=None, offset=None):
-        """Extends select to convert directory/file columns back into Dir/FileHandles. If the file doesn't exist, you will still get a handle, but it may not be the correct type."""
+    def select(self, table, columns='*', where=None, sql='', toDict=True, toArray=False, distinct=False, limit=None, offset=None, toColumns=False, chunkSize=10000, lazyHandles=False):
+        """Extends select to convert directory/file columns back into Dir/FileHandles. If the file doesn't exist, you will still get a handle, but it may not be the correct type.
+        If toColumns is True, a ColumnarResult is returned (see SqliteDatabase.select).
+        If lazyHandles is True, handles that are not already cached are returned as LazyHandle instances,
+        which only access the file system when they are used."""
         prof = debug.Profiler("AnalysisDatabase.select()", disabled=True)
         
-        data = SqliteDatabase.select(self, table, columns, where=where, sql=sql, distinct=distinct, limit=limit, offset=offset, toDict=True, toArray=False)
-        data = TableData(data)
+        if toColumns:
+            data = SqliteDatabase.select(self, table, columns, where=where, sql=sql, distinct=distinct, limit=limit, offset=offset, toColumns=True, chunkSize=chunkSize)
+        else:
+            data = SqliteDatabase.select(self, table, columns, where=where, sql=sql, distinct=distinct, limit=limit, offset=offset, toDict=True, toArray=False)
+            data = TableData(data)
         prof.mark("got data from SQliteDatabase")
         
         config = self.getColumnConfig(table)
@@ -778,34 +829,87 @@ class AnalysisDatabase(SqliteDatabase):
                 continue
             
             if conf.get('Type', '').startswith('directory'):
-                rids = set([d[column] for d in data])
-                linkTable = conf['Link']
-                handles = dict([(rid, self.getDir(linkTable, rid)) for rid in rids if rid is not None])
+                rids = set(list(data[column]))
+                rids.discard(None)
+                handles = self.getDirs(conf['Link'], rids, lazy=lazyHandles)
                 handles[None] = None
-                data[column] = list(map(handles.get, data[column]))
+                data[column] = self._mapColumn(handles.get, data[column], toColumns)
                     
             elif conf.get('Type', None) == 'file':
-                def getHandle(name):
-                    if name is None:
-                        return None
-                    else:
-                        if os.sep == '/':
-                            sep = '\\'
-                        else:
-                            sep = '/'
-                        name = name.replace(sep, os.sep) ## make sure file handles have an operating-system-appropriate separator (/ for Unix, \ for Windows)
-                        return self.baseDir()[name]
-                data[column] = list(map(getHandle, data[column]))
+                names = set(list(data[column]))
+                if lazyHandles:
+                    handles = dict([(name, None if name is None else LazyHandle(self, name)) for name in names])
+                else:
+                    handles = dict([(name, self._fileHandle(name)) for name in names])
+                data[column] = self._mapColumn(handles.get, data[column], toColumns)
                 
         prof.mark("converted file/dir handles")
-                
+        
+        if toColumns:
+            prof.finish()
+            return data
         ret = data.originalData()
         if toArray:
             ret = data.toArray()
             prof.mark("converted data to array")
         prof.finish()
         return ret
+
+    @staticmethod
+    def _mapColumn(fn, values, toArray):
+        if toArray:
+            return np.frompyfunc(fn, 1, 1)(values)
+        return list(map(fn, values))
+
+    @staticmethod
+    def _osPath(name):
+        if os.sep == '/':
+            sep = '\\'
+        else:
+            sep = '/'
+        return name.replace(sep, os.sep) ## make sure file handles have an operating-system-appropriate separator (/ for Unix, \ for Windows)
+
+    def _fileHandle(self, name):
+        if name is None:
+            return None
+        return self.baseDir()[self._osPath(name)]
     
+    def _prepareColumns(self, table, data, ignoreUnknownColumns=False):
+        """
+        Extends SqliteDatabase._prepareColumns() with the same directory / file handle conversions as
+        _prepareData(). Handles are converted once per distinct value, and directory rowids are cached.
+        """
+        data = TableData(data)
+        columns = OrderedDict([(name, data[name]) for name in data.columnNames()])
+        config = self.getColumnConfig(table)
+        for colName, colConf in config.items():
+            if colName not in columns:
+                continue
+            values = columns[colName]
+            if colConf.get('Type', '').startswith('directory'):
+                linkTable = colConf['Link']
+                if linkTable is None:
+                    raise Exception('Column "%s" is type "%s" but is not linked to any table.' % (colName, colConf['Type']))
+                rowids = {None: None}
+                for dh in set(list(values)):
+                    if dh is None:
+                        continue
+                    dirTable, rid = self._dirRowId(dh)
+                    if dirTable.lower() != linkTable.lower():
+                        linkType = self.getTableConfig(linkTable)['DirType']
+                        dirType = self.getTableConfig(dirTable)['DirType']
+                        raise Exception("Trying to use directory '%s' (type='%s') for column %s.%s, but this column is for directories of type '%s'." % (dh.name(), dirType, table, colName, linkType))
+                    rowids[dh] = rid
+                columns[colName] = [rowids[dh] for dh in values]
+            elif colConf.get('Type', None) == 'file':
+                names = {None: None}
+                for fh in set(list(values)):
+                    if fh is not None:
+                        names[fh] = fh.name(relativeTo=self.baseDir())
+                columns[colName] = [names[fh] for fh in values]
+
+        return SqliteDatabase._prepareColumns(self, table, columns, ignoreUnknownColumns)
+
     def _prepareData(self, table, data, ignoreUnknownColumns=False, batch=False):
         """
         Extends SqliteDatabase._prepareData():
@@ -835,7 +939,7 @@ class AnalysisDatabase(SqliteDatabase):
                 for dh in set(handles):
                     if dh is None:
                         continue
-                    dirTable, rid = self.addDir(dh)
+                    dirTable, rid = self._dirRowId(dh)
                     if dirTable != linkTable:
                         linkType = self.getTableConfig(linkTable)['DirType']
                         dirType = self.getTableConfig(dirTable)['DirType']
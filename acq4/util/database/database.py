@@ -2,6 +2,7 @@ import collections
 import os
 import pickle
 import sqlite3
+import time
 
 import numpy as np
 
@@ -24,7 +25,14 @@ class SqliteDatabase:
     regardless of the type specified by its column.
     """
 
-    def __init__(self, fileName=':memory:'):
+    ## Pragmas applied for the duration of bulkInsert(). synchronous can only be changed outside of a transaction.
+    bulkPragmas = {'synchronous': 'NORMAL', 'cache_size': -65536, 'temp_store': 'MEMORY'}
+
+    def __init__(self, fileName=':memory:', pragmas=None):
+        """
+        *pragmas* may be a dict of {name: value} pragmas to set on the new connection, eg.
+        {'journal_mode': 'WAL'}. (Note that WAL mode does not work for databases on network file systems.)
+        """
         ## decide on an appropriate name for this connection.
         ## For file connections, the name should always be the name of the file
         ## to avoid opening more than one connection to the same file.
@@ -36,6 +44,9 @@ class SqliteDatabase:
         self.db.isolation_level = None
         self.tables = None
         self._transactions = []
+        self.lastInsertStats = None
+        if pragmas is not None:
+            self.setPragmas(pragmas)
         self._readTableList()
 
     def close(self):
@@ -49,24 +60,34 @@ class SqliteDatabase:
         # gc.collect()  ## try to convince python to clean up the db immediately so we can remove the connection
         # Qt.QSqlDatabase.removeDatabase(self._connectionName)
 
-    def exe(self, cmd, data=None, batch=False, toDict=True, toArray=False):
+    def exe(self, cmd, data=None, batch=False, toDict=True, toArray=False, toColumns=False, schema=None,
+            chunkSize=10000):
         """Execute an SQL query. If data is provided, it should be a list of dicts and each will 
         be bound to the query and executed sequentially. Returns the query object.
         Arguments:
-            cmd     - The SQL query to execute
-            data    - List of dicts, one per record to be processed
-                      For each record, data is bound to the query by key name
-                      {"key1": "value1"}  =>  ":key1"="value1"
-            batch   - If True, then all input data is processed in a single execution.
-                      In this case, data must be provided as a dict-of-lists or record array.
-            toDict  - If True, return a list-of-dicts representation of the query results
-            toArray - If True, return a record array representation of the query results
+            cmd       - The SQL query to execute
+            data      - List of dicts, one per record to be processed
+                        For each record, data is bound to the query by key name
+                        {"key1": "value1"}  =>  ":key1"="value1"
+            batch     - If True, then all input data is processed in a single execution.
+                        In this case, data must be provided as a dict-of-lists or record array.
+            toDict    - If True, return a list-of-dicts representation of the query results
+            toArray   - If True, return a record array representation of the query results
+            toColumns - If True, return a ColumnarResult holding one typed array per column.
+                        Rows are fetched *chunkSize* at a time. *schema* may be a dict of
+                        {columnName: sqliteType} used to choose the array type of each column.
         """
         p = debug.Profiler('SqliteDatabase.exe', disabled=True)
         p.mark('Command: %s' % cmd)
 
         if data is None:
-            cur = self.db.execute(cmd)
+            if toColumns:
+                ## plain tuples are much cheaper to transpose than sqlite3.Row objects
+                cur = self.db.cursor()
+                cur.row_factory = None
+                cur.execute(cmd)
+            else:
+                cur = self.db.execute(cmd)
             p.mark("Executed with no data")
         else:
             data = TableData(data)
@@ -83,7 +104,9 @@ class SqliteDatabase:
             if str(cmd)[:6].lower() == 'create':
                 self.tables = None  ## clear table cache
 
-        if toArray:
+        if toColumns:
+            ret = self._queryToColumns(cur, schema, chunkSize)
+        elif toArray:
             ret = self._queryToArray(cur)
         elif toDict:
             ret = self._queryToDict(cur)
@@ -96,7 +119,7 @@ class SqliteDatabase:
         return self.exe(*args, **kargs)
 
     def select(self, table, columns='*', where=None, sql='', toDict=True, toArray=False, distinct=False, limit=None,
-               offset=None):
+               offset=None, toColumns=False, chunkSize=10000):
         """
         Construct and execute a SELECT statement, returning the results.
         
@@ -113,6 +136,11 @@ class SqliteDatabase:
         sql            Optional string to be appended to the SQL query (will be inserted before limit/offset arguments)
         toDict         If True, return a list-of-dicts (this is the default)
         toArray        if True, return a numpy record array
+        toColumns      If True, return a ColumnarResult. Rows are fetched *chunkSize* at a time
+                       directly into one array per column, typed according to the table schema
+                       (int -> int64, real -> float64, everything else -> object). This is much
+                       faster than toArray for large tables. Pickled BLOB values are only
+                       unpickled when their column is accessed.
         ============== ================================================================
         """
         p = debug.Profiler("SqliteDatabase.select", disabled=True)
@@ -136,7 +164,8 @@ class SqliteDatabase:
 
         cmd = "SELECT %s %s FROM %s %s %s %s %s" % (distinct, columns, table, whereStr, sql, limit, offset)
         p.mark("generated command")
-        q = self.exe(cmd, toDict=toDict, toArray=toArray)
+        schema = self.tableSchema(table) if toColumns else None
+        q = self.exe(cmd, toDict=toDict, toArray=toArray, toColumns=toColumns, schema=schema, chunkSize=chunkSize)
         p.finish()
         return q
 
@@ -202,44 +231,84 @@ class SqliteDatabase:
         # records = [records]
         if len(records) == 0:
             return
-        ret = []
+        startTime = time.perf_counter()
 
         with self.transaction():
-            ## Rememember that _prepareData may change the number of columns!
-            records = TableData(self._prepareData(table, records, ignoreUnknownColumns=ignoreExtraColumns, batch=True))
+            ## Rememember that _prepareColumns may change the number of columns!
+            columns = self._prepareColumns(table, records, ignoreUnknownColumns=ignoreExtraColumns)
             p.mark("prepared data")
 
-            columns = list(records.keys())
+            names = list(columns.keys())
+            values = list(columns.values())
             insert = "INSERT"
             if replaceOnConflict:
                 insert += " OR REPLACE"
-            # print "Insert:", columns
-            cmd = "%s INTO %s (%s) VALUES (%s)" % (
-            insert, table, quoteList(columns), ','.join([':' + f for f in columns]))
+                self._invalidateCaches()  ## replaced rows may get new rowids
+            cmd = "%s INTO %s (%s) VALUES (%s)" % (insert, table, quoteList(names), ','.join(['?'] * len(names)))
 
-            numRecs = len(records)
+            numRecs = len(values[0]) if len(values) > 0 else 0
             if chunkAll:  ## insert all records in one go.
-                self.exe(cmd, records, batch=True)
+                self.db.executemany(cmd, zip(*values))
+                self._insertFinished(numRecs, startTime)
                 yield (numRecs, numRecs)
                 return
 
             chunkSize = int(chunkSize)  ## just make sure
             offset = 0
-            i = 0
-            while offset < len(records):
-                # print len(columns), len(records[0]), len(self.tableSchema(table))
-                chunk = records[offset:offset + chunkSize]
-                self.exe(cmd, chunk, batch=True)
-                offset += len(chunk)
+            while offset < numRecs:
+                stop = min(offset + chunkSize, numRecs)
+                self.db.executemany(cmd, zip(*[col[offset:stop] for col in values]))
+                offset = stop
                 yield (offset, numRecs)
             p.mark("Transaction done")
+            self._insertFinished(numRecs, startTime)
 
         p.finish()
 
+    def _insertFinished(self, numRecs, startTime):
+        dt = time.perf_counter() - startTime
+        self.lastInsertStats = {'rows': numRecs, 'seconds': dt, 'rowsPerSecond': numRecs / dt if dt > 0 else float('inf')}
+
+    def bulkInsert(self, table, records, replaceOnConflict=False, ignoreExtraColumns=False, chunkSize=10000,
+                   pragmas=None):
+        """Insert a large number of records as quickly as possible.
+
+        All records are inserted within a single transaction, with the connection temporarily
+        configured by *pragmas* (default is SqliteDatabase.bulkPragmas). Other arguments are as for insert().
+
+        Returns a dict {'rows': n, 'seconds': t, 'rowsPerSecond': n/t} describing the measured insert speed.
+        The same dict is stored as db.lastInsertStats after every insert.
+        """
+        if pragmas is None:
+            pragmas = self.bulkPragmas
+        if len(self._transactions) > 0:
+            ## these can not be changed inside a transaction
+            pragmas = {k: v for k, v in pragmas.items() if k.lower() not in ('synchronous', 'journal_mode')}
+        oldPragmas = {k: self.pragma(k) for k in pragmas}
+        self.setPragmas(pragmas)
+        try:
+            for n, nmax in self.iterInsert(table, records, replaceOnConflict=replaceOnConflict,
+                                           ignoreExtraColumns=ignoreExtraColumns, chunkSize=chunkSize):
+                pass
+        finally:
+            self.setPragmas(oldPragmas)
+        return self.lastInsertStats
+
+    def pragma(self, name):
+        """Return the current value of an sqlite pragma."""
+        res = self.db.execute('PRAGMA %s' % name).fetchone()
+        return None if res is None else res[0]
+
+    def setPragmas(self, pragmas):
+        """Set sqlite pragmas given as a dict {name: value}."""
+        for name, value in pragmas.items():
+            self.db.execute('PRAGMA %s=%s' % (name, value))
+
     def delete(self, table, where):
         with self.transaction():
             whereStr = self._buildWhereClause(where, table)
             cmd = "DELETE FROM %s %s" % (table, whereStr)
+            self._invalidateCaches()
             return self(cmd)
 
     def update(self, table, vals, where=None, rowid=None, sql=''):
@@ -259,6 +328,7 @@ class SqliteDatabase:
             setStr = ', '.join(['"%s"=:%s' % (k, k) for k in vals])
             cmd = "UPDATE %s SET %s %s %s" % (table, setStr, whereStr, sql)
             data = self._prepareData(table, [vals], batch=True)
+            self._invalidateCaches()
             return self(cmd, data, batch=True)
 
     def transaction(self, name=None):
@@ -335,6 +405,14 @@ class SqliteDatabase:
 
     def removeTable(self, table):
         self('DROP TABLE "%s"' % table)
+        self.tables = None
+        self._invalidateCaches()
+
+    def _invalidateCaches(self):
+        ## Called whenever existing rows may have been changed or removed (updates, deletes, replacing inserts,
+        ## dropped tables and rolled-back transactions).
+        ## Subclasses that cache row data should clear their caches here.
+        pass
 
     def hasTable(self, table):
         self.listTables()  ## make sure table list has been generated
@@ -365,6 +443,39 @@ class SqliteDatabase:
         whereStr = "WHERE " + " AND ".join(conds)
         return whereStr
 
+    def _insertPlan(self, table):
+        """Return the compiled insert plan for *table*: a dict {columnName: converter}, where each converter
+        converts an entire column of values (list or array) to a list of values ready for insertion.
+        Plans are rebuilt whenever the table list is re-read.
+        """
+        if self.tables is None:
+            self._readTableList()
+        plan = self._insertPlans.get(table)
+        if plan is None:
+            schema = self.tableSchema(table)
+            plan = advancedTypes.CaselessDict()
+            for name, typ in schema.items():
+                plan[name] = _ColumnConverter(table, name, typ)
+            self._insertPlans[table] = plan
+        return plan
+
+    def _prepareColumns(self, table, data, ignoreUnknownColumns=False):
+        ## Like _prepareData(batch=True), but converts data column-by-column using the table's insert plan.
+        ## Returns an OrderedDict of {columnName: list of values}
+        data = TableData(data)
+        plan = self._insertPlan(table)
+        columns = collections.OrderedDict()
+        for name in data.columnNames():
+            if name not in plan:
+                if ignoreUnknownColumns:
+                    continue
+                if name.lower() != 'rowid':
+                    raise Exception("Column '%s' not present in table '%s'" % (name, table))
+                columns[name] = list(data[name])
+                continue
+            columns[name] = plan[name](data[name])
+        return columns
+
     def _prepareData(self, table, data, ignoreUnknownColumns=False, batch=False):
         ## Massage data so it is ready for insert into the DB. (internal use only)
         ##   - data destined for BLOB columns is pickled
@@ -376,52 +487,25 @@ class SqliteDatabase:
         ## Returns a dict-of-lists if batch=True, otherwise list-of-dicts
         data = TableData(data)
 
-        converters = {}
-
-        ## determine the conversion functions to use for each column.
-        schema = self.tableSchema(table)
-        for k in schema:
-            if k in converters:
-                continue
-
-            typ = schema[k].lower()
-            if typ == 'blob':
-                converters[k] = lambda obj: buffer(pickle.dumps(obj))
-            elif typ == 'int':
-                converters[k] = int
-            elif typ == 'real':
-                converters[k] = float
-            elif typ == 'text':
-                converters[k] = str
-            else:
-                converters[k] = lambda obj: obj
+        ## conversion functions for each column are taken from the table's insert plan
+        plan = self._insertPlan(table)
 
         if batch:
-            newData = dict([(k, []) for k in data.columnNames() if not (ignoreUnknownColumns and (k not in schema))])
+            newData = dict([(k, []) for k in data.columnNames() if not (ignoreUnknownColumns and (k not in plan))])
         else:
             newData = []
 
         for rec in data:
             newRec = {}
             for k in rec:
-                if k not in schema:
+                if k not in plan:
                     if ignoreUnknownColumns:
                         continue
-                    # if addUnknownColumns:  ## Is this just a bad idea?
-                    # dtyp = self.suggestColumnType(rec[k])
-                    # self.addColumn(table, k, dtyp)
-                if rec[k] is None:
-                    newRec[k] = None
+                    if k.lower() != 'rowid':
+                        raise Exception("Column '%s' not present in table '%s'" % (k, table))
+                    newRec[k] = rec[k]
                 else:
-                    try:
-                        newRec[k] = converters[k](rec[k])
-                    except:
-                        newRec[k] = rec[k]
-                        if k.lower() != 'rowid':
-                            if k not in schema:
-                                raise Exception("Column '%s' not present in table '%s'" % (k, table))
-                            print("Warning: Setting %s column %s.%s with type %s" % (
-                            schema[k], table, k, str(type(rec[k]))))
+                    newRec[k] = plan[k].convertValue(rec[k])
             if batch:
                 for k in newData:
                     newData[k].append(newRec.get(k, None))
@@ -455,6 +539,33 @@ class SqliteDatabase:
         prof.finish()
         return arr
 
+    def _queryToColumns(self, q, schema=None, chunkSize=10000):
+        prof = debug.Profiler("_queryToColumns", disabled=True)
+        names = [d[0] for d in q.description]
+        if schema is None:
+            schema = {}
+        types = []
+        for name in names:
+            if name.lower() == 'rowid':
+                types.append('int')
+            else:
+                types.append((schema.get(name) or '').lower())
+        builders = [_ColumnBuilder(typ) for typ in types]
+
+        while True:
+            rows = q.fetchmany(chunkSize)
+            if len(rows) == 0:
+                break
+            for builder, values in zip(builders, zip(*rows)):
+                builder.append(values)
+            prof.mark("read %d rows" % len(rows))
+
+        ret = ColumnarResult(collections.OrderedDict(
+            [(name, builder.finish()) for name, builder in zip(names, builders)]),
+            pickled=[name for name, builder in zip(names, builders) if builder.hasBytes])
+        prof.finish()
+        return ret
+
     def _readRecord(self, rec):
         prof = debug.Profiler("_readRecord", disabled=True)
         data = collections.OrderedDict()
@@ -464,8 +575,8 @@ class SqliteDatabase:
             name = names[i]
             ## Unpickle byte arrays into their original objects.
             ## (Hopefully they were stored as pickled data in the first place!)
-            if isinstance(val, buffer):
-                val = pickle.loads(str(val))
+            if isinstance(val, (bytes, buffer)):
+                val = pickle.loads(bytes(val))
             data[name] = val
         prof.finish()
         return data
@@ -483,6 +594,183 @@ class SqliteDatabase:
             tables[table] = columns
 
         self.tables = tables
+        self._insertPlans = advancedTypes.CaselessDict()
+
+
+class _ColumnConverter:
+    """Converts whole columns of values for insertion into one column of a table.
+
+    Numeric arrays are converted in a single numpy operation; other values are converted one at a time
+    with the same rules as SqliteDatabase._prepareData (BLOB values are pickled, None is left as NULL,
+    and values that can not be converted are inserted unchanged with a warning).
+    """
+
+    def __init__(self, table, column, sqlType):
+        self.table = table
+        self.column = column
+        self.sqlType = sqlType
+        typ = sqlType.lower()
+        if typ == 'blob':
+            self.convert = pickle.dumps
+        elif typ == 'int':
+            self.convert = int
+        elif typ == 'real':
+            self.convert = float
+        elif typ == 'text':
+            self.convert = str
+        else:
+            self.convert = None
+        self.typ = typ
+
+    def __call__(self, values):
+        if isinstance(values, np.ndarray):
+            kind = values.dtype.kind
+            if self.typ == 'int' and kind in 'iub':
+                return values.tolist()
+            if self.typ == 'int' and kind == 'f' and np.all(np.isfinite(values)):
+                return values.astype(np.int64).tolist()
+            if self.typ == 'real' and kind in 'iubf':
+                return values.astype(float).tolist()
+            if self.convert is None and kind in 'iubf':
+                return values.tolist()
+            values = values.tolist()
+        if self.convert is None:
+            return list(values)
+        convert = self.convert
+        try:
+            return [None if v is None else convert(v) for v in values]
+        except Exception:
+            return [self.convertValue(v) for v in values]
+
+    def convertValue(self, val):
+        if val is None:
+            return None
+        try:
+            return self.convert(val)
+        except Exception:
+            print("Warning: Setting %s column %s.%s with type %s" % (self.sqlType, self.table, self.column, str(type(val))))
+            return val
+
+
+_columnDTypes = {'int': np.int64, 'integer': np.int64, 'real': np.float64, 'float': np.float64, 'double': np.float64}
+
+
+class _ColumnBuilder:
+    """Accumulates the values of one result column into a growing, preallocated array.
+
+    The array type is chosen from the declared sqlite type of the column. Because sqlite allows any
+    value in any column, the array is converted to dtype=object as soon as a value does not fit.
+    """
+
+    def __init__(self, sqlType):
+        self.sqlType = sqlType
+        self.dtype = _columnDTypes.get(sqlType, object)
+        ## text columns never hold pickled data, so they do not need to be checked for bytes values
+        self.checkBytes = self.dtype is object and sqlType != 'text'
+        self.hasBytes = False
+        self.data = None
+        self.length = 0
+
+    def append(self, values):
+        chunk = self._convert(values)
+        if chunk is None:
+            self._setDType(object)
+            chunk = self._convert(values)
+        n = len(chunk)
+        if self.data is None:
+            self.data = np.empty(max(n, 1024), dtype=self.dtype)
+        elif self.length + n > len(self.data):
+            newData = np.empty(max(2 * len(self.data), self.length + n), dtype=self.dtype)
+            newData[:self.length] = self.data[:self.length]
+            self.data = newData
+        self.data[self.length:self.length + n] = chunk
+        self.length += n
+
+    def _convert(self, values):
+        ## return an array of self.dtype, or None if the values cannot be represented exactly
+        if self.dtype is object:
+            arr = np.empty(len(values), dtype=object)
+            arr[:] = values
+            if self.checkBytes and not self.hasBytes:
+                self.hasBytes = any(isinstance(v, bytes) for v in values)
+            return arr
+        arr = np.array(values)
+        if arr.dtype.kind == 'i':
+            return arr.astype(self.dtype, copy=False)
+        if self.dtype is np.float64:
+            if arr.dtype.kind == 'f':
+                return arr
+            ## NULL values are read as NaN
+            if arr.dtype.kind == 'O' and all(v is None or isinstance(v, (int, float)) for v in values):
+                return np.array(values, dtype=float)
+        return None
+
+    def _setDType(self, dtype):
+        self.dtype = dtype
+        self.checkBytes = True
+        if self.data is not None:
+            self.data = self.data.astype(dtype)
+
+    def finish(self):
+        if self.data is None:
+            return np.empty(0, dtype=self.dtype)
+        return self.data[:self.length]
+
+
+class ColumnarResult:
+    """Query results stored as one numpy array per column (see SqliteDatabase.select(toColumns=True)).
+
+    Columns are accessed by name (case-insensitive), eg: result['fitTime']. Values in BLOB columns
+    are unpickled the first time their column is accessed, so columns that are never used cost nothing
+    to decode. Use toArray() to get a numpy record array like select(toArray=True) would return.
+    """
+
+    def __init__(self, columns, pickled=()):
+        self._columns = advancedTypes.CaselessDict(columns)
+        self._pickled = set(pickled)
+
+    def __getitem__(self, name):
+        col = self._columns[name]
+        key = self._columns.keyMap[name.lower()]
+        if key in self._pickled:
+            ## Unpickle byte arrays into their original objects.
+            for i, val in enumerate(col):
+                if isinstance(val, bytes):
+                    col[i] = pickle.loads(val)
+            self._columns[key] = col
+            self._pickled.discard(key)
+        return col
+
+    def __setitem__(self, name, values):
+        if name in self._columns:
+            name = self._columns.keyMap[name.lower()]
+        self._pickled.discard(name)
+        self._columns[name] = values
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __len__(self):
+        if len(self._columns) == 0:
+            return 0
+        return len(next(iter(self._columns.values())))
+
+    def columnNames(self):
+        return list(self._columns.keys())
+
+    def keys(self):
+        return self.columnNames()
+
+    def toArray(self, columns=None):
+        """Return a numpy record array containing *columns* (default is all columns)."""
+        if columns is None:
+            columns = self.columnNames()
+        arrays = [self[name] for name in columns]
+        ## NOTE: dtype is specified as {names: formats:} to allow non-ascii column names
+        arr = np.empty(len(self), dtype={'names': list(columns), 'formats': [a.dtype for a in arrays]})
+        for name, col in zip(columns, arrays):
+            arr[name] = col
+        return arr
 
 
 def quoteList(strns):
@@ -512,7 +800,9 @@ class Transaction:
         else:
             try:
                 self.db('ROLLBACK TRANSACTION TO %s' % self.name)
+                self.db('RELEASE SAVEPOINT %s' % self.name)  ## rolling back does not remove the savepoint itself
                 self.db.tables = None  ## make sure we are forced to re-read the table list after the rollback.
+                self.db._invalidateCaches()
             except Exception:
                 print("WARNING: Error occurred during transaction and rollback failed.")
 
@@ -562,10 +852,17 @@ class TableData:
         else:
             raise Exception("Cannot create TableData from object '%s' (type='%s')" % (str(data), type(data)))
 
-        for fn in ['__getitem__', '__setitem__']:
-            setattr(self, fn, getattr(self, '_TableData' + fn + self.mode))
+        ## special methods are looked up on the class, so dispatch to the mode-specific implementations here
+        self._getitem = getattr(self, '_TableData__getitem__' + self.mode)
+        self._setitem = getattr(self, '_TableData__setitem__' + self.mode)
         self.copy = getattr(self, 'copy_' + self.mode)
 
+    def __getitem__(self, arg):
+        return self._getitem(arg)
+
+    def __setitem__(self, arg, val):
+        self._setitem(arg, val)
+
     def originalData(self):
         return self.data
 
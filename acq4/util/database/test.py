@@ -85,3 +85,122 @@ def testBatchInsert():
     
     for i, row in enumerate(db.iterSelect('t', limit=1)):
         assert tuple(row[0].values()) == tuple(data[i])
+
+
+def testColumnarSelect():
+    db = SqliteDatabase()
+    db("create table 't' ('int' int, 'real' real, 'text' text, 'blob' blob, 'other' other)")
+    data = np.array([
+        (1, 27.3, u'x', [5], None),
+        (3, np.nan, u'yy', None, 2),
+        (5, 21.3, u'zzz', [(5,3), 'q'], 'a'),
+    ], dtype=[('int', int), ('real', float), ('text', object), ('blob', object), ('other', object)])
+    db.insert('t', data)
+
+    result = db.select('t', toColumns=True, chunkSize=2)
+    assert len(result) == 3
+    assert result.columnNames() == ['int', 'real', 'text', 'blob', 'other']
+    assert result['int'].dtype == np.int64
+    assert result['REAL'].dtype == np.float64 and np.isnan(result['real'][1])
+    assert list(result['blob']) == [[5], None, [(5,3), 'q']]
+    assert list(result['other']) == [None, 2, 'a']
+
+    arr = result.toArray(['int', 'text'])
+    assert arr.dtype.names == ('int', 'text')
+    assert list(arr['text']) == ['x', 'yy', 'zzz']
+
+    ## values that do not match the declared column type fall back to object arrays
+    db.insert('t', {'int': 'seven', 'real': None})
+    result = db.select('t', ['rowid', 'int', 'real'], toColumns=True, chunkSize=2)
+    assert result['rowid'].dtype == np.int64
+    assert list(result['int']) == [1, 3, 5, 'seven']
+    assert result['real'].dtype == np.float64
+
+    empty = db.select('t', where={'int': 100}, toColumns=True)
+    assert len(empty) == 0 and empty.toArray().dtype.names == ('int', 'real', 'text', 'blob', 'other')
+
+
+def testBulkInsert():
+    db = SqliteDatabase()
+    db("create table 't' ('int' int, 'real' real, 'text' text, 'blob' blob)")
+    n = 20000
+    data = np.empty(n, dtype=[('int', int), ('real', float), ('text', object), ('blob', object)])
+    data['int'] = np.arange(n)
+    data['real'] = np.linspace(0, 1, n)
+    data['text'] = ['row%d' % i for i in range(n)]
+    data['blob'] = [(i, 'x') for i in range(n)]
+    synchronous = db.pragma('synchronous')
+
+    stats = db.bulkInsert('t', data, chunkSize=3000)
+    assert stats['rows'] == n and stats['rowsPerSecond'] > 0
+    assert db.lastInsertStats is stats
+    assert db.pragma('synchronous') == synchronous
+
+    result = db.select('t', toColumns=True)
+    assert np.all(result['int'] == data['int'])
+    assert np.all(result['real'] == data['real'])
+    assert list(result['text']) == list(data['text'])
+    assert result['blob'][-1] == (n-1, 'x')
+
+    ## values that can not be converted are inserted unchanged; unknown columns are rejected
+    db.bulkInsert('t', {'int': [1.5, np.nan], 'real': ['x', None]})
+    assert db.select('t', ['int', 'real'], sql='where rowid > %d' % n) == [{'int': 1, 'real': 'x'}, {'int': None, 'real': None}]
+    try:
+        db.bulkInsert('t', {'missing': [1]})
+        raise AssertionError("expected an exception for an unknown column")
+    except Exception as exc:
+        assert 'missing' in str(exc)
+
+
+class DirTypeModel:
+    ## minimal data model: directory types are read from the 'dirType' meta-info key
+    @staticmethod
+    def dirType(dh):
+        return dh.info().get('dirType', None)
+
+    @staticmethod
+    def getParent(dh, dirType):
+        return None
+
+
+def testDirHandleCache(tmp_path):
+    import acq4.util.DataManager as dm
+    from acq4.util.database.AnalysisDatabase import AnalysisDatabase, LazyHandle
+
+    base = dm.getDirHandle(str(tmp_path))
+    base.setInfo(dirType='Base')
+    cells = [base.mkdir('cell%d' % i, info={'dirType': 'Cell'}) for i in range(3)]
+    db = AnalysisDatabase(str(tmp_path / 'db.sqlite'), DirTypeModel(), base)
+    db.createTable('DirTable_Cell', [('Dir', 'file')], dirType='Cell')
+    db.createTable('events', [('CellDir', 'directory:Cell'), ('x', 'real')])
+    db.insert('events', {'CellDir': [cells[0], cells[1], cells[2], cells[0]], 'x': [1., 2., 3., 4.]})
+    assert db.getDirRowID(cells[1]) == db.select('DirTable_Cell', ['rowid'], sql="where Dir='cell1'")[0]['rowid']
+
+    ## all uncached rowids are resolved with a single query
+    db._invalidateCaches()
+    queries = []
+    exe = db.exe
+    db.exe = lambda cmd, *args, **kwds: queries.append(cmd) or exe(cmd, *args, **kwds)
+    result = db.select('events', toColumns=True)
+    assert list(result['CellDir']) == [cells[0], cells[1], cells[2], cells[0]]
+    assert result['CellDir'][0] is cells[0]
+    assert len([q for q in queries if 'DirTable_Cell' in q]) == 1
+    del queries[:]
+    assert db.select('events')[1]['CellDir'] is cells[1]
+    assert len([q for q in queries if 'DirTable_Cell' in q]) == 0
+
+    ## lazy handles are only resolved when used
+    db._invalidateCaches()
+    lazy = db.select('events', lazyHandles=True)[2]['CellDir']
+    assert isinstance(lazy, LazyHandle) and lazy._handle is None
+    assert lazy == cells[2] and lazy.name() == cells[2].name()
+    assert lazy._handle is None
+    assert lazy.shortName() == 'cell2'
+    assert lazy.resolve() is cells[2]
+
+    ## writes invalidate the cache
+    db.select('events')
+    assert len(db._dirHandles) == 3
+    db.delete('events', {'x': 4.})
+    assert len(db._dirHandles) == 0
+    db.close()
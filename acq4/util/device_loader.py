@@ -0,0 +1,162 @@
+"""
+Dependency-aware loading of the devices defined in a configuration.
+
+Loading happens in two phases:
+
+1. Driver modules for all devices are imported concurrently on a thread pool (SDK and DLL imports are
+   often the slowest part of startup).
+2. Devices are constructed one at a time in the calling (main) thread, in dependency order. A device depends
+   on every other configured device whose name appears anywhere in its configuration (parent devices, DAQ
+   channels, ...), and is only constructed after those have finished; otherwise configuration order is kept.
+   Constructors are not run concurrently because most drivers create timers or other QObjects that must
+   live in the main thread.
+
+Import and construction times are recorded for every device; see `DeviceLoader.report`.
+"""
+from __future__ import annotations
+
+import concurrent.futures
+import time
+from collections import OrderedDict
+
+from acq4 import devices
+
+
+def formatStartupReport(times, totalTime):
+    """Format a {name: {'driver', 'import', 'init', ...}} dict of device load times as a table, slowest first."""
+    lines = [f"Device startup: {len(times)} devices in {totalTime:.2f} s"]
+    lines.append(f"    {'device':<24s} {'driver':<24s} {'import':>8s} {'init':>8s}")
+    order = sorted(times.items(), key=lambda item: -(item[1]['import'] + item[1]['init']))
+    for name, t in order:
+        flags = ''
+        if t.get('lazy'):
+            flags += ' [lazy]'
+        if t.get('error') is not None:
+            flags += ' [failed]'
+        lines.append(f"    {name:<24s} {t['driver']:<24s} {t['import']:8.3f} {t['init']:8.3f}{flags}")
+    return '\n'.join(lines)
+
+
+class DeviceLoader:
+    """Loads devices into *manager* (using ``manager.loadDevice``).
+
+    Parameters
+    ----------
+    manager : Manager
+        The manager that owns the devices.
+    workers : int
+        Number of threads used to import drivers. With workers=0, everything happens serially in the
+        calling thread, in configuration order.
+    onError : callable | None
+        Called as onError(name) from within an ``except`` block (so sys.exc_info() is available) when a
+        device fails to load. If None, errors are raised.
+    log : callable | None
+        Called with progress messages.
+    """
+
+    def __init__(self, manager, workers=4, onError=None, log=None):
+        self.manager = manager
+        self.workers = int(workers)
+        self.onError = onError
+        self.log = log or (lambda msg: None)
+        self.times = OrderedDict()  # name: {'driver', 'import', 'init', 'error'}
+        self.totalTime = 0.0
+
+    @staticmethod
+    def dependencies(name, conf, names):
+        """Return the names in *names* (other than *name*) that appear as strings anywhere in *conf*."""
+        found = set()
+        stack = [conf]
+        while stack:
+            obj = stack.pop()
+            if isinstance(obj, str):
+                if obj in names and obj != name:
+                    found.add(obj)
+            elif isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple)):
+                stack.extend(obj)
+        return found
+
+    def load(self, entries):
+        """Load devices from *entries*, an ordered dict of {name: (driverName, config)}.
+
+        Returns the list of names that were loaded successfully.
+        """
+        start = time.perf_counter()
+        entries = OrderedDict(entries)
+        for name, (driver, conf) in entries.items():
+            self.times[name] = {'driver': driver, 'import': 0.0, 'init': 0.0, 'error': None}
+        deps = {name: self.dependencies(name, conf, entries) for name, (driver, conf) in entries.items()}
+
+        if self.workers <= 0:
+            loaded = [name for name in entries if self._loadSerial(name, *entries[name])]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix='DeviceLoader') as pool:
+                classes = self._importDrivers(pool, entries)
+            loaded = self._construct(entries, deps, classes)
+        self.totalTime = time.perf_counter() - start
+        return loaded
+
+    def report(self):
+        """Return a table of per-device import and construction times, slowest first."""
+        return formatStartupReport(self.times, self.totalTime)
+
+    def _loadSerial(self, name, driver, conf):
+        self.log(f"  === Configuring device '{name}' ===")
+        try:
+            t0 = time.perf_counter()
+            devices.getDeviceClass(driver)
+            t1 = time.perf_counter()
+            self.times[name]['import'] = t1 - t0
+            self.manager.loadDevice(driver, conf, name)
+            self.times[name]['init'] = time.perf_counter() - t1
+            return True
+        except Exception as exc:
+            self.times[name]['error'] = exc
+            self._handleError(name)
+            return False
+
+    def _importDrivers(self, pool, entries):
+        ## import each driver once, concurrently; returns {driver: class or exception}
+        def importDriver(driver):
+            t0 = time.perf_counter()
+            try:
+                result = devices.getDeviceClass(driver)
+            except Exception as exc:
+                result = exc
+            return result, time.perf_counter() - t0
+
+        drivers = list(OrderedDict.fromkeys(driver for driver, conf in entries.values()))
+        results = dict(zip(drivers, pool.map(importDriver, drivers)))
+        for name, (driver, conf) in entries.items():
+            self.times[name]['import'] = results[driver][1]
+        return {driver: result for driver, (result, dt) in results.items()}
+
+    def _construct(self, entries, deps, classes):
+        pending = OrderedDict(entries)
+        loaded = []
+        while pending:
+            ready = [name for name in pending if not (deps[name] & set(pending))]
+            ## on a dependency cycle, fall back to configuration order
+            name = ready[0] if ready else next(iter(pending))
+            driver, conf = pending.pop(name)
+            self.log(f"  === Configuring device '{name}' ===")
+            try:
+                cls = classes[driver]
+                if isinstance(cls, Exception):
+                    raise cls
+                t0 = time.perf_counter()
+                self.manager.loadDevice(driver, conf, name)
+                self.times[name]['init'] = time.perf_counter() - t0
+                loaded.append(name)
+            except Exception as exc:
+                self.times[name]['error'] = exc
+                self._handleError(name)
+        return loaded
+
+    def _handleError(self, name):
+        if self.onError is None:
+            raise
+        self.onError(name)
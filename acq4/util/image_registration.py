@@ -58,3 +58,150 @@ def iterativeImageTemplateMatch(img, template, dsVals=(4, 2, 1), matchFn=imageTe
             end = offset + np.array(tmpDs[i+1].shape) + 3
             end = np.clip(end, 0, imgDs[i+1].shape)
             imgDs[i+1] = imgDs[i+1][offset[0]:end[0], offset[1]:end[1]]
+
+
+def _windowSums(img, shape):
+    ## sum of *img* over every window of *shape* that fits entirely inside the image
+    h, w = shape
+    c = np.zeros((img.shape[0] + 1, img.shape[1] + 1))
+    np.cumsum(np.cumsum(img, axis=0), axis=1, out=c[1:, 1:])
+    return c[h:, w:] - c[:-h, w:] - c[h:, :-w] + c[:-h, :-w]
+
+
+def _normalizedCorrelation(numerator, windowSum, windowSum2, nPixels, templateSsd):
+    ## finish a normalized cross-correlation the same way skimage.feature.match_template does
+    denom = np.maximum(windowSum2 - windowSum ** 2 / nPixels, 0) * templateSsd
+    np.sqrt(denom, out=denom)
+    cc = np.zeros(np.broadcast_shapes(numerator.shape, denom.shape))
+    mask = np.broadcast_to(denom > np.finfo(float).eps, cc.shape)
+    np.divide(numerator, denom, out=cc, where=mask)
+    return cc
+
+
+class TemplateBank(object):
+    """A set of same-sized templates prepared for repeated matching with `iterativeImageTemplateMatch`.
+
+    The downsampled template pyramids and template statistics are computed once, and FFTs of the templates
+    are cached for each image size they are matched against. `match` correlates all templates with the
+    coarsest image level in a single batched FFT, then refines each match at higher resolution; it returns
+    the same results as calling ``iterativeImageTemplateMatch(img, t, dsVals)`` for every template *t*.
+
+    Banks can be pickled (including the cached FFTs); thread pools are recreated as needed.
+
+    Parameters
+    ----------
+    templates : array
+        (nTemplates, rows, cols) array of template images.
+    dsVals : tuple
+        Downsampling factors, as for `iterativeImageTemplateMatch`.
+    unsharp : float | False
+        High-pass filter sigma, as for `imageTemplateMatch`.
+    workers : int | None
+        Number of threads used for FFTs and for refining matches. None uses a single thread.
+    """
+
+    def __init__(self, templates, dsVals=(4, 2, 1), unsharp=3, workers=None):
+        templates = np.asarray(templates, dtype=float)
+        self.dsVals = tuple(dsVals)
+        self.unsharp = unsharp
+        self.workers = workers
+        self.signature = TemplateBank.computeSignature(templates, self.dsVals, unsharp)
+        self.levels = []
+        for ds in self.dsVals:
+            tmpl = pg.downsample(pg.downsample(templates, ds, axis=1), ds, axis=2)
+            tmpl = tmpl - tmpl.mean(axis=(1, 2), keepdims=True)
+            self.levels.append({
+                'templates': tmpl,
+                'ssd': (tmpl ** 2).sum(axis=(1, 2)),
+                'shape': tmpl.shape[1:],
+            })
+        self._ffts = {}  ## fft shape: conjugate template FFTs, most recently added last
+        self._pool = None
+
+    @staticmethod
+    def computeSignature(templates, dsVals=(4, 2, 1), unsharp=3):
+        """Return a string that identifies a bank built from these arguments."""
+        import hashlib
+        templates = np.ascontiguousarray(templates, dtype=float)
+        h = hashlib.sha1(templates.tobytes())
+        h.update(repr((templates.shape, tuple(dsVals), unsharp)).encode())
+        return h.hexdigest()
+
+    ## number of image sizes for which template FFTs are kept
+    maxFftShapes = 4
+
+    def __len__(self):
+        return self.levels[0]['templates'].shape[0]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        return state
+
+    def match(self, img):
+        """Match every template against *img*. Return a list of (offset, value) tuples, one per template."""
+        imgDs = [pg.downsample(pg.downsample(img, n, axis=0), n, axis=1).astype(float) for n in self.dsVals]
+        cc = self._matchFull(imgDs[0])
+        positions = [np.unravel_index(np.argmax(c), c.shape) for c in self._highPass(cc)]
+        values = [cc[i][p] for i, p in enumerate(positions)]
+        if len(self.dsVals) == 1:
+            return [(np.array(p), v) for p, v in zip(positions, values)]
+
+        refine = lambda i: self._refine(i, imgDs, np.array(positions[i]))
+        if self.workers is not None and self.workers > 1:
+            if self._pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='TemplateBank')
+            return list(self._pool.map(refine, range(len(self))))
+        return [refine(i) for i in range(len(self))]
+
+    def _highPass(self, cc):
+        if self.unsharp is False:
+            return cc
+        sigma = (0,) * (cc.ndim - 2) + (self.unsharp, self.unsharp)
+        return cc - scipy.ndimage.gaussian_filter(cc, sigma)
+
+    def _matchFull(self, img):
+        ## normalized cross-correlation of every template at the first level, using one batched FFT
+        import scipy.fft
+        level = self.levels[0]
+        h, w = level['shape']
+        if img.shape[0] < h or img.shape[1] < w:
+            raise ValueError(f"Image ({img.shape}) must be larger than template ({level['shape']})")
+        fshape = tuple(scipy.fft.next_fast_len(n, real=True) for n in img.shape)
+        tmplFft = self._ffts.get(fshape)
+        if tmplFft is None:
+            tmplFft = np.conj(scipy.fft.rfft2(level['templates'], s=fshape, workers=self.workers))
+            self._ffts[fshape] = tmplFft
+            while len(self._ffts) > self.maxFftShapes:
+                del self._ffts[next(iter(self._ffts))]
+        imgFft = scipy.fft.rfft2(img, s=fshape, workers=self.workers)
+        xcorr = scipy.fft.irfft2(imgFft[np.newaxis] * tmplFft, s=fshape, workers=self.workers)
+        xcorr = xcorr[:, :img.shape[0] - h + 1, :img.shape[1] - w + 1]
+        return _normalizedCorrelation(xcorr, _windowSums(img, (h, w)), _windowSums(img ** 2, (h, w)), h * w,
+                                      level['ssd'][:, np.newaxis, np.newaxis])
+
+    def _refine(self, i, imgDs, pos):
+        ## repeat the iterative search of iterativeImageTemplateMatch for template i, starting from level 1
+        offset = np.array([0, 0])
+        for li in range(1, len(self.dsVals)):
+            level = self.levels[li]
+            scale = self.dsVals[li - 1] // self.dsVals[li]
+            assert scale == self.dsVals[li - 1] / self.dsVals[li], "dsVals must satisfy constraint: dsVals[i] == dsVals[i+1] * int(x)"
+            offset *= scale
+            offset += np.clip(((pos - 1) * scale), 0, imgDs[li].shape)
+            end = np.clip(offset + np.array(level['shape']) + 3, 0, imgDs[li].shape)
+            crop = imgDs[li][offset[0]:end[0], offset[1]:end[1]]
+            h, w = level['shape']
+            if crop.shape[0] < h or crop.shape[1] < w:
+                raise ValueError(f"Image ({crop.shape}) must be larger than template ({level['shape']})")
+
+            ## the search region is only a few pixels wide, so correlate directly
+            windows = np.lib.stride_tricks.sliding_window_view(crop, (h, w))
+            tmpl = level['templates'][i]
+            numerator = np.einsum('abij,ij->ab', windows, tmpl)
+            cc = _normalizedCorrelation(numerator, windows.sum(axis=(2, 3)), (windows ** 2).sum(axis=(2, 3)),
+                                        h * w, level['ssd'][i])
+            pos = np.array(np.unravel_index(np.argmax(self._highPass(cc)), cc.shape))
+            val = cc[pos[0], pos[1]]
+        return offset + pos, val
@@ -25,12 +25,20 @@ class Frame:
 
     @classmethod
     def loadFromFileHandle(cls, fh: FileHandle) -> "Frame | list[Frame]":
+        """Load the frame (or list of frames, for stacks) stored in *fh*.
+
+        Frames of stacks saved with `saveStack` are loaded lazily; each one reads its image data from the
+        file the first time it is needed.
+        """
+        if fh.fileType() == "ChunkedVideo":
+            return cls._loadChunkedStack(fh)
         data = fh.read()
         if fh.fileType() == "MetaArray":
             if data.ndim == 3:
                 frames = []
+                baseInfo = fh.info().deepcopy()
                 for row in data:
-                    info = fh.info().deepcopy()
+                    info = dict(baseInfo)  # only top-level keys differ between rows
                     if data.axisName(0) == "Time":
                         info["time"] = row.axisValues(2)
                     elif data.axisName(0) == "Depth":
@@ -50,6 +58,50 @@ class Frame:
         frame.loadLinkedFiles(fh.parent())
         return frame
 
+    @classmethod
+    def _loadChunkedStack(cls, fh: FileHandle) -> "list[Frame]":
+        # frames read their data through the reader later on; don't keep the file open in the meantime
+        with fh.read() as reader:
+            times = reader.times()
+            transforms = reader.transforms()
+        baseInfo = fh.info().deepcopy()
+        frames = []
+        for i in range(len(times)):
+            info = dict(baseInfo)
+            info["time"] = times[i]
+            info["transform"] = pg.SRTTransform3D(pg.Transform3D(transforms[i]))
+            frames.append(_StackSliceFrame(reader, i, info))
+        if len(frames) > 0:
+            frames[0].loadLinkedFiles(fh.parent())
+            for f in frames[1:]:
+                f._bg_removal = frames[0]._bg_removal
+        return frames
+
+    @staticmethod
+    def saveStack(frames: "list[Frame]", dh: DirHandle, filename: str, axis: str = "Depth",
+                  autoIncrement: bool = True, **options) -> FileHandle:
+        """Save *frames* (e.g. a z-stack) to a single chunked HDF5 file inside DirHandle *dh*.
+
+        The stack is preallocated and written one slice per chunk, with per-frame times and transforms
+        stored as columnar arrays (see acq4.filetypes.ChunkedVideo); the meta info of the first frame is
+        stored for the file. Extra *options* are passed to ChunkedVideoWriter. Read the frames back with
+        `loadFromFileHandle`.
+        """
+        from acq4.filetypes.ChunkedVideo import ChunkedVideoWriter
+
+        first = frames[0]
+        data = first.getImage()
+        options.setdefault("chunkFrames", 1)
+        writer = ChunkedVideoWriter(data.shape, data.dtype, axis=axis, preallocate=len(frames), **options)
+        fh = dh.writeFile(writer, filename, first._infoForSaving(dh), autoIncrement=autoIncrement,
+                          fileType="ChunkedVideo")
+        try:
+            writer.append([f.getImage() for f in frames], [f.time for f in frames],
+                          [f.globalTransform() for f in frames])
+        finally:
+            writer.close()
+        return fh
+
     def data(self):
         """Return raw imaging data.
         """
@@ -155,9 +207,7 @@ class Frame:
         value you must also supply as *valuesForAppend*.
         """
         data = self.getImage()
-        info = self.info()
-        if callable(info.get('backgroundInfo')):
-            info['backgroundInfo'] = info['backgroundInfo'](dh)
+        info = self._infoForSaving(dh)
 
         if not filename.endswith('.ma'):
             return dh.writeFile(data, filename, info, fileType="ImageFile", autoIncrement=autoIncrement)
@@ -172,6 +222,12 @@ class Frame:
             **self._metaArrayWriteKwargs,
         )
 
+    def _infoForSaving(self, dh: DirHandle) -> dict:
+        info = self.info()
+        if callable(info.get('backgroundInfo')):
+            info['backgroundInfo'] = info['backgroundInfo'](dh)
+        return info
+
     def loadLinkedFiles(self, dh):
         """Load linked files from the same directory as the main file."""
         bg_removal = self.info().get("backgroundInfo", None)
@@ -203,3 +259,23 @@ class Frame:
         item = ImageItem(data, levels=levels, lut=lut, removable=True)
         item.setTransform(self.globalTransform().as2D())
         return item
+
+
+class _StackSliceFrame(Frame):
+    """A frame from a stack saved with `Frame.saveStack`. Image data are read from the file on first access."""
+
+    def __init__(self, reader, index: int, info: dict):
+        self._reader = reader
+        self._index = index
+        self._loaded = None
+        super().__init__(None, info)
+
+    @property
+    def _data(self):
+        if self._loaded is None:
+            self._loaded = self._reader.readFrame(self._index)
+        return self._loaded
+
+    @_data.setter
+    def _data(self, data):
+        self._loaded = data
@@ -0,0 +1,139 @@
+import threading
+import weakref
+from collections import deque
+
+import numpy as np
+
+
+class _FrameSlot:
+    """Exposes one slot of a FrameRingBuffer through the numpy array interface.
+
+    Arrays created from this object (and any views derived from them) keep the slot
+    alive; the slot is returned to the ring buffer only when the last of them is released.
+    """
+
+    def __init__(self, ring, index, shape, dtype):
+        self._ring = ring
+        self._pool = ring._data  # keeps the underlying memory alive, even if the ring is reallocated
+        address = self._pool[index].__array_interface__["data"][0]
+        self.__array_interface__ = {
+            "shape": tuple(shape),
+            "typestr": np.dtype(dtype).str,
+            "data": (address, False),
+            "strides": None,
+            "version": 3,
+        }
+
+
+class FrameRingBuffer:
+    """Fixed pool of preallocated frame arrays that camera drivers write into directly.
+
+    The pool is allocated once per acquisition. Each call to `acquire()` returns a writable
+    array backed by a free slot; the slot is reference counted through the returned array, so
+    it is not reused until the array and all views of it have been garbage collected. If no
+    slot is free (all frames are still held by frame processors), a new array is allocated
+    instead so that no data is ever overwritten.
+
+    Parameters
+    ----------
+    size : int
+        Number of frame slots.
+    shape : tuple
+        Shape of a single frame.
+    dtype : numpy dtype
+        Data type of a single frame.
+    shared : bool
+        If True, the pool is allocated in a `multiprocessing.shared_memory` segment (see
+        `sharedMemoryName`) so that other processes can attach to it without copying.
+    """
+
+    def __init__(self, size, shape, dtype=np.uint16, shared=False):
+        self._lock = threading.Lock()
+        # slots released by finalizers; drained by acquire() under the lock. Finalizers can run during any
+        # allocation (including inside acquire), so they must not take the lock themselves.
+        self._released = deque()
+        self._shm = None
+        self._shared = shared
+        self.size = int(size)
+        self._allocate(tuple(shape), np.dtype(dtype))
+        self.stats = {"acquired": 0, "fallbackAllocations": 0, "reallocations": 0}
+
+    def _allocate(self, shape, dtype):
+        self.shape = shape
+        self.dtype = dtype
+        nbytes = max(1, self.size * int(np.prod(shape)) * dtype.itemsize)
+        if self._shared:
+            from multiprocessing import shared_memory
+
+            self._releaseSharedMemory()
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._data = np.ndarray((self.size,) + shape, dtype=dtype, buffer=self._shm.buf)
+        else:
+            self._data = np.empty((self.size,) + shape, dtype=dtype)
+        self._free = deque(range(self.size))
+        self._generation = getattr(self, "_generation", 0) + 1
+
+    @property
+    def sharedMemoryName(self):
+        """Name of the shared memory segment holding the pool, or None if the pool is not shared."""
+        return None if self._shm is None else self._shm.name
+
+    def acquire(self, shape=None, dtype=None) -> np.ndarray:
+        """Return a writable array for the next frame.
+
+        If *shape* or *dtype* differ from the pool's current layout (for example, after the
+        camera region or binning changed), the pool is reallocated.
+        """
+        shape = self.shape if shape is None else tuple(shape)
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+        with self._lock:
+            self._drainReleased()
+            if shape != self.shape or dtype != self.dtype:
+                # outstanding slots keep the old pool alive; their releases are ignored
+                self._allocate(shape, dtype)
+                self.stats["reallocations"] += 1
+            self.stats["acquired"] += 1
+            if len(self._free) == 0:
+                self.stats["fallbackAllocations"] += 1
+                return np.empty(shape, dtype=dtype)
+            index = self._free.popleft()
+            slot = _FrameSlot(self, index, shape, dtype)
+            weakref.finalize(slot, self._release, index, self._generation)
+        return np.asarray(slot)
+
+    def isBufferArray(self, arr) -> bool:
+        """Return True if *arr* is backed by a slot in this pool."""
+        base = arr
+        while isinstance(base, np.ndarray):
+            base = base.base
+        return isinstance(base, _FrameSlot) and base._ring is self
+
+    def freeSlots(self) -> int:
+        with self._lock:
+            self._drainReleased()
+            return len(self._free)
+
+    def _release(self, index, generation):
+        # deque.append is atomic; see __init__
+        self._released.append((index, generation))
+
+    def _drainReleased(self):
+        while self._released:
+            index, generation = self._released.popleft()
+            if generation == self._generation:
+                self._free.append(index)
+
+    def _releaseSharedMemory(self):
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except BufferError:
+                pass  # slots still in use keep the mapping open until they are released
+            self._shm.unlink()
+            self._shm = None
+
+    def __del__(self):
+        try:
+            self._releaseSharedMemory()
+        except Exception:
+            pass
@@ -1,3 +1,5 @@
+import threading
+
 import pyqtgraph as pg
 from acq4.util import Qt, ptime
 from acq4.util.cuda import shouldUseCuda, cupy
@@ -36,6 +38,8 @@ class FrameDisplay(Qt.QObject):
         self.contrastCtrl.setImageItem(self._imageItem)
         self.bgCtrl = self.bgSubtractClass()
         self.bgCtrl.needFrameUpdate.connect(self.backgroundChanged)
+        # background is integrated by the recording thread and removed by the display thread
+        self._bgLock = threading.Lock()
 
         self.nextFrame = None
         self._updateFrame = False
@@ -84,12 +88,18 @@ class FrameDisplay(Qt.QObject):
         return self.currentFrame.getImage()
 
     def newFrame(self, frame):
-        # integrate new frame into background
-        self.bgCtrl.includeNewFrame(frame)
+        self.includeFrame(frame)
         # possibly draw the frame and update auto gain (rate limited)
         self.checkForDraw(frame)
-        # annotate frame with background and contrast info
-        frame.addInfo(backgroundInfo=self.bgCtrl.deferredSave(), contrastInfo=self.contrastCtrl.saveState())
+
+    def includeFrame(self, frame):
+        """Integrate *frame* into the running background and attach the current background and
+        contrast settings to its info. Must be called for every frame, in order; drawing
+        (`checkForDraw`) may skip frames and run on another thread.
+        """
+        with self._bgLock:
+            self.bgCtrl.includeNewFrame(frame)
+            frame.addInfo(backgroundInfo=self.bgCtrl.deferredSave(), contrastInfo=self.contrastCtrl.saveState())
 
     def checkForDraw(self, frame=None):
         if self.hasQuit:
@@ -118,7 +128,8 @@ class FrameDisplay(Qt.QObject):
             prof()
 
             # divide the background out of the current frame if needed
-            data = self.bgCtrl.processImage(data)
+            with self._bgLock:
+                data = self.bgCtrl.processImage(data)
             prof()
 
             # Set new levels if auto gain is enabled
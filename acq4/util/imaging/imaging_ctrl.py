@@ -121,6 +121,13 @@ class ImagingCtrl(Qt.QWidget):
         btn.clicked.connect(self._handleNamedVideoButtonClick)
 
     def newFrame(self, frame):
+        self.recordFrame(frame)
+        self.displayFrame(frame)
+
+    def recordFrame(self, frame):
+        """Integrate *frame* into the background, annotate and record it. Must be called for every
+        acquired frame, in order.
+        """
         # update acquisition frame rate
         now = frame.info()["time"]
         if self.lastFrameTime is not None:
@@ -138,11 +145,14 @@ class ImagingCtrl(Qt.QWidget):
                 # new image does not match stack shape; need to stop recording.
                 self.endStack()
 
+        self.frameDisplay.includeFrame(frame)
         self.recordThread.newFrame(frame)
         if self.ui.recordStackBtn.isChecked():
             self.ui.stackSizeLabel.setText("%d frames" % self.recordThread.stackSize)
 
-        self.frameDisplay.newFrame(frame)
+    def displayFrame(self, frame):
+        """Show *frame*. Frames may be skipped if display cannot keep up."""
+        self.frameDisplay.checkForDraw(frame)
         self.sigUpdateUi.emit()
 
     def updateUi(self):
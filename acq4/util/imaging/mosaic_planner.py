@@ -0,0 +1,223 @@
+"""
+Ordering of mosaic tiles to minimize stage travel time.
+
+Stage moves are modeled per axis with a trapezoidal velocity profile (constant acceleration up to the
+stage's fast speed), with all axes moving at once, plus a fixed settling time per move. Tiles can be
+visited in the raster ("serpentine") order in which they are generated, in nearest-neighbor order, or in
+the best of those two improved by 2-opt exchanges. When z-stacks are acquired at every tile, consecutive
+stacks alternate direction, so each stack starts at the depth where the previous one ended.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+STRATEGIES = ("serpentine", "nearest", "2opt")
+
+
+class StageMotionModel:
+    """Predicts the time needed to move a stage between two global positions.
+
+    Parameters
+    ----------
+    speed : float | array
+        Maximum speed (m/s), either for all axes or per (x, y, z) axis.
+    acceleration : float | array
+        Acceleration (m/s^2), either for all axes or per axis. ``inf`` ignores acceleration.
+    settleTime : float
+        Time (s) added to every move that is not of zero length.
+    """
+
+    def __init__(self, speed=1e-3, acceleration=np.inf, settleTime=0.0):
+        self.speed = np.broadcast_to(np.asarray(speed, dtype=float), (3,))
+        self.acceleration = np.broadcast_to(np.asarray(acceleration, dtype=float), (3,))
+        self.settleTime = float(settleTime)
+
+    @classmethod
+    def fromImager(cls, imager, speed="fast") -> "StageMotionModel":
+        """Build a model from the stage that positions *imager* (x, y) and its focus device (z).
+
+        Uses each stage's speed and its optional 'acceleration' and 'settleTime' config options.
+        """
+        scope = imager.scopeDev
+        devices = [scope.positionDevice()] * 2 + [scope.focusDevice()]
+        speeds = []
+        accels = []
+        settle = 0.0
+        for dev in devices:
+            if dev is None:
+                speeds.append(1e-3)
+                accels.append(np.inf)
+                continue
+            speeds.append(dev._interpretSpeed(speed))
+            accels.append(np.inf if dev.acceleration is None else dev.acceleration)
+            settle = max(settle, dev.settleTime)
+        return cls(speeds, accels, settle)
+
+    def axisTimes(self, distance):
+        """Return the time each axis needs to travel *distance* (array (..., 3) of absolute distances)."""
+        d = np.abs(np.asarray(distance, dtype=float))
+        v = self.speed
+        a = self.acceleration
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ramp = 2 * np.sqrt(d / a)  # short moves never reach full speed
+            cruise = d / v + v / a
+        return np.where(d < v ** 2 / a, ramp, cruise)
+
+    def moveTime(self, start, stop):
+        """Return the predicted time to move from *start* to *stop*. Both may be arrays of positions."""
+        delta = np.asarray(stop, dtype=float) - np.asarray(start, dtype=float)
+        t = self.axisTimes(delta).max(axis=-1)
+        return np.where(np.any(delta != 0, axis=-1), t + self.settleTime, 0.0)
+
+    def costMatrix(self, positions) -> np.ndarray:
+        """Return an (N, N) array of move times between all pairs of *positions*."""
+        positions = np.asarray(positions, dtype=float)
+        return self.moveTime(positions[:, np.newaxis, :], positions[np.newaxis, :, :])
+
+
+class MosaicPlan:
+    """An ordered list of tiles to visit, with optional z-stack ranges and predicted move times.
+
+    Iterating yields ``(position, z_stack, predicted_move_time)`` for each tile, where *position* is the
+    global position to move the imager's center to (including the starting depth of its z-stack), and
+    *z_stack* is the ``(start, stop, step)`` range to acquire there, or None.
+    """
+
+    def __init__(self, positions, z_stacks, start, model: StageMotionModel, strategy: str = "serpentine"):
+        self.positions = np.array(positions, dtype=float).reshape(-1, 3)
+        self.z_stacks = list(z_stacks)
+        self.start = np.asarray(start, dtype=float)
+        self.model = model
+        self.strategy = strategy
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return iter(zip([tuple(p) for p in self.positions], self.z_stacks, self.predictedMoveTimes()))
+
+    def endPositions(self) -> np.ndarray:
+        """Return where the imager's center is after acquiring at each tile."""
+        ends = self.positions.copy()
+        for i, stack in enumerate(self.z_stacks):
+            if stack is not None:
+                ends[i, 2] = stack[1]
+        return ends
+
+    def predictedMoveTimes(self) -> np.ndarray:
+        """Return the predicted time of the move into each tile."""
+        if len(self) == 0:
+            return np.zeros(0)
+        origins = np.vstack([self.start[np.newaxis, :], self.endPositions()[:-1]])
+        return self.model.moveTime(origins, self.positions)
+
+    def predictedMoveTime(self) -> float:
+        return float(self.predictedMoveTimes().sum())
+
+    def reversed(self) -> "MosaicPlan":
+        """Return a plan that visits the same tiles backward, starting where this plan ends.
+
+        Used to revisit all tiles (e.g. in a timelapse) without traveling back to the first tile.
+        """
+        stacks = [None if s is None else (s[1], s[0], s[2]) for s in self.z_stacks[::-1]]
+        ends = self.endPositions()
+        positions = ends[::-1].copy()
+        start = ends[-1] if len(self) > 0 else self.start
+        return MosaicPlan(positions, stacks, start, self.model, self.strategy)
+
+
+def plan_mosaic(
+        positions,
+        start,
+        model: "StageMotionModel | None" = None,
+        strategy: str = "2opt",
+        z_stack: "tuple[float, float, float] | None" = None,
+) -> MosaicPlan:
+    """Order tile *positions* (global imager center positions) to minimize predicted stage travel time.
+
+    Parameters
+    ----------
+    positions : list
+        (x, y, z) tile positions in raster order, as generated by `positions_to_cover_region`.
+    start : array-like
+        Current (x, y, z) position of the imager's center.
+    model : StageMotionModel | None
+        Motion model used to predict move times; default is a constant-speed model.
+    strategy : str
+        "serpentine" keeps the given order, "nearest" always moves to the closest remaining tile, and
+        "2opt" improves the better of those two orders by reversing sections of the path.
+    z_stack : tuple | None
+        (start, stop, step) of the z-stack to acquire at each tile. Stacks alternate direction.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown mosaic path strategy {strategy!r}; use one of {STRATEGIES}")
+    if model is None:
+        model = StageMotionModel()
+    positions = np.array(positions, dtype=float).reshape(-1, 3)
+    start = np.asarray(start, dtype=float)
+
+    # tiles all share one depth, so only lateral travel depends on the order
+    nodes = np.vstack([start[np.newaxis, :], positions])
+    nodes[:, 2] = 0
+    cost = model.costMatrix(nodes)
+    serpentine = np.arange(len(nodes))
+    if strategy == "serpentine" or len(positions) < 3:
+        order = serpentine
+    elif strategy == "nearest":
+        order = _nearest_neighbor_path(cost)
+    else:
+        nearest = _nearest_neighbor_path(cost)
+        order = min((serpentine, nearest), key=lambda p: _path_cost(cost, p))
+        order = _two_opt(cost, order)
+    order = order[1:] - 1
+
+    positions = positions[order]
+    stacks = [None] * len(positions)
+    if z_stack is not None:
+        for i in range(len(positions)):
+            stacks[i] = tuple(z_stack) if i % 2 == 0 else (z_stack[1], z_stack[0], z_stack[2])
+            positions[i, 2] = stacks[i][0]
+    return MosaicPlan(positions, stacks, start, model, strategy)
+
+
+def _path_cost(cost, path):
+    return cost[path[:-1], path[1:]].sum()
+
+
+def _nearest_neighbor_path(cost):
+    # open path beginning at node 0
+    n = len(cost)
+    visited = np.zeros(n, dtype=bool)
+    path = [0]
+    visited[0] = True
+    for _ in range(n - 1):
+        c = np.where(visited, np.inf, cost[path[-1]])
+        nxt = int(np.argmin(c))
+        path.append(nxt)
+        visited[nxt] = True
+    return np.array(path)
+
+
+def _two_opt(cost, path, maxPasses=100):
+    # improve an open path with fixed first node (the starting position) and free last node by reversing
+    # segments path[i:j+1] whenever that shortens it; costs must be symmetric
+    path = np.array(path)
+    n = len(path)
+    for _ in range(maxPasses):
+        improved = False
+        for i in range(1, n - 1):
+            a, b = path[i - 1], path[i]
+            j = np.arange(i + 1, n)
+            c = path[j]
+            # node following each candidate segment end; the last node has none
+            d = path[np.minimum(j + 1, n - 1)]
+            hasNext = j + 1 < n
+            delta = (cost[a, c] - cost[a, b]
+                     + np.where(hasNext, cost[b, d] - cost[c, d], 0))
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-12:
+                path[i:j[k] + 1] = path[i:j[k] + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return path
@@ -39,12 +39,30 @@ class RecordThread(Thread):
         self.lock = Mutex(Qt.QMutex.Recursive)
         self.newFrames = []  # list of frames and the files they should be sored / appended to.
 
+        # Storage format for recorded stacks; see setVideoFormat()
+        self.videoFormat = 'MetaArray'
+        self.videoOptions = {}
+
         # Attributes private to worker thread:
         self.currentStack = None  # file handle of currently recorded stack
+        self.currentWriter = None  # ChunkedVideoWriter for currently recorded stack, if any
         self.startFrameTime = None
         self.lastFrameTime = None
         self.currentFrameNum = 0
 
+    def setVideoFormat(self, fmt, **options):
+        """Set the file format used for recording image stacks.
+
+        *fmt* may be 'MetaArray' (the default; frames are appended to a .ma file) or
+        'ChunkedVideo' (frames are streamed into a preallocated, chunked HDF5 file by a dedicated
+        writer thread). Extra *options* are passed to ChunkedVideoWriter (for example,
+        compression='gzip' or chunkFrames=16).
+        """
+        if fmt not in ('MetaArray', 'ChunkedVideo'):
+            raise ValueError(f"Unsupported video format '{fmt}'")
+        self.videoFormat = fmt
+        self.videoOptions = options
+
     def startRecording(self, frameLimit=None):
         """Ask the recording thread to begin recording a new image stack.
 
@@ -139,6 +157,10 @@ class RecordThread(Thread):
 
             time.sleep(100e-3)
 
+        if self.currentWriter is not None:
+            self.currentWriter.close()
+            self.currentWriter = None
+
     def handleFrames(self, frames):
         # Write as many frames into the stack as possible.
         # If False appears in the list of frames, it indicates the end of a stack
@@ -153,6 +175,10 @@ class RecordThread(Thread):
                     self.writeFrames(recFrames, dh)
                     recFrames = []
 
+                if self.currentWriter is not None:
+                    self.currentWriter.close()
+                    self.currentWriter = None
+
                 if self.currentStack is not None:
                     dur = self.lastFrameTime - self.startFrameTime
                     if dur > 0:
@@ -196,6 +222,10 @@ class RecordThread(Thread):
         if newRec:
             self.startFrameTime = frames[0][1]['time']
 
+        if self.videoFormat == 'ChunkedVideo':
+            self.writeFramesChunked(frames, dh, newRec)
+            return
+
         times = [f[1]['time'] for f in frames]
         translations = np.array([f[1]['transform'].getTranslation() for f in frames])
         arrayInfo = [
@@ -217,3 +247,18 @@ class RecordThread(Thread):
             )
         else:
             data.write(self.currentStack.name(), appendAxis='Time', appendKeys=['translation'])
+
+    def writeFramesChunked(self, frames, dh, newRec):
+        if newRec:
+            from acq4.filetypes.ChunkedVideo import ChunkedVideoWriter
+
+            firstFrame = frames[0][0]
+            self.currentWriter = ChunkedVideoWriter(firstFrame.shape, firstFrame.dtype, axis='Time', **self.videoOptions)
+            self.currentStack = dh.writeFile(
+                self.currentWriter, 'video.h5', autoIncrement=True, info=frames[0][1], fileType='ChunkedVideo'
+            )
+        self.currentWriter.append(
+            [f[0] for f in frames],
+            [f[1]['time'] for f in frames],
+            [f[1]['transform'] for f in frames],
+        )
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import contextlib
 import itertools
+import queue
+import threading
 import weakref
 from typing import Union, Optional, Generator
 
@@ -9,9 +12,11 @@ import numpy as np
 import acq4.Manager as Manager
 import pyqtgraph as pg
 from acq4.util import Qt, ptime
+from acq4.util.debug import printExc
 from acq4.util.DataManager import DirHandle
 from acq4.util.future import Future, future_wrap
 from acq4.util.imaging import Frame
+from acq4.util.imaging.mosaic_planner import StageMotionModel, plan_mosaic
 from acq4.util.surface import find_surface
 from acq4.util.threadrun import runInGuiThread
 
@@ -166,27 +171,24 @@ def _save_results(
         +-----------+--------+---------+------------------------+
         | timelapse | mosaic | z-stack |    resultant files     |
         +-----------+--------+---------+------------------------+
-        | true      | true   | true    | folders of z-stack mas |
+        | true      | true   | true    | folders of z-stack h5s |
         | true      | true   | false   | folders of images      |
-        | true      | false  | true    | multiple z-stack mas   |
+        | true      | false  | true    | multiple z-stack h5s   |
         | true      | false  | false   | single timelapse ma    |
-        | false     | true   | true    | multiple z-stack mas   |
+        | false     | true   | true    | multiple z-stack h5s   |
         | false     | true   | false   | multiple images        |
-        | false     | false  | true    | single z-stack ma      |
+        | false     | false  | true    | single z-stack h5      |
         | false     | false  | false   | single image           |
         +-----------+--------+---------+------------------------+
+
+    Z-stacks are saved with Frame.saveStack (one chunked HDF5 file per stack).
     """
     if is_mosaic and is_timelapse:
         storage_dir = storage_dir.getDir(f"mosaic_{idx:03d}", create=True)
 
     if is_z_stack:
-        stack = None
-        for frame in frames:
-            if stack is None:
-                # TODO do we want to save the background/contrast display data for each frame, too
-                stack = frame.saveImage(storage_dir, "z_stack.ma")
-            else:
-                stack = frame.appendImage(stack)
+        # TODO do we want to save the background/contrast display data for each frame, too
+        Frame.saveStack(frames, storage_dir, "z_stack.h5")
     elif is_timelapse and not is_mosaic:
         if idx == 0:
             frames.saveImage(storage_dir, "timelapse.ma", autoIncrement=False)
@@ -197,6 +199,133 @@ def _save_results(
         frames.saveImage(storage_dir, "image.tif")
 
 
+class _StageStats:
+    """Timing statistics for one stage of an ImageSequencePipeline."""
+
+    def __init__(self):
+        self.count = 0
+        self.busy = 0.0  # total time spent doing the work of this stage
+        self.maxBusy = 0.0
+        self.blocked = 0.0  # total time producers waited for room in this stage's queue
+        self.maxQueued = 0
+
+    def add(self, duration):
+        self.count += 1
+        self.busy += duration
+        self.maxBusy = max(self.maxBusy, duration)
+
+    def asDict(self):
+        return {
+            "count": self.count,
+            "busy": self.busy,
+            "mean": self.busy / self.count if self.count > 0 else 0.0,
+            "max": self.maxBusy,
+            "blocked": self.blocked,
+            "maxQueued": self.maxQueued,
+        }
+
+
+class _PipelineStage:
+    """Worker thread that calls *func* on every item put into its bounded queue, in order."""
+
+    def __init__(self, name: str, func, maxQueueSize: int):
+        self.name = name
+        self.func = func
+        self.stats = _StageStats()
+        self.error = None
+        self._queue = queue.Queue(maxsize=maxQueueSize)
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"ImageSequence-{name}")
+        self._thread.start()
+
+    def put(self, item):
+        start = ptime.time()
+        self._queue.put(item)
+        self.stats.blocked += ptime.time() - start
+        self.stats.maxQueued = max(self.stats.maxQueued, self._queue.qsize())
+
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue  # drain the queue without doing any more work
+            start = ptime.time()
+            try:
+                self.func(*item)
+            except Exception as exc:
+                printExc(f"Error in image sequence {self.name} stage:")
+                self.error = exc
+            self.stats.add(ptime.time() - start)
+
+
+class ImageSequencePipeline:
+    """Hands acquired frames to background analysis and storage stages so that the next stage move
+    and acquisition can begin immediately.
+
+    Each stage has its own worker thread and processes frames in the order they were submitted. Queues
+    are bounded: if a stage falls *maxQueueSize* items behind, `submit` blocks until it catches up, so
+    memory use stays bounded when storage is slower than acquisition. Time spent in each stage (and in
+    the move and acquire steps of the caller, recorded with `timing`) is available from `stats`.
+
+    Errors raised by a stage are re-raised in the caller by the next `submit`, `check` or `close`.
+    """
+
+    def __init__(self, stages: "dict[str, Callable]", maxQueueSize: int = 4):
+        self._stages = [_PipelineStage(name, func, maxQueueSize) for name, func in stages.items()]
+        self._timers = {}
+        self._closed = False
+
+    @contextlib.contextmanager
+    def timing(self, name: str):
+        """Context manager that records the duration of a step performed by the caller (e.g. "move")."""
+        start = ptime.time()
+        try:
+            yield
+        finally:
+            self._timers.setdefault(name, _StageStats()).add(ptime.time() - start)
+
+    def submit(self, *args):
+        """Queue *args* to be passed to every stage."""
+        self.check()
+        for stage in self._stages:
+            stage.put(args)
+
+    def queued(self) -> int:
+        """Return the largest number of items waiting in any stage."""
+        return max((stage.queued() for stage in self._stages), default=0)
+
+    def check(self):
+        """Raise the first error that occurred in any stage."""
+        for stage in self._stages:
+            if stage.error is not None:
+                raise RuntimeError(f"Image sequence {stage.name} stage failed") from stage.error
+
+    def close(self):
+        """Wait for all stages to finish their queued work, then raise any error that occurred."""
+        if not self._closed:
+            self._closed = True
+            for stage in self._stages:
+                stage.close()
+        self.check()
+
+    def stats(self) -> dict:
+        """Return {stage name: {count, busy, mean, max, blocked, maxQueued}} with times in seconds."""
+        stats = {name: timer.asDict() for name, timer in self._timers.items()}
+        stats.update({stage.name: stage.stats.asDict() for stage in self._stages})
+        return stats
+
+    def summary(self) -> str:
+        return ", ".join(f"{name}={s['mean'] * 1000:.0f}ms" for name, s in self.stats().items() if s["count"] > 0)
+
+
 @future_wrap
 def run_image_sequence(
         imager,
@@ -206,14 +335,54 @@ def run_image_sequence(
         z_stack: "tuple[float, float, float] | None" = None,
         mosaic: "tuple[float, float, float, float, float] | None" = None,
         storage_dir: "DirHandle | None" = None,
+        max_queue_size: int = 4,
+        path_strategy: str = "2opt",
         _future: Future = None
 ) -> "Frame | list[Frame | list[Frame | list[Frame]]]":
-    _hold_imager_focus(imager, True)
-    _open_shutter(imager, True)  # don't toggle shutter between stack frames
+    """Acquire a timelapse, mosaic and/or z-stack sequence.
+
+    Pinning (including finding the focused frame of each z-stack) and saving happen in background
+    stages of an ImageSequencePipeline, while the next move and acquisition proceed. At most
+    *max_queue_size* acquisitions wait for each stage before acquisition pauses to let it catch up.
+    Timing statistics for each step are stored in *storage_dir*'s info as "pipelineStats".
+
+    Mosaic tiles are visited in the order given by `plan_mosaic` with *path_strategy* ("serpentine",
+    "nearest" or "2opt"), using the imager's stage speeds. Timelapse iterations alternate between the
+    planned order and its reverse. Predicted and measured stage travel times are stored in *storage_dir*'s
+    info as "pathPlan".
+    """
     man = Manager.getManager()
     result = []
     is_timelapse = count > 1
 
+    # plan before touching the hardware, so that a planning error leaves the shutter and focus alone
+    plan = None
+    predicted_move_time = 0.0
+    if mosaic:
+        plan = plan_mosaic(
+            list(positions_to_cover_region(mosaic, imager.globalCenterPosition(), imager.getBoundary(mode="roi"))),
+            start=imager.globalCenterPosition(),
+            model=StageMotionModel.fromImager(imager),
+            strategy=path_strategy,
+            z_stack=z_stack,
+        )
+
+    def pin_frames(f: "Frame | list[Frame]", idx: int):
+        if z_stack:
+            most_focused = find_surface(f) or (len(f) // 2)
+            pin(f[most_focused])
+        else:
+            pin(f)
+
+    def save_frames(f: "Frame | list[Frame]", idx: int):
+        _save_results(f, storage_dir, idx, is_timelapse, bool(mosaic), bool(z_stack))
+
+    stages = {}
+    if pin:
+        stages["analysis"] = pin_frames
+    if storage_dir:
+        stages["storage"] = save_frames
+
     def handle_new_frames(f: "Frame | list[Frame]", idx: int):
         if is_timelapse:
             if idx + 1 > len(result):
@@ -222,52 +391,94 @@ def run_image_sequence(
         else:
             dest = result
         dest.append(f)
-        if pin:
-            if z_stack:
-                most_focused = find_surface(f) or (len(f) // 2)
-                pin(f[most_focused])
-            else:
-                pin(f)
-        if storage_dir:
-            _save_results(f, storage_dir, idx, count > 1, bool(mosaic), bool(z_stack))
+        pipeline.submit(f, idx)
 
     # record
-    with man.reserveDevices(imager.devicesToReserve()):
+    pipeline = ImageSequencePipeline(stages, maxQueueSize=max_queue_size)
+    completed = False
+    close_error = None
+    try:
+        _hold_imager_focus(imager, True)
+        _open_shutter(imager, True)  # don't toggle shutter between stack frames
         try:
-            for i in itertools.count():
-                if i >= count:
-                    break
-                start = ptime.time()
-                for move in movements_to_cover_region(imager, mosaic):
-                    _future.waitFor(move)
-                    if z_stack:
-                        stack = acquire_z_stack(imager, *z_stack, block=True, checkStopThrough=_future).getResult()
-                        handle_new_frames(stack, i)
-                    else:  # single frame
-                        frame = _future.waitFor(imager.acquireFrames(1, ensureFreshFrames=True)).getResult()[0]
-                        handle_new_frames(frame, i)
-                    _future.checkStop()
-                _future.setState(_status_message(i, count))
-                _future.sleep(interval - (ptime.time() - start))
+            with man.reserveDevices(imager.devicesToReserve()):
+                for i in itertools.count():
+                    if i >= count:
+                        break
+                    start = ptime.time()
+                    if plan is None:
+                        tiles = [(None, z_stack, 0.0)]
+                    else:
+                        tiles = plan if i % 2 == 0 else plan.reversed()
+                    for pos, tile_z_stack, predicted in tiles:
+                        if pos is not None:
+                            with pipeline.timing("move"):
+                                _future.waitFor(imager.moveCenterToGlobal(pos, "fast"))
+                            predicted_move_time += predicted
+                        with pipeline.timing("acquire"):
+                            if z_stack:
+                                frames = acquire_z_stack(imager, *tile_z_stack, block=True, checkStopThrough=_future).getResult()
+                            else:  # single frame
+                                frames = _future.waitFor(imager.acquireFrames(1, ensureFreshFrames=True)).getResult()[0]
+                        handle_new_frames(frames, i)
+                        _future.checkStop()
+                    status = _status_message(i, count)
+                    if pipeline.queued() > 0:
+                        status += f" ({pipeline.queued()} waiting to be saved)"
+                    _future.setState(status)
+                    _future.sleep(interval - (ptime.time() - start))
         finally:
             _open_shutter(imager, False)
             _hold_imager_focus(imager, False)
+        completed = True
+    finally:
+        # frames that were already acquired are still saved if the sequence is stopped or fails
+        try:
+            pipeline.close()
+        except Exception as exc:
+            if completed:
+                close_error = exc
+            else:
+                # don't replace the error that stopped the sequence
+                printExc("Error saving image sequence after it was stopped:")
+        stats = pipeline.stats()
+        measured_move_time = stats["move"]["busy"] if "move" in stats else 0.0
+        if storage_dir:
+            info = {"pipelineStats": stats}
+            if plan is not None:
+                info["pathPlan"] = {
+                    "strategy": path_strategy,
+                    "tiles": len(plan),
+                    "predictedMoveTime": predicted_move_time,
+                    "measuredMoveTime": measured_move_time,
+                }
+            storage_dir.setInfo(info)
+    if close_error is not None:
+        raise close_error
+    status = f"done ({pipeline.summary()})"
+    if plan is not None:
+        status += f"; stage travel predicted {predicted_move_time:.1f} s, measured {measured_move_time:.1f} s"
+    _future.setState(status)
     return result
 
 
 def movements_to_cover_region(
-    imager, region: "tuple[float, float, float, float, float] | None"
+    imager, region: "tuple[float, float, float, float, float] | None", strategy: str = "serpentine"
 ) -> Generator[Future, None, None]:
     """
-    Generate a sequence of snaking movements to cover the region. `region` is a tuple containing the `left`, `top`,
+    Generate a sequence of movements to cover the region. `region` is a tuple containing the `left`, `top`,
     `right`, and `bottom` coordinates, as well as an `overlap`, all in global/meters. `region` can also be None, in
-    which case this yields once with a no-op Future.
+    which case this yields once with a no-op Future. Tiles are ordered by `plan_mosaic` using *strategy*;
+    the default is a snaking raster.
     """
     if region is None:
         yield Future.immediate()
         return
 
-    for pos in positions_to_cover_region(region, imager.globalCenterPosition(), imager.getBoundary(mode="roi")):
+    start = imager.globalCenterPosition()
+    positions = list(positions_to_cover_region(region, start, imager.getBoundary(mode="roi")))
+    plan = plan_mosaic(positions, start, StageMotionModel.fromImager(imager), strategy=strategy)
+    for pos, _, _ in plan:
         yield imager.moveCenterToGlobal(pos, "fast")
 
 
@@ -298,7 +509,7 @@ def positions_to_cover_region(region, imager_center, imager_region) -> Generator
     while not y_finished:
         y_finished = (pos - coverage_offset)[1] <= region_bottom_right[1]
         while not x_finished:
-            yield pos
+            yield pos.copy()
             x_finished = x_tests[x_direction]()
             if not x_finished:
                 pos[0] += x_steps[x_direction]
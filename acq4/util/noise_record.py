@@ -0,0 +1,246 @@
+"""
+Incremental noise statistics and compact on-disk noise records.
+
+WelchAccumulator computes a power spectral density with Welch's method one chunk at a time: segments that span
+chunk boundaries are carried over, so feeding a signal in pieces gives the same result as feeding it all at
+once. It also keeps running min/max/mean/RMS.
+
+NoiseRecordWriter appends one row per analyzed trace to a chunked HDF5 file: a summary row, the trace's PSD,
+and a decimated copy of the raw trace. NoiseRecord reads such a file back.
+"""
+import contextlib
+import threading
+
+import h5py
+import numpy as np
+import scipy.signal
+
+
+class WelchAccumulator:
+    """Accumulates a Welch PSD estimate and summary statistics from a stream of samples.
+
+    Parameters
+    ----------
+    rate : float
+        Sample rate in Hz.
+    nperseg : int
+        Samples per Welch segment; the PSD has nperseg // 2 + 1 frequency bins.
+    overlap : float
+        Fraction of each segment shared with the next one.
+    """
+
+    def __init__(self, rate, nperseg=2048, overlap=0.5):
+        self.rate = float(rate)
+        self.nperseg = int(nperseg)
+        self.step = max(1, int(self.nperseg * (1 - overlap)))
+        self.window = scipy.signal.get_window('hann', self.nperseg)
+        self.reset()
+
+    def reset(self):
+        self._tail = np.empty(0)
+        self._psdSum = np.zeros(self.nperseg // 2 + 1)
+        self.segments = 0
+        self.count = 0
+        self._sum = 0.0
+        self._sumSq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, data):
+        data = np.asarray(data, dtype=float).ravel()
+        if len(data) == 0:
+            return
+        self.count += len(data)
+        self._sum += data.sum()
+        self._sumSq += np.dot(data, data)
+        self.min = min(self.min, data.min())
+        self.max = max(self.max, data.max())
+
+        buf = np.concatenate([self._tail, data])
+        nSeg = 0 if len(buf) < self.nperseg else (len(buf) - self.nperseg) // self.step + 1
+        if nSeg > 0:
+            starts = np.arange(nSeg) * self.step
+            segs = buf[starts[:, None] + np.arange(self.nperseg)]
+            segs = (segs - segs.mean(axis=1, keepdims=True)) * self.window
+            self._psdSum += (np.abs(np.fft.rfft(segs, axis=1)) ** 2).sum(axis=0)
+            self.segments += nSeg
+        self._tail = buf[nSeg * self.step:]
+
+    def merge(self, other):
+        """Add the statistics accumulated by *other* (which must use the same rate and segment length)."""
+        if other.rate != self.rate or other.nperseg != self.nperseg:
+            raise ValueError("Cannot merge accumulators with different rate or segment length.")
+        self._psdSum += other._psdSum
+        self.segments += other.segments
+        self.count += other.count
+        self._sum += other._sum
+        self._sumSq += other._sumSq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def frequencies(self):
+        return np.fft.rfftfreq(self.nperseg, 1.0 / self.rate)
+
+    def psd(self):
+        """Return the one-sided power spectral density (units**2 / Hz) averaged over all complete segments."""
+        if self.segments == 0:
+            return np.zeros_like(self._psdSum)
+        psd = self._psdSum / (self.segments * self.rate * (self.window ** 2).sum())
+        psd[1:-1] *= 2
+        return psd
+
+    @property
+    def mean(self):
+        return self._sum / self.count
+
+    @property
+    def std(self):
+        return np.sqrt(max(0.0, self._sumSq / self.count - self.mean ** 2))
+
+    @property
+    def rms(self):
+        return np.sqrt(self._sumSq / self.count)
+
+
+def decimate(data, maxPoints):
+    """Block-average *data* down to at most *maxPoints* samples. Returns (decimated, factor)."""
+    ds = max(1, int(np.ceil(len(data) / maxPoints)))
+    n = len(data) // ds
+    return data[:n * ds].reshape(n, ds).mean(axis=1), ds
+
+
+class NoiseRecordWriter:
+    """Appends analyzed traces to a chunked HDF5 noise record.
+
+    The file holds:
+
+    * ``summary``: one row per trace with the columns listed in SUMMARY_COLUMNS
+    * ``psd``: one Welch PSD per trace (float32)
+    * ``raw``: the trace block-averaged to at most *rawPoints* samples, NaN-padded
+    * ``psdTotal``: the PSD averaged over every trace recorded so far at the current sample rate
+
+    Appending to an existing file continues the record, keeping the PSD length and raw row length it was
+    created with (see `nperseg` and `rawPoints`).
+    """
+
+    SUMMARY_COLUMNS = ['time', 'min', 'mean', 'max', 'std', 'rms', 'rawDt', 'df']
+
+    def __init__(self, fileName, nFreq, rawPoints=10000, units=None, chunkRows=64):
+        self.fileName = fileName
+        self.total = None
+        self.lock = threading.Lock()
+        f = h5py.File(fileName, 'a')
+        if 'summary' not in f:
+            nCols = len(self.SUMMARY_COLUMNS)
+            f.attrs['summaryColumns'] = self.SUMMARY_COLUMNS
+            if units is not None:
+                f.attrs['units'] = units
+            f.create_dataset('summary', shape=(0, nCols), maxshape=(None, nCols), chunks=(chunkRows, nCols),
+                             dtype=float)
+            f.create_dataset('psd', shape=(0, nFreq), maxshape=(None, nFreq), chunks=(chunkRows, nFreq),
+                             dtype=np.float32)
+            f.create_dataset('raw', shape=(0, rawPoints), maxshape=(None, rawPoints),
+                             chunks=(max(1, chunkRows // 8), rawPoints), dtype=np.float32)
+            f.create_dataset('psdTotal', data=np.zeros(nFreq))
+        self._file = f
+        self.rawPoints = f['raw'].shape[1]
+        self.nperseg = (f['psd'].shape[1] - 1) * 2
+
+    def __len__(self):
+        return self._file['summary'].shape[0]
+
+    def append(self, t, data, acc):
+        """Append the trace *data*, acquired at time *t*, and its statistics from WelchAccumulator *acc*."""
+        f = self._file
+        raw, ds = decimate(np.asarray(data, dtype=float), self.rawPoints)
+        rawRow = np.full(self.rawPoints, np.nan, dtype=np.float32)
+        rawRow[:len(raw)] = raw
+        df = acc.rate / acc.nperseg
+        row = [t, acc.min, acc.mean, acc.max, acc.std, acc.rms, ds / acc.rate, df]
+
+        if self.total is None or self.total.rate != acc.rate or self.total.nperseg != acc.nperseg:
+            self.total = WelchAccumulator(acc.rate, acc.nperseg)
+        self.total.merge(acc)
+
+        psd = acc.psd()
+        with self.lock:
+            n = len(self)
+            for name, value in (('summary', row), ('psd', psd), ('raw', rawRow)):
+                f[name].resize(n + 1, axis=0)
+                f[name][n] = value
+            f['psdTotal'][:] = self.total.psd()
+            f.flush()
+
+    def reader(self):
+        """Return a NoiseRecord that reads through this writer's open file.
+
+        Reads and appends share a lock, so the reader never sees a partially written row.
+        """
+        return NoiseRecord(self._file, lock=self.lock)
+
+    def close(self):
+        with self.lock:
+            self._file.close()
+
+
+class NoiseRecord:
+    """Read-only access to a file written by NoiseRecordWriter.
+
+    *source* is a file name, or an open h5py.File (for example `NoiseRecordWriter.reader()`), which is then
+    left open by `close`. If given, *lock* is held during every read.
+    """
+
+    def __init__(self, source, lock=None):
+        self._lock = contextlib.nullcontext() if lock is None else lock
+        if isinstance(source, h5py.File):
+            self.fileName = source.filename
+            self._file = source
+            self._ownFile = False
+        else:
+            self.fileName = source
+            self._file = h5py.File(source, 'r')
+            self._ownFile = True
+        self._columns = list(self._file.attrs['summaryColumns'])
+
+    def __len__(self):
+        with self._lock:
+            return self._file['summary'].shape[0]
+
+    def column(self, name):
+        with self._lock:
+            return self._file['summary'][:, self._columns.index(name)]
+
+    def times(self):
+        return self.column('time')
+
+    def envelope(self):
+        """Return an (N, 4) array of [min, mean, max, std] per trace."""
+        with self._lock:
+            summary = self._file['summary'][:]
+        return summary[:, [self._columns.index(c) for c in ('min', 'mean', 'max', 'std')]]
+
+    def psd(self):
+        """Return the (N, nFreq) per-trace PSDs and the frequencies of the last trace."""
+        with self._lock:
+            psd = self._file['psd'][:]
+        df = self.column('df')[-1] if len(psd) > 0 else 1.0
+        return psd, np.arange(psd.shape[1]) * df
+
+    def totalPsd(self):
+        with self._lock:
+            return self._file['psdTotal'][:]
+
+    def units(self):
+        return self._file.attrs.get('units', None)
+
+    def raw(self, index):
+        """Return (timeValues, data) for the decimated raw trace at *index*."""
+        with self._lock:
+            data = self._file['raw'][index]
+        data = data[~np.isnan(data)]
+        dt = self.column('rawDt')[index]
+        return np.arange(len(data)) * dt, data
+
+    def close(self):
+        if self._ownFile:
+            self._file.close()
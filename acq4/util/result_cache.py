@@ -0,0 +1,142 @@
+"""
+Persistent, content-addressed cache of analysis results.
+
+Results are pickled into a single sqlite database and looked up by a key computed from everything that
+determines them: the identity of the input file (path, modification time and size), the saved state of the
+analysis that produced them, and a version number that is bumped whenever the meaning of a result changes::
+
+    cache = ResultCache('/path/to/results.sqlite')
+    key = ResultCache.makeKey('events', 1, fileIdentity(fileName), flowchartState(fc.saveState()))
+    events = cache.get(key)
+    if events is None:
+        events = fc.process(dataIn=fileName)
+        cache.put(key, events)
+
+Because keys change whenever any input changes, stale entries are never returned; they are simply no longer
+looked up. `prune` removes old entries.
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from acq4.util.DataManager import FileHandle
+
+
+def fileIdentity(fileName):
+    """Return (absolute path, mtime_ns, size) for *fileName*; the part of a cache key that identifies a file."""
+    fileName = os.path.abspath(fileName)
+    st = os.stat(fileName)
+    return fileName, st.st_mtime_ns, st.st_size
+
+
+def flowchartState(state):
+    """Return a copy of a Flowchart.saveState() structure without the node positions.
+
+    Moving nodes around in the flowchart editor does not change the results, so it should not change cache keys.
+    """
+    if isinstance(state, dict):
+        return {k: flowchartState(v) for k, v in state.items() if k != 'pos'}
+    if isinstance(state, (list, tuple)):
+        return type(state)(flowchartState(v) for v in state)
+    return state
+
+
+def _canonical(obj):
+    ## reduce obj to a deterministic string representation (dicts are sorted by key)
+    if isinstance(obj, dict):
+        items = sorted((repr(k), _canonical(v)) for k, v in obj.items())
+        return '{' + ', '.join('%s: %s' % kv for kv in items) + '}'
+    if isinstance(obj, (list, tuple)):
+        return type(obj).__name__ + '(' + ', '.join(_canonical(v) for v in obj) + ')'
+    if hasattr(obj, 'tolist') and hasattr(obj, 'dtype'):  ## numpy scalars and arrays
+        return 'array(%s, %s)' % (obj.dtype, _canonical(obj.tolist()))
+    if isinstance(obj, FileHandle):
+        ## file and dir handles (e.g. the SourceFile column of event tables); their repr includes the object id
+        return '%s(%r)' % (type(obj).__name__, obj.name())
+    return repr(obj)
+
+
+class ResultCache:
+    """Sqlite-backed store of pickled results, keyed by `makeKey` digests.
+
+    Parameters
+    ----------
+    fileName : str
+        Path of the sqlite database. It is created if it does not exist.
+    """
+
+    def __init__(self, fileName):
+        self.fileName = os.path.abspath(fileName)
+        dirName = os.path.dirname(self.fileName)
+        if not os.path.isdir(dirName):
+            os.makedirs(dirName)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.fileName, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, created REAL, data BLOB)")
+        self._db.commit()
+
+    @staticmethod
+    def makeKey(*parts):
+        """Return a hex digest identifying *parts*, which may be any nesting of dicts, lists and plain values."""
+        return hashlib.sha1(_canonical(parts).encode()).hexdigest()
+
+    def get(self, key, default=None):
+        """Return the result stored under *key*, or *default* if there is none."""
+        with self._lock:
+            row = self._db.execute("SELECT data FROM results WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return default
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            # written by an incompatible version; treat as a miss
+            return default
+
+    def put(self, key, value, commit=True):
+        """Store *value* under *key*. Values that cannot be pickled are silently not cached."""
+        self.putMany([(key, value)], commit=commit)
+
+    def putMany(self, items, commit=True):
+        """Store a sequence of (key, value) pairs in a single transaction."""
+        rows = []
+        now = time.time()
+        for key, value in items:
+            try:
+                rows.append((key, now, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+            except Exception:
+                continue
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO results (key, created, data) VALUES (?, ?, ?)", rows)
+            if commit:
+                self._db.commit()
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM results WHERE key=?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def prune(self, maxAge):
+        """Remove entries that were written more than *maxAge* seconds ago."""
+        with self._lock:
+            self._db.execute("DELETE FROM results WHERE created < ?", (time.time() - maxAge,))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM results")
+            self._db.commit()
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
@@ -0,0 +1,108 @@
+import threading
+
+import pyqtgraph as pg
+import pytest
+
+from acq4 import devices
+from acq4.devices.Device import Device
+from acq4.util.device_loader import DeviceLoader
+
+app = pg.mkQApp()
+
+
+class LoaderTestDevice(Device):
+    def __init__(self, dm, config, name):
+        Device.__init__(self, dm, config, name)
+        # parents must be completely loaded before their children are constructed
+        self.parent = dm.getDevice(config['parent']) if 'parent' in config else None
+        assert self.parent is None or self.parent.ready
+        if config.get('fail', False):
+            raise RuntimeError("device failed to initialize")
+        self.initThread = threading.current_thread()
+        dm.order.append(name)
+        self.ready = True
+
+
+class FakeManager:
+    def __init__(self):
+        self.devices = {}
+        self.order = []
+
+    def declareInterface(self, name, types, obj):
+        pass
+
+    def loadDevice(self, driver, conf, name):
+        dev = devices.getDeviceClass(driver)(self, conf, name)
+        self.devices[name] = dev
+        return dev
+
+    def getDevice(self, name):
+        return self.devices[name]
+
+
+def test_dependencies():
+    conf = {'parent': 'Stage', 'channels': {'ai': {'device': 'DAQ', 'channel': '/Dev1/ai0'}}}
+    deps = DeviceLoader.dependencies('Camera', conf, {'Stage', 'DAQ', 'Camera', 'Laser'})
+    assert deps == {'Stage', 'DAQ'}
+
+
+def test_dependency_order():
+    man = FakeManager()
+    # children are listed before the devices they depend on
+    entries = {'Main': ('LoaderTestDevice', {'parent': 'Dev0'})}
+    for i in range(3):
+        entries[f'Dev{i}'] = ('LoaderTestDevice', {'parent': 'Stage'})
+    entries['Stage'] = ('LoaderTestDevice', {})
+    entries['Broken'] = ('LoaderTestDevice', {'fail': True})
+
+    errors = []
+    loader = DeviceLoader(man, workers=4, onError=errors.append)
+    loaded = loader.load(entries)
+
+    assert sorted(loaded) == sorted(set(entries) - {'Broken'})
+    assert errors == ['Broken']
+    assert loader.times['Broken']['error'] is not None
+    order = man.order
+    assert all(order.index('Stage') < order.index(f'Dev{i}') for i in range(3))
+    assert order.index('Dev0') < order.index('Main')
+    assert all(dev.initThread is threading.main_thread() for dev in man.devices.values())
+    assert 'Dev1' in loader.report()
+
+
+def test_unknown_driver():
+    man = FakeManager()
+    errors = []
+    loader = DeviceLoader(man, workers=2, onError=errors.append)
+    loaded = loader.load({'A': ('NoSuchDriverClass', {}), 'B': ('LoaderTestDevice', {})})
+    assert loaded == ['B'] and errors == ['A']
+    assert loader.times['A']['error'] is not None
+
+
+def test_serial_load():
+    man = FakeManager()
+    entries = {
+        'A': ('LoaderTestDevice', {}),
+        'B': ('LoaderTestDevice', {'parent': 'A'}),
+        'C': ('LoaderTestDevice', {}),
+    }
+    loader = DeviceLoader(man, workers=0)
+    assert loader.load(entries) == ['A', 'B', 'C']
+    assert man.order == ['A', 'B', 'C']
+    assert all(dev.initThread is threading.main_thread() for dev in man.devices.values())
+
+
+def test_lazy_device_retries_after_failure():
+    from acq4.Manager import Manager
+
+    man = FakeManager()
+    man.lock = threading.RLock()
+    man.deviceLoadTimes = {}
+    man._lazyDevices = {'Lazy': ('LoaderTestDevice', {'fail': True})}
+    man.getInterface = lambda kind, name: man.devices[name]
+    with pytest.raises(RuntimeError):
+        Manager._loadLazyDevice(man, 'Lazy')
+    # the entry is kept, so the next request tries again
+    man._lazyDevices['Lazy'][1]['fail'] = False
+    dev = Manager._loadLazyDevice(man, 'Lazy')
+    assert dev is man.devices['Lazy'] and 'Lazy' not in man._lazyDevices
+    assert man.deviceLoadTimes['Lazy']['lazy']
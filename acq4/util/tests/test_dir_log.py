@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pyqtgraph as pg
+
+import acq4.util.DataManager as dm
+from acq4.util.DataManager.log_file import LogWriter, formatLogLine, parseLogLine
+
+app = pg.mkQApp()
+
+
+def test_dir_log():
+    root = tempfile.mkdtemp()
+    try:
+        rh = dm.getDirHandle(root)
+        sub = rh.mkdir('sub')
+
+        # a line in the original repr() format is still readable
+        with open(os.path.join(root, '.log'), 'w') as fd:
+            fd.write("%s\n" % repr({'__timestamp__': 1.0, '__message__': 'old', 'n': (1, 2)}))
+
+        for i in range(200):
+            target = rh if i % 2 == 0 else sub
+            target.logMsg('msg %d' % i, tags={'i': i, 'even': i % 2 == 0})
+
+        log = rh.readLog()
+        assert log[0]['__message__'] == 'old'
+        assert log[0]['n'] == (1, 2)
+        assert len(log) == 101
+
+        # recursive logs are merged in time order
+        full = rh.readLog(recursive=1)
+        assert len(full) == 201
+        assert [m['i'] for m in full[1:]] == list(range(200))
+        assert full[2]['subdir'] == os.path.join('sub', '')
+
+        # time range and tag filters
+        t0 = full[50]['__timestamp__']
+        t1 = full[60]['__timestamp__']
+        part = rh.readLog(recursive=1, startTime=t0, stopTime=t1)
+        assert [m['__timestamp__'] for m in part] == [m['__timestamp__'] for m in full[50:60]]
+        odd = rh.readLog(recursive=1, tags={'even': False})
+        assert len(odd) == 100 and all(m['subdir'] for m in odd)
+
+        # renaming closes the open log so that it is reopened at the new location
+        sub.rename('sub2')
+        sub.logMsg('after rename')
+        assert sub.readLog()[-1]['__message__'] == 'after rename'
+        rh.closeLog()
+        sub.closeLog()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_log_tag_types_round_trip():
+    tags = {'t': (1, 2), 'f': np.float64(0.5), 'i': np.int32(3), 'l': [1, (2, 3)], 'ok': {'a': [1.5, None]}}
+    for k, v in tags.items():
+        back = parseLogLine(formatLogLine({k: v}))[k]
+        assert back == v and type(back) is type(v), k
+    # plain JSON types are still written as JSON
+    assert formatLogLine({'ok': tags['ok']}).startswith('{"ok"')
+
+
+def test_open_log_files_are_limited(monkeypatch):
+    monkeypatch.setattr(LogWriter, 'maxOpenFiles', 3)
+    root = tempfile.mkdtemp()
+    try:
+        writers = [LogWriter(os.path.join(root, 'log%d' % i)) for i in range(5)]
+        for rep in range(2):
+            for i, w in enumerate(writers):
+                w.write({'i': i, 'rep': rep})
+                assert sum(w._file is not None for w in writers) <= 3
+        for i in range(5):
+            with open(os.path.join(root, 'log%d' % i)) as fd:
+                assert [parseLogLine(l)['rep'] for l in fd] == [0, 1]
+        for w in writers:
+            w.close()
+        assert not any(w in LogWriter._openWriters for w in writers)
+    finally:
+        shutil.rmtree(root)
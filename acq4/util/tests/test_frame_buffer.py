@@ -0,0 +1,62 @@
+import gc
+
+import numpy as np
+
+from acq4.util.imaging.frame_buffer import FrameRingBuffer
+
+
+def test_slots_are_recycled_after_release():
+    buf = FrameRingBuffer(size=2, shape=(4, 3))
+    a = buf.acquire()
+    assert a.shape == (4, 3)
+    assert a.dtype == np.uint16
+    assert buf.isBufferArray(a)
+    assert buf.freeSlots() == 1
+
+    # views keep the slot alive
+    view = a[1:]
+    del a
+    gc.collect()
+    assert buf.freeSlots() == 1
+    assert buf.isBufferArray(view)
+    del view
+    gc.collect()
+    assert buf.freeSlots() == 2
+
+
+def test_exhausted_pool_falls_back_to_allocation():
+    buf = FrameRingBuffer(size=2, shape=(4, 4))
+    held = [buf.acquire() for _ in range(2)]
+    extra = buf.acquire()
+    assert not buf.isBufferArray(extra)
+    assert buf.stats["fallbackAllocations"] == 1
+
+    # held slots are never overwritten by new frames
+    held[0][:] = 7
+    held[1][:] = 9
+    extra[:] = 1
+    assert (held[0] == 7).all() and (held[1] == 9).all()
+
+
+def test_reallocate_on_shape_change():
+    buf = FrameRingBuffer(size=2, shape=(4, 4))
+    old = buf.acquire()
+    old[:] = 5
+    new = buf.acquire((2, 2), np.float32)
+    assert new.shape == (2, 2) and new.dtype == np.float32
+    assert buf.stats["reallocations"] == 1
+    assert (old == 5).all()
+    del old
+    gc.collect()
+    # slot from the previous layout is not returned to the new pool
+    assert buf.freeSlots() == 1
+
+
+def test_release_while_lock_is_held():
+    # a GC pass inside acquire() can finalize an unreachable slot while the lock is held
+    buf = FrameRingBuffer(size=2, shape=(4, 4))
+    a = buf.acquire()
+    with buf._lock:
+        del a
+        gc.collect()
+    assert buf.freeSlots() == 2
@@ -0,0 +1,28 @@
+import numpy as np
+import pyqtgraph as pg
+
+from acq4.util.imaging.frame import Frame
+from acq4.util.imaging.frame_display import FrameDisplay
+
+pg.mkQApp()
+
+
+def test_background_integrates_recorded_frames_only():
+    display = FrameDisplay()
+    display.bgCtrl.ui.contAvgBgCheck.setChecked(True)
+    display.bgCtrl.ui.collectBgBtn.setChecked(True)
+
+    first = Frame(np.full((4, 4), 10, dtype=np.uint16), {"time": 0.0})
+    display.includeFrame(first)
+    assert first.info()["backgroundInfo"] is not None
+    background = display.bgCtrl.backgroundFrame.copy()
+
+    # drawing a frame does not integrate it into the background
+    display.checkForDraw(Frame(np.full((4, 4), 1000, dtype=np.uint16), {"time": 0.1}))
+    assert np.array_equal(display.bgCtrl.backgroundFrame, background)
+
+    second = Frame(np.full((4, 4), 20, dtype=np.uint16), {"time": 0.2})
+    display.includeFrame(second)
+    assert not np.array_equal(display.bgCtrl.backgroundFrame, background)
+    assert second.info()["backgroundInfo"] is not first.info()["backgroundInfo"]
+    display.quit()
@@ -0,0 +1,51 @@
+import h5py
+import numpy as np
+import pyqtgraph as pg
+
+import acq4.util.DataManager as dm
+from acq4.util.imaging import Frame
+
+
+def _makeStack(n):
+    frames = []
+    for i in range(n):
+        tr = pg.SRTTransform3D()
+        tr.scale(1e-6, 1e-6, 1)
+        tr.translate(10e-6, 20e-6, 100e-6 - i * 1e-6)
+        info = {'time': 5.0 + i * 0.1, 'transform': tr, 'pixelSize': (1e-6, 1e-6), 'objective': '40x'}
+        frames.append(Frame(np.full((8, 6), i, dtype=np.uint16), info))
+    return frames
+
+
+def test_save_and_load_stack(tmp_path):
+    dh = dm.getDirHandle(str(tmp_path))
+    frames = _makeStack(7)
+    fh = Frame.saveStack(frames, dh, "z_stack.h5")
+    assert fh.shortName() == "z_stack_000.h5"
+    assert fh.fileType() == "ChunkedVideo"
+    assert fh.read().axis == "Depth"
+
+    loaded = Frame.loadFromFileHandle(fh)
+    assert len(loaded) == 7
+    assert loaded[0].info()['objective'] == '40x'
+    # per-frame values come from the columnar datasets, not the shared info
+    assert loaded[3].time == frames[3].time
+    assert np.allclose(loaded[3].globalPosition, frames[3].globalPosition)
+    assert np.isclose(loaded[6].depth, 94e-6)
+    assert loaded[5].info() is not loaded[4].info()
+
+    # data are only read when requested
+    assert loaded[2]._loaded is None
+    assert np.all(loaded[2].data() == 2)
+    assert loaded[2].shape == (8, 6)
+    assert loaded[1]._loaded is None
+
+    # lazy frames don't keep the file open between reads
+    assert loaded[2]._reader._file is None
+    with h5py.File(fh.name(), 'r+'):
+        pass
+
+    # autoIncrement keeps stacks from the same directory apart
+    fh2 = Frame.saveStack(frames[:2], dh, "z_stack.h5")
+    assert fh2.shortName() != fh.shortName()
+    assert len(Frame.loadFromFileHandle(fh2)) == 2
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from acq4.util.imaging.sequencer import ImageSequencePipeline
+
+
+def test_pipeline_order_and_backpressure():
+    saved = []
+    pinned = []
+    release = threading.Event()
+
+    def save(frame, idx):
+        release.wait()
+        saved.append((frame, idx))
+
+    pipeline = ImageSequencePipeline({"analysis": lambda f, i: pinned.append(f), "storage": save}, maxQueueSize=2)
+    for i in range(3):
+        with pipeline.timing("acquire"):
+            pipeline.submit(f"frame{i}", i)
+
+    # storage is stalled; once its queue is full, submit must wait for it
+    threading.Timer(0.2, release.set).start()
+    start = time.time()
+    pipeline.submit("frame3", 3)
+    assert time.time() - start > 0.1
+    pipeline.close()
+
+    assert saved == [(f"frame{i}", i) for i in range(4)]
+    assert pinned == [f"frame{i}" for i in range(4)]
+    stats = pipeline.stats()
+    assert stats["acquire"]["count"] == 3
+    assert stats["storage"]["count"] == 4
+    assert stats["storage"]["blocked"] > 0.1
+    assert stats["storage"]["maxQueued"] <= 2
+
+
+def test_pipeline_errors():
+    def save(frame, idx):
+        if idx == 1:
+            raise ValueError("disk full")
+
+    pipeline = ImageSequencePipeline({"storage": save})
+    pipeline.submit("frame0", 0)
+    pipeline.submit("frame1", 1)
+    with pytest.raises(RuntimeError) as exc:
+        pipeline.close()
+    assert isinstance(exc.value.__cause__, ValueError)
+    assert pipeline.stats()["storage"]["count"] == 2
+
+
+def test_planning_error_leaves_hardware_untouched(monkeypatch):
+    import numpy as np
+    from unittest.mock import MagicMock
+    from acq4.util.imaging import sequencer
+
+    monkeypatch.setattr(sequencer.Manager, "getManager", MagicMock())
+    imager = MagicMock()
+    imager.scopeDev = None  # StageMotionModel.fromImager fails
+    imager.globalCenterPosition.return_value = np.zeros(3)
+    imager.getBoundary.return_value = (0, 0, 1e-4, 1e-4)
+    with pytest.raises(RuntimeError):
+        sequencer.run_image_sequence(imager, mosaic=(0, 0, 3e-4, 3e-4, 0), block=True)
+    imager.openShutter.assert_not_called()
+    imager.getFocusDevice.assert_not_called()
+
+
+def test_close_error_does_not_hide_acquisition_error(monkeypatch):
+    from unittest.mock import MagicMock
+    from acq4.util.imaging import sequencer
+
+    def failingClose(self):
+        raise RuntimeError("save failed")
+
+    monkeypatch.setattr(sequencer.Manager, "getManager", MagicMock())
+    monkeypatch.setattr(sequencer.ImageSequencePipeline, "close", failingClose)
+    imager = MagicMock()
+    imager.acquireFrames.side_effect = ValueError("camera lost")
+    with pytest.raises(RuntimeError) as exc:
+        sequencer.run_image_sequence(imager, storage_dir=MagicMock(), block=True)
+    assert isinstance(exc.value.__cause__, ValueError)
+    imager.openShutter.assert_called_with(False)
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+
+import pyqtgraph as pg
+
+import acq4.util.DataManager as dm
+from acq4.util.DataManager.index_cache import IndexCache
+
+app = pg.mkQApp()
+
+
+def test_index_cache():
+    root = tempfile.mkdtemp()
+    try:
+        rh = dm.getDirHandle(root)
+        rh.setInfo(description='test')
+        sub = rh.mkdir('site', info={'depth': 1})
+        cacheFile = os.path.join(root, 'cache', 'index.sqlite')
+        cache = IndexCache(cacheFile)
+
+        indexFile = dm.abspath(os.path.join(sub.name(), '.index'))
+        assert cache.get(indexFile) is None
+        assert cache.warm(root) == 2
+        assert cache.get(indexFile)['.']['depth'] == 1
+        # a second pass finds everything cached
+        assert cache.warm(root) == 0
+
+        # modifying the file invalidates the entry
+        sub.setInfo(depth=2)
+        assert cache.get(indexFile) is None
+        assert cache.read(indexFile)['.']['depth'] == 2
+        cache.close()
+
+        # DirHandles read through the cache when it is enabled
+        dm.dm.setIndexCache(cacheFile)
+        try:
+            sub._index = None
+            assert sub.info()['depth'] == 2
+            assert dm.dm.indexCache.get(indexFile)['.']['depth'] == 2
+        finally:
+            dm.dm.setIndexCache(None)
+    finally:
+        shutil.rmtree(root)
+
+
+class _CountingConnection:
+    def __init__(self, db):
+        self.db = db
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+        self.db.commit()
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def test_index_cache_commits_once_per_pass(tmp_path):
+    rh = dm.getDirHandle(str(tmp_path / 'data'), create=True)
+    rh.setInfo(description='test')
+    for i in range(5):
+        rh.mkdir('site_%d' % i, info={'depth': i})
+    cache = IndexCache(str(tmp_path / 'index.sqlite'))
+    db = cache._db = _CountingConnection(cache._db)
+
+    assert cache.warm(rh.name()) == 6
+    assert db.commits == 1
+    assert not db.in_transaction
+
+    # reads made while listing a directory are committed together
+    for i in range(5):
+        rh['site_%d' % i].setInfo(depth=i + 10)
+    dm.dm.indexCache = cache
+    try:
+        db.commits = 0
+        for i in range(5):
+            rh['site_%d' % i]._index = None
+        rh.cTimeCache.clear()
+        with dm.dm.indexCacheBatch():
+            assert [rh[name].info()['depth'] for name in rh.subDirs()] == [10, 11, 12, 13, 14]
+        assert db.commits == 1
+        assert not db.in_transaction
+    finally:
+        dm.dm.indexCache = None
+    cache.close()
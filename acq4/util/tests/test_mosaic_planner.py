@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from acq4.util.imaging.mosaic_planner import StageMotionModel, plan_mosaic
+from acq4.util.imaging.sequencer import positions_to_cover_region
+
+
+def test_motion_model():
+    model = StageMotionModel(speed=[1e-3, 1e-3, 0.5e-3], acceleration=10e-3, settleTime=0.1)
+    # short move never reaches full speed: t = 2 * sqrt(d / a)
+    assert np.isclose(model.moveTime([0, 0, 0], [50e-6, 0, 0]), 2 * np.sqrt(50e-6 / 10e-3) + 0.1)
+    # long move: t = d / v + v / a; axes move together, so the slowest one counts
+    assert np.isclose(model.moveTime([0, 0, 0], [1e-3, 0.5e-3, 0]), 1 + 0.1 + 0.1)
+    assert model.moveTime([1, 2, 3], [1, 2, 3]) == 0
+    cost = model.costMatrix(np.random.uniform(0, 1e-3, (5, 3)))
+    assert cost.shape == (5, 5) and np.allclose(cost, cost.T)
+
+
+def test_plan_orders():
+    grid = list(positions_to_cover_region((0, 0, 3e-3, -2e-3, 50e-6), np.array([1e-4, -1e-4, 0.]),
+                                          (-1e-4, -1e-4, 4e-4, 3e-4)))
+    rng = np.random.default_rng(0)
+    scattered = np.c_[rng.uniform(0, 5e-3, (60, 2)), np.zeros(60)]
+    model = StageMotionModel(speed=2e-3, acceleration=5e-3, settleTime=0.05)
+    for positions, start in [(grid, [5e-3, 5e-3, 0]), (scattered, [0, 0, 0])]:
+        plans = {s: plan_mosaic(positions, start, model, strategy=s) for s in ("serpentine", "nearest", "2opt")}
+        assert np.allclose(plans["serpentine"].positions, positions)
+        for plan in plans.values():
+            # every tile is visited exactly once
+            visited = sorted(map(tuple, np.round(plan.positions, 9)))
+            assert visited == sorted(map(tuple, np.round(np.asarray(positions), 9)))
+        best = min(plans["serpentine"].predictedMoveTime(), plans["nearest"].predictedMoveTime())
+        assert plans["2opt"].predictedMoveTime() <= best + 1e-9
+    assert plans["2opt"].predictedMoveTime() < 0.5 * plans["serpentine"].predictedMoveTime()
+
+    with pytest.raises(ValueError):
+        plan_mosaic(grid, [0, 0, 0], model, strategy="random")
+
+
+def test_z_stack_directions_and_revisits():
+    positions = [(0, 0, 0), (1e-3, 0, 0), (2e-3, 0, 0)]
+    plan = plan_mosaic(positions, (0, 0, 0), StageMotionModel(), strategy="serpentine", z_stack=(1e-4, 0, 1e-6))
+    tiles = list(plan)
+    assert [t[1][:2] for t in tiles] == [(1e-4, 0), (0, 1e-4), (1e-4, 0)]
+    # each stack starts where the previous one ended; only the lateral move remains
+    assert [t[0][2] for t in tiles] == [1e-4, 0, 1e-4]
+    assert np.allclose([t[2] for t in tiles], [0.1, 1, 1])
+
+    rev = list(plan.reversed())
+    assert [t[0][0] for t in rev] == [2e-3, 1e-3, 0]
+    assert rev[0][1][:2] == (0, 1e-4) and rev[0][2] == 0
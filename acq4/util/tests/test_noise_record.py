@@ -0,0 +1,60 @@
+import numpy as np
+import scipy.signal
+
+from acq4.util.noise_record import NoiseRecord, NoiseRecordWriter, WelchAccumulator
+
+
+def test_welch_accumulator_matches_scipy():
+    rate = 10000.
+    rng = np.random.default_rng(0)
+    t = np.arange(50000) / rate
+    data = np.sin(2 * np.pi * 60 * t) + rng.normal(scale=0.1, size=len(t))
+
+    acc = WelchAccumulator(rate, nperseg=1024)
+    # uneven chunks; segments that straddle chunk boundaries must still be counted
+    for chunk in np.array_split(data, 37):
+        acc.add(chunk)
+
+    freqs, expected = scipy.signal.welch(data, fs=rate, window='hann', nperseg=1024, noverlap=512, detrend='constant')
+    assert np.allclose(acc.frequencies(), freqs)
+    assert np.allclose(acc.psd(), expected)
+    assert abs(freqs[np.argmax(acc.psd())] - 60) < rate / 1024
+    assert np.isclose(acc.rms, np.sqrt(np.mean(data ** 2)))
+    assert np.isclose(acc.std, data.std())
+    assert acc.min == data.min() and acc.max == data.max()
+
+
+def test_noise_record_roundtrip(tmp_path):
+    fileName = str(tmp_path / 'noise.h5')
+    rate = 20000.
+    writer = NoiseRecordWriter(fileName, nFreq=129, rawPoints=500, units='A')
+    reader = writer.reader()
+    traces = []
+    for i in range(3):
+        data = np.random.normal(size=4000) * (i + 1)
+        acc = WelchAccumulator(rate, nperseg=writer.nperseg)
+        acc.add(data)
+        writer.append(float(i), data, acc)
+        traces.append(data)
+        assert len(reader) == i + 1
+    writer.close()
+
+    rec = NoiseRecord(fileName)
+    assert rec.units() == 'A'
+    assert np.all(rec.times() == [0, 1, 2])
+    env = rec.envelope()
+    assert np.allclose(env[:, 1], [d.mean() for d in traces])
+    assert np.allclose(env[:, 3], [d.std() for d in traces])
+    psd, freqs = rec.psd()
+    assert psd.shape == (3, 129)
+    assert np.isclose(freqs[1], rate / 256)
+    tvals, raw = rec.raw(1)
+    assert len(raw) == 500
+    assert np.allclose(raw, traces[1].reshape(500, 8).mean(axis=1), atol=1e-5)
+    assert np.isclose(tvals[1], 8 / rate)
+    rec.close()
+
+    # reopening continues the record
+    writer = NoiseRecordWriter(fileName, nFreq=1025)
+    assert writer.nperseg == 256 and len(writer) == 3
+    writer.close()
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from acq4.util.result_cache import ResultCache, fileIdentity, flowchartState
+
+
+def test_result_cache_roundtrip(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache' / 'results.sqlite'))
+    value = {'events': np.arange(5), 'name': 'x'}
+    key = ResultCache.makeKey('events', 1, {'b': 2, 'a': np.float64(1.5)})
+    assert cache.get(key) is None
+    cache.put(key, value)
+    assert key in cache and len(cache) == 1
+    cache.close()
+
+    cache = ResultCache(str(tmp_path / 'cache' / 'results.sqlite'))
+    ## keys do not depend on dict order
+    out = cache.get(ResultCache.makeKey('events', 1, {'a': np.float64(1.5), 'b': 2}))
+    assert np.all(out['events'] == value['events']) and out['name'] == 'x'
+    assert cache.get(ResultCache.makeKey('events', 2, {'a': 1.5, 'b': 2}), 'miss') == 'miss'
+    cache.prune(-1)
+    assert len(cache) == 0
+    cache.close()
+
+
+def test_key_parts(tmp_path):
+    ## node positions do not change the key; anything else does
+    state = {'nodes': [{'name': 'a', 'pos': (0, 0), 'state': {'pos': (0, 0), 'ctrl': {'cutoff': 100}}}]}
+    moved = {'nodes': [{'name': 'a', 'pos': (5, 5), 'state': {'pos': (5, 5), 'ctrl': {'cutoff': 100}}}]}
+    changed = {'nodes': [{'name': 'a', 'pos': (0, 0), 'state': {'pos': (0, 0), 'ctrl': {'cutoff': 200}}}]}
+    key = ResultCache.makeKey(flowchartState(state))
+    assert ResultCache.makeKey(flowchartState(moved)) == key
+    assert ResultCache.makeKey(flowchartState(changed)) != key
+
+    fileName = tmp_path / 'data.ma'
+    fileName.write_bytes(b'1234')
+    ident = fileIdentity(str(fileName))
+    fileName.write_bytes(b'123456')
+    assert fileIdentity(str(fileName)) != ident
+
+
+_KEY_SCRIPT = """
+import sys
+import numpy as np
+import acq4.util.DataManager as dm
+from acq4.util.result_cache import ResultCache
+fh = dm.getHandle(sys.argv[1])
+events = np.zeros(2, dtype=[('time', float), ('SourceFile', object)])
+events['SourceFile'] = fh
+print(ResultCache.makeKey('stats', 1, fh.parent(), events))
+"""
+
+
+def test_key_is_stable_across_processes(tmp_path):
+    ## file handles must not contribute their (per-process) object ids to keys
+    fileName = tmp_path / 'data.ma'
+    fileName.write_bytes(b'1234')
+    import acq4
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(acq4.__file__)))
+    keys = [
+        subprocess.run([sys.executable, '-c', _KEY_SCRIPT, str(fileName)], capture_output=True, text=True,
+                       check=True, env=env).stdout.strip()
+        for _ in range(2)
+    ]
+    assert len(keys[0]) == 40
+    assert keys[0] == keys[1]
@@ -0,0 +1,46 @@
+import pickle
+
+import numpy as np
+import pytest
+import scipy.ndimage
+
+from acq4.util.image_registration import TemplateBank, iterativeImageTemplateMatch
+
+pytest.importorskip('skimage')
+
+
+def _makeImages():
+    rng = np.random.default_rng(1)
+    img = scipy.ndimage.gaussian_filter(rng.normal(size=(200, 260)), 2)
+    templates = np.stack([
+        img[60 + k:108 + k, 90 + 2 * k:154 + 2 * k] + rng.normal(scale=0.05 * (k + 1), size=(48, 64))
+        for k in range(6)
+    ])
+    return (img * 1000).astype(int), templates
+
+
+@pytest.mark.parametrize('workers', [None, 3])
+def test_template_bank_matches_iterative_match(workers):
+    img, templates = _makeImages()
+    bank = TemplateBank(templates, workers=workers)
+    expected = [iterativeImageTemplateMatch(img, t) for t in templates]
+    for _ in range(2):  # second pass uses cached FFTs
+        result = bank.match(img)
+        assert len(result) == len(templates)
+        for (pos1, val1), (pos2, val2) in zip(expected, result):
+            assert tuple(pos1) == tuple(pos2)
+            assert np.isclose(val1, val2)
+    assert tuple(result[0][0]) == (60, 90)
+
+
+def test_template_bank_pickle():
+    img, templates = _makeImages()
+    bank = TemplateBank(templates, workers=2)
+    result = bank.match(img)
+    bank2 = pickle.loads(pickle.dumps(bank))
+    assert bank2.signature == TemplateBank.computeSignature(templates)
+    assert bank2.signature != TemplateBank.computeSignature(templates[::-1])
+    assert [tuple(p) for p, v in bank2.match(img)] == [tuple(p) for p, v in result]
+
+    with pytest.raises(ValueError):
+        bank.match(img[:40, :40])
@@ -0,0 +1,68 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+from MetaArray import MetaArray
+
+from acq4.util.trace_cache import TraceCache
+
+
+def writeTrace(fileName, n, **kwds):
+    info = [
+        {'name': 'Channel', 'cols': [{'name': 'primary'}, {'name': 'command'}]},
+        {'name': 'Time', 'values': np.arange(n) * 1e-4},
+        {'startTime': 1.0},
+    ]
+    data = MetaArray(np.random.normal(size=(2, n)), info=info)
+    data.write(str(fileName), **kwds)
+    return data
+
+
+def _attachedSum(shared):
+    return float(shared.attach()['Channel': 'primary'].asarray().sum())
+
+
+def test_trace_cache(tmp_path):
+    cache = TraceCache(maxBytes=2 * 2 * 1000 * 8)
+    orig = writeTrace(tmp_path / 'a.ma', 1000)
+    writeTrace(tmp_path / 'b.ma', 1000)
+    writeTrace(tmp_path / 'c.ma', 1000)
+
+    data = cache.read(str(tmp_path / 'a.ma'))
+    assert np.all(data.asarray() == orig.asarray())
+    assert data.infoCopy()[-1]['startTime'] == 1.0
+    assert np.all(data['Channel': 'primary'].asarray() == orig['Channel': 'primary'].asarray())
+    with pytest.raises(ValueError):
+        data.asarray()[0, 0] = 1  ## cached data is shared and must not be modified
+    cache.read(str(tmp_path / 'a.ma'))
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    ## least recently used file is evicted once the memory limit is exceeded
+    cache.read(str(tmp_path / 'b.ma'))
+    cache.read(str(tmp_path / 'c.ma'))
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1 and stats['bytes'] == 2 * 2 * 1000 * 8
+
+    ## rewritten files are reread
+    new = writeTrace(tmp_path / 'c.ma', 500)
+    assert cache.read(str(tmp_path / 'c.ma')).shape == new.shape
+
+    ## contiguous files are memory-mapped and do not count against the limit
+    mapped = writeTrace(tmp_path / 'm.ma', 1000, mappable=True)
+    assert np.all(cache.read(str(tmp_path / 'm.ma')).asarray() == mapped.asarray())
+    assert cache.stats()['mappedBytes'] == 2 * 1000 * 8
+    cache.clear()
+
+
+def test_shared_trace(tmp_path):
+    cache = TraceCache()
+    orig = writeTrace(tmp_path / 'a.ma', 1000)
+    mapped = writeTrace(tmp_path / 'm.ma', 1000, mappable=True)
+    shared = [cache.share(str(tmp_path / 'a.ma')), cache.share(str(tmp_path / 'm.ma'))]
+    assert shared[0].shmName is not None and shared[1].fileName is not None
+    assert cache.stats()['sharedBytes'] == 2 * 1000 * 8
+
+    with multiprocessing.get_context('spawn').Pool(2) as pool:
+        sums = pool.map(_attachedSum, shared)
+    assert np.allclose(sums, [orig['Channel': 'primary'].asarray().sum(), mapped['Channel': 'primary'].asarray().sum()])
+    cache.clear()
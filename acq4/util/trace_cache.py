@@ -0,0 +1,232 @@
+"""
+Process-wide cache of MetaArray data files.
+
+Analysis modules tend to read the same clamp files over and over (switching between analyzers on one cell, or
+re-running an analysis with new parameters). TraceCache keeps recently read files in memory, keyed by path,
+modification time and size, and evicts the least recently used files once a memory limit is reached.
+
+* Uncompressed, contiguously stored HDF5 data is memory-mapped rather than read, so it costs no heap memory.
+* Everything else is read into memory. Cached arrays are read-only; callers that modify data in place must
+  copy it first.
+* `TraceCache.share` moves a cached array into a shared memory segment and returns a small, picklable
+  SharedTrace. Worker processes call `SharedTrace.attach()` to get the data without copying or rereading it.
+
+Most code should simply use::
+
+    data = readTrace(fileHandle)      # same as fileHandle.read(), but cached
+    getTraceCache().stats()           # hits, misses, memory use, ...
+"""
+import copy
+import os
+import threading
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+
+import h5py
+import numpy as np
+from MetaArray import MetaArray
+
+
+class TraceCache(object):
+    """LRU cache of MetaArray files, bounded by the number of bytes held in (shared or private) memory.
+
+    Parameters
+    ----------
+    maxBytes : int
+        Memory limit for cached data. Memory-mapped files are not counted, since their pages belong to the
+        operating system's file cache.
+    """
+
+    def __init__(self, maxBytes=2e9):
+        self.maxBytes = int(maxBytes)
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  ## path: _Entry, least recently used first
+        self._retired = []  ## released shared memory segments that are still referenced by arrays
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(fileName):
+        st = os.stat(fileName)
+        return st.st_mtime_ns, st.st_size
+
+    def read(self, fileHandle):
+        """Return the MetaArray stored in *fileHandle* (a FileHandle or file name), reading it only if needed."""
+        entry = self._get(fileHandle)
+        return MetaArray(entry.data, info=copy.deepcopy(entry.info))
+
+    def share(self, fileHandle):
+        """Return a picklable SharedTrace through which other processes can access the data without copying."""
+        with self._lock:
+            entry = self._get(fileHandle)
+            if entry.shared is None:
+                if entry.mapped:
+                    entry.shared = SharedTrace(entry.info, entry.data.shape, entry.data.dtype.str,
+                                               fileName=entry.fileName, offset=entry.offset)
+                else:
+                    shm = shared_memory.SharedMemory(create=True, size=max(1, entry.data.nbytes))
+                    data = np.ndarray(entry.data.shape, dtype=entry.data.dtype, buffer=shm.buf)
+                    data[...] = entry.data
+                    data.flags.writeable = False
+                    entry.data = data
+                    entry.shm = shm
+                    entry.shared = SharedTrace(entry.info, data.shape, data.dtype.str, shmName=shm.name)
+            return entry.shared
+
+    def stats(self):
+        """Return a dict of hit/miss counts and memory use."""
+        with self._lock:
+            entries = list(self._entries.values())
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(entries),
+                'bytes': sum(e.nbytes for e in entries),
+                'mappedBytes': sum(e.data.nbytes for e in entries if e.mapped),
+                'sharedBytes': sum(e.nbytes for e in entries if e.shm is not None),
+                'maxBytes': self.maxBytes,
+            }
+
+    def setMaxBytes(self, maxBytes):
+        with self._lock:
+            self.maxBytes = int(maxBytes)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._entries):
+                self._remove(path)
+
+    def _get(self, fileHandle):
+        fileName = os.path.abspath(fileHandle.name() if hasattr(fileHandle, 'name') else fileHandle)
+        key = self._key(fileName)
+        with self._lock:
+            entry = self._entries.get(fileName)
+            if entry is not None and entry.key == key:
+                self._entries.move_to_end(fileName)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                ## file has changed since it was cached
+                self._remove(fileName)
+            self.misses += 1
+            entry = _Entry(fileName, key)
+            self._entries[fileName] = entry
+            self._evict()
+            return entry
+
+    def _evict(self):
+        total = sum(e.nbytes for e in self._entries.values())
+        while total > self.maxBytes and len(self._entries) > 1:
+            path = next(iter(self._entries))
+            total -= self._entries[path].nbytes
+            self._remove(path)
+            self.evictions += 1
+        ## try again to release segments that were still in use when their entries were removed
+        self._retired = [shm for shm in self._retired if not _releaseSegment(shm)]
+
+    def _remove(self, path):
+        entry = self._entries.pop(path)
+        if entry.shm is not None:
+            entry.shm.unlink()
+            entry.data = None
+            if not _releaseSegment(entry.shm):
+                self._retired.append(entry.shm)
+
+
+class _Entry(object):
+    def __init__(self, fileName, key):
+        self.fileName = fileName
+        self.key = key
+        self.shm = None
+        self.shared = None
+        self.offset = None
+        self.mapped = False
+
+        if h5py.is_hdf5(fileName):
+            ma = MetaArray(file=fileName, readAllData=False)
+            dataset = ma._data
+            try:
+                self.offset = dataset.id.get_offset()
+                if self.offset is not None and dataset.compression is None and dataset.size > 0:
+                    data = MetaArray.mapHDF5Array(dataset)
+                    self.mapped = True
+                else:
+                    data = dataset[:]
+            finally:
+                ma._openFile.close()
+        else:
+            ma = MetaArray(file=fileName)
+            data = ma.asarray()
+        if not self.mapped:
+            data.flags.writeable = False
+        self.info = ma._info
+        self.data = data
+
+    @property
+    def nbytes(self):
+        return 0 if self.mapped else self.data.nbytes
+
+
+def _releaseSegment(shm):
+    ## close a shared memory segment unless arrays still refer to its buffer
+    try:
+        shm.close()
+        return True
+    except BufferError:
+        return False
+
+
+_attached = {}
+
+
+class SharedTrace(object):
+    """Picklable reference to data held by a TraceCache, either in shared memory or in a memory-mappable file.
+
+    The segment stays valid as long as the owning cache keeps the file; after it is evicted, processes that
+    already attached keep their data, but new attaches fail.
+    """
+
+    def __init__(self, info, shape, dtype, shmName=None, fileName=None, offset=None):
+        self.info = info
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self.shmName = shmName
+        self.fileName = fileName
+        self.offset = offset
+
+    def attach(self):
+        """Return a read-only MetaArray backed by the shared data."""
+        if self.shmName is None:
+            data = np.memmap(self.fileName, dtype=self.dtype, mode='r', offset=self.offset, shape=self.shape)
+        else:
+            shm = _attached.get(self.shmName)
+            if shm is None:
+                shm = shared_memory.SharedMemory(name=self.shmName)
+                ## the creating process owns the segment; don't let this process's resource tracker remove it
+                if os.name == 'posix':
+                    resource_tracker.unregister(shm._name, 'shared_memory')
+                _attached[self.shmName] = shm
+            data = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+            data.flags.writeable = False
+        return MetaArray(data, info=self.info)
+
+
+_cache = None
+_cacheLock = threading.Lock()
+
+
+def getTraceCache():
+    """Return the process-wide TraceCache."""
+    global _cache
+    with _cacheLock:
+        if _cache is None:
+            _cache = TraceCache()
+        return _cache
+
+
+def readTrace(fileHandle):
+    """Read a MetaArray file through the process-wide TraceCache."""
+    return getTraceCache().read(fileHandle)
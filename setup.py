@@ -91,5 +91,9 @@ setup(
     author_email='luke.campagnola@gmail.com',
     version=version,
     packages=packages,
+    extras_require={
+        # blosc / lz4 compression for ChunkedVideo recordings
+        'video-compression': ['hdf5plugin'],
+    },
 )
 